@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:14
+
+import books.images
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Renditions de la photo'),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, storage=books.images.content_addressed_storage, upload_to='profiles/', verbose_name='Photo de profil'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from books.images import content_addressed_storage
+
 
 class CustomUser(AbstractUser):
     """Modèle utilisateur personnalisé avec des champs supplémentaires"""
@@ -29,10 +31,17 @@ class CustomUser(AbstractUser):
     )
     profile_picture = models.ImageField(
         upload_to='profiles/', 
+        storage=content_addressed_storage,
         blank=True, 
         null=True,
         verbose_name="Photo de profil"
     )
+    profile_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Renditions de la photo"
+    )
     
     class Meta:
         verbose_name = "Utilisateur"
@@ -63,12 +63,8 @@ def profile_detail(request):
     # Statistiques de l'utilisateur
     from loans.models import Loan
     total_loans = Loan.objects.filter(borrower=user).count()
-    active_loans = Loan.objects.filter(borrower=user, returned_date__isnull=True).count()
-    overdue_loans = Loan.objects.filter(
-        borrower=user, 
-        returned_date__isnull=True,
-        due_date__lt=timezone.now().date()
-    ).count()
+    active_loans = Loan.objects.filter(borrower=user).active().count()
+    overdue_loans = Loan.objects.filter(borrower=user).overdue().count()
     
     context = {
         'user': user,
@@ -1,7 +1,21 @@
 from django.contrib import admin
+from django.db.models import Count, Q
 from django.utils.html import format_html
 from django.urls import reverse
+from .admin_filters import DateDrilldownFilter
+from .autocomplete import PREFIX_END
 from .models import Book, Author, Publisher, Category, BookReview
+from .normalize import normalize_key, sort_key
+from .pagination import EstimatedCountPaginator
+
+
+def book_count_link(obj, lookup):
+    """Lien vers les livres filtrés (nombre annoté par la requête de la liste)"""
+    count = obj.book_count
+    if count > 0:
+        url = reverse('admin:books_book_changelist') + f'?{lookup}={obj.id}'
+        return format_html('<a href="{}">{} livre{}</a>', url, count, 's' if count > 1 else '')
+    return '0'
 
 
 @admin.register(Category)
@@ -11,14 +25,14 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     ordering = ['name']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(book_count=Count('book'))
+    
     def book_count(self, obj):
         """Nombre de livres dans la catégorie"""
-        count = obj.book_set.count()
-        if count > 0:
-            url = reverse('admin:books_book_changelist') + f'?category__id__exact={obj.id}'
-            return format_html('<a href="{}">{} livre{}</a>', url, count, 's' if count > 1 else '')
-        return '0'
+        return book_count_link(obj, 'category__id__exact')
     book_count.short_description = 'Nombre de livres'
+    book_count.admin_order_field = 'book_count'
 
 
 @admin.register(Author)
@@ -27,20 +41,23 @@ class AuthorAdmin(admin.ModelAdmin):
     list_display = ['get_full_name', 'nationality', 'birth_date', 'book_count']
     list_filter = ['nationality', 'birth_date']
     search_fields = ['first_name', 'last_name', 'nationality']
-    ordering = ['last_name', 'first_name']
+    ordering = ['last_name_key', 'first_name_key']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(book_count=Count('book'))
     
     def get_full_name(self, obj):
         return f"{obj.first_name} {obj.last_name}"
     get_full_name.short_description = 'Nom complet'
+    get_full_name.admin_order_field = 'last_name_key'
     
     def book_count(self, obj):
         """Nombre de livres de l'auteur"""
-        count = obj.book_set.count()
-        if count > 0:
-            url = reverse('admin:books_book_changelist') + f'?authors__id__exact={obj.id}'
-            return format_html('<a href="{}">{} livre{}</a>', url, count, 's' if count > 1 else '')
-        return '0'
+        return book_count_link(obj, 'authors__id__exact')
     book_count.short_description = 'Nombre de livres'
+    book_count.admin_order_field = 'book_count'
 
 
 @admin.register(Publisher)
@@ -48,16 +65,17 @@ class PublisherAdmin(admin.ModelAdmin):
     """Administration des éditeurs"""
     list_display = ['name', 'book_count', 'website']
     search_fields = ['name', 'address']
-    ordering = ['name']
+    ordering = ['name_key']
+    show_full_result_count = False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(book_count=Count('book'))
     
     def book_count(self, obj):
         """Nombre de livres de l'éditeur"""
-        count = obj.book_set.count()
-        if count > 0:
-            url = reverse('admin:books_book_changelist') + f'?publisher__id__exact={obj.id}'
-            return format_html('<a href="{}">{} livre{}</a>', url, count, 's' if count > 1 else '')
-        return '0'
+        return book_count_link(obj, 'publisher__id__exact')
     book_count.short_description = 'Nombre de livres'
+    book_count.admin_order_field = 'book_count'
 
 
 @admin.register(Book)
@@ -65,11 +83,17 @@ class BookAdmin(admin.ModelAdmin):
     """Administration des livres"""
     list_display = ['title', 'get_authors_display', 'category', 'publisher', 'publication_date', 
                    'available_copies', 'total_copies', 'is_active', 'created_at']
-    list_filter = ['category', 'publisher', 'language', 'is_active', 'publication_date', 'created_at']
-    search_fields = ['title', 'isbn', 'authors__first_name', 'authors__last_name', 'keywords']
+    list_select_related = ['category', 'publisher']
+    # Éditeurs trop nombreux pour un filtre latéral : lien « N livres » de leur liste
+    list_filter = ['category', 'language', 'is_active', ('created_at', DateDrilldownFilter)]
+    # Recherche par préfixe sur des colonnes indexées (voir get_search_results)
+    search_fields = ['title', 'isbn']
+    search_help_text = "Début du titre, de l'ISBN ou du nom d'un auteur"
     ordering = ['-created_at']
-    filter_horizontal = ['authors']
+    autocomplete_fields = ['authors', 'publisher', 'category']
     readonly_fields = ['created_at', 'updated_at', 'added_by']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Informations principales', {
@@ -93,6 +117,32 @@ class BookAdmin(admin.ModelAdmin):
         })
     )
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('authors')
+    
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Préfixe du titre (avec ou sans article), début d'ISBN ou nom d'auteur :
+        intervalles sur des colonnes indexées, les auteurs en sous-requête (ni
+        jointure sur toute la table ni DISTINCT)
+        """
+        prefix = normalize_key(search_term)
+        if not prefix:
+            return queryset, False
+        end = prefix + PREFIX_END
+        title = sort_key(search_term) or prefix
+        authors = Book.authors.through.objects.filter(
+            author__last_name_key__gte=prefix, author__last_name_key__lt=end
+        ).values('book_id')
+        term = search_term.strip()
+        condition = (
+            Q(title_key__gte=prefix, title_key__lt=end)
+            | Q(sort_title__gte=title, sort_title__lt=title + PREFIX_END)
+            | Q(isbn__gte=term, isbn__lt=term + PREFIX_END)
+            | Q(pk__in=authors)
+        )
+        return queryset.filter(condition), False
+    
     def save_model(self, request, obj, form, change):
         """Enregistrer l'utilisateur qui ajoute le livre"""
         if not change:  # Nouveau livre
@@ -109,10 +159,14 @@ class BookAdmin(admin.ModelAdmin):
 class BookReviewAdmin(admin.ModelAdmin):
     """Administration des avis sur les livres"""
     list_display = ['book', 'reviewer', 'rating', 'created_at']
-    list_filter = ['rating', 'created_at']
+    list_select_related = ['book', 'reviewer']
+    list_filter = ['rating', ('created_at', DateDrilldownFilter)]
     search_fields = ['book__title', 'reviewer__username', 'comment']
     ordering = ['-created_at']
+    autocomplete_fields = ['book', 'reviewer']
     readonly_fields = ['created_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def get_readonly_fields(self, request, obj=None):
         """Champs en lecture seule"""
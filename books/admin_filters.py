@@ -0,0 +1,84 @@
+"""
+Filtres partagés des listes de l'administration.
+
+``DateDrilldownFilter`` remplace ``date_hierarchy`` sur les grandes tables :
+la hiérarchie de Django liste les années par un ``SELECT DISTINCT`` sur la
+date tronquée, qui parcourt toute la table (11 s pour un million d'emprunts
+sous SQLite). Ici les années vont de la première à la dernière valeur de
+la colonne (deux lectures de son index) et le choix d'une année ou d'un
+mois devient un filtre d'intervalle ``__gte`` / ``__lt``, lui aussi indexé.
+"""
+import datetime
+
+from django.contrib import admin
+from django.db import models
+from django.utils import timezone
+from django.utils.dates import MONTHS
+
+
+class DateDrilldownFilter(admin.FieldListFilter):
+    """Années puis mois d'une colonne date indexée, en filtres d'intervalle"""
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg_since = f'{field_path}__gte'
+        self.lookup_kwarg_until = f'{field_path}__lt'
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.is_datetime = isinstance(field, models.DateTimeField)
+        # Deux lectures d'index : SQLite n'optimise pas MIN et MAX dans une même requête
+        values = model._default_manager.filter(**{f'{field_path}__isnull': False})
+        values = values.values_list(field_path, flat=True)
+        self.first = self._to_date(values.order_by(field_path).first())
+        self.last = self._to_date(values.order_by(f'-{field_path}').first())
+        self.title = getattr(field, 'verbose_name', field_path)
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg_since, self.lookup_kwarg_until]
+
+    def has_output(self):
+        return self.first is not None
+
+    def _to_date(self, value):
+        """Date locale d'une valeur de la colonne"""
+        if isinstance(value, datetime.datetime):
+            return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+        return value
+
+    def _bound(self, day):
+        """Valeur de paramètre d'un début de période (minuit local pour un DateTimeField)"""
+        if self.is_datetime:
+            return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min)).isoformat()
+        return day.isoformat()
+
+    def _choice(self, changelist, label, since, until):
+        params = {self.lookup_kwarg_since: self._bound(since), self.lookup_kwarg_until: self._bound(until)}
+        return {
+            'selected': all(self.used_parameters.get(k) == v for k, v in params.items()),
+            'query_string': changelist.get_query_string(params),
+            'display': label,
+        }
+
+    def _selected_year(self):
+        """Année de la période choisie (ses mois sont proposés), ou None"""
+        try:
+            return datetime.date.fromisoformat(self.used_parameters[self.lookup_kwarg_since][:10]).year
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def choices(self, changelist):
+        yield {
+            'selected': not self.used_parameters,
+            'query_string': changelist.get_query_string(remove=self.expected_parameters()),
+            'display': "Toutes les dates",
+        }
+        selected = self._selected_year()
+        for year in range(self.last.year, self.first.year - 1, -1):
+            start = datetime.date(year, 1, 1)
+            yield self._choice(changelist, str(year), start, datetime.date(year + 1, 1, 1))
+            if year != selected:
+                continue
+            for month, name in MONTHS.items():
+                start = datetime.date(year, month, 1)
+                if not self.first.replace(day=1) <= start <= self.last:
+                    continue
+                end = datetime.date(year + month // 12, month % 12 + 1, 1)
+                yield self._choice(changelist, f'— {name}', start, end)
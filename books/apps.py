@@ -5,3 +5,6 @@ class BooksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'books'
     verbose_name = 'Gestion des livres'
+    
+    def ready(self):
+        from . import checks, signals  # noqa: F401
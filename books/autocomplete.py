@@ -0,0 +1,270 @@
+"""
+Index de préfixes en mémoire pour l'autocomplétion de la recherche.
+
+L'index est un tableau trié de clés normalisées ``(clé, type, id)`` parcouru
+par dichotomie (``bisect``). Il est construit au démarrage du worker (ou à la
+première requête), puis tenu à jour par les signaux post_save/post_delete de
+``Book``, ``Author`` et ``Publisher``. Si sa taille estimée dépasse le budget
+mémoire (``BOOKS_AUTOCOMPLETE_MEMORY_MB``), il est vidé et les suggestions sont
+servies par des requêtes d'intervalle sur les colonnes normalisées indexées.
+
+Les signaux ne touchent que l'index du processus qui écrit : l'index retient
+les versions des espaces de noms ``books``, ``authors`` et ``publishers`` du
+cache de référence lues à sa construction, et il est reconstruit quand elles
+ont changé (écriture dans un autre worker, import par lots), au plus tard
+``BOOKS_CACHE_VERSION_TTL`` secondes après.
+"""
+import logging
+import sys
+import threading
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.urls import reverse
+
+from .cache import reference_cache
+from .models import Author, Book, Publisher
+from .normalize import normalize_key
+
+logger = logging.getLogger(__name__)
+
+# Surcoût mémoire approximatif d'une entrée (tuple, entiers, liste)
+ENTRY_OVERHEAD = 120
+# Nombre maximum d'entrées parcourues par recherche
+MAX_SCAN = 200
+# Borne haute d'un intervalle de préfixe
+PREFIX_END = '￿'
+# Espaces de noms du cache de référence dont dépend l'index
+INDEX_NAMESPACES = ('books', 'authors', 'publishers')
+
+
+def index_versions():
+    """Versions partagées des espaces de noms indexés"""
+    return tuple(reference_cache.version(namespace) for namespace in INDEX_NAMESPACES)
+
+
+def _book_keys(book):
+    """Clés d'un livre : titre complet, chaque suite de mots du titre et ISBN"""
+    words = normalize_key(book.title).split()
+    keys = {' '.join(words[i:]) for i in range(len(words))}
+    keys.add(book.isbn)
+    return keys
+
+
+def _author_keys(author):
+    first = normalize_key(author.first_name)
+    last = normalize_key(author.last_name)
+    return {f"{first} {last}".strip(), f"{last} {first}".strip(), last}
+
+
+def _publisher_keys(publisher):
+    return {normalize_key(publisher.name)}
+
+
+def _suggestion(kind, obj):
+    if kind == 'book':
+        return {'type': 'book', 'label': obj.title, 'detail': obj.isbn,
+                'url': reverse('books:detail', args=[obj.pk])}
+    if kind == 'author':
+        return {'type': 'author', 'label': obj.get_full_name(), 'detail': '',
+                'url': reverse('books:by_author', args=[obj.pk])}
+    return {'type': 'publisher', 'label': obj.name, 'detail': '',
+            'url': f"{reverse('books:search')}?publisher={obj.pk}"}
+
+
+KEY_FUNCTIONS = {
+    'book': _book_keys,
+    'author': _author_keys,
+    'publisher': _publisher_keys,
+}
+
+
+class PrefixIndex:
+    """Tableau trié de clés normalisées interrogé par dichotomie"""
+
+    def __init__(self, memory_budget=None):
+        self.memory_budget = memory_budget
+        self._lock = threading.RLock()
+        self._reset()
+        self.loaded = False
+        self.over_budget = False
+        self.versions = None
+
+    def _reset(self):
+        self._entries = []
+        self._object_keys = {}
+        self._suggestions = {}
+        self._size = 0
+
+    @property
+    def budget(self):
+        if self.memory_budget is not None:
+            return self.memory_budget
+        return getattr(settings, 'BOOKS_AUTOCOMPLETE_MEMORY_MB', 64) * 1024 * 1024
+
+    @property
+    def size(self):
+        """Taille estimée de l'index en octets"""
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _add(self, kind, obj):
+        ref = (kind, obj.pk)
+        keys = KEY_FUNCTIONS[kind](obj)
+        for key in keys:
+            insort(self._entries, (key, kind, obj.pk))
+            self._size += sys.getsizeof(key) + ENTRY_OVERHEAD
+        self._object_keys[ref] = keys
+        self._suggestions[ref] = _suggestion(kind, obj)
+
+    def _remove(self, kind, object_id):
+        ref = (kind, object_id)
+        for key in self._object_keys.pop(ref, ()):
+            entry = (key, kind, object_id)
+            position = bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+                self._size -= sys.getsizeof(key) + ENTRY_OVERHEAD
+        self._suggestions.pop(ref, None)
+
+    def _check_budget(self):
+        if self._size > self.budget:
+            logger.warning(
+                "Index d'autocomplétion au-delà du budget mémoire (%d octets) : repli sur la base",
+                self._size,
+            )
+            self._reset()
+            self.over_budget = True
+            return False
+        return True
+
+    def load(self):
+        """Construit l'index depuis la base (une requête par modèle)"""
+        with self._lock:
+            self._reset()
+            self.over_budget = False
+            # Versions lues avant les données : une écriture pendant la construction relance un chargement
+            self.versions = index_versions()
+            entries = []
+            sources = [
+                ('book', Book.objects.filter(is_active=True).only('pk', 'title', 'isbn')),
+                ('author', Author.objects.only('pk', 'first_name', 'last_name')),
+                ('publisher', Publisher.objects.only('pk', 'name')),
+            ]
+            for kind, queryset in sources:
+                for obj in queryset.iterator(chunk_size=2000):
+                    ref = (kind, obj.pk)
+                    keys = KEY_FUNCTIONS[kind](obj)
+                    entries.extend((key, kind, obj.pk) for key in keys)
+                    self._size += sum(sys.getsizeof(key) + ENTRY_OVERHEAD for key in keys)
+                    self._object_keys[ref] = keys
+                    self._suggestions[ref] = _suggestion(kind, obj)
+                    if not self._check_budget():
+                        self.loaded = True
+                        return
+            entries.sort()
+            self._entries = entries
+            self.loaded = True
+
+    def warm_up(self):
+        """Construit l'index (démarrage du worker, reconstruction) sans bloquer en cas d'erreur de base"""
+        try:
+            self.load()
+        except DatabaseError:
+            # Index incomplet : la base sert les suggestions jusqu'au prochain essai
+            self.loaded = False
+            logger.exception("Impossible de construire l'index d'autocomplétion")
+
+    def is_current(self, versions):
+        # Au-delà du budget, la base sert les suggestions : rien à reconstruire
+        return self.loaded and (self.over_budget or self.versions == versions)
+
+    def refresh(self):
+        """Construit ou reconstruit l'index si le catalogue a changé depuis sa construction"""
+        versions = index_versions()
+        if self.is_current(versions):
+            return
+        with self._lock:
+            # Un autre thread a pu recharger l'index pendant l'attente du verrou
+            if not self.is_current(versions):
+                self.warm_up()
+
+    def update(self, kind, obj, present=True):
+        """Met à jour un objet dans l'index (ignoré tant que l'index n'est pas chargé)"""
+        if not self.loaded or self.over_budget:
+            return
+        with self._lock:
+            self._remove(kind, obj.pk)
+            if present:
+                self._add(kind, obj)
+                self._check_budget()
+
+    def search(self, query, limit=10):
+        """Suggestions dont une clé commence par la requête normalisée"""
+        prefix = normalize_key(query)
+        if not prefix:
+            return []
+        with self._lock:
+            position = bisect_left(self._entries, (prefix,))
+            seen = set()
+            results = []
+            for key, kind, object_id in self._entries[position:position + MAX_SCAN]:
+                if not key.startswith(prefix):
+                    break
+                ref = (kind, object_id)
+                if ref in seen:
+                    continue
+                seen.add(ref)
+                results.append(self._suggestions[ref])
+                if len(results) >= limit:
+                    break
+        return results
+
+
+def search_database(query, limit=10):
+    """Suggestions servies par la base (intervalles sur les clés normalisées indexées)"""
+    prefix = normalize_key(query)
+    if not prefix:
+        return []
+    end = prefix + PREFIX_END
+    results = [
+        _suggestion('book', book)
+        for book in Book.objects.filter(
+            is_active=True, title_key__gte=prefix, title_key__lt=end
+        ).only('pk', 'title', 'isbn').order_by('title_key')[:limit]
+    ]
+    if query.strip().isdigit():
+        results += [
+            _suggestion('book', book)
+            for book in Book.objects.filter(
+                is_active=True, isbn__gte=query.strip(), isbn__lt=query.strip() + PREFIX_END
+            ).only('pk', 'title', 'isbn').order_by('isbn')[:limit]
+        ]
+    results += [
+        _suggestion('author', author)
+        for author in Author.objects.filter(
+            last_name_key__gte=prefix, last_name_key__lt=end
+        )[:limit]
+    ]
+    results += [
+        _suggestion('publisher', publisher)
+        for publisher in Publisher.objects.filter(
+            name_key__gte=prefix, name_key__lt=end
+        )[:limit]
+    ]
+    return results[:limit]
+
+
+# Index partagé par le processus (un par worker)
+prefix_index = PrefixIndex()
+
+
+def suggest(query, limit=10):
+    """Retourne (suggestions, source) en privilégiant l'index en mémoire"""
+    prefix_index.refresh()
+    if prefix_index.loaded and not prefix_index.over_budget:
+        return prefix_index.search(query, limit), 'memory'
+    return search_database(query, limit), 'database'
@@ -0,0 +1,227 @@
+"""
+Cache des données de référence du catalogue.
+
+Deux niveaux :
+
+- un LRU local au processus (``BOOKS_CACHE_LOCAL_ENTRIES`` entrées au plus),
+  sans sérialisation ni aller-retour réseau ;
+- le cache Django partagé (``BOOKS_CACHE_ALIAS``) derrière lui.
+
+Les clés sont versionnées par espace de noms (``categories``, ``books``...) :
+les signaux ``post_save``/``post_delete`` des modèles du catalogue incrémentent
+la version (``bump``), ce qui rend les anciennes entrées inaccessibles sans
+avoir à les retrouver pour les supprimer. Un processus relit les versions du
+cache partagé au plus toutes les ``BOOKS_CACHE_VERSION_TTL`` secondes. Une
+version perdue (cache partagé vidé) repart d'une valeur horodatée, pour ne
+pas retomber sur des entrées locales plus anciennes.
+
+Les compteurs de succès et d'échecs de chaque niveau (``stats``) servent à
+dimensionner le cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+NAMESPACES = ('categories', 'publishers', 'authors', 'books')
+
+
+class LocalLRU:
+    """Dictionnaire borné, l'entrée la moins récemment utilisée est évincée"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return default
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    """Cache à clés versionnées : LRU local devant le cache partagé"""
+
+    MISSING = object()
+
+    def __init__(self, prefix='books'):
+        self.prefix = prefix
+        self.local = LocalLRU(getattr(settings, 'BOOKS_CACHE_LOCAL_ENTRIES', 512))
+        self._versions = {}
+        self._counters_lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def shared(self):
+        return caches[getattr(settings, 'BOOKS_CACHE_ALIAS', 'default')]
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'BOOKS_CACHE_TIMEOUT', 3600)
+
+    def reset_stats(self):
+        self.counters = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+    def _count(self, name):
+        with self._counters_lock:
+            self.counters[name] += 1
+
+    def _version_key(self, namespace):
+        return f'{self.prefix}:version:{namespace}'
+
+    def version(self, namespace):
+        """Version courante d'un espace de noms (relue périodiquement dans le cache partagé)"""
+        cached = self._versions.get(namespace)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        key = self._version_key(namespace)
+        version = self.shared.get(key)
+        if version is None:
+            self.shared.add(key, time.time_ns(), None)
+            version = self.shared.get(key)
+        self._remember_version(namespace, version)
+        return version
+
+    def _remember_version(self, namespace, version):
+        ttl = getattr(settings, 'BOOKS_CACHE_VERSION_TTL', 2)
+        self._versions[namespace] = (time.monotonic() + ttl, version)
+
+    def bump(self, *namespaces):
+        """Invalide toutes les entrées des espaces de noms donnés"""
+        for namespace in namespaces:
+            key = self._version_key(namespace)
+            try:
+                version = self.shared.incr(key)
+            except ValueError:
+                version = time.time_ns()
+                self.shared.set(key, version, None)
+            self._remember_version(namespace, version)
+
+    def clear_local(self):
+        """Vide le niveau local et oublie les versions connues du processus"""
+        self.local.clear()
+        self._versions.clear()
+
+    def key(self, name, namespaces):
+        versions = '.'.join(str(self.version(ns)) for ns in namespaces)
+        return f'{self.prefix}:{name}:{versions}'
+
+    def get_or_set(self, name, compute, namespaces, timeout=None):
+        """Valeur en cache (local puis partagé) ou calculée par ``compute()``"""
+        key = self.key(name, namespaces)
+        value = self.local.get(key, self.MISSING)
+        if value is not self.MISSING:
+            self._count('local_hits')
+            return value
+        timeout = timeout or self.timeout
+        value = self.shared.get(key, self.MISSING)
+        if value is not self.MISSING:
+            self._count('shared_hits')
+        else:
+            self._count('misses')
+            value = compute()
+            self.shared.set(key, value, timeout)
+        self.local.set(key, value, timeout)
+        return value
+
+    def stats(self):
+        lookups = sum(self.counters.values())
+        hits = self.counters['local_hits'] + self.counters['shared_hits']
+        return {
+            **self.counters,
+            'hit_ratio': round(hits / lookups, 3) if lookups else None,
+            'local_entries': len(self.local),
+            'local_max_entries': self.local.max_entries,
+            'local_evictions': self.local.evictions,
+        }
+
+
+# Cache partagé par le processus
+reference_cache = TieredCache()
+
+
+def categories():
+    """Catégories triées par nom"""
+    from .models import Category
+    return reference_cache.get_or_set(
+        'categories', lambda: list(Category.objects.order_by('name')), ['categories']
+    )
+
+
+def category_names():
+    """{id: nom} des catégories"""
+    return reference_cache.get_or_set(
+        'category_names', lambda: {c.pk: c.name for c in categories()}, ['categories']
+    )
+
+
+def publishers():
+    """[(id, nom)] des éditeurs, dans l'ordre alphabétique normalisé"""
+    from .models import Publisher
+    return reference_cache.get_or_set(
+        'publishers',
+        lambda: list(Publisher.objects.order_by('name_key').values_list('pk', 'name')),
+        ['publishers'],
+    )
+
+
+def publisher_names():
+    """{id: nom} des éditeurs"""
+    return reference_cache.get_or_set('publisher_names', lambda: dict(publishers()), ['publishers'])
+
+
+def languages():
+    """Langues des livres actifs"""
+    from .models import Book
+    return reference_cache.get_or_set(
+        'languages',
+        lambda: list(
+            Book.objects.filter(is_active=True).order_by('language')
+            .values_list('language', flat=True).distinct()
+        ),
+        ['books'],
+    )
+
+
+def book_detail_bundle(book):
+    """
+    Données stables de la fiche d'un livre : auteurs, catégorie, éditeur et
+    livres similaires. Le stock n'y figure pas (il change sans signal).
+    """
+    from .recommendations import similar_books
+
+    def compute():
+        return {
+            'authors': list(book.authors.all()),
+            'category': book.category,
+            'publisher': book.publisher,
+            'similar_books': similar_books(book, limit=4),
+        }
+
+    return reference_cache.get_or_set(f'book:{book.pk}', compute, list(NAMESPACES))
@@ -0,0 +1,29 @@
+"""
+Vérifications au démarrage (``manage.py check``, ``runserver``, ``migrate``).
+
+Le cache du catalogue (``BOOKS_CACHE_ALIAS``) porte les versions invalidées
+par les signaux : un cache local au processus (``LocMemCache``) ne les
+transmet pas aux autres workers, qui serviraient des données périmées. Il
+est refusé dès que ``WEB_CONCURRENCY`` dépasse 1.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    alias = getattr(settings, 'BOOKS_CACHE_ALIAS', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend not in LOCAL_BACKENDS:
+        return []
+    workers = getattr(settings, 'WEB_CONCURRENCY', 1)
+    if workers > 1:
+        return [Error(
+            f"Le cache '{alias}' est local à chaque processus alors que WEB_CONCURRENCY={workers} : "
+            "les invalidations n'atteignent pas les autres workers.",
+            hint="Configurer un cache partagé : CACHE_URL=redis://... ou CACHE_URL=db://.",
+            id='books.E001',
+        )]
+    return []
@@ -0,0 +1,445 @@
+"""
+Livres proches par le contenu (« plus de livres comme celui-ci »).
+
+Chaque livre est décrit par son titre, ses mots-clés, son résumé et sa
+catégorie : mots normalisés (``normalize_key``), mots vides français retirés,
+racinisation légère par suffixes. Le titre et les mots-clés comptent double,
+la catégorie est un terme à part (``#cat<id>``).
+
+Construction (commande ``build_content_index``), par lots vectorisés :
+
+1. matrice creuse TF-IDF livres × termes (fréquence sous-linéaire, termes
+   présents dans au moins ``MIN_DF`` livres), lignes normalisées ;
+2. réduction à ``dimensions`` composantes (SVD tronquée, SciPy) : le
+   vocabulaire d'un catalogue dépasse vite 30 000 termes, les vecteurs denses
+   de 128 composantes (512 octets par livre) rapprochent aussi les livres
+   aux mots voisins ;
+3. vecteurs normalisés écrits dans un fichier ``.npy``.
+
+Les vues ouvrent ce fichier en mémoire partagée (``np.load(mmap_mode='r')``) :
+les pages sont celles du cache du système, communes à tous les workers
+gunicorn. Un voisinage est un produit matrice × vecteur (cosinus) suivi d'un
+``argpartition``, de l'ordre de la milliseconde pour 20 000 livres. NumPy et
+SciPy ne sont importés qu'à la première utilisation : un worker qui n'affiche
+aucun voisinage ne les charge pas.
+
+Chaque écriture produit une nouvelle génération de fichiers, publiée par le
+remplacement atomique de ``meta.json`` ; les lecteurs la voient à la requête
+suivante. Les livres importés sont ajoutés sans tout recalculer
+(``add_books``) : projetés avec le vocabulaire, les IDF et les composantes de
+la dernière construction. Les résumés modifiés et les nouveaux mots ne sont
+pris en compte qu'à la reconstruction (``--full``).
+"""
+import itertools
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+from .models import Book
+from .normalize import normalize_key
+
+# Mots vides français (sans accents, comme les clés normalisées)
+STOPWORDS = frozenset("""
+    a ai ainsi alors apres au aucun aussi autre autres aux avant avec avoir
+    bien c ca car ce ceci cela celle celles celui ces cet cette ceux chez
+    comme comment d dans de deja des deux donc dont du elle elles en encore
+    entre est et etaient etait ete etre eu fait faire fois font hors il ils
+    j je jusqu l la le les leur leurs lors lui m ma mais me meme mes moi
+    moins mon n ne ni non nos notre nous on ont or ou par parce pas peu plus
+    pour pourquoi qu quand que quel quelle quelles quels qui quoi s sa sans
+    se selon ses si sien son sont sous sur t ta te tes toi ton tous tout
+    toute toutes tres tu un une vers voici voila vos votre vous y
+    an and of the to with
+""".split())
+
+# Suffixes retirés (racinisation légère), du plus long au plus court
+SUFFIXES = tuple(sorted((
+    'issements', 'issement', 'atrices', 'atrice', 'ateurs', 'ateur', 'ations', 'ation',
+    'ements', 'ement', 'euses', 'euse', 'eux', 'istes', 'iste', 'ismes', 'isme',
+    'ables', 'able', 'ances', 'ance', 'ences', 'ence', 'ites', 'ite', 'ives', 'ive',
+    'ifs', 'if', 'ees', 'ee', 'es', 'er', 'e', 's', 'x',
+), key=len, reverse=True))
+MIN_STEM = 3
+
+# Poids des champs dans la description d'un livre
+TITLE_WEIGHT = 2
+KEYWORDS_WEIGHT = 2
+SUMMARY_WEIGHT = 1
+CATEGORY_WEIGHT = 1
+
+# Termes présents dans moins de MIN_DF livres ignorés (fautes, noms propres isolés)
+MIN_DF = 2
+# Livres lus et projetés par lot
+BATCH_SIZE = 2000
+# Similarité minimale d'un voisin
+MIN_SCORE = 0.1
+# Verrou d'écriture abandonné (processus interrompu) au-delà de ce délai (secondes)
+STALE_LOCK_SECONDS = 600
+LOCK_TIMEOUT = 60
+
+
+def stem(word):
+    """Racine d'un mot normalisé : 'recettes' -> 'recett'"""
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            return word[:-len(suffix)]
+    return word
+
+
+def analyze(text):
+    """Termes d'un texte : mots normalisés, sans mots vides ni nombres, racinisés"""
+    return [
+        stem(word) for word in normalize_key(text).split()
+        if len(word) > 1 and word not in STOPWORDS and not word.isdigit()
+    ]
+
+
+def document_terms(title, keywords, summary, category_id):
+    """Couples (terme, poids) décrivant un livre"""
+    for text, weight in ((title, TITLE_WEIGHT), (keywords, KEYWORDS_WEIGHT), (summary, SUMMARY_WEIGHT)):
+        for term in analyze(text):
+            yield term, weight
+    if category_id:
+        yield f'#cat{category_id}', CATEGORY_WEIGHT
+
+
+def _term_counts(rows, vocabulary, grow):
+    """
+    Matrice creuse des fréquences pondérées d'un lot de lignes (pk, titre,
+    mots-clés, résumé, catégorie) ; ``grow`` ajoute les termes inconnus au
+    vocabulaire, sinon ils sont ignorés
+    """
+    import numpy as np
+    from scipy import sparse
+
+    indptr, indices, data = [0], [], []
+    for _, *fields in rows:
+        counts = {}
+        for term, weight in document_terms(*fields):
+            index = vocabulary.get(term)
+            if index is None:
+                if not grow:
+                    continue
+                index = vocabulary[term] = len(vocabulary)
+            counts[index] = counts.get(index, 0) + weight
+        indices.extend(counts)
+        data.extend(counts.values())
+        indptr.append(len(indices))
+    return sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int64), np.asarray(indptr)),
+        shape=(len(rows), len(vocabulary)),
+    )
+
+
+def _tfidf(counts, idf):
+    """Pondération TF-IDF (fréquence sous-linéaire) et normalisation des lignes"""
+    import numpy as np
+    from scipy import sparse
+
+    weighted = counts.astype(np.float32, copy=True)
+    weighted.data = 1 + np.log(weighted.data)
+    weighted = weighted @ sparse.diags(idf)
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    return sparse.diags(_inverse(norms)) @ weighted
+
+
+def _inverse(norms):
+    """Inverses des normes, 0 pour les vecteurs nuls"""
+    import numpy as np
+
+    inverse = np.zeros_like(norms, dtype=np.float32)
+    np.divide(1, norms, out=inverse, where=norms > 0)
+    return inverse
+
+
+def _project(tfidf, components):
+    """Vecteurs réduits normalisés (float32) de lignes TF-IDF"""
+    import numpy as np
+
+    vectors = np.asarray(tfidf @ components, dtype=np.float32)
+    vectors *= _inverse(np.linalg.norm(vectors, axis=1))[:, None]
+    return vectors
+
+
+def _rows(queryset):
+    """Lots de lignes (pk, titre, mots-clés, résumé, catégorie), lus en flux"""
+    rows = queryset.order_by('pk').values_list(
+        'pk', 'title', 'keywords', 'summary', 'category_id'
+    ).iterator(chunk_size=BATCH_SIZE)
+    while True:
+        batch = list(itertools.islice(rows, BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+# --- Stockage ---------------------------------------------------------------
+
+def index_directory():
+    return Path(settings.BOOKS_SIMILARITY_DIR)
+
+
+def _read_meta(directory):
+    try:
+        return json.loads((directory / 'meta.json').read_text())
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def _write_lock(directory):
+    """Un seul processus écrit l'index à la fois (fichier créé en exclusif)"""
+    path = directory / 'write.lock'
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        try:
+            descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - path.stat().st_mtime > STALE_LOCK_SECONDS:
+                    path.unlink()
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Index de contenu verrouillé : {path}")
+            time.sleep(0.1)
+    try:
+        yield
+    finally:
+        os.close(descriptor)
+        path.unlink(missing_ok=True)
+
+
+def _save(path, array):
+    import numpy as np
+
+    with open(path, 'wb') as handle:
+        np.save(handle, array)
+
+
+def _publish(directory, previous, ids, vectors, model=None):
+    """
+    Écrit une nouvelle génération (identifiants triés, vecteurs et, après une
+    construction, le modèle) puis la publie ; retourne les métadonnées
+    """
+    import numpy as np
+
+    generation = (previous['generation'] + 1) if previous else 1
+    order = np.argsort(ids, kind='stable')
+    meta = {
+        'generation': generation,
+        'books': len(ids),
+        'dimensions': int(vectors.shape[1]),
+        'ids': f'ids-{generation}.npy',
+        'vectors': f'vectors-{generation}.npy',
+        'model': f'model-{generation}.npz' if model is not None else previous['model'],
+    }
+    _save(directory / meta['ids'], ids[order].astype(np.int64))
+    _save(directory / meta['vectors'], vectors[order])
+    if model is not None:
+        np.savez(directory / meta['model'], **model)
+    temporary = directory / 'meta.json.tmp'
+    temporary.write_text(json.dumps(meta))
+    os.replace(temporary, directory / 'meta.json')
+
+    # Les workers qui lisent encore la génération précédente la gardent
+    # ouverte : seules les plus anciennes sont supprimées.
+    keep = {
+        current[key] for current in (meta, previous) if current
+        for key in ('ids', 'vectors', 'model')
+    }
+    for path in directory.glob('*-*.np[yz]'):
+        if path.name not in keep:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+    return meta
+
+
+def build_content_index(dimensions=None):
+    """Reconstruit l'index de tous les livres ; retourne le nombre de livres indexés"""
+    import numpy as np
+    from scipy import sparse
+    from scipy.sparse.linalg import svds
+
+    from .cache import reference_cache
+
+    dimensions = dimensions or settings.BOOKS_SIMILARITY_DIMENSIONS
+    vocabulary = {}
+    batches, ids = [], []
+    for rows in _rows(Book.objects.all()):
+        batches.append(_term_counts(rows, vocabulary, grow=True))
+        ids.extend(row[0] for row in rows)
+    for counts in batches:
+        counts.resize((counts.shape[0], len(vocabulary)))
+    counts = sparse.vstack(batches, format='csr') if batches else sparse.csr_matrix((0, 0), dtype=np.float32)
+
+    # IDF lissé, termes trop rares retirés
+    df = np.bincount(counts.indices, minlength=counts.shape[1])
+    kept = np.flatnonzero(df >= MIN_DF)
+    counts = counts[:, kept]
+    idf = (np.log((1 + len(ids)) / (1 + df[kept])) + 1).astype(np.float32)
+    terms = np.array(list(vocabulary), dtype=str)[kept] if len(kept) else np.array([], dtype=str)
+    tfidf = _tfidf(counts, idf)
+
+    if not tfidf.nnz:
+        components = np.zeros((tfidf.shape[1], 1), dtype=np.float32)
+    elif min(tfidf.shape) <= dimensions:
+        # Petit catalogue : décomposition exacte
+        _, _, vt = np.linalg.svd(tfidf.toarray(), full_matrices=False)
+        components = vt.T
+    else:
+        v0 = np.random.default_rng(0).uniform(-1, 1, min(tfidf.shape))
+        _, _, vt = svds(tfidf, k=dimensions, v0=v0)
+        components = vt.T
+    components = np.ascontiguousarray(components, dtype=np.float32)
+
+    vectors = np.vstack([
+        _project(tfidf[offset:offset + BATCH_SIZE], components)
+        for offset in range(0, tfidf.shape[0], BATCH_SIZE)
+    ] or [np.zeros((0, components.shape[1]), dtype=np.float32)])
+
+    directory = index_directory()
+    directory.mkdir(parents=True, exist_ok=True)
+    with _write_lock(directory):
+        _publish(
+            directory, _read_meta(directory), np.asarray(ids, dtype=np.int64), vectors,
+            model={'terms': terms, 'idf': idf, 'components': components},
+        )
+    reference_cache.bump('books')
+    return len(ids)
+
+
+def add_books(book_ids):
+    """
+    Ajoute à l'index existant les livres qui n'y sont pas encore (livres
+    importés), sans recalcul du modèle ; retourne le nombre de livres ajoutés
+    """
+    import numpy as np
+
+    from .cache import reference_cache
+
+    directory = index_directory()
+    book_ids = set(book_ids)
+    if not book_ids or _read_meta(directory) is None:
+        return 0
+    with _write_lock(directory):
+        meta = _read_meta(directory)
+        ids = np.load(directory / meta['ids'])
+        missing = sorted(book_ids - set(ids.tolist()))
+        if not missing:
+            return 0
+        with np.load(directory / meta['model']) as model:
+            vocabulary = {term: index for index, term in enumerate(model['terms'].tolist())}
+            idf, components = model['idf'], model['components']
+        new_ids, new_vectors = [], []
+        for offset in range(0, len(missing), BATCH_SIZE):
+            for rows in _rows(Book.objects.filter(pk__in=missing[offset:offset + BATCH_SIZE])):
+                counts = _term_counts(rows, vocabulary, grow=False)
+                new_vectors.append(_project(_tfidf(counts, idf), components))
+                new_ids.extend(row[0] for row in rows)
+        if not new_ids:
+            return 0
+        vectors = np.load(directory / meta['vectors'], mmap_mode='r')
+        _publish(
+            directory, meta,
+            np.concatenate([ids, np.asarray(new_ids, dtype=np.int64)]),
+            np.vstack([vectors, *new_vectors]),
+        )
+    reference_cache.bump('books')
+    return len(new_ids)
+
+
+# --- Lecture ----------------------------------------------------------------
+
+class ContentIndex:
+    """Index ouvert en lecture, rechargé quand une nouvelle génération est publiée"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._stamp = None
+        self._state = None
+
+    def _load(self):
+        import numpy as np
+
+        try:
+            status = (self.directory / 'meta.json').stat()
+        except FileNotFoundError:
+            self._stamp = self._state = None
+            return None
+        stamp = (status.st_ino, status.st_mtime_ns)
+        if stamp != self._stamp:
+            meta = _read_meta(self.directory)
+            try:
+                ids = np.load(self.directory / meta['ids'])
+                vectors = np.load(self.directory / meta['vectors'], mmap_mode='r')
+            except (FileNotFoundError, TypeError):
+                # Génération remplacée pendant la lecture : relue à l'appel suivant
+                return self._state
+            self._state = (meta, ids, vectors)
+            self._stamp = stamp
+        return self._state
+
+    def __len__(self):
+        state = self._load()
+        return len(state[1]) if state else 0
+
+    def nearest(self, book_id, count):
+        """Couples (identifiant, similarité) des ``count`` livres les plus proches"""
+        import numpy as np
+
+        state = self._load()
+        if state is None or count < 1:
+            return []
+        _, ids, vectors = state
+        row = int(np.searchsorted(ids, book_id))
+        if row == len(ids) or ids[row] != book_id:
+            return []
+        scores = vectors @ vectors[row]
+        scores[row] = -math.inf
+        count = min(count, len(ids) - 1)
+        if count < 1:
+            return []
+        best = np.argpartition(-scores, count - 1)[:count]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [
+            (int(ids[position]), float(scores[position]))
+            for position in best if scores[position] >= MIN_SCORE
+        ]
+
+
+_indexes = {}
+
+
+def get_index():
+    """Index du répertoire configuré, partagé par les threads du processus"""
+    directory = str(index_directory())
+    if directory not in _indexes:
+        _indexes[directory] = ContentIndex(directory)
+    return _indexes[directory]
+
+
+def similar_books(book, limit=10, exclude=()):
+    """Livres actifs au contenu le plus proche, avec leur similarité (``similarity``)"""
+    exclude = set(exclude)
+    # Marge pour les livres exclus ou inactifs
+    found = get_index().nearest(book.pk, 2 * limit + len(exclude))
+    found = [(pk, score) for pk, score in found if pk not in exclude]
+    books = Book.objects.filter(is_active=True).select_related('category').in_bulk([pk for pk, _ in found])
+    similar = []
+    for pk, score in found:
+        if pk in books:
+            books[pk].similarity = score
+            similar.append(books[pk])
+            if len(similar) == limit:
+                break
+    return similar
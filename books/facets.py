@@ -0,0 +1,124 @@
+"""
+Facettes de la recherche du catalogue.
+
+Les comptes par catégorie, langue, éditeur, disponibilité et décennie sont
+obtenus par une requête groupée par facette sur le résultat courant, sur sa
+seule colonne : le résultat a autant de lignes que la facette a de valeurs,
+et la base n'en renvoie que les ``top_n`` premières par compte décroissant.
+Seules celles-ci sont résolues (libellés) et affichées ; le reste est
+chargé à la demande.
+"""
+from django.db.models import BooleanField, Case, Count, When
+from django.db.models.functions import ExtractYear
+
+from . import cache as reference
+
+DEFAULT_TOP_N = 8
+
+FACET_LABELS = {
+    'category': 'Catégorie',
+    'language': 'Langue',
+    'publisher': 'Éditeur',
+    'available': 'Disponibilité',
+    'decade': 'Décennie',
+}
+
+
+def _facet_expressions():
+    return {
+        'category': 'category_id',
+        'language': 'language',
+        'publisher': 'publisher_id',
+        'available': Case(
+            When(available_copies__gt=0, then=True),
+            default=False,
+            output_field=BooleanField(),
+        ),
+        'decade': ExtractYear('publication_date') / 10 * 10,
+    }
+
+
+def _grouping(queryset, facet):
+    """
+    Comptes d'une facette, un GROUP BY sur sa seule colonne : (valeur, compte)
+    par compte décroissant, à découper
+    """
+    expression = _facet_expressions()[facet]
+    queryset = queryset.order_by()
+    if facet == 'language':
+        # Seule colonne texte des facettes : la valeur vide n'est pas proposée
+        queryset = queryset.exclude(language='')
+    if isinstance(expression, str):
+        key = expression
+        values = queryset.values(key)
+    else:
+        key = f'facet_{facet}'
+        values = queryset.values(**{key: expression})
+    return values.annotate(facet_count=Count('id')).order_by('-facet_count', key).values_list(key, 'facet_count')
+
+
+def _row_value(facet, value):
+    if facet == 'decade' and value is not None:
+        value = int(value)
+    return value
+
+
+def _labels(facet, values):
+    """Libellés des valeurs affichées (noms lus dans le cache de référence)"""
+    if facet in ('category', 'publisher'):
+        names = reference.category_names() if facet == 'category' else reference.publisher_names()
+        return {value: names[value] for value in values if value in names}
+    if facet == 'available':
+        return {True: 'Disponible', False: 'Emprunté'}
+    if facet == 'decade':
+        return {value: f'Années {value}' for value in values}
+    return {value: value for value in values}
+
+
+def _param_value(facet, value):
+    if facet == 'available':
+        return '1' if value else '0'
+    return str(value)
+
+
+def _build_entries(facet, ordered, request_params):
+    labels = _labels(facet, [value for value, _ in ordered])
+    entries = []
+    for value, count in ordered:
+        param = _param_value(facet, value)
+        params = request_params.copy()
+        params.pop('page', None)
+        params.pop('cursor', None)
+        params[facet] = param
+        entries.append({
+            'value': param,
+            'label': labels.get(value, value),
+            'count': count,
+            'selected': request_params.get(facet) == param,
+            'querystring': params.urlencode(),
+        })
+    return entries
+
+
+def compute_facets(queryset, request_params, top_n=DEFAULT_TOP_N):
+    """
+    Calcule les facettes du résultat courant : une petite requête groupée par
+    facette, limitée à ses ``top_n`` premières valeurs (plus une pour savoir
+    s'il en reste). Retourne une liste de dicts {name, label, values, has_more}.
+    """
+    facets = []
+    for facet, label in FACET_LABELS.items():
+        rows = [(_row_value(facet, value), count) for value, count in _grouping(queryset, facet)[:top_n + 1]]
+        facets.append({
+            'name': facet,
+            'label': label,
+            'values': _build_entries(facet, rows[:top_n], request_params),
+            'has_more': len(rows) > top_n,
+        })
+    return facets
+
+
+def facet_values(queryset, facet, request_params):
+    """Toutes les valeurs d'une facette (chargement à la demande)"""
+    rows = [(_row_value(facet, value), count) for value, count in _grouping(queryset, facet)]
+    return _build_entries(facet, rows, request_params)
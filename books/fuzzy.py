@@ -0,0 +1,144 @@
+"""
+Recherche approchée par trigrammes.
+
+La table ``TrigramEntry`` associe chaque trigramme normalisé aux livres,
+auteurs et éditeurs qui le contiennent. Une recherche ne lit que les entrées
+des trigrammes de la requête (index ``kind, gram, object_id``), regroupe les
+candidats en une requête et ne garde qu'un nombre borné d'entre eux avant de
+calculer la similarité exacte.
+"""
+from django.db import connections, router
+from django.db.models import Case, Count, IntegerField, When
+
+from .models import Author, Book, Publisher, TrigramEntry
+from .normalize import trigrams, word_similarity
+
+# Nombre maximum de trigrammes de la requête et de candidats examinés
+MAX_QUERY_GRAMS = 32
+MAX_CANDIDATES = 200
+DEFAULT_THRESHOLD = 0.3
+
+
+def _source_text(kind, obj):
+    if kind == 'book':
+        return obj.title
+    if kind == 'author':
+        return f"{obj.first_name} {obj.last_name}"
+    return obj.name
+
+
+def _keys(kind, object_ids):
+    """Retourne {id: clé normalisée} pour les objets candidats"""
+    if kind == 'book':
+        rows = Book.objects.filter(pk__in=object_ids).values_list('pk', 'title_key')
+    elif kind == 'author':
+        rows = (
+            (pk, f"{first} {last}")
+            for pk, first, last in Author.objects.filter(pk__in=object_ids).values_list(
+                'pk', 'first_name_key', 'last_name_key'
+            )
+        )
+    else:
+        rows = Publisher.objects.filter(pk__in=object_ids).values_list('pk', 'name_key')
+    return dict(rows)
+
+
+def index_object(kind, obj):
+    """Met à jour les trigrammes d'un objet (seules les différences sont écrites)"""
+    wanted = trigrams(_source_text(kind, obj))
+    existing = set(
+        TrigramEntry.objects.filter(kind=kind, object_id=obj.pk).values_list('gram', flat=True)
+    )
+    removed = existing - wanted
+    if removed:
+        TrigramEntry.objects.filter(kind=kind, object_id=obj.pk, gram__in=removed).delete()
+    added = wanted - existing
+    if added:
+        TrigramEntry.objects.bulk_create(
+            [TrigramEntry(kind=kind, object_id=obj.pk, gram=gram) for gram in added],
+            ignore_conflicts=True,
+        )
+
+
+def index_objects(kind, objects):
+    """
+    Indexe un lot d'objets nouvellement créés (import en masse, reconstruction).
+    Les lignes sont écrites par ``executemany`` : instancier un ``TrigramEntry``
+    par trigramme coûterait bien plus cher que l'insertion elle-même.
+    """
+    rows = [
+        (kind, obj.pk, gram)
+        for obj in objects
+        for gram in trigrams(_source_text(kind, obj))
+    ]
+    if not rows:
+        return
+    connection = connections[router.db_for_write(TrigramEntry)]
+    quote = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}, {}, {}) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING".format(
+        quote(TrigramEntry._meta.db_table), quote('kind'), quote('object_id'), quote('gram'),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def unindex_object(kind, object_id):
+    TrigramEntry.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def fuzzy_match(kind, text, limit=20, threshold=DEFAULT_THRESHOLD):
+    """
+    Retourne [(object_id, similarité)] des objets proches de ``text``,
+    triés par similarité décroissante.
+    """
+    query_grams = sorted(trigrams(text))[:MAX_QUERY_GRAMS]
+    if not query_grams:
+        return []
+
+    # Un candidat doit partager au moins ce nombre de trigrammes pour atteindre le seuil
+    # (la similarité de Jaccard est majorée par la part de trigrammes partagés)
+    min_hits = max(1, int(len(query_grams) * threshold))
+    candidates = (
+        TrigramEntry.objects.filter(kind=kind, gram__in=query_grams)
+        .values('object_id')
+        .annotate(hits=Count('id'))
+        .filter(hits__gte=min_hits)
+        .order_by('-hits')[:MAX_CANDIDATES]
+    )
+    candidate_ids = [row['object_id'] for row in candidates]
+    if not candidate_ids:
+        return []
+
+    scored = []
+    for object_id, key in _keys(kind, candidate_ids).items():
+        score = word_similarity(text, key)
+        if score >= threshold:
+            scored.append((object_id, score))
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored[:limit]
+
+
+def fuzzy_book_ids(query, limit=50, threshold=DEFAULT_THRESHOLD):
+    """Identifiants des livres dont le titre ou un auteur ressemble à la requête"""
+    scores = dict(fuzzy_match('book', query, limit=limit, threshold=threshold))
+
+    author_scores = dict(fuzzy_match('author', query, limit=limit, threshold=threshold))
+    if author_scores:
+        through = Book.authors.through.objects.filter(author_id__in=author_scores)
+        for book_id, author_id in through.values_list('book_id', 'author_id')[:limit]:
+            scores[book_id] = max(scores.get(book_id, 0), author_scores[author_id])
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return [book_id for book_id, _ in ranked[:limit]]
+
+
+def fuzzy_search(queryset, query, limit=50):
+    """Restreint un queryset de livres aux correspondances approchées, les plus proches en tête"""
+    book_ids = fuzzy_book_ids(query, limit=limit)
+    if not book_ids:
+        return queryset.none()
+    position = Case(
+        *[When(pk=book_id, then=index) for index, book_id in enumerate(book_ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=book_ids).annotate(fuzzy_position=position).order_by('fuzzy_position')
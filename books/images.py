@@ -0,0 +1,209 @@
+"""
+Traitement des images téléversées (couvertures, photos de profil).
+
+- Les originaux sont réencodés sans métadonnées (EXIF, XMP, commentaires ;
+  l'orientation est appliquée avant), puis rangés sous un chemin dérivé de
+  l'empreinte SHA-256 de leur contenu (``ContentAddressedStorage``) : une
+  même couverture envoyée deux fois n'est stockée qu'une fois, et un chemin
+  ne change jamais de contenu, ce qui permet de le servir avec un cache
+  « immutable ».
+- Chaque image est déclinée en renditions de taille fixe (``thumb``,
+  ``medium``) aux formats WebP et JPEG, sans métadonnées EXIF (l'orientation
+  est appliquée avant). Le résultat est enregistré dans un champ JSON du
+  modèle (``cover_renditions``, ``profile_renditions``).
+- La conversion est faite hors de la requête, après validation de la
+  transaction, par un pool de ``IMAGE_PROCESSING_WORKERS`` threads (0 : dans
+  le processus courant). La commande ``process_images`` traite les images
+  existantes en parallèle.
+"""
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import close_old_connections
+from PIL import Image, ImageOps
+
+# Boîtes (largeur, hauteur) des renditions par type d'image
+RENDITIONS = {
+    'cover': {'thumb': (200, 300), 'medium': (400, 600)},
+    'avatar': {'thumb': (64, 64), 'medium': (256, 256)},
+}
+
+# Formats produits : (format Pillow, extension, options d'encodage)
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Champs traités : modèle -> (champ image, champ des renditions, type)
+IMAGE_FIELDS = {
+    'books.Book': ('cover_image', 'cover_renditions', 'cover'),
+    'accounts.CustomUser': ('profile_picture', 'profile_renditions', 'avatar'),
+}
+
+RENDITIONS_PREFIX = 'renditions'
+
+# Balise EXIF d'orientation
+ORIENTATION_TAG = 0x0112
+
+
+def content_name(data, extension, prefix=RENDITIONS_PREFIX):
+    """Chemin d'un contenu : <prefix>/ab/cd/<sha256>.<extension>"""
+    digest = hashlib.sha256(data).hexdigest()
+    return f'{prefix}/{digest[:2]}/{digest[2:4]}/{digest}.{extension}'
+
+
+def render_renditions(data, kind):
+    """
+    Renditions d'une image : {nom: {'width', 'height', <format>: octets}}.
+    Les images sont réduites pour tenir dans leur boîte, jamais agrandies.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+    renditions = {}
+    for name, box in RENDITIONS[kind].items():
+        resized = image.copy()
+        resized.thumbnail(box, Image.LANCZOS)
+        entry = {'width': resized.width, 'height': resized.height}
+        for format_name, (pil_format, _, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            # Aucune métadonnée n'est recopiée (ni EXIF, ni profil ICC)
+            resized.save(buffer, pil_format, **options)
+            entry[format_name] = buffer.getvalue()
+        renditions[name] = entry
+    return renditions
+
+
+def strip_metadata(data):
+    """
+    Original réencodé dans son format sans métadonnées (seul le profil ICC est
+    gardé). Un JPEG sans orientation à appliquer garde ses tables de
+    quantification ; un contenu illisible ou animé est rendu tel quel.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            image_format = source.format
+            if image_format is None or getattr(source, 'n_frames', 1) > 1:
+                return data
+            options = {}
+            if source.info.get('icc_profile'):
+                options['icc_profile'] = source.info['icc_profile']
+            if source.getexif().get(ORIENTATION_TAG, 1) != 1:
+                image = ImageOps.exif_transpose(source)
+                if image_format == 'JPEG':
+                    options['quality'] = 95
+            else:
+                source.load()
+                image = source
+                if image_format == 'JPEG':
+                    options.update(quality='keep', subsampling='keep')
+            buffer = io.BytesIO()
+            image.save(buffer, image_format, **options)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return data
+    return buffer.getvalue()
+
+
+# --- Stockage -----------------------------------------------------------------
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Stockage des originaux, sans métadonnées, sous le chemin de leur empreinte (dédoublonnés)"""
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        content.seek(0)
+        data = strip_metadata(content.read())
+        digest = hashlib.sha256(data).hexdigest()
+        content = ContentFile(data)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest[:2], f'{digest}{extension}')
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+def content_addressed_storage():
+    """Stockage des champs image (appelable, pour ne pas figer le stockage dans les migrations)"""
+    return _content_storage
+
+
+_content_storage = ContentAddressedStorage()
+
+
+def store_renditions(renditions):
+    """Enregistre les renditions ; renvoie {nom: {'width', 'height', <format>: chemin}}"""
+    stored = {}
+    for name, entry in renditions.items():
+        paths = {'width': entry['width'], 'height': entry['height']}
+        for format_name, (_, extension, _) in FORMATS.items():
+            path = content_name(entry[format_name], extension)
+            if not default_storage.exists(path):
+                default_storage.save(path, ContentFile(entry[format_name]))
+            paths[format_name] = path
+        stored[name] = paths
+    return stored
+
+
+# --- Traitement ---------------------------------------------------------------
+
+def process_instance(model, pk, renditions=None):
+    """
+    Calcule (ou enregistre, si déjà calculées) les renditions d'une instance.
+    La mise à jour est conditionnelle : ignorée si l'image a changé entre-temps.
+    """
+    image_field, renditions_field, kind = IMAGE_FIELDS[model._meta.label]
+    name = model.objects.filter(pk=pk).values_list(image_field, flat=True).first()
+    stored = {}
+    if name:
+        if renditions is None:
+            with model._meta.get_field(image_field).storage.open(name, 'rb') as handle:
+                renditions = render_renditions(handle.read(), kind)
+        stored = store_renditions(renditions)
+    return model.objects.filter(pk=pk, **{image_field: name}).update(**{renditions_field: stored})
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _run(model, pk):
+    try:
+        process_instance(model, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule(model, pk):
+    """Planifie le traitement hors de la requête (dans le processus si aucun worker)"""
+    global _executor
+    workers = getattr(settings, 'IMAGE_PROCESSING_WORKERS', 2)
+    if workers <= 0:
+        process_instance(model, pk)
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='images')
+    _executor.submit(_run, model, pk)
+
+
+def rendition_url(renditions, name, format_name='jpeg'):
+    """URL d'une rendition, ou None si l'image n'est pas encore traitée"""
+    entry = (renditions or {}).get(name)
+    if not entry or format_name not in entry:
+        return None
+    return default_storage.url(entry[format_name])
@@ -0,0 +1,9 @@
+"""
+Import en masse du catalogue.
+
+- ``readers`` : lecteurs en flux (CSV, ONIX, MARC21) et analyse des
+  enregistrements en dicts normalisés. Ce module n'utilise pas l'ORM et peut
+  tourner dans des processus séparés.
+- ``loader`` : écriture par lots (``bulk_create``, upsert sur l'ISBN) avec
+  caches de déduplication des auteurs, éditeurs et catégories.
+"""
@@ -0,0 +1,210 @@
+"""
+Écriture par lots des enregistrements importés.
+
+Chaque lot est écrit dans sa propre transaction :
+
+1. éditeurs, catégories et auteurs résolus par des caches en mémoire ; seuls
+   les absents sont cherchés en base (une requête par modèle et par lot) puis
+   créés par ``bulk_create`` ;
+2. livres insérés ou mis à jour en une requête (upsert sur l'ISBN) ; les
+   exemplaires d'un livre existant ne sont pas modifiés ;
+3. table de liaison ``Book.authors`` réécrite en ``bulk_create`` ;
+4. statistiques, documents de recherche et trigrammes créés ou recalculés
+   pour le lot, les signaux ``post_save`` n'étant pas émis par ``bulk_create`` ;
+5. cache de référence invalidé et compteur de livres du tableau de bord
+   ajusté pour la même raison.
+
+Les identifiants des livres créés sont conservés (``created_ids``) : la
+commande d'import les ajoute à l'index de contenu en fin d'import.
+"""
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from dashboard import metrics
+
+from .. import fuzzy
+from ..cache import NAMESPACES, reference_cache
+from ..models import Author, Book, Category, Publisher, TrigramEntry
+from ..normalize import normalize_key, sort_key
+from ..search import update_search_documents
+from ..stats import ensure_stats
+
+# Champs mis à jour quand l'ISBN existe déjà
+UPSERT_FIELDS = [
+    'title', 'subtitle', 'title_key', 'sort_title', 'publisher', 'category',
+    'publication_date', 'pages', 'language', 'summary', 'keywords', 'updated_at',
+]
+
+
+class ImportStats:
+    """Compteurs et débit d'un import"""
+
+    def __init__(self, offset=0):
+        self.started = time.monotonic()
+        self.offset = offset
+        self.read = 0
+        self.rejected = 0
+        self.created = 0
+        self.updated = 0
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        """Enregistrements traités par seconde"""
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (
+            f"{self.offset + self.read} enregistrements lus, {self.created} livres créés, "
+            f"{self.updated} mis à jour, {self.rejected} rejetés "
+            f"({self.rate:.0f} enr./s, {self.elapsed:.1f} s)"
+        )
+
+
+class CatalogueLoader:
+    """Écrit des lots d'enregistrements normalisés (voir ``readers``)"""
+
+    def __init__(self, added_by=None):
+        self.added_by = added_by
+        self.publishers = {}
+        self.categories = {}
+        self.authors = {}
+        self.created_ids = []
+
+    # --- Caches de déduplication ---------------------------------------------
+
+    def _resolve_publishers(self, names):
+        wanted = {normalize_key(name): name for name in names}
+        missing = [key for key in wanted if key not in self.publishers]
+        if not missing:
+            return
+        for pk, key in Publisher.objects.filter(name_key__in=missing).values_list('pk', 'name_key'):
+            self.publishers.setdefault(key, pk)
+        new = [key for key in missing if key not in self.publishers]
+        if new:
+            created = [Publisher(name=wanted[key], name_key=key) for key in new]
+            Publisher.objects.bulk_create(created, ignore_conflicts=True)
+            rows = Publisher.objects.filter(name_key__in=new).values_list('pk', 'name_key')
+            for pk, key in rows:
+                self.publishers.setdefault(key, pk)
+            fuzzy.index_objects('publisher', Publisher.objects.filter(name_key__in=new))
+
+    def _resolve_categories(self, names):
+        missing = [name for name in set(names) if name not in self.categories]
+        if not missing:
+            return
+        self.categories.update(
+            Category.objects.filter(name__in=missing).values_list('name', 'pk')
+        )
+        new = [name for name in missing if name not in self.categories]
+        if new:
+            Category.objects.bulk_create([Category(name=name) for name in new], ignore_conflicts=True)
+            self.categories.update(Category.objects.filter(name__in=new).values_list('name', 'pk'))
+
+    def _resolve_authors(self, names):
+        wanted = {}
+        for first, last in names:
+            wanted.setdefault((normalize_key(first), normalize_key(last)), (first, last))
+        missing = [key for key in wanted if key not in self.authors]
+        if not missing:
+            return
+        last_names = {last for _, last in missing}
+        rows = Author.objects.filter(last_name_key__in=last_names).order_by('pk').values_list(
+            'pk', 'first_name_key', 'last_name_key'
+        )
+        for pk, first, last in rows:
+            self.authors.setdefault((first, last), pk)
+        new = [key for key in missing if key not in self.authors]
+        if new:
+            created = Author.objects.bulk_create([
+                Author(
+                    first_name=wanted[key][0][:100], last_name=wanted[key][1][:100],
+                    first_name_key=key[0][:100], last_name_key=key[1][:100],
+                )
+                for key in new
+            ])
+            if any(author.pk is None for author in created):
+                # Bases ne renvoyant pas les clés insérées : relecture des nouveaux auteurs
+                created = Author.objects.filter(last_name_key__in={last for _, last in new}).exclude(
+                    pk__in=self.authors.values()
+                )
+            for author in created:
+                self.authors.setdefault((author.first_name_key, author.last_name_key), author.pk)
+            fuzzy.index_objects('author', created)
+
+    # --- Écriture d'un lot ---------------------------------------------------
+
+    def load_batch(self, records, stats):
+        """Écrit un lot dans une transaction ; met à jour ``stats``"""
+        # Un ISBN en double dans le lot : le dernier enregistrement l'emporte
+        records = list({record['isbn']: record for record in records}.values())
+        if not records:
+            return
+        with transaction.atomic():
+            self._resolve_publishers(r['publisher'] for r in records)
+            self._resolve_categories(r['category'] for r in records)
+            self._resolve_authors(a for r in records for a in r['authors'])
+
+            isbns = [r['isbn'] for r in records]
+            existing = set(Book.objects.filter(isbn__in=isbns).values_list('isbn', flat=True))
+            now = timezone.now()
+            books = []
+            for record in records:
+                books.append(Book(
+                    isbn=record['isbn'],
+                    title=record['title'],
+                    subtitle=record['subtitle'],
+                    title_key=normalize_key(record['title']),
+                    sort_title=sort_key(record['title']),
+                    publisher_id=self.publishers[normalize_key(record['publisher'])],
+                    category_id=self.categories[record['category']],
+                    publication_date=record['publication_date'],
+                    pages=record['pages'],
+                    language=record['language'],
+                    summary=record['summary'],
+                    keywords=record['keywords'],
+                    total_copies=record['copies'],
+                    available_copies=record['copies'],
+                    added_by=self.added_by,
+                    updated_at=now,
+                ))
+            Book.objects.bulk_create(
+                books,
+                update_conflicts=True,
+                unique_fields=['isbn'],
+                update_fields=UPSERT_FIELDS,
+            )
+            book_ids = dict(Book.objects.filter(isbn__in=isbns).values_list('isbn', 'pk'))
+
+            through = Book.authors.through
+            through.objects.filter(book_id__in=book_ids.values()).delete()
+            links = {
+                (book_ids[r['isbn']], self.authors[(normalize_key(first), normalize_key(last))])
+                for r in records
+                for first, last in r['authors']
+            }
+            through.objects.bulk_create(
+                [through(book_id=book_id, author_id=author_id) for book_id, author_id in links],
+                ignore_conflicts=True,
+            )
+
+            ensure_stats(book_ids.values())
+            update_search_documents(book_ids.values())
+            TrigramEntry.objects.filter(kind='book', object_id__in=book_ids.values()).delete()
+            fuzzy.index_objects('book', [
+                Book(pk=book_ids[r['isbn']], title=r['title']) for r in records
+            ])
+            created = len(records) - len(existing)
+            if created:
+                metrics.adjust(total_books=created)
+            reference_cache.bump(*NAMESPACES)
+            transaction.on_commit(lambda: reference_cache.bump(*NAMESPACES))
+
+        self.created_ids.extend(pk for isbn, pk in book_ids.items() if isbn not in existing)
+        stats.updated += len(existing)
+        stats.created += created
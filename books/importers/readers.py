@@ -0,0 +1,366 @@
+"""
+Lecteurs en flux des fichiers de catalogue.
+
+Chaque format fournit un lecteur, qui produit des enregistrements bruts sans
+jamais charger le fichier entier, et une fonction d'analyse, qui transforme
+un enregistrement brut en dict normalisé :
+
+    {isbn, title, subtitle, authors: [(prénom, nom)], publisher, category,
+     publication_date, pages, language, summary, keywords, copies}
+
+Les fonctions d'analyse sont pures (pas d'ORM) : elles peuvent être
+exécutées dans un pool de processus.
+"""
+import csv
+import datetime
+import os
+import re
+import xml.etree.ElementTree as ET
+
+DEFAULT_CATEGORY = 'Non classé'
+DEFAULT_LANGUAGE = 'Français'
+
+LANGUAGES = {
+    'fre': 'Français', 'fra': 'Français', 'fr': 'Français',
+    'eng': 'Anglais', 'en': 'Anglais', 'en-us': 'Anglais', 'en-gb': 'Anglais', 'en-ca': 'Anglais',
+    'spa': 'Espagnol', 'es': 'Espagnol',
+    'ger': 'Allemand', 'deu': 'Allemand', 'de': 'Allemand',
+    'ita': 'Italien', 'it': 'Italien',
+    'por': 'Portugais', 'pt': 'Portugais',
+    'jpn': 'Japonais', 'ja': 'Japonais',
+}
+
+DIGITS_RE = re.compile(r'\d+')
+YEAR_RE = re.compile(r'(\d{4})')
+ISBN_RE = re.compile(r'[0-9Xx]{10,13}')
+
+
+def clean_isbn(value):
+    """Retourne un ISBN sans tirets ni espaces (10 ou 13 caractères) ou ''"""
+    if not value:
+        return ''
+    match = ISBN_RE.search(value.replace('-', '').replace(' ', ''))
+    return match.group(0).upper() if match else ''
+
+
+def parse_date(value, month_first=False):
+    """Accepte AAAA-MM-JJ, JJ/MM/AAAA (MM/JJ/AAAA si ``month_first``), AAAAMMJJ ou AAAA"""
+    value = (value or '').strip()
+    slashed = ('%m/%d/%Y', '%d/%m/%Y') if month_first else ('%d/%m/%Y', '%m/%d/%Y')
+    for fmt in ('%Y-%m-%d', *slashed, '%Y%m%d'):
+        try:
+            return datetime.datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    match = YEAR_RE.search(value)
+    if match:
+        return f'{match.group(1)}-01-01'
+    return None
+
+
+def parse_int(value, default=0):
+    match = DIGITS_RE.search(str(value or ''))
+    return int(match.group(0)) if match else default
+
+
+def split_name(name):
+    """'Hugo, Victor' ou 'Victor Hugo' -> ('Victor', 'Hugo')"""
+    name = ' '.join((name or '').replace('.', '. ').split()).strip(' ,')
+    if not name:
+        return None
+    if ',' in name:
+        last, first = [part.strip() for part in name.split(',', 1)]
+        return (first, last)
+    parts = name.rsplit(' ', 1)
+    if len(parts) == 1:
+        return ('', parts[0])
+    return (parts[0], parts[1])
+
+
+def language_label(code):
+    code = (code or '').strip()
+    return LANGUAGES.get(code.lower(), code or DEFAULT_LANGUAGE)
+
+
+def make_record(**values):
+    """Complète un enregistrement avec les valeurs par défaut ; None si inexploitable"""
+    record = {
+        'isbn': clean_isbn(values.get('isbn')),
+        'title': (values.get('title') or '').strip()[:300],
+        'subtitle': (values.get('subtitle') or '').strip()[:300],
+        'authors': [a for a in values.get('authors') or [] if a],
+        'publisher': (values.get('publisher') or '').strip()[:200] or 'Éditeur inconnu',
+        'category': (values.get('category') or '').strip()[:100] or DEFAULT_CATEGORY,
+        'publication_date': values.get('publication_date') or '1900-01-01',
+        'pages': values.get('pages') or 1,
+        'language': (values.get('language') or DEFAULT_LANGUAGE)[:50],
+        'summary': (values.get('summary') or '').strip(),
+        'keywords': (values.get('keywords') or '').strip()[:500],
+        'copies': max(1, values.get('copies') or 1),
+    }
+    if not record['isbn'] or not record['title']:
+        return None
+    return record
+
+
+# --- CSV ---------------------------------------------------------------------
+
+def read_csv(path):
+    """Lignes d'un CSV (dicts), lues une à une"""
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        # Le dataset Goodreads contient des lignes mal formées : on les ignore
+        for row in csv.DictReader(handle, skipinitialspace=True):
+            if row:
+                yield row
+
+
+def parse_csv_row(row):
+    """Colonnes génériques ou colonnes du dataset Kaggle Goodreads"""
+    row = {(key or '').strip().lower(): (value or '') for key, value in row.items()}
+    authors = row.get('authors', '')
+    separator = '/' if '/' in authors else ';'
+    # Le dataset Goodreads (colonne bookID) date au format américain
+    goodreads = 'bookid' in row
+    return make_record(
+        isbn=row.get('isbn13') or row.get('isbn'),
+        title=row.get('title'),
+        subtitle=row.get('subtitle'),
+        authors=[split_name(name) for name in authors.split(separator)],
+        publisher=row.get('publisher'),
+        category=row.get('category'),
+        publication_date=parse_date(row.get('publication_date'), month_first=goodreads),
+        pages=parse_int(row.get('pages') or row.get('num_pages'), 1),
+        language=language_label(row.get('language') or row.get('language_code')),
+        summary=row.get('summary'),
+        keywords=row.get('keywords'),
+        copies=parse_int(row.get('copies'), 1),
+    )
+
+
+# --- ONIX --------------------------------------------------------------------
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def read_onix(path):
+    """Éléments <Product> d'un fichier ONIX sérialisés un à un (mémoire constante)"""
+    context = ET.iterparse(path, events=('start', 'end'))
+    _, root = next(context)
+    for event, element in context:
+        if event == 'end' and _local(element.tag) == 'Product':
+            yield ET.tostring(element)
+            element.clear()
+            root.clear()
+
+
+def _strip_namespaces(element):
+    for node in element.iter():
+        node.tag = _local(node.tag)
+    return element
+
+
+def parse_onix_product(data):
+    """Analyse un <Product> ONIX 3.0 (balises de référence)"""
+    product = _strip_namespaces(ET.fromstring(data))
+
+    isbn = ''
+    for identifier in product.findall('ProductIdentifier'):
+        if identifier.findtext('ProductIDType') in ('15', '03', '02'):
+            isbn = identifier.findtext('IDValue', '')
+            if identifier.findtext('ProductIDType') == '15':
+                break
+
+    detail = product.find('DescriptiveDetail')
+    if detail is None:
+        detail = product
+    title_element = detail.find('TitleDetail/TitleElement')
+    title = subtitle = ''
+    if title_element is not None:
+        title = title_element.findtext('TitleText') or ' '.join(
+            filter(None, [title_element.findtext('TitlePrefix'), title_element.findtext('TitleWithoutPrefix')])
+        )
+        subtitle = title_element.findtext('Subtitle', '')
+
+    authors = []
+    for contributor in detail.findall('Contributor'):
+        if contributor.findtext('KeyNames'):
+            authors.append((contributor.findtext('NamesBeforeKey', ''), contributor.findtext('KeyNames')))
+        else:
+            authors.append(split_name(
+                contributor.findtext('PersonNameInverted') or contributor.findtext('PersonName')
+            ))
+
+    pages = 1
+    for extent in detail.findall('Extent'):
+        if extent.findtext('ExtentType') in ('00', '11', None):
+            pages = parse_int(extent.findtext('ExtentValue'), 1)
+            break
+
+    subjects = [s.findtext('SubjectHeadingText') for s in detail.findall('Subject')]
+    subjects = [s for s in subjects if s]
+
+    summary = ''
+    for text in product.findall('CollateralDetail/TextContent'):
+        summary = ' '.join(''.join(text.find('Text').itertext()).split()) if text.find('Text') is not None else ''
+        if text.findtext('TextType') == '03':
+            break
+
+    publishing = product.find('PublishingDetail')
+    publisher = publication_date = None
+    if publishing is not None:
+        publisher = publishing.findtext('Publisher/PublisherName')
+        publication_date = parse_date(publishing.findtext('PublishingDate/Date'))
+
+    return make_record(
+        isbn=isbn,
+        title=title,
+        subtitle=subtitle,
+        authors=authors,
+        publisher=publisher,
+        category=subjects[0] if subjects else None,
+        publication_date=publication_date,
+        pages=pages,
+        language=language_label(detail.findtext('Language/LanguageCode')),
+        summary=summary,
+        keywords=', '.join(subjects),
+    )
+
+
+# --- MARC21 (ISO 2709) -------------------------------------------------------
+
+RECORD_TERMINATOR = b'\x1d'
+FIELD_TERMINATOR = b'\x1e'
+SUBFIELD_DELIMITER = b'\x1f'
+
+
+def _read_to_terminator(handle, chunk_size=4096):
+    """Octets jusqu'au prochain terminateur d'enregistrement (inclus) ou la fin du fichier"""
+    data = b''
+    while True:
+        chunk = handle.read(chunk_size)
+        end = chunk.find(RECORD_TERMINATOR)
+        if end >= 0:
+            handle.seek(end + 1 - len(chunk), os.SEEK_CUR)
+            return data + chunk[:end + 1]
+        data += chunk
+        if not chunk:
+            return data
+
+
+def read_marc(path):
+    """
+    Enregistrements MARC21 bruts, lus un à un grâce à leur longueur (octets 0-4).
+    Un enregistrement à la longueur illisible ou fausse est délimité par son
+    terminateur : il est transmis tel quel et rejeté à l'analyse, la lecture
+    reprend à l'enregistrement suivant.
+    """
+    with open(path, 'rb') as handle:
+        while True:
+            start = handle.tell()
+            length = handle.read(5)
+            if len(length) < 5 or not length.strip():
+                return
+            if length.isdigit() and int(length) > 24:
+                record = length + handle.read(int(length) - 5)
+                if record.endswith(RECORD_TERMINATOR):
+                    yield record
+                    continue
+            handle.seek(start)
+            yield _read_to_terminator(handle)
+
+
+def _marc_fields(raw):
+    """Retourne {tag: [valeur brute]} d'un enregistrement ISO 2709"""
+    base_address = int(raw[12:17])
+    directory = raw[24:base_address - 1]
+    fields = {}
+    for i in range(0, len(directory) - len(directory) % 12, 12):
+        entry = directory[i:i + 12]
+        tag = entry[:3].decode('ascii')
+        length = int(entry[3:7])
+        start = int(entry[7:12])
+        value = raw[base_address + start:base_address + start + length].rstrip(FIELD_TERMINATOR)
+        fields.setdefault(tag, []).append(value)
+    return fields
+
+
+def _subfields(value):
+    """Sous-zones d'une zone de données : [(code, texte)]"""
+    result = []
+    for chunk in value.split(SUBFIELD_DELIMITER)[1:]:
+        if chunk:
+            result.append((chr(chunk[0]), chunk[1:].decode('utf-8', errors='replace').strip(' /:;,.')))
+    return result
+
+
+def _first(fields, tags, code):
+    for tag in tags:
+        for value in fields.get(tag, []):
+            for sub_code, text in _subfields(value):
+                if sub_code == code and text:
+                    return text
+    return ''
+
+
+def parse_marc_record(raw):
+    """Analyse un enregistrement bibliographique MARC21"""
+    fields = _marc_fields(raw)
+
+    authors = [split_name(_first(fields, ['100'], 'a'))] if '100' in fields else []
+    for value in fields.get('700', []):
+        name = dict(_subfields(value)).get('a')
+        if name:
+            authors.append(split_name(name))
+
+    language = ''
+    if fields.get('008'):
+        language = fields['008'][0][35:38].decode('ascii', errors='ignore')
+    language = _first(fields, ['041'], 'a') or language
+
+    subjects = []
+    for value in fields.get('650', []):
+        subject = dict(_subfields(value)).get('a')
+        if subject:
+            subjects.append(subject)
+
+    return make_record(
+        isbn=_first(fields, ['020'], 'a'),
+        title=_first(fields, ['245'], 'a'),
+        subtitle=_first(fields, ['245'], 'b'),
+        authors=authors,
+        publisher=_first(fields, ['264', '260'], 'b'),
+        category=subjects[0] if subjects else None,
+        publication_date=parse_date(_first(fields, ['264', '260'], 'c')),
+        pages=parse_int(_first(fields, ['300'], 'a'), 1),
+        language=language_label(language),
+        summary=_first(fields, ['520'], 'a'),
+        keywords=', '.join(subjects),
+    )
+
+
+FORMATS = {
+    'csv': (read_csv, parse_csv_row),
+    'onix': (read_onix, parse_onix_product),
+    'marc': (read_marc, parse_marc_record),
+}
+
+EXTENSIONS = {
+    '.csv': 'csv',
+    '.xml': 'onix',
+    '.onix': 'onix',
+    '.mrc': 'marc',
+    '.marc': 'marc',
+}
+
+
+def parse_batch(format_name, raw_records):
+    """Analyse un lot d'enregistrements bruts ; les illisibles donnent None"""
+    parser = FORMATS[format_name][1]
+    records = []
+    for raw in raw_records:
+        try:
+            records.append(parser(raw))
+        except (ValueError, IndexError, KeyError, ET.ParseError):
+            records.append(None)
+    return records
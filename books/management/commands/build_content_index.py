@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from books.content import add_books, build_content_index, get_index
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = (
+        "Construit l'index des livres proches par le contenu (TF-IDF réduit) ; "
+        "par défaut, seuls les livres absents de l'index y sont ajoutés"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Reconstruit l'index et son vocabulaire")
+        parser.add_argument(
+            '--dimensions', type=int, default=settings.BOOKS_SIMILARITY_DIMENSIONS,
+            help=f"Composantes par livre (défaut : {settings.BOOKS_SIMILARITY_DIMENSIONS})"
+        )
+
+    def handle(self, *args, **options):
+        if options['dimensions'] < 1:
+            raise CommandError("--dimensions doit être positif")
+        started = time.monotonic()
+        if options['full'] or not len(get_index()):
+            books = build_content_index(options['dimensions'])
+            action = 'reconstruit'
+        else:
+            books = add_books(Book.objects.values_list('pk', flat=True))
+            action = 'mis à jour'
+        self.stdout.write(self.style.SUCCESS(
+            f"Index de contenu {action} : {books} livres en {time.monotonic() - started:.1f} s"
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from books.recommendations import (
+    DEFAULT_BLOCK_SIZE, DEFAULT_MIN_SHARED, DEFAULT_TOP_K, refresh_similar_books,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcule les livres similaires par co-emprunt (similarité cosinus) ; "
+        "seuls les livres touchés depuis la dernière exécution sont recalculés"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Recalcule tous les livres")
+        parser.add_argument(
+            '--top-k', type=int, default=DEFAULT_TOP_K,
+            help=f"Voisins conservés par livre (défaut : {DEFAULT_TOP_K})"
+        )
+        parser.add_argument(
+            '--min-shared', type=int, default=DEFAULT_MIN_SHARED,
+            help=f"Lecteurs en commun requis pour un voisin (défaut : {DEFAULT_MIN_SHARED})"
+        )
+        parser.add_argument(
+            '--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+            help=f"Livres calculés par bloc (défaut : {DEFAULT_BLOCK_SIZE})"
+        )
+
+    def handle(self, *args, **options):
+        if options['top_k'] < 1 or options['min_shared'] < 1 or options['block_size'] < 1:
+            raise CommandError("--top-k, --min-shared et --block-size doivent être positifs")
+        run = refresh_similar_books(
+            full=options['full'],
+            top_k=options['top_k'],
+            min_shared=options['min_shared'],
+            block_size=options['block_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Livres similaires {'recalculés' if run.full else 'mis à jour'} : "
+            f"{run.books} livres en {run.duration:.1f} s"
+        ))
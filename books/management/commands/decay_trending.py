@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from books import trending
+
+
+class Command(BaseCommand):
+    help = (
+        "Ramène les scores de tendance à la date du jour (à planifier chaque nuit) ; "
+        "--rebuild les recalcule depuis les emprunts"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help="Recalcule tous les scores depuis les emprunts")
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            books = trending.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"Tendances recalculées : {books} livres"))
+        else:
+            books = trending.normalize()
+            self.stdout.write(self.style.SUCCESS(f"Tendances normalisées : {books} livres"))
@@ -0,0 +1,134 @@
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from books.content import add_books
+from books.importers.loader import CatalogueLoader, ImportStats
+from books.importers.readers import EXTENSIONS, FORMATS, parse_batch
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class _InlineExecutor:
+    """Analyse dans le processus courant (--workers 0)"""
+
+    class _Done:
+        def __init__(self, value):
+            self._value = value
+
+        def result(self):
+            return self._value
+
+    def submit(self, fn, *args):
+        return self._Done(fn(*args))
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Importe en flux un catalogue CSV, ONIX ou MARC21 (upsert sur l'ISBN)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Fichier à importer")
+        parser.add_argument(
+            '--format', choices=sorted(FORMATS),
+            help="Format du fichier (déduit de l'extension par défaut)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Enregistrements écrits par transaction (défaut : 1000)"
+        )
+        parser.add_argument(
+            '--workers', type=int, default=0,
+            help="Processus d'analyse en parallèle de l'écriture (défaut : 0, analyse en ligne)"
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help="Reprend après le dernier lot validé (fichier <path>.checkpoint)"
+        )
+        parser.add_argument(
+            '--offset', type=int, default=0,
+            help="Ignore les N premiers enregistrements"
+        )
+        parser.add_argument('--user', help="Nom de l'utilisateur enregistré comme ayant ajouté les livres")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"Fichier introuvable : {path}")
+        format_name = options['format'] or EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if format_name is None:
+            raise CommandError("Format inconnu : précisez --format")
+        batch_size = max(1, options['batch_size'])
+
+        added_by = None
+        if options['user']:
+            try:
+                added_by = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Utilisateur inconnu : {options['user']}")
+
+        checkpoint_path = f"{path}.checkpoint"
+        offset = options['offset']
+        if options['resume'] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as handle:
+                offset = json.load(handle)['offset']
+            self.stdout.write(f"Reprise après {offset} enregistrements")
+
+        reader = FORMATS[format_name][0]
+        raw_batches = _batches(islice(reader(path), offset, None), batch_size)
+        stats = ImportStats(offset)
+        loader = CatalogueLoader(added_by=added_by)
+
+        if options['workers'] > 0:
+            # Les processus fils n'utilisent pas la base : ne pas leur transmettre de connexion ouverte
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=options['workers'])
+        else:
+            executor = _InlineExecutor()
+
+        try:
+            # Jusqu'à ``workers`` lots analysés pendant l'écriture du plus ancien,
+            # écrits dans l'ordre du fichier (reprise par position)
+            pending = deque()
+            in_flight = max(1, options['workers'])
+            for raw_batch in raw_batches:
+                pending.append(executor.submit(parse_batch, format_name, raw_batch))
+                if len(pending) > in_flight:
+                    self._write(loader, pending.popleft(), stats, checkpoint_path)
+            while pending:
+                self._write(loader, pending.popleft(), stats, checkpoint_path)
+        finally:
+            executor.shutdown()
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        # Livres créés : ajoutés à l'index de contenu s'il a été construit
+        added = add_books(loader.created_ids)
+        if added:
+            self.stdout.write(f"Index de contenu : {added} livres ajoutés")
+        self.stdout.write(self.style.SUCCESS(f"Import terminé : {stats.summary()}"))
+
+    def _write(self, loader, future, stats, checkpoint_path):
+        parsed = future.result()
+        records = [record for record in parsed if record is not None]
+        loader.load_batch(records, stats)
+        stats.read += len(parsed)
+        stats.rejected += len(parsed) - len(records)
+        with open(checkpoint_path, 'w') as handle:
+            json.dump({'offset': stats.offset + stats.read}, handle)
+        self.stdout.write(f"  {stats.summary()}")
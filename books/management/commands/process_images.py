@@ -0,0 +1,65 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from books.images import IMAGE_FIELDS, process_instance, render_renditions
+
+
+def _render(task):
+    """Exécutée dans un processus fils : (modèle, pk, renditions, erreur)"""
+    label, pk, path, kind = task
+    try:
+        with open(path, 'rb') as handle:
+            return label, pk, render_renditions(handle.read(), kind), None
+    except Exception as exc:
+        return label, pk, None, str(exc)
+
+
+class Command(BaseCommand):
+    help = "Calcule les renditions des couvertures et photos de profil existantes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Processus de conversion (défaut : nombre de cœurs ; 0 : en ligne)"
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help="Recalcule aussi les images qui ont déjà des renditions"
+        )
+
+    def _tasks(self):
+        """(modèle, pk, chemin du fichier, type) des images à traiter"""
+        for label, (image_field, renditions_field, kind) in IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            queryset = model.objects.exclude(**{image_field: ''}).exclude(**{f'{image_field}__isnull': True})
+            if not self.recompute:
+                queryset = queryset.filter(**{renditions_field: {}})
+            storage = model._meta.get_field(image_field).storage
+            for pk, name in queryset.values_list('pk', image_field).iterator():
+                yield label, pk, storage.path(name), kind
+
+    def handle(self, *args, **options):
+        self.recompute = options['all']
+        tasks = list(self._tasks())
+        if options['workers'] > 0:
+            # Les processus fils n'utilisent pas la base : ne pas leur transmettre de connexion ouverte
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+                self._store(executor.map(_render, tasks, chunksize=4))
+        else:
+            self._store(map(_render, tasks))
+
+    def _store(self, results):
+        """Enregistre les renditions au fil des conversions"""
+        done = errors = 0
+        for label, pk, renditions, error in results:
+            if error:
+                errors += 1
+                self.stderr.write(f"{label} {pk} : {error}")
+                continue
+            done += process_instance(apps.get_model(label), pk, renditions)
+        self.stdout.write(self.style.SUCCESS(f"{done} images traitées, {errors} erreurs"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from books.models import Book, BookSearchDocument
+from books.search import get_search_backend, update_search_documents
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les documents et l'index de recherche plein texte des livres"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Nombre de livres traités par lot (défaut : 1000)"
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        
+        # Supprimer les documents orphelins
+        orphans, _ = BookSearchDocument.objects.exclude(
+            book_id__in=Book.objects.values('pk')
+        ).delete()
+        
+        total = 0
+        batch = []
+        for book_id in Book.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=batch_size):
+            batch.append(book_id)
+            if len(batch) >= batch_size:
+                total += update_search_documents(batch)
+                batch = []
+                self.stdout.write(f"  {total} livres indexés...")
+        total += update_search_documents(batch)
+        
+        get_search_backend().rebuild()
+        
+        self.stdout.write(self.style.SUCCESS(
+            f"Index de recherche reconstruit : {total} livres indexés, {orphans} documents orphelins supprimés."
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from books.models import BookStats
+from books.stats import rebuild_book_stats
+
+
+class Command(BaseCommand):
+    help = "Recalcule entièrement les statistiques des livres (emprunts, avis, notes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Nombre de livres écrits par lot (défaut : 1000)"
+        )
+
+    def handle(self, *args, **options):
+        before = BookStats.objects.count()
+        total = rebuild_book_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Statistiques recalculées pour {total} livres ({total - before} lignes créées)."
+        ))
@@ -0,0 +1,134 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE books_search_fts USING fts5(
+        title, subtitle, authors, keywords, summary,
+        content='books_booksearchdocument',
+        content_rowid='book_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    # Pondération bm25 : titre > auteurs > sous-titre > mots-clés > résumé
+    "INSERT INTO books_search_fts(books_search_fts, rank) VALUES('rank', 'bm25(10.0, 4.0, 8.0, 3.0, 1.0)')",
+    """
+    CREATE TRIGGER books_search_fts_ai AFTER INSERT ON books_booksearchdocument BEGIN
+        INSERT INTO books_search_fts(rowid, title, subtitle, authors, keywords, summary)
+        VALUES (new.book_id, new.title, new.subtitle, new.authors, new.keywords, new.summary);
+    END
+    """,
+    """
+    CREATE TRIGGER books_search_fts_ad AFTER DELETE ON books_booksearchdocument BEGIN
+        INSERT INTO books_search_fts(books_search_fts, rowid, title, subtitle, authors, keywords, summary)
+        VALUES ('delete', old.book_id, old.title, old.subtitle, old.authors, old.keywords, old.summary);
+    END
+    """,
+    """
+    CREATE TRIGGER books_search_fts_au AFTER UPDATE ON books_booksearchdocument BEGIN
+        INSERT INTO books_search_fts(books_search_fts, rowid, title, subtitle, authors, keywords, summary)
+        VALUES ('delete', old.book_id, old.title, old.subtitle, old.authors, old.keywords, old.summary);
+        INSERT INTO books_search_fts(rowid, title, subtitle, authors, keywords, summary)
+        VALUES (new.book_id, new.title, new.subtitle, new.authors, new.keywords, new.summary);
+    END
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS books_search_fts_au",
+    "DROP TRIGGER IF EXISTS books_search_fts_ad",
+    "DROP TRIGGER IF EXISTS books_search_fts_ai",
+    "DROP TABLE IF EXISTS books_search_fts",
+]
+
+POSTGRESQL_FORWARD = [
+    """
+    ALTER TABLE books_booksearchdocument ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('french', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('french', coalesce(authors, '')), 'A') ||
+        setweight(to_tsvector('french', coalesce(subtitle, '')), 'B') ||
+        setweight(to_tsvector('french', coalesce(keywords, '')), 'B') ||
+        setweight(to_tsvector('french', coalesce(summary, '')), 'D')
+    ) STORED
+    """,
+    "CREATE INDEX books_search_vector_gin ON books_booksearchdocument USING GIN (search_vector)",
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS books_search_vector_gin",
+    "ALTER TABLE books_booksearchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_fulltext_index(apps, schema_editor):
+    """Crée l'index plein texte propre au moteur de base de données"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FORWARD)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRESQL_FORWARD)
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_BACKWARD)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRESQL_BACKWARD)
+
+
+def populate_documents(apps, schema_editor):
+    """Construit les documents de recherche des livres existants"""
+    Book = apps.get_model('books', 'Book')
+    BookSearchDocument = apps.get_model('books', 'BookSearchDocument')
+    documents = []
+    for book in Book.objects.prefetch_related('authors').iterator(chunk_size=1000):
+        documents.append(BookSearchDocument(
+            book_id=book.pk,
+            title=book.title,
+            subtitle=book.subtitle,
+            authors=" ".join(f"{a.first_name} {a.last_name}" for a in book.authors.all()),
+            keywords=book.keywords,
+            summary=book.summary,
+        ))
+        if len(documents) >= 1000:
+            BookSearchDocument.objects.bulk_create(documents)
+            documents = []
+    BookSearchDocument.objects.bulk_create(documents)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchDocument',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='books.book', verbose_name='Livre')),
+                ('title', models.CharField(max_length=300, verbose_name='Titre')),
+                ('subtitle', models.CharField(blank=True, max_length=300, verbose_name='Sous-titre')),
+                ('authors', models.TextField(blank=True, verbose_name='Auteurs')),
+                ('keywords', models.TextField(blank=True, verbose_name='Mots-clés')),
+                ('summary', models.TextField(blank=True, verbose_name='Résumé')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Indexé le')),
+            ],
+            options={
+                'verbose_name': 'Document de recherche',
+                'verbose_name_plural': 'Documents de recherche',
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(populate_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:53
+
+from django.db import migrations, models
+
+from books.normalize import normalize_key, sort_key, trigrams
+
+
+def backfill_keys(apps, schema_editor):
+    """Calcule les clés normalisées et les trigrammes des données existantes"""
+    Book = apps.get_model('books', 'Book')
+    Author = apps.get_model('books', 'Author')
+    Publisher = apps.get_model('books', 'Publisher')
+    TrigramEntry = apps.get_model('books', 'TrigramEntry')
+
+    def process(model, kind, fields, compute, text):
+        objects = list(model.objects.all())
+        for obj in objects:
+            compute(obj)
+        model.objects.bulk_update(objects, fields, batch_size=1000)
+        TrigramEntry.objects.bulk_create(
+            [TrigramEntry(kind=kind, object_id=obj.pk, gram=gram) for obj in objects for gram in trigrams(text(obj))],
+            batch_size=5000,
+            ignore_conflicts=True,
+        )
+
+    def compute_book(book):
+        book.title_key = normalize_key(book.title)
+        book.sort_title = sort_key(book.title)
+
+    def compute_author(author):
+        author.first_name_key = normalize_key(author.first_name)
+        author.last_name_key = normalize_key(author.last_name)
+
+    def compute_publisher(publisher):
+        publisher.name_key = normalize_key(publisher.name)
+
+    process(Book, 'book', ['title_key', 'sort_title'], compute_book, lambda b: b.title)
+    process(Author, 'author', ['first_name_key', 'last_name_key'], compute_author,
+            lambda a: f"{a.first_name} {a.last_name}")
+    process(Publisher, 'publisher', ['name_key'], compute_publisher, lambda p: p.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_book_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrigramEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('book', 'Livre'), ('author', 'Auteur'), ('publisher', 'Éditeur')], max_length=10, verbose_name='Type')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='Objet')),
+                ('gram', models.CharField(max_length=3, verbose_name='Trigramme')),
+            ],
+            options={
+                'verbose_name': 'Trigramme',
+                'verbose_name_plural': 'Trigrammes',
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='author',
+            options={'ordering': ['last_name_key', 'first_name_key'], 'verbose_name': 'Auteur', 'verbose_name_plural': 'Auteurs'},
+        ),
+        migrations.AlterModelOptions(
+            name='publisher',
+            options={'ordering': ['name_key'], 'verbose_name': 'Éditeur', 'verbose_name_plural': 'Éditeurs'},
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='first_name_key',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='last_name_key',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='sort_title',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='title_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=300),
+        ),
+        migrations.AddField(
+            model_name='publisher',
+            name='name_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['last_name_key', 'first_name_key'], name='books_autho_last_na_92b104_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trigramentry',
+            index=models.Index(fields=['kind', 'gram', 'object_id'], name='trigram_lookup_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='trigramentry',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id', 'gram'), name='unique_trigram_entry'),
+        ),
+        migrations.RunPython(backfill_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:03
+
+from django.db import migrations, models
+
+
+def clamp_available_copies(apps, schema_editor):
+    """Ramène le stock disponible au nombre total d'exemplaires avant d'ajouter la contrainte"""
+    Book = apps.get_model('books', 'Book')
+    Book.objects.filter(available_copies__gt=models.F('total_copies')).update(
+        available_copies=models.F('total_copies')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_normalized_keys_trigrams'),
+    ]
+
+    operations = [
+        migrations.RunPython(clamp_available_copies, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.CheckConstraint(check=models.Q(('available_copies__lte', models.F('total_copies'))), name='book_available_lte_total'),
+        ),
+    ]
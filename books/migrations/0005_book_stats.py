@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_stats(apps, schema_editor):
+    """Calcule les statistiques des livres existants"""
+    Book = apps.get_model('books', 'Book')
+    BookReview = apps.get_model('books', 'BookReview')
+    BookStats = apps.get_model('books', 'BookStats')
+    Loan = apps.get_model('loans', 'Loan')
+
+    values = {pk: {} for pk in Book.objects.values_list('pk', flat=True)}
+    for row in Loan.objects.order_by().values('book_id').annotate(
+        loan_count=models.Count('id'),
+        active_loans=models.Count('id', filter=models.Q(returned_date__isnull=True)),
+    ):
+        values[row.pop('book_id')].update(row)
+    for row in BookReview.objects.order_by().values('book_id').annotate(
+        review_count=models.Count('id'),
+        rating_sum=models.Sum('rating'),
+        **{f'rating_{r}': models.Count('id', filter=models.Q(rating=r)) for r in range(1, 6)}
+    ):
+        values[row.pop('book_id')].update(row)
+    BookStats.objects.bulk_create(
+        [BookStats(book_id=pk, **counters) for pk, counters in values.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_circulation_constraints'),
+        ('loans', '0002_circulation_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookStats',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='books.book', verbose_name='Livre')),
+                ('loan_count', models.PositiveIntegerField(default=0, verbose_name='Emprunts')),
+                ('active_loans', models.PositiveIntegerField(default=0, verbose_name='Emprunts en cours')),
+                ('review_count', models.PositiveIntegerField(default=0, verbose_name='Avis')),
+                ('rating_sum', models.PositiveIntegerField(default=0, verbose_name='Somme des notes')),
+                ('rating_1', models.PositiveIntegerField(default=0, verbose_name='Notes 1')),
+                ('rating_2', models.PositiveIntegerField(default=0, verbose_name='Notes 2')),
+                ('rating_3', models.PositiveIntegerField(default=0, verbose_name='Notes 3')),
+                ('rating_4', models.PositiveIntegerField(default=0, verbose_name='Notes 4')),
+                ('rating_5', models.PositiveIntegerField(default=0, verbose_name='Notes 5')),
+            ],
+            options={
+                'verbose_name': 'Statistiques du livre',
+                'verbose_name_plural': 'Statistiques des livres',
+                'indexes': [models.Index(fields=['-loan_count'], name='book_stats_popularity_idx'), models.Index(fields=['-active_loans'], name='book_stats_active_idx')],
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:14
+
+import books.images
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_book_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Renditions de la couverture'),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='cover_image',
+            field=models.ImageField(blank=True, null=True, storage=books.images.content_addressed_storage, upload_to='book_covers/', verbose_name='Image de couverture'),
+        ),
+    ]
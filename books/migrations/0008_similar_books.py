@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('finished_at', models.DateTimeField(auto_now_add=True, verbose_name='Terminé le')),
+                ('last_loan_id', models.PositiveBigIntegerField(verbose_name='Dernier emprunt pris en compte')),
+                ('full', models.BooleanField(default=False, verbose_name='Calcul complet')),
+                ('books', models.PositiveIntegerField(default=0, verbose_name='Livres recalculés')),
+                ('duration', models.FloatField(default=0, verbose_name='Durée (s)')),
+            ],
+            options={
+                'verbose_name': 'Calcul des livres similaires',
+                'verbose_name_plural': 'Calculs des livres similaires',
+                'ordering': ['-finished_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarBook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Similarité')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='books.book', verbose_name='Livre')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbour_of', to='books.book', verbose_name='Livre similaire')),
+            ],
+            options={
+                'verbose_name': 'Livre similaire',
+                'verbose_name_plural': 'Livres similaires',
+                'indexes': [models.Index(fields=['book', '-score'], name='similar_book_score_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='similarbook',
+            constraint=models.UniqueConstraint(fields=('book', 'similar'), name='unique_similar_book'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_similar_books'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingEpoch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(verbose_name='Référence')),
+            ],
+            options={
+                'verbose_name': 'Référence des tendances',
+                'verbose_name_plural': 'Références des tendances',
+            },
+        ),
+        migrations.CreateModel(
+            name='CategoryTrend',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='books.category', verbose_name='Catégorie')),
+                ('week', models.FloatField(default=0, verbose_name='Score de la semaine')),
+                ('month', models.FloatField(default=0, verbose_name='Score du mois')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Emprunts')),
+            ],
+            options={
+                'verbose_name': "Tendance d'une catégorie",
+                'verbose_name_plural': 'Tendances des catégories',
+                'indexes': [models.Index(fields=['-week'], name='category_trend_week_idx'), models.Index(fields=['-month'], name='category_trend_month_idx'), models.Index(fields=['-total'], name='category_trend_total_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BookTrend',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='books.book', verbose_name='Livre')),
+                ('week', models.FloatField(default=0, verbose_name='Score de la semaine')),
+                ('month', models.FloatField(default=0, verbose_name='Score du mois')),
+            ],
+            options={
+                'verbose_name': "Tendance d'un livre",
+                'verbose_name_plural': 'Tendances des livres',
+                'indexes': [models.Index(fields=['-week'], name='book_trend_week_idx'), models.Index(fields=['-month'], name='book_trend_month_idx')],
+            },
+        ),
+    ]
@@ -2,10 +2,24 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.urls import reverse
+from .images import content_addressed_storage
+from .normalize import normalize_key, sort_key
 
 User = get_user_model()
 
 
+def _include_key_fields(save_kwargs, **key_fields):
+    """Ajoute les clés normalisées à ``update_fields`` quand leur champ source y figure"""
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is None:
+        return
+    update_fields = set(update_fields)
+    for source, keys in key_fields.items():
+        if source in update_fields:
+            update_fields.update([keys] if isinstance(keys, str) else keys)
+    save_kwargs['update_fields'] = update_fields
+
+
 class Category(models.Model):
     """Modèle pour les catégories de livres"""
     name = models.CharField(max_length=100, unique=True, verbose_name="Nom")
@@ -30,14 +44,27 @@ class Author(models.Model):
     biography = models.TextField(blank=True, verbose_name="Biographie")
     nationality = models.CharField(max_length=100, blank=True, verbose_name="Nationalité")
     
+    # Clés normalisées (sans accents, casse ignorée) pour le tri et la recherche
+    first_name_key = models.CharField(max_length=100, blank=True, editable=False)
+    last_name_key = models.CharField(max_length=100, blank=True, editable=False)
+    
     class Meta:
         verbose_name = "Auteur"
         verbose_name_plural = "Auteurs"
-        ordering = ['last_name', 'first_name']
+        ordering = ['last_name_key', 'first_name_key']
+        indexes = [
+            models.Index(fields=['last_name_key', 'first_name_key']),
+        ]
     
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
     
+    def save(self, *args, **kwargs):
+        self.first_name_key = normalize_key(self.first_name)
+        self.last_name_key = normalize_key(self.last_name)
+        _include_key_fields(kwargs, first_name='first_name_key', last_name='last_name_key')
+        super().save(*args, **kwargs)
+    
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}"
 
@@ -47,14 +74,20 @@ class Publisher(models.Model):
     name = models.CharField(max_length=200, unique=True, verbose_name="Nom")
     address = models.TextField(blank=True, verbose_name="Adresse")
     website = models.URLField(blank=True, verbose_name="Site web")
+    name_key = models.CharField(max_length=200, blank=True, db_index=True, editable=False)
     
     class Meta:
         verbose_name = "Éditeur"
         verbose_name_plural = "Éditeurs"
-        ordering = ['name']
+        ordering = ['name_key']
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        self.name_key = normalize_key(self.name)
+        _include_key_fields(kwargs, name='name_key')
+        super().save(*args, **kwargs)
 
 
 class Book(models.Model):
@@ -63,6 +96,8 @@ class Book(models.Model):
     # Informations de base
     title = models.CharField(max_length=300, verbose_name="Titre")
     subtitle = models.CharField(max_length=300, blank=True, verbose_name="Sous-titre")
+    title_key = models.CharField(max_length=300, blank=True, db_index=True, editable=False)
+    sort_title = models.CharField(max_length=300, blank=True, db_index=True, editable=False)
     isbn = models.CharField(max_length=13, unique=True, verbose_name="ISBN")
     authors = models.ManyToManyField(Author, verbose_name="Auteurs")
     publisher = models.ForeignKey(Publisher, on_delete=models.CASCADE, verbose_name="Éditeur")
@@ -80,10 +115,17 @@ class Book(models.Model):
     # Informations physiques
     cover_image = models.ImageField(
         upload_to='book_covers/', 
+        storage=content_addressed_storage,
         blank=True, 
         null=True,
         verbose_name="Image de couverture"
     )
+    cover_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Renditions de la couverture"
+    )
     
     # Gestion des stocks
     total_copies = models.PositiveIntegerField(
@@ -118,11 +160,25 @@ class Book(models.Model):
             models.Index(fields=['title']),
             models.Index(fields=['isbn']),
             models.Index(fields=['category']),
+            # Liste de l'administration (tri et filtre par années et mois)
+            models.Index(fields=['created_at'], name='book_created_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(available_copies__lte=models.F('total_copies')),
+                name='book_available_lte_total',
+            ),
         ]
     
     def __str__(self):
         return self.title
     
+    def save(self, *args, **kwargs):
+        self.title_key = normalize_key(self.title)
+        self.sort_title = sort_key(self.title)
+        _include_key_fields(kwargs, title=('title_key', 'sort_title'))
+        super().save(*args, **kwargs)
+    
     def get_absolute_url(self):
         return reverse('books:detail', kwargs={'pk': self.pk})
     
@@ -135,20 +191,20 @@ class Book(models.Model):
         return ", ".join([author.get_full_name() for author in self.authors.all()])
     
     def borrow_book(self):
-        """Emprunte un exemplaire du livre"""
-        if self.available_copies > 0:
-            self.available_copies -= 1
-            self.save()
-            return True
-        return False
+        """Emprunte un exemplaire du livre (UPDATE conditionnel, sans réécrire la ligne)"""
+        updated = Book.objects.filter(pk=self.pk, available_copies__gt=0).update(
+            available_copies=models.F('available_copies') - 1
+        )
+        self.refresh_from_db(fields=['available_copies'])
+        return updated == 1
     
     def return_book(self):
-        """Retourne un exemplaire du livre"""
-        if self.available_copies < self.total_copies:
-            self.available_copies += 1
-            self.save()
-            return True
-        return False
+        """Retourne un exemplaire du livre (UPDATE conditionnel, sans réécrire la ligne)"""
+        updated = Book.objects.filter(pk=self.pk, available_copies__lt=models.F('total_copies')).update(
+            available_copies=models.F('available_copies') + 1
+        )
+        self.refresh_from_db(fields=['available_copies'])
+        return updated == 1
 
 
 class BookReview(models.Model):
@@ -167,6 +223,222 @@ class BookReview(models.Model):
         verbose_name_plural = "Avis"
         unique_together = ['book', 'reviewer']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='review_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.book.title} - {self.reviewer.username} ({self.rating}/5)"
+
+
+class BookStats(models.Model):
+    """
+    Statistiques dénormalisées d'un livre (emprunts, avis, histogramme des
+    notes), tenues à jour par incréments lors de l'écriture des emprunts et des
+    avis ; ``reconcile_book_stats`` les recalcule entièrement.
+    """
+    book = models.OneToOneField(
+        Book,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name="Livre"
+    )
+    loan_count = models.PositiveIntegerField(default=0, verbose_name="Emprunts")
+    active_loans = models.PositiveIntegerField(default=0, verbose_name="Emprunts en cours")
+    review_count = models.PositiveIntegerField(default=0, verbose_name="Avis")
+    rating_sum = models.PositiveIntegerField(default=0, verbose_name="Somme des notes")
+    rating_1 = models.PositiveIntegerField(default=0, verbose_name="Notes 1")
+    rating_2 = models.PositiveIntegerField(default=0, verbose_name="Notes 2")
+    rating_3 = models.PositiveIntegerField(default=0, verbose_name="Notes 3")
+    rating_4 = models.PositiveIntegerField(default=0, verbose_name="Notes 4")
+    rating_5 = models.PositiveIntegerField(default=0, verbose_name="Notes 5")
+    
+    class Meta:
+        verbose_name = "Statistiques du livre"
+        verbose_name_plural = "Statistiques des livres"
+        indexes = [
+            models.Index(fields=['-loan_count'], name='book_stats_popularity_idx'),
+            models.Index(fields=['-active_loans'], name='book_stats_active_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Statistiques - {self.book_id}"
+    
+    @property
+    def average_rating(self):
+        """Note moyenne, ou None sans avis"""
+        if not self.review_count:
+            return None
+        return self.rating_sum / self.review_count
+    
+    def rating_histogram(self):
+        """Liste de (note, nombre d'avis) de 5 à 1"""
+        return [(rating, getattr(self, f'rating_{rating}')) for rating in range(5, 0, -1)]
+
+
+class BookSearchDocument(models.Model):
+    """Document de recherche dénormalisé d'un livre (alimente l'index plein texte)"""
+    book = models.OneToOneField(
+        Book,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document',
+        verbose_name="Livre"
+    )
+    title = models.CharField(max_length=300, verbose_name="Titre")
+    subtitle = models.CharField(max_length=300, blank=True, verbose_name="Sous-titre")
+    authors = models.TextField(blank=True, verbose_name="Auteurs")
+    keywords = models.TextField(blank=True, verbose_name="Mots-clés")
+    summary = models.TextField(blank=True, verbose_name="Résumé")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Indexé le")
+    
+    class Meta:
+        verbose_name = "Document de recherche"
+        verbose_name_plural = "Documents de recherche"
+    
+    def __str__(self):
+        return self.title
+
+
+class TrigramEntry(models.Model):
+    """Index de trigrammes pour la recherche approchée (fautes de frappe)"""
+    
+    KIND_CHOICES = [
+        ('book', 'Livre'),
+        ('author', 'Auteur'),
+        ('publisher', 'Éditeur'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name="Type")
+    object_id = models.PositiveBigIntegerField(verbose_name="Objet")
+    gram = models.CharField(max_length=3, verbose_name="Trigramme")
+    
+    class Meta:
+        verbose_name = "Trigramme"
+        verbose_name_plural = "Trigrammes"
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id', 'gram'], name='unique_trigram_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'gram', 'object_id'], name='trigram_lookup_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind}:{self.object_id} '{self.gram}'"
+
+
+class SimilarBook(models.Model):
+    """
+    Voisin précalculé d'un livre : livres souvent empruntés par les mêmes
+    lecteurs (similarité cosinus), calculés par ``compute_similar_books``.
+    """
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        related_name='neighbours',
+        verbose_name="Livre"
+    )
+    similar = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        related_name='neighbour_of',
+        verbose_name="Livre similaire"
+    )
+    score = models.FloatField(verbose_name="Similarité")
+    
+    class Meta:
+        verbose_name = "Livre similaire"
+        verbose_name_plural = "Livres similaires"
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'similar'], name='unique_similar_book'),
+        ]
+        indexes = [
+            # Voisins d'un livre par similarité décroissante (fiche du livre)
+            models.Index(fields=['book', '-score'], name='similar_book_score_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.book_id} → {self.similar_id} ({self.score:.3f})"
+
+
+class SimilarityRun(models.Model):
+    """Exécution de ``compute_similar_books`` (point de reprise du calcul incrémental)"""
+    finished_at = models.DateTimeField(auto_now_add=True, verbose_name="Terminé le")
+    last_loan_id = models.PositiveBigIntegerField(verbose_name="Dernier emprunt pris en compte")
+    full = models.BooleanField(default=False, verbose_name="Calcul complet")
+    books = models.PositiveIntegerField(default=0, verbose_name="Livres recalculés")
+    duration = models.FloatField(default=0, verbose_name="Durée (s)")
+    
+    class Meta:
+        verbose_name = "Calcul des livres similaires"
+        verbose_name_plural = "Calculs des livres similaires"
+        ordering = ['-finished_at']
+    
+    def __str__(self):
+        return f"{self.finished_at:%Y-%m-%d %H:%M} ({self.books} livres)"
+
+
+class TrendingEpoch(models.Model):
+    """
+    Date de référence des scores de tendance (une seule ligne, pk=1) : les
+    scores sont exprimés en emprunts à cette date (voir ``books.trending``)
+    """
+    started_at = models.DateTimeField(verbose_name="Référence")
+    
+    class Meta:
+        verbose_name = "Référence des tendances"
+        verbose_name_plural = "Références des tendances"
+    
+    def __str__(self):
+        return f"Tendances au {self.started_at:%Y-%m-%d %H:%M}"
+
+
+class BookTrend(models.Model):
+    """Scores de tendance d'un livre (emprunts pondérés par leur ancienneté)"""
+    book = models.OneToOneField(
+        Book,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trend',
+        verbose_name="Livre"
+    )
+    week = models.FloatField(default=0, verbose_name="Score de la semaine")
+    month = models.FloatField(default=0, verbose_name="Score du mois")
+    
+    class Meta:
+        verbose_name = "Tendance d'un livre"
+        verbose_name_plural = "Tendances des livres"
+        indexes = [
+            models.Index(fields=['-week'], name='book_trend_week_idx'),
+            models.Index(fields=['-month'], name='book_trend_month_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Tendance - {self.book_id}"
+
+
+class CategoryTrend(models.Model):
+    """Scores de tendance et nombre total d'emprunts d'une catégorie"""
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='trend',
+        verbose_name="Catégorie"
+    )
+    week = models.FloatField(default=0, verbose_name="Score de la semaine")
+    month = models.FloatField(default=0, verbose_name="Score du mois")
+    total = models.PositiveIntegerField(default=0, verbose_name="Emprunts")
+    
+    class Meta:
+        verbose_name = "Tendance d'une catégorie"
+        verbose_name_plural = "Tendances des catégories"
+        indexes = [
+            models.Index(fields=['-week'], name='category_trend_week_idx'),
+            models.Index(fields=['-month'], name='category_trend_month_idx'),
+            models.Index(fields=['-total'], name='category_trend_total_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Tendance - {self.category_id}"
@@ -0,0 +1,77 @@
+"""
+Normalisation des textes du catalogue.
+
+Les clés produites ici sont stockées dans des colonnes indexées (``title_key``,
+``last_name_key``...) : sans accents, en minuscules (casefold), ligatures
+développées et ponctuation réduite à des espaces. Comparer ou trier sur ces
+colonnes évite les ``icontains`` et les tris de collation non indexés.
+"""
+import re
+import unicodedata
+
+LIGATURES = {
+    'œ': 'oe',
+    'æ': 'ae',
+    'ß': 'ss',
+    'ﬁ': 'fi',
+    'ﬂ': 'fl',
+}
+
+# Articles ignorés en tête de titre pour le classement alphabétique
+LEADING_ARTICLES = ('l ', 'le ', 'la ', 'les ', 'un ', 'une ', 'des ', 'the ', 'a ', 'an ')
+
+NON_ALNUM_RE = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_key(value):
+    """Retourne la clé de recherche d'un texte : 'Les Misérables' -> 'les miserables'"""
+    if not value:
+        return ''
+    value = value.casefold()
+    for ligature, replacement in LIGATURES.items():
+        value = value.replace(ligature, replacement)
+    value = unicodedata.normalize('NFKD', value)
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return NON_ALNUM_RE.sub(' ', value).strip()
+
+
+def sort_key(value):
+    """Retourne la clé de tri d'un titre, sans article initial : "L'Étranger" -> 'etranger'"""
+    key = normalize_key(value)
+    for article in LEADING_ARTICLES:
+        if key.startswith(article) and len(key) > len(article):
+            return key[len(article):]
+    return key
+
+
+def trigrams(value):
+    """Ensemble des trigrammes d'un texte (mots complétés d'espaces, comme pg_trgm)"""
+    grams = set()
+    for word in normalize_key(value).split():
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def similarity(left, right):
+    """Similarité de Jaccard entre deux ensembles de trigrammes"""
+    if not left or not right:
+        return 0.0
+    shared = len(left & right)
+    return shared / (len(left) + len(right) - shared)
+
+
+def word_similarity(query, text):
+    """
+    Meilleure similarité entre la requête et le texte entier ou toute suite de
+    mots du texte de même longueur ('celin' retrouve 'louis ferdinand celine').
+    """
+    query_grams = trigrams(query)
+    words = normalize_key(text).split()
+    size = max(1, len(normalize_key(query).split()))
+    best = similarity(query_grams, trigrams(text))
+    for start in range(max(0, len(words) - size) + 1):
+        window = ' '.join(words[start:start + size])
+        best = max(best, similarity(query_grams, trigrams(window)))
+    return best
@@ -0,0 +1,233 @@
+"""
+Pagination du catalogue.
+
+- ``EstimatedCountPaginator`` : pagination par numéro de page dont le total
+  vient des statistiques de la base (PostgreSQL, table non filtrée) ou d'un
+  compte mis en cache, au lieu d'un ``COUNT(*)`` exact à chaque requête.
+- ``CursorPaginator`` : pagination par curseur (keyset) sur la colonne de tri
+  active plus ``id``. Chaque page est une requête d'intervalle indexée, quelle
+  que soit sa profondeur ; les jetons suivant/précédent sont opaques.
+- ``KeysetPaginationMixin`` : active le mode curseur d'une ``ListView`` quand
+  le paramètre ``cursor`` est présent, la pagination par numéro sinon (total
+  exact, sauf pour les vues qui choisissent ``EstimatedCountPaginator``).
+"""
+import base64
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+# Durée de conservation des comptes mis en cache (secondes)
+COUNT_CACHE_TIMEOUT = getattr(settings, 'BOOKS_COUNT_CACHE_TIMEOUT', 300)
+# En dessous de ce nombre de lignes estimées, le compte exact reste bon marché
+EXACT_COUNT_THRESHOLD = 10000
+
+
+def estimated_count(queryset):
+    """
+    Nombre de lignes estimé d'un queryset : statistiques PostgreSQL pour une
+    table non filtrée, sinon compte exact conservé en cache.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= EXACT_COUNT_THRESHOLD:
+            return row[0]
+
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(f"{sql}|{params!r}".encode()).hexdigest()
+    key = f"books:count:{digest}"
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator dont le total est estimé (voir ``estimated_count``)"""
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Conserve les microsecondes (DjangoJSONEncoder les tronque), nécessaires au keyset"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.date)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(direction, value, pk):
+    payload = json.dumps({'d': direction, 'v': value, 'id': pk}, cls=CursorEncoder)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    padding = '=' * (-len(token) % 4)
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + padding))
+        return payload['d'], payload['v'], int(payload['id'])
+    except (ValueError, KeyError, TypeError):
+        raise InvalidPage("Curseur invalide")
+
+
+class CursorPage:
+    """Page obtenue par curseur ; expose l'interface utile des templates"""
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Pagination keyset sur ``(champ de tri, id)``"""
+
+    def __init__(self, queryset, per_page, ordering):
+        self.descending = ordering.startswith('-')
+        self.field_name = ordering.lstrip('-')
+        self.field = queryset.model._meta.get_field(self.field_name)
+        self.queryset = queryset
+        self.per_page = per_page
+
+    @cached_property
+    def count(self):
+        """Total estimé (jamais de COUNT(DISTINCT) exact à chaque page)"""
+        return estimated_count(self.queryset)
+
+    def _ordered(self, reverse):
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        return self.queryset.order_by(f'{prefix}{self.field_name}', f'{prefix}pk'), descending
+
+    def _after(self, value, pk, descending):
+        """Condition « strictement après (value, pk) » dans l'ordre donné"""
+        op = 'lt' if descending else 'gt'
+        return (
+            Q(**{f'{self.field_name}__{op}': value}) |
+            Q(**{self.field_name: value, f'pk__{op}': pk})
+        )
+
+    def _cursor(self, direction, obj):
+        value = self.field.value_from_object(obj)
+        return encode_cursor(direction, value, obj.pk)
+
+    def page(self, token=None):
+        direction, value, pk = 'n', None, None
+        if token:
+            direction, raw_value, pk = decode_cursor(token)
+            if direction not in ('n', 'p'):
+                raise InvalidPage("Curseur invalide")
+            try:
+                value = self.field.to_python(raw_value)
+            except ValidationError:
+                raise InvalidPage("Curseur invalide")
+
+        backwards = direction == 'p'
+        queryset, descending = self._ordered(reverse=backwards)
+        if pk is not None:
+            queryset = queryset.filter(self._after(value, pk, descending))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or backwards:
+                next_cursor = self._cursor('n', rows[-1])
+            if pk is not None and (has_more or not backwards):
+                previous_cursor = self._cursor('p', rows[0])
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """
+    Pagination d'une ListView : par curseur si ``?cursor=`` est présent
+    (et que le tri porte sur un champ simple), par numéro de page sinon.
+    Le total reste exact (``Paginator``) ; une vue sur tout le catalogue
+    choisit ``paginator_class = EstimatedCountPaginator``.
+    """
+
+    cursor_param = 'cursor'
+
+    def get_keyset_ordering(self, queryset):
+        """Champ de tri utilisable en keyset, ou None (tri par pertinence, par relation...)"""
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        if not all(isinstance(o, str) for o in ordering):
+            return None
+        ordering = [o for o in ordering if o.lstrip('-') not in ('pk', 'id')]
+        if len(ordering) != 1:
+            return None
+        name = ordering[0].lstrip('-')
+        if '__' in name:
+            return None
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete or field.null:
+            return None
+        return ordering[0]
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.cursor_param not in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+        ordering = self.get_keyset_ordering(queryset)
+        if ordering is None:
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size, ordering)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_param))
+        except InvalidPage as e:
+            raise Http404(str(e))
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        params.pop(self.cursor_param, None)
+        context['cursor_querystring'] = params.urlencode()
+        return context
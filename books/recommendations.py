@@ -0,0 +1,207 @@
+"""
+Livres similaires par co-emprunt (« les lecteurs de ce livre ont aussi emprunté »).
+
+Calcul hors ligne (commande ``compute_similar_books``) :
+
+1. les couples (lecteur, livre) des emprunts sont lus en flux
+   (``values_list(...).iterator()``) dans une matrice creuse SciPy
+   lecteurs × livres, binaire : un livre emprunté plusieurs fois par le même
+   lecteur compte une fois ;
+2. un bloc de livres multiplié par cette matrice donne, pour chacun, le nombre
+   de lecteurs en commun avec tous les autres livres ; divisé par les normes
+   (racine du nombre de lecteurs), c'est la similarité cosinus. La matrice
+   livres × livres complète n'est jamais formée ;
+3. les ``top_k`` meilleurs voisins de chaque livre (au moins ``min_shared``
+   lecteurs en commun) remplacent ses lignes de ``SimilarBook``.
+
+Le calcul incrémental ne reprend que les livres touchés depuis la dernière
+exécution (``SimilarityRun``) : ceux qu'ont empruntés les lecteurs ayant un
+nouvel emprunt, car leurs co-emprunts ont changé. La matrice est tout de même
+construite en entier, la similarité d'un livre dépendant de tous ses
+lecteurs. Le score qu'un livre non touché attribue à un livre touché peut
+vieillir légèrement (le nombre de lecteurs de ce dernier a changé) : un
+calcul complet (``--full``) les remet à jour.
+
+NumPy et SciPy ne sont importés que par le calcul : les vues n'en ont pas
+besoin, la fiche d'un livre lit ses voisins en une requête sur l'index
+(livre, score).
+
+Un livre peu emprunté (ou récent) est complété par les livres proches par le
+contenu (``books.content``), puis par des livres de sa catégorie.
+"""
+import itertools
+import time
+
+from django.db import transaction
+from django.db.models import Max
+
+from . import content
+from .models import Book, SimilarBook, SimilarityRun
+
+DEFAULT_TOP_K = 10
+DEFAULT_MIN_SHARED = 2
+DEFAULT_BLOCK_SIZE = 500
+# Couples (lecteur, livre) lus par aller-retour avec la base
+PAIRS_CHUNK = 20000
+
+
+def similar_books(book, limit=4):
+    """
+    Livres similaires actifs, par similarité décroissante ; complétés par les
+    livres proches par le contenu, puis de la même catégorie (livre récent)
+    """
+    similar = list(
+        Book.objects.filter(neighbour_of__book=book, is_active=True)
+        .select_related('category')
+        .order_by('-neighbour_of__score')[:limit]
+    )
+    if len(similar) < limit:
+        similar += content.similar_books(
+            book, limit=limit - len(similar), exclude=[other.pk for other in similar]
+        )
+    if len(similar) < limit:
+        similar += list(
+            Book.objects.filter(category_id=book.category_id, is_active=True)
+            .exclude(pk__in=[book.pk, *(other.pk for other in similar)])
+            .select_related('category')[:limit - len(similar)]
+        )
+    return similar
+
+
+def borrowing_matrix(loans=None):
+    """
+    Matrice creuse binaire lecteurs × livres des emprunts, et identifiants des
+    livres de ses colonnes (tableau trié)
+    """
+    import numpy as np
+    from scipy import sparse
+
+    from loans.models import Loan
+
+    loans = Loan.objects.all() if loans is None else loans
+    pairs = loans.order_by().values_list('borrower_id', 'book_id').iterator(chunk_size=PAIRS_CHUNK)
+    flat = np.fromiter(itertools.chain.from_iterable(pairs), dtype=np.int64)
+    borrower_ids, rows = np.unique(flat[0::2], return_inverse=True)
+    book_ids, columns = np.unique(flat[1::2], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+        shape=(len(borrower_ids), len(book_ids)),
+    )
+    # Les doublons ont été additionnés : emprunté au moins une fois
+    matrix.data[:] = 1
+    return matrix, book_ids
+
+
+def neighbours(matrix, targets, top_k=DEFAULT_TOP_K, min_shared=DEFAULT_MIN_SHARED,
+               block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Itère sur (colonne, [(colonne voisine, score)]) pour les colonnes
+    ``targets`` de la matrice lecteurs × livres, calculées par blocs
+    """
+    import numpy as np
+
+    items = matrix.T.tocsr()
+    norms = np.sqrt(np.asarray(items.sum(axis=1)).ravel())
+    for offset in range(0, len(targets), block_size):
+        block = targets[offset:offset + block_size]
+        # Lecteurs en commun de chaque livre du bloc avec tous les livres
+        shared = (items[block] @ matrix).tocsr()
+        for position, column in enumerate(block):
+            start, end = shared.indptr[position], shared.indptr[position + 1]
+            others = shared.indices[start:end]
+            counts = shared.data[start:end]
+            keep = (others != column) & (counts >= min_shared)
+            others, counts = others[keep], counts[keep]
+            if not len(others):
+                yield column, []
+                continue
+            scores = counts / (norms[column] * norms[others])
+            if len(scores) > top_k:
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+                others, scores = others[best], scores[best]
+            order = np.argsort(-scores, kind='stable')
+            yield column, [(others[i], float(scores[i])) for i in order]
+
+
+def compute_similar_books(book_ids=None, top_k=DEFAULT_TOP_K, min_shared=DEFAULT_MIN_SHARED,
+                          block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Recalcule les voisins des livres ``book_ids`` (tous si None) ; retourne le
+    nombre de livres recalculés
+    """
+    import numpy as np
+
+    from loans.models import Loan
+
+    matrix, columns = borrowing_matrix()
+    if book_ids is None:
+        targets = np.arange(len(columns))
+        # Livres qui n'ont plus d'emprunts (emprunts supprimés) : plus de voisins
+        SimilarBook.objects.exclude(book_id__in=Loan.objects.values('book_id')).delete()
+    else:
+        book_ids = sorted(set(book_ids))
+        targets = np.flatnonzero(np.isin(columns, book_ids))
+        SimilarBook.objects.filter(book_id__in=set(book_ids) - set(columns[targets].tolist())).delete()
+
+    rows = []
+    done = []
+    for column, found in neighbours(matrix, targets, top_k, min_shared, block_size):
+        book_id = int(columns[column])
+        done.append(book_id)
+        rows.extend(
+            SimilarBook(book_id=book_id, similar_id=int(columns[other]), score=score)
+            for other, score in found
+        )
+        if len(done) >= block_size:
+            _replace(done, rows)
+            done, rows = [], []
+    _replace(done, rows)
+    return len(targets)
+
+
+def _replace(book_ids, rows):
+    """Remplace les voisins d'un lot de livres (transaction courte par lot)"""
+    if not book_ids:
+        return
+    with transaction.atomic():
+        SimilarBook.objects.filter(book_id__in=book_ids).delete()
+        SimilarBook.objects.bulk_create(rows, batch_size=1000)
+
+
+def touched_books(since_loan_id):
+    """Livres dont les co-emprunts ont changé depuis l'emprunt ``since_loan_id``"""
+    from loans.models import Loan
+
+    borrowers = Loan.objects.filter(pk__gt=since_loan_id).values('borrower_id')
+    return set(
+        Loan.objects.filter(borrower_id__in=borrowers).order_by()
+        .values_list('book_id', flat=True).distinct()
+    )
+
+
+def refresh_similar_books(full=False, **options):
+    """
+    Calcul incrémental depuis la dernière exécution (complet la première fois
+    ou avec ``full``) ; retourne l'exécution enregistrée
+    """
+    from loans.models import Loan
+
+    from .cache import reference_cache
+
+    started = time.monotonic()
+    # Lu avant le calcul : un emprunt créé pendant sera repris à l'exécution suivante
+    last_loan_id = Loan.objects.aggregate(last=Max('pk'))['last'] or 0
+    previous = SimilarityRun.objects.order_by('-pk').first()
+    full = full or previous is None
+    if full:
+        books = compute_similar_books(**options)
+    else:
+        touched = touched_books(previous.last_loan_id)
+        books = compute_similar_books(touched, **options) if touched else 0
+    if books:
+        # Fiches en cache (livres similaires de book_detail_bundle)
+        reference_cache.bump('books')
+    return SimilarityRun.objects.create(
+        last_loan_id=last_loan_id, full=full, books=books,
+        duration=round(time.monotonic() - started, 3),
+    )
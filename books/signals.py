@@ -0,0 +1,217 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from loans.models import Loan, LoanHistory
+
+from . import fuzzy, images, stats, trending
+from .cache import reference_cache
+from .autocomplete import prefix_index
+from .models import Author, Book, BookReview, Category, Publisher
+from .search import update_search_documents
+
+TRIGRAM_KINDS = {Book: 'book', Author: 'author', Publisher: 'publisher'}
+
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, raw=False, **kwargs):
+    """Met à jour le document de recherche après enregistrement d'un livre"""
+    if raw:
+        return
+    update_search_documents([instance.pk])
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Publisher)
+def index_trigrams(sender, instance, raw=False, **kwargs):
+    """Met à jour l'index de trigrammes (recherche approchée)"""
+    if raw:
+        return
+    fuzzy.index_object(TRIGRAM_KINDS[sender], instance)
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Publisher)
+def unindex_trigrams(sender, instance, **kwargs):
+    fuzzy.unindex_object(TRIGRAM_KINDS[sender], instance.pk)
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def index_book_authors(sender, instance, action, reverse, pk_set, **kwargs):
+    """Répercute les ajouts/retraits d'auteurs dans les documents de recherche"""
+    if action == 'pre_clear' and reverse:
+        # clear() depuis l'auteur : mémoriser les livres avant qu'ils ne soient détachés
+        instance._cleared_book_ids = list(instance.book_set.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        update_search_documents([instance.pk])
+    elif action == 'post_clear':
+        update_search_documents(getattr(instance, '_cleared_book_ids', []))
+    else:
+        update_search_documents(pk_set)
+
+
+@receiver(post_save, sender=Author)
+def index_author_books(sender, instance, created, raw=False, **kwargs):
+    """Réindexe les livres d'un auteur renommé"""
+    if raw or created:
+        return
+    update_search_documents(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Publisher)
+def update_prefix_index(sender, instance, raw=False, **kwargs):
+    """Tient l'index d'autocomplétion du processus à jour"""
+    if raw:
+        return
+    present = instance.is_active if sender is Book else True
+    prefix_index.update(TRIGRAM_KINDS[sender], instance, present=present)
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Publisher)
+def remove_from_prefix_index(sender, instance, **kwargs):
+    prefix_index.update(TRIGRAM_KINDS[sender], instance, present=False)
+
+
+# --- Cache de référence -----------------------------------------------------
+
+CACHE_NAMESPACES = {Book: 'books', Author: 'authors', Publisher: 'publishers', Category: 'categories'}
+
+
+def bump_after_commit(namespace):
+    reference_cache.bump(namespace)
+    transaction.on_commit(lambda: reference_cache.bump(namespace))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Publisher)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Publisher)
+@receiver(post_delete, sender=Category)
+def bump_reference_cache(sender, raw=False, **kwargs):
+    """
+    Invalide les entrées du cache de référence qui dépendent du modèle, tout
+    de suite puis à la validation (une lecture concurrente a pu remettre en
+    cache l'état d'avant la transaction entre-temps).
+    """
+    if not raw:
+        bump_after_commit(CACHE_NAMESPACES[sender])
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def bump_reference_cache_authors(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_after_commit('books')
+
+
+# --- Images -------------------------------------------------------------------
+
+User = get_user_model()
+
+
+@receiver(post_init, sender=Book)
+@receiver(post_init, sender=User)
+def remember_image_name(sender, instance, **kwargs):
+    """Mémorise l'image chargée pour ne retraiter que les images modifiées"""
+    image_field = images.IMAGE_FIELDS[sender._meta.label][0]
+    value = instance.__dict__.get(image_field)
+    instance._image_name = getattr(value, 'name', value) or None
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=User)
+def process_image(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Calcule les renditions d'une image modifiée, après validation et hors de la requête"""
+    image_field = images.IMAGE_FIELDS[sender._meta.label][0]
+    if raw or (update_fields is not None and image_field not in update_fields):
+        return
+    name = getattr(instance, image_field).name or None
+    if name != instance._image_name:
+        pk = instance.pk
+        transaction.on_commit(lambda: images.schedule(sender, pk))
+    instance._image_name = name
+
+
+# --- Statistiques des livres -------------------------------------------------
+
+@receiver(post_save, sender=Book)
+def create_book_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.ensure_stats([instance.pk])
+
+
+@receiver(post_init, sender=BookReview)
+def remember_review_rating(sender, instance, **kwargs):
+    """Mémorise la note chargée pour calculer l'écart lors d'une modification"""
+    instance._stats_rating = instance.rating
+
+
+@receiver(post_save, sender=BookReview)
+def count_review(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        stats.adjust(instance.book_id, **stats.review_deltas(instance.rating))
+    elif instance._stats_rating is not None and int(instance._stats_rating) != int(instance.rating):
+        deltas = stats.review_deltas(instance._stats_rating, -1)
+        for field, delta in stats.review_deltas(instance.rating).items():
+            deltas[field] = deltas.get(field, 0) + delta
+        stats.adjust(instance.book_id, **deltas)
+    instance._stats_rating = instance.rating
+
+
+@receiver(post_delete, sender=BookReview)
+def uncount_review(sender, instance, **kwargs):
+    stats.adjust(instance.book_id, **stats.review_deltas(instance._stats_rating or instance.rating, -1))
+
+
+@receiver(post_save, sender=Loan)
+def count_loan(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.adjust(
+            instance.book_id,
+            loan_count=1,
+            active_loans=1 if instance.returned_date is None else 0,
+        )
+
+
+@receiver(post_delete, sender=Loan)
+def uncount_loan(sender, instance, **kwargs):
+    stats.adjust(
+        instance.book_id,
+        loan_count=-1,
+        active_loans=-1 if instance.returned_date is None else 0,
+    )
+
+
+@receiver(post_save, sender=Loan)
+def update_trending(sender, instance, created, raw=False, **kwargs):
+    """Scores de tendance du livre et de sa catégorie (deux incréments)"""
+    if created and not raw:
+        trending.record_loan(instance.book_id, instance.loan_date)
+
+
+@receiver(post_delete, sender=Loan)
+def remove_from_trending(sender, instance, **kwargs):
+    trending.record_loan(instance.book_id, instance.loan_date, sign=-1)
+
+
+@receiver(post_save, sender=LoanHistory)
+def count_return(sender, instance, created, raw=False, **kwargs):
+    """Un retour est toujours journalisé (service de circulation) : l'emprunt n'est plus en cours"""
+    if created and not raw and instance.action == 'returned':
+        book_id = Loan.objects.filter(pk=instance.loan_id).values_list('book_id', flat=True).first()
+        if book_id is not None:
+            stats.adjust(book_id, active_loans=-1)
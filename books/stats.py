@@ -0,0 +1,95 @@
+"""
+Statistiques dénormalisées des livres (``BookStats``).
+
+Les compteurs sont modifiés par incréments ``UPDATE ... SET x = x + n`` depuis
+les signaux des emprunts et des avis (voir ``signals``) : aucun agrégat n'est
+recalculé sur la table des emprunts à l'affichage. ``rebuild_book_stats``
+recalcule tout depuis les tables sources (commande ``reconcile_book_stats``).
+"""
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Greatest
+
+from .models import Book, BookReview, BookStats
+
+RATING_FIELDS = [f'rating_{rating}' for rating in range(1, 6)]
+COUNTER_FIELDS = ['loan_count', 'active_loans', 'review_count', 'rating_sum'] + RATING_FIELDS
+
+
+def ensure_stats(book_ids):
+    """Crée les lignes de statistiques manquantes (livres importés en masse...)"""
+    BookStats.objects.bulk_create(
+        [BookStats(book_id=book_id) for book_id in book_ids],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+def adjust(book_id, **deltas):
+    """Applique des incréments aux compteurs d'un livre (jamais en dessous de zéro)"""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    changes = {
+        field: Greatest(F(field) + Value(delta), Value(0))
+        for field, delta in deltas.items()
+    }
+    if not BookStats.objects.filter(book_id=book_id).update(**changes):
+        ensure_stats([book_id])
+        BookStats.objects.filter(book_id=book_id).update(**changes)
+
+
+def review_deltas(rating, sign=1):
+    """Incréments correspondant à l'ajout (sign=1) ou au retrait (sign=-1) d'une note"""
+    rating = int(rating)
+    deltas = {'review_count': sign, 'rating_sum': sign * rating}
+    if 1 <= rating <= 5:
+        deltas[f'rating_{rating}'] = sign
+    return deltas
+
+
+def rebuild_book_stats(batch_size=1000):
+    """Recalcule toutes les statistiques depuis les emprunts et les avis ; retourne le nombre de livres"""
+    from loans.models import Loan
+
+    loans = {
+        row['book_id']: row
+        for row in Loan.objects.order_by().values('book_id').annotate(
+            loan_count=Count('id'),
+            active_loans=Count('id', filter=Q(returned_date__isnull=True)),
+        )
+    }
+    reviews = {
+        row['book_id']: row
+        for row in BookReview.objects.order_by().values('book_id').annotate(
+            review_count=Count('id'),
+            rating_sum=Sum('rating'),
+            **{
+                f'rating_{rating}': Count('id', filter=Q(rating=rating))
+                for rating in range(1, 6)
+            }
+        )
+    }
+
+    total = 0
+    batch = []
+    for book_id in Book.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=batch_size):
+        values = {field: 0 for field in COUNTER_FIELDS}
+        for source in (loans.get(book_id), reviews.get(book_id)):
+            if source:
+                values.update({k: v or 0 for k, v in source.items() if k in values})
+        batch.append(BookStats(book_id=book_id, **values))
+        if len(batch) >= batch_size:
+            total += _write(batch)
+            batch = []
+    total += _write(batch)
+    return total
+
+
+def _write(batch):
+    BookStats.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['book'],
+        update_fields=COUNTER_FIELDS,
+    )
+    return len(batch)
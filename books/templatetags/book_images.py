@@ -0,0 +1,42 @@
+from django import template
+from django.utils.html import format_html
+
+from books import images
+
+register = template.Library()
+
+
+def _srcset(renditions, format_name):
+    return ', '.join(
+        f"{images.rendition_url(renditions, name, format_name)} {entry['width']}w"
+        for name, entry in renditions.items()
+    )
+
+
+@register.simple_tag
+def responsive_image(obj, size='thumb', css_class='', style='', alt=''):
+    """
+    Balise <picture> d'une couverture ou d'une photo de profil : WebP puis
+    JPEG, ``srcset`` de toutes les renditions et taille d'affichage ``size``.
+    Tant que les renditions ne sont pas calculées, l'original est affiché.
+    """
+    image_field, renditions_field, _ = images.IMAGE_FIELDS[obj._meta.label]
+    renditions = getattr(obj, renditions_field)
+    if not renditions or size not in renditions:
+        image = getattr(obj, image_field)
+        if not image:
+            return ''
+        return format_html(
+            '<img src="{}" class="{}" style="{}" alt="{}" loading="lazy">',
+            image.url, css_class, style, alt
+        )
+    entry = renditions[size]
+    sizes = f"{entry['width']}px"
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" class="{}" style="{}" alt="{}" loading="lazy">'
+        '</picture>',
+        _srcset(renditions, 'webp'), sizes,
+        images.rendition_url(renditions, size), _srcset(renditions, 'jpeg'), sizes,
+        entry['width'], entry['height'], css_class, style, alt
+    )
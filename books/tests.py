@@ -1,6 +1,46 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
-from .models import Book, Author, Publisher, Category
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from PIL import Image
+from django.core.paginator import InvalidPage
+from django.http import QueryDict
+from django.urls import reverse
+from django.utils import timezone
+from .autocomplete import PrefixIndex, prefix_index, search_database, suggest
+from .checks import check_shared_cache
+from .facets import compute_facets
+from .importers.readers import parse_marc_record, parse_onix_product
+from .fuzzy import fuzzy_book_ids, fuzzy_match
+from loans import services as circulation
+from loans.models import Loan
+from dashboard import metrics
+from . import cache as reference
+from . import content
+from . import images
+from . import recommendations
+from . import stats as book_stats
+from . import trending
+from .models import (
+    Book, Author, Publisher, Category, BookReview, BookStats, BookTrend, CategoryTrend, SimilarBook,
+    SimilarityRun, TrigramEntry,
+)
+from .normalize import normalize_key, sort_key
+from .pagination import CursorPaginator, encode_cursor
+from .search import get_search_backend
+from .views import serve_rendition
 
 User = get_user_model()
 
@@ -71,3 +111,923 @@ class BookModelTest(TestCase):
     def test_get_authors_display(self):
         """Test d'affichage des auteurs"""
         self.assertEqual(self.book.get_authors_display(), 'Test Author')
+
+
+class BookSearchTest(TestCase):
+    """Tests du moteur de recherche plein texte"""
+    
+    def setUp(self):
+        self.category = Category.objects.create(name='Roman')
+        self.publisher = Publisher.objects.create(name='Gallimard')
+        self.author = Author.objects.create(first_name='Victor', last_name='Hugo')
+        
+        self.book = Book.objects.create(
+            title='Les Misérables',
+            isbn='9782070409228',
+            publisher=self.publisher,
+            category=self.category,
+            publication_date='1862-01-01',
+            pages=1900,
+            summary='Jean Valjean, ancien forçat, cherche la rédemption.',
+        )
+        self.book.authors.add(self.author)
+        
+        self.other = Book.objects.create(
+            title='Le Petit Prince',
+            isbn='9782070612758',
+            publisher=self.publisher,
+            category=self.category,
+            publication_date='1943-01-01',
+            pages=96,
+            summary='Un aviateur rencontre un petit prince venu des étoiles.',
+        )
+    
+    def search(self, query):
+        return list(get_search_backend().search(Book.objects.all(), query))
+    
+    def test_search_by_title_and_accents(self):
+        """Recherche par titre, insensible aux accents et aux préfixes"""
+        self.assertEqual(self.search('miserables'), [self.book])
+        self.assertEqual(self.search('Misér'), [self.book])
+    
+    def test_search_by_author_follows_m2m_changes(self):
+        """Les auteurs ajoutés ou renommés sont indexés"""
+        self.assertEqual(self.search('hugo'), [self.book])
+        self.author.last_name = 'Duchemin'
+        self.author.save()
+        self.assertEqual(self.search('hugo'), [])
+        self.assertEqual(self.search('duchemin'), [self.book])
+        self.book.authors.clear()
+        self.assertEqual(self.search('duchemin'), [])
+    
+    def test_search_ranks_title_before_summary(self):
+        """Un terme du titre est mieux classé qu'un terme du résumé"""
+        self.book.summary = 'Un prince déchu traverse Paris.'
+        self.book.save()
+        self.assertEqual(self.search('prince'), [self.other, self.book])
+    
+    def test_search_ignores_operators(self):
+        """Les caractères spéciaux ne sont pas interprétés comme syntaxe"""
+        self.assertEqual(self.search('"prince" * ('), [self.other])
+        self.assertEqual(self.search('!!!'), [])
+    
+    def test_deleted_book_leaves_index(self):
+        """La suppression d'un livre retire son document"""
+        self.book.delete()
+        self.assertEqual(self.search('miserables'), [])
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_book_list_view_search(self):
+        """La vue catalogue utilise le moteur de recherche"""
+        response = self.client.get(reverse('books:list'), {'q': 'valjean'})
+        self.assertEqual(list(response.context['books']), [self.book])
+
+
+class NormalizedKeysTest(TestCase):
+    """Tests des clés normalisées et de la recherche approchée"""
+    
+    def setUp(self):
+        self.category = Category.objects.create(name='Roman')
+        self.publisher = Publisher.objects.create(name='Éditions Gallimard')
+        self.celine = Author.objects.create(first_name='Louis-Ferdinand', last_name='Céline')
+        self.beauvoir = Author.objects.create(first_name='Simone', last_name='de Beauvoir')
+        self.book = Book.objects.create(
+            title="L'Étranger",
+            isbn='9782070360024',
+            publisher=self.publisher,
+            category=self.category,
+            publication_date='1942-01-01',
+            pages=184,
+            summary='Meursault.',
+        )
+        self.book.authors.add(self.celine)
+    
+    def test_normalize_key(self):
+        """Accents, casse, ligatures et ponctuation sont normalisés"""
+        self.assertEqual(normalize_key('Les Misérables'), 'les miserables')
+        self.assertEqual(normalize_key("Œuvres  complètes !"), 'oeuvres completes')
+        self.assertEqual(sort_key("L'Étranger"), 'etranger')
+    
+    def test_keys_saved_on_models(self):
+        """Les clés sont calculées à l'enregistrement"""
+        self.assertEqual(self.book.title_key, 'l etranger')
+        self.assertEqual(self.book.sort_title, 'etranger')
+        self.assertEqual(self.celine.last_name_key, 'celine')
+        self.assertEqual(self.publisher.name_key, 'editions gallimard')
+        
+        self.book.title = 'La Peste'
+        self.book.save(update_fields=['title'])
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.sort_title, 'peste')
+    
+    def test_author_ordering_uses_keys(self):
+        """Le tri des auteurs ignore accents et casse"""
+        self.assertEqual(list(Author.objects.all()), [self.celine, self.beauvoir])
+    
+    def test_fuzzy_match_with_typo(self):
+        """Une faute de frappe retrouve le titre ou l'auteur"""
+        self.assertEqual(fuzzy_book_ids('etrnger'), [self.book.pk])
+        self.assertEqual(fuzzy_book_ids('celin'), [self.book.pk])
+        self.assertEqual(fuzzy_book_ids('zzzz'), [])
+    
+    def test_trigrams_follow_updates(self):
+        """L'index de trigrammes suit les renommages et suppressions"""
+        self.book.title = 'La Peste'
+        self.book.save()
+        self.assertEqual(fuzzy_match('book', 'etranger'), [])
+        self.assertEqual([pk for pk, _ in fuzzy_match('book', 'pest')], [self.book.pk])
+        self.book.delete()
+        self.assertFalse(TrigramEntry.objects.filter(kind='book').exists())
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_book_list_falls_back_to_fuzzy_search(self):
+        """Le catalogue se replie sur la recherche approchée sans résultat exact"""
+        response = self.client.get(reverse('books:list'), {'q': 'Etrangre'})
+        self.assertEqual(list(response.context['books']), [self.book])
+
+
+class BookFacetsTest(TestCase):
+    """Tests des facettes de recherche"""
+    
+    def setUp(self):
+        self.roman = Category.objects.create(name='Roman')
+        self.essai = Category.objects.create(name='Essai')
+        self.publisher = Publisher.objects.create(name='Gallimard')
+        for i, (category, year, copies) in enumerate([
+            (self.roman, 1962, 1), (self.roman, 1968, 0), (self.essai, 1949, 2),
+        ]):
+            Book.objects.create(
+                title=f'Livre {i}',
+                isbn=f'978000000000{i}',
+                publisher=self.publisher,
+                category=category,
+                publication_date=f'{year}-01-01',
+                pages=100,
+                summary='Résumé',
+                total_copies=2,
+                available_copies=copies,
+            )
+    
+    def facets(self, params=''):
+        facets = compute_facets(Book.objects.all(), QueryDict(params))
+        return {facet['name']: {entry['label']: entry['count'] for entry in facet['values']} for facet in facets}
+    
+    def test_counts_for_all_facets(self):
+        """Chaque facette compte le résultat courant"""
+        facets = self.facets()
+        self.assertEqual(facets['category'], {'Roman': 2, 'Essai': 1})
+        self.assertEqual(facets['available'], {'Disponible': 2, 'Emprunté': 1})
+        self.assertEqual(facets['decade'], {'Années 1960': 2, 'Années 1940': 1})
+        self.assertEqual(facets['language'], {'Français': 3})
+    
+    def test_one_bounded_query_per_facet(self):
+        """Une requête groupée sur une seule colonne par facette, limitée aux premières valeurs (plus les libellés)"""
+        with CaptureQueriesContext(connection) as queries:
+            compute_facets(Book.objects.filter(category=self.roman), QueryDict(), top_n=8)
+        grouped = [query['sql'] for query in queries if 'GROUP BY' in query['sql']]
+        self.assertEqual(len(grouped), 5)
+        self.assertEqual(len(queries), 7)
+        for sql in grouped:
+            self.assertNotIn(',', sql.split('GROUP BY')[1].split('ORDER BY')[0])
+            self.assertTrue(sql.endswith('LIMIT 9'))
+    
+    def test_top_n_and_lazy_values(self):
+        """Seules les premières valeurs sont rendues, le reste est chargé à la demande"""
+        category_facet = compute_facets(Book.objects.all(), QueryDict(), top_n=1)[0]
+        self.assertEqual(len(category_facet['values']), 1)
+        self.assertTrue(category_facet['has_more'])
+        
+        response = self.client.get(reverse('books:search_facet', args=['category']))
+        self.assertEqual([v['count'] for v in response.json()['values']], [2, 1])
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_search_view_filters_by_decade(self):
+        """Le filtre de décennie restreint les résultats"""
+        response = self.client.get(reverse('books:search'), {'decade': '1940'})
+        self.assertEqual(len(response.context['books']), 1)
+
+
+class AutocompleteTest(TestCase):
+    """Tests de l'index d'autocomplétion"""
+    
+    def setUp(self):
+        category = Category.objects.create(name='Roman')
+        self.publisher = Publisher.objects.create(name='Gallimard')
+        self.author = Author.objects.create(first_name='Émile', last_name='Zola')
+        self.book = Book.objects.create(
+            title='Les Misérables',
+            isbn='9782070409228',
+            publisher=self.publisher,
+            category=category,
+            publication_date='1862-01-01',
+            pages=1900,
+            summary='Résumé',
+        )
+        self.index = PrefixIndex()
+        self.index.load()
+    
+    def tearDown(self):
+        prefix_index.loaded = False
+    
+    def labels(self, results):
+        return [result['label'] for result in results]
+    
+    def test_prefix_lookup(self):
+        """Préfixes de titre, de mot, d'auteur, d'éditeur et d'ISBN"""
+        self.assertEqual(self.labels(self.index.search('les mis')), ['Les Misérables'])
+        self.assertEqual(self.labels(self.index.search('MISER')), ['Les Misérables'])
+        self.assertEqual(self.labels(self.index.search('emile')), ['Émile Zola'])
+        self.assertEqual(self.labels(self.index.search('zol')), ['Émile Zola'])
+        self.assertEqual(self.labels(self.index.search('galli')), ['Gallimard'])
+        self.assertEqual(self.labels(self.index.search('978207')), ['Les Misérables'])
+    
+    def test_incremental_updates(self):
+        """Les ajouts, renommages et suppressions sont répercutés"""
+        self.index.update('author', Author(pk=self.author.pk, first_name='Émile', last_name='Ajar'))
+        self.assertEqual(self.index.search('zola'), [])
+        self.assertEqual(self.labels(self.index.search('ajar')), ['Émile Ajar'])
+        self.index.update('book', self.book, present=False)
+        self.assertEqual(self.index.search('miser'), [])
+    
+    def test_memory_budget_falls_back_to_database(self):
+        """Au-delà du budget, l'index est vidé et la base prend le relais"""
+        index = PrefixIndex(memory_budget=100)
+        with self.assertLogs('books.autocomplete', level='WARNING'):
+            index.load()
+        self.assertTrue(index.over_budget)
+        self.assertEqual(len(index), 0)
+        self.assertEqual(self.labels(search_database('miser')), [])
+        self.assertEqual(self.labels(search_database('les mis')), ['Les Misérables'])
+    
+    def test_rebuilt_after_change_in_another_worker(self):
+        """Un changement invisible aux signaux du processus reconstruit l'index à sa version suivante"""
+        self.assertEqual(self.labels(suggest('zo')[0]), ['Émile Zola'])
+        # Écriture d'un autre worker : pas de signal ici, seule la version partagée change
+        Author.objects.filter(pk=self.author.pk).update(last_name='Ajar')
+        self.assertEqual(self.labels(suggest('zo')[0]), ['Émile Zola'])
+        reference.reference_cache.bump('authors')
+        self.assertEqual(suggest('zo'), ([], 'memory'))
+        self.assertEqual(self.labels(suggest('ajar')[0]), ['Émile Ajar'])
+    
+    def test_endpoint(self):
+        """Le point d'accès JSON sert les suggestions depuis la mémoire"""
+        response = self.client.get(reverse('books:autocomplete'), {'q': 'zo'})
+        self.assertEqual(response.json()['source'], 'memory')
+        self.assertEqual(self.labels(response.json()['results']), ['Émile Zola'])
+
+
+class KeysetPaginationTest(TestCase):
+    """Tests de la pagination par curseur"""
+    
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Roman')
+        publisher = Publisher.objects.create(name='Gallimard')
+        self.books = [
+            Book.objects.create(
+                title=f'Livre {i:02d}',
+                isbn=f'97800000000{i:02d}',
+                publisher=publisher,
+                category=category,
+                publication_date='2000-01-01',
+                pages=100,
+                summary='Résumé',
+            )
+            for i in range(7)
+        ]
+    
+    def test_walks_forward_and_backward(self):
+        """Les curseurs parcourent tout le résultat dans les deux sens, sans doublon"""
+        paginator = CursorPaginator(Book.objects.all(), 3, '-created_at')
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        seen = [book for page in pages for book in page]
+        self.assertEqual(seen, list(reversed(self.books)))
+        self.assertFalse(pages[0].has_previous())
+        
+        previous = paginator.page(pages[-1].previous_cursor)
+        self.assertEqual(list(previous), list(pages[-2]))
+    
+    def test_ties_on_sort_column_use_id(self):
+        """Les égalités sur la colonne de tri sont départagées par l'id"""
+        paginator = CursorPaginator(Book.objects.all(), 2, 'publication_date')
+        page = paginator.page()
+        seen = list(page)
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, self.books)
+    
+    def test_invalid_cursor(self):
+        """Un curseur illisible est rejeté"""
+        with self.assertRaises(InvalidPage):
+            CursorPaginator(Book.objects.all(), 2, 'sort_title').page('pas-un-curseur')
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_forged_cursor_value(self):
+        """Une valeur de curseur forgée, illisible pour la colonne de tri, donne une 404"""
+        forged = encode_cursor('n', 'abc', self.books[0].pk)
+        with self.assertRaises(InvalidPage):
+            CursorPaginator(Book.objects.all(), 2, 'publication_date').page(forged)
+        response = self.client.get(reverse('books:list'), {'cursor': forged})
+        self.assertEqual(response.status_code, 404)
+    
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_list_view_cursor_mode(self):
+        """La vue catalogue passe en mode curseur avec ?cursor= et garde les numéros sinon"""
+        response = self.client.get(reverse('books:by_category', args=[self.books[0].category_id]), {'cursor': ''})
+        page = response.context['page_obj']
+        self.assertTrue(page.is_cursor)
+        self.assertEqual(len(page), 7)
+        
+        response = self.client.get(reverse('books:list'), {'sort': 'title', 'cursor': ''})
+        self.assertTrue(response.context['page_obj'].is_cursor)
+        
+        response = self.client.get(reverse('books:list'))
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(response.context['paginator'].count, 7)
+
+
+def _marc_record(fields):
+    """Construit un enregistrement ISO 2709 minimal : [(tag, [(code, texte)])]"""
+    directory = b''
+    data = b''
+    for tag, subfields in fields:
+        value = b'  ' + b''.join(b'\x1f' + code.encode() + text.encode() for code, text in subfields) + b'\x1e'
+        directory += tag.encode() + b'%04d%05d' % (len(value), len(data))
+        data += value
+    base = 24 + len(directory) + 1
+    length = base + len(data) + 1
+    leader = b'%05dnam a22%05d a 4500' % (length, base)
+    return leader + directory + b'\x1e' + data + b'\x1d'
+
+
+class ImportBooksTest(TestCase):
+    """Tests de l'import en masse du catalogue"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        # Index de contenu propre au test (ajout des livres créés)
+        similarity = override_settings(BOOKS_SIMILARITY_DIR=os.path.join(self.tmpdir.name, 'similarity'))
+        similarity.enable()
+        self.addCleanup(similarity.disable)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as handle:
+            handle.write(content)
+        return path
+
+    def test_csv_import_deduplicates_and_upserts(self):
+        path = self.write('books.csv', (
+            "bookID,title,authors,isbn,isbn13,language_code,num_pages,publication_date,publisher\n"
+            "1,Les Misérables,Victor Hugo,2070409228,9782070409228,fre,1232,1/15/1998,Gallimard\n"
+            "2,Notre-Dame de Paris,Victor Hugo/Jean Dupont,2070409236,9782070409235,fre,940,3/2/2001,Gallimard\n"
+            "3,,Sans Titre,,,,,,\n"
+        ))
+        metrics.reconcile()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_books', path, '--batch-size', '2', stdout=open(os.devnull, 'w'))
+
+        self.assertEqual(Book.objects.count(), 2)
+        # Compteur du tableau de bord ajusté sans signal post_save
+        self.assertEqual(metrics.get_snapshot()['total_books'], 2)
+        self.assertEqual(Publisher.objects.count(), 1)
+        self.assertEqual(Author.objects.filter(last_name='Hugo').count(), 1)
+        book = Book.objects.get(isbn='9782070409235')
+        self.assertEqual(book.authors.count(), 2)
+        self.assertEqual(book.title_key, 'notre dame de paris')
+        self.assertEqual(str(book.publication_date), '2001-03-02')
+        self.assertEqual(book.language, 'Français')
+        self.assertIn(book.pk, set(get_search_backend().filter(Book.objects.all(), 'notre dame').values_list('pk', flat=True)))
+        self.assertTrue(TrigramEntry.objects.filter(kind='book', object_id=book.pk).exists())
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+        # Ré-import : mise à jour sur l'ISBN sans toucher aux exemplaires
+        book.available_copies = 0
+        book.save()
+        path = self.write('update.csv', (
+            "isbn,title,authors,publisher,category\n"
+            "9782070409235,Notre-Dame de Paris (édition revue),Victor Hugo,Gallimard,Roman\n"
+        ))
+        call_command('import_books', path, stdout=open(os.devnull, 'w'))
+        book.refresh_from_db()
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertEqual(book.title, 'Notre-Dame de Paris (édition revue)')
+        self.assertEqual(book.category.name, 'Roman')
+        self.assertEqual(book.available_copies, 0)
+        self.assertEqual(list(book.authors.values_list('last_name', flat=True)), ['Hugo'])
+
+    def test_resume_skips_committed_records(self):
+        path = self.write('books.csv', (
+            "isbn,title,authors\n"
+            "9780000000001,Premier,Jean Martin\n"
+            "9780000000002,Second,Jean Martin\n"
+        ))
+        with open(path + '.checkpoint', 'w') as handle:
+            handle.write('{"offset": 1}')
+        call_command('import_books', path, '--resume', stdout=open(os.devnull, 'w'))
+        self.assertEqual(list(Book.objects.values_list('title', flat=True)), ['Second'])
+
+    def test_parse_onix_product(self):
+        record = parse_onix_product(b"""
+            <Product xmlns="http://ns.editeur.org/onix/3.0/reference">
+              <ProductIdentifier><ProductIDType>15</ProductIDType><IDValue>9782070368228</IDValue></ProductIdentifier>
+              <DescriptiveDetail>
+                <TitleDetail><TitleElement><TitleText>L'Etranger</TitleText></TitleElement></TitleDetail>
+                <Contributor><NamesBeforeKey>Albert</NamesBeforeKey><KeyNames>Camus</KeyNames></Contributor>
+                <Extent><ExtentType>00</ExtentType><ExtentValue>186</ExtentValue></Extent>
+                <Language><LanguageCode>fre</LanguageCode></Language>
+                <Subject><SubjectHeadingText>Roman</SubjectHeadingText></Subject>
+              </DescriptiveDetail>
+              <PublishingDetail>
+                <Publisher><PublisherName>Gallimard</PublisherName></Publisher>
+                <PublishingDate><Date>19720101</Date></PublishingDate>
+              </PublishingDetail>
+            </Product>""")
+        self.assertEqual(record['isbn'], '9782070368228')
+        self.assertEqual(record['authors'], [('Albert', 'Camus')])
+        self.assertEqual(record['pages'], 186)
+        self.assertEqual(record['category'], 'Roman')
+        self.assertEqual(record['publication_date'], '1972-01-01')
+
+    def test_parse_marc_record(self):
+        record = parse_marc_record(_marc_record([
+            ('020', [('a', '9782070360024')]),
+            ('100', [('a', 'Camus, Albert')]),
+            ('245', [('a', 'La Peste /'), ('b', 'roman')]),
+            ('264', [('b', 'Gallimard,'), ('c', '1947.')]),
+            ('300', [('a', '279 p.')]),
+            ('650', [('a', 'Épidémies')]),
+        ]))
+        self.assertEqual(record['isbn'], '9782070360024')
+        self.assertEqual(record['title'], 'La Peste')
+        self.assertEqual(record['subtitle'], 'roman')
+        self.assertEqual(record['authors'], [('Albert', 'Camus')])
+        self.assertEqual(record['publisher'], 'Gallimard')
+        self.assertEqual(record['pages'], 279)
+        self.assertEqual(record['publication_date'], '1947-01-01')
+
+
+    def test_marc_import_survives_malformed_leaders(self):
+        def record(isbn, title):
+            return _marc_record([('020', [('a', isbn)]), ('245', [('a', title)])])
+
+        # Longueur illisible : enregistrement délimité par son terminateur ; illisible : rejeté
+        bad_length = b'12x45' + record('9782070360031', 'Caligula')[5:]
+        garbage = b'?????' + b'x' * 40 + b'\x1d'
+        path = os.path.join(self.tmpdir.name, 'books.mrc')
+        with open(path, 'wb') as handle:
+            handle.write(record('9782070360024', 'La Peste') + bad_length + garbage + record('9782070360048', 'La Chute'))
+        out = io.StringIO()
+        call_command('import_books', path, stdout=out)
+        self.assertEqual(
+            sorted(Book.objects.values_list('title', flat=True)), ['Caligula', 'La Chute', 'La Peste']
+        )
+        self.assertIn('1 rejetés', out.getvalue())
+
+
+class BookStatsTest(TestCase):
+    """Tests des statistiques dénormalisées des livres"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='testpass123')
+        self.other = User.objects.create_user(username='other', password='testpass123')
+        self.book = Book.objects.create(
+            title='Test Book',
+            isbn='1234567890123',
+            publisher=Publisher.objects.create(name='Test Publisher'),
+            category=Category.objects.create(name='Test Category'),
+            publication_date='2023-01-01',
+            pages=100,
+            summary='Test summary',
+            total_copies=2,
+            available_copies=2
+        )
+
+    def stats(self):
+        return BookStats.objects.get(book=self.book)
+
+    def test_loans_are_counted_incrementally(self):
+        loan = circulation.borrow(self.book, self.user)
+        circulation.borrow(self.book, self.other)
+        self.assertEqual((self.stats().loan_count, self.stats().active_loans), (2, 2))
+        circulation.return_loan(loan)
+        self.assertEqual((self.stats().loan_count, self.stats().active_loans), (2, 1))
+        loan.delete()
+        self.assertEqual((self.stats().loan_count, self.stats().active_loans), (1, 1))
+
+    def test_reviews_update_histogram(self):
+        review = BookReview.objects.create(book=self.book, reviewer=self.user, rating=4)
+        BookReview.objects.create(book=self.book, reviewer=self.other, rating=2)
+        self.assertEqual(self.stats().average_rating, 3)
+        review = BookReview.objects.get(pk=review.pk)
+        review.rating = '5'
+        review.save()
+        stats = self.stats()
+        self.assertEqual((stats.review_count, stats.rating_sum, stats.rating_4, stats.rating_5), (2, 7, 0, 1))
+        review.delete()
+        stats = self.stats()
+        self.assertEqual((stats.review_count, stats.rating_sum, stats.rating_5, stats.rating_2), (1, 2, 0, 1))
+
+    def test_rebuild_matches_incremental_counters(self):
+        circulation.borrow(self.book, self.user)
+        BookReview.objects.create(book=self.book, reviewer=self.user, rating=3)
+        expected = {field: getattr(self.stats(), field) for field in book_stats.COUNTER_FIELDS}
+        BookStats.objects.all().delete()
+        call_command('reconcile_book_stats', stdout=open(os.devnull, 'w'))
+        self.assertEqual({field: getattr(self.stats(), field) for field in book_stats.COUNTER_FIELDS}, expected)
+
+
+class SimilarBooksTest(TestCase):
+    """Tests des livres similaires par co-emprunt"""
+
+    def setUp(self):
+        cache.clear()
+        publisher = Publisher.objects.create(name='Test Publisher')
+        category = Category.objects.create(name='Roman')
+        self.books = {
+            name: Book.objects.create(
+                title=f'Livre {name}', isbn=f'97800000000{i:02d}', publisher=publisher, category=category,
+                publication_date='2023-01-01', pages=100, summary='Résumé', total_copies=10, available_copies=10,
+            )
+            for i, name in enumerate('ABCDE')
+        }
+        self.readers = [User.objects.create_user(username=f'reader{i}', password='testpass123') for i in range(5)]
+        for reader in self.readers[:3]:
+            self.borrow(reader, 'A', 'B')
+        self.borrow(self.readers[0], 'C')
+        self.borrow(self.readers[3], 'C', 'D')
+
+    def borrow(self, reader, *names):
+        for name in names:
+            circulation.borrow(self.books[name], reader, max_active_loans=None)
+
+    def neighbours(self, name):
+        rows = SimilarBook.objects.filter(book=self.books[name]).order_by('-score')
+        return [(row.similar.title[-1], round(row.score, 3)) for row in rows]
+
+    def test_cosine_neighbours(self):
+        call_command('compute_similar_books', stdout=io.StringIO())
+        # A et B : trois lecteurs en commun sur trois ; C n'en partage qu'un avec A
+        self.assertEqual(self.neighbours('A'), [('B', 1.0)])
+        self.assertEqual(self.neighbours('C'), [])
+        run = SimilarityRun.objects.get()
+        self.assertTrue(run.full)
+        self.assertEqual(run.books, 4)
+
+        with self.assertNumQueries(1):
+            similar = recommendations.similar_books(self.books['A'], limit=1)
+        self.assertEqual(similar, [self.books['B']])
+        # Complété par la catégorie
+        self.assertEqual(len(recommendations.similar_books(self.books['A'], limit=4)), 4)
+
+    def test_incremental_refresh(self):
+        recommendations.refresh_similar_books()
+        self.borrow(self.readers[4], 'A', 'C')
+        run = recommendations.refresh_similar_books(min_shared=2)
+        self.assertFalse(run.full)
+        # Seuls les livres du lecteur qui a emprunté depuis sont recalculés
+        self.assertEqual(run.books, 2)
+        self.assertEqual(self.neighbours('A'), [('B', 0.866), ('C', 0.577)])
+        self.assertEqual(self.neighbours('C'), [('A', 0.577)])
+        self.assertEqual(recommendations.refresh_similar_books().books, 0)
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_detail_page(self):
+        recommendations.refresh_similar_books()
+        response = self.client.get(reverse('books:detail', args=[self.books['A'].pk]))
+        self.assertEqual(response.context['similar_books'][0], self.books['B'])
+        self.assertContains(response, 'Livres similaires')
+
+
+class ContentSimilarityTest(TestCase):
+    """Tests des livres proches par le contenu (TF-IDF, index en mémoire partagée)"""
+
+    SUMMARIES = {
+        'dragon': "Un dragon et une magicienne cherchent l'épée magique du royaume.",
+        'sorcier': "La magicienne affronte les dragons d'un royaume perdu grâce à la magie.",
+        'chevalier': "Un chevalier, une épée et un dragon : la quête magique d'un royaume.",
+        'cuisine': "Recettes de cuisine du marché : légumes, tartes et desserts.",
+        'patisserie': "Les desserts de la cuisine française : recettes de tartes et gâteaux.",
+        'potager': "Cuisiner les légumes du potager : recettes simples et marché de saison.",
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        similarity = override_settings(BOOKS_SIMILARITY_DIR=self.tmpdir.name)
+        similarity.enable()
+        self.addCleanup(similarity.disable)
+        self.publisher = Publisher.objects.create(name='Test Publisher')
+        self.fantasy = Category.objects.create(name='Fantasy')
+        self.cooking = Category.objects.create(name='Cuisine')
+        self.books = {
+            name: self.create_book(i, name, summary)
+            for i, (name, summary) in enumerate(self.SUMMARIES.items())
+        }
+
+    def create_book(self, i, name, summary, keywords=''):
+        category = self.cooking if 'recettes' in summary.lower() else self.fantasy
+        return Book.objects.create(
+            title=f'Livre {name}', isbn=f'97800000001{i:02d}', publisher=self.publisher,
+            category=category, publication_date='2023-01-01', pages=100, summary=summary,
+            keywords=keywords, total_copies=1, available_copies=1,
+        )
+
+    def titles(self, book, limit=2):
+        return [other.title for other in content.similar_books(book, limit=limit)]
+
+    def test_analyzer(self):
+        self.assertEqual(content.analyze("Les recettes d'une cuisine, 2023"), ['recett', 'cuisin'])
+        self.assertEqual(content.stem('dragons'), content.stem('dragon'))
+
+    def test_nearest_neighbours(self):
+        self.assertEqual(content.similar_books(self.books['dragon']), [])
+        call_command('build_content_index', stdout=io.StringIO())
+        self.assertEqual(len(content.get_index()), 6)
+        for name, topic in (('dragon', self.fantasy), ('cuisine', self.cooking)):
+            similar = content.similar_books(self.books[name], limit=2)
+            self.assertEqual({book.category for book in similar}, {topic})
+            self.assertNotIn(self.books[name], similar)
+            self.assertGreater(similar[0].similarity, similar[1].similarity - 1e-6)
+        # Les livres inactifs ne sont pas proposés
+        Book.objects.filter(pk=self.books['sorcier'].pk).update(is_active=False)
+        self.assertNotIn('Livre sorcier', self.titles(self.books['dragon'], limit=5))
+
+    def test_incremental_add(self):
+        content.build_content_index()
+        generation = content.get_index()._load()[0]['generation']
+        book = self.create_book(9, 'soupe', "Soupes et recettes de légumes du marché.")
+        self.assertEqual(content.add_books([book.pk, self.books['dragon'].pk]), 1)
+        self.assertEqual(content.add_books([book.pk]), 0)
+        meta = content.get_index()._load()[0]
+        self.assertEqual((meta['generation'], meta['books']), (generation + 1, 7))
+        self.assertEqual(content.similar_books(book, limit=2)[0].category, self.cooking)
+        # Les fichiers de la génération précédente restent lisibles, pas les plus anciens
+        call_command('build_content_index', '--full', stdout=io.StringIO())
+        self.assertEqual(len(list(Path(self.tmpdir.name).glob('vectors-*.npy'))), 2)
+
+    def test_more_like_this_endpoint(self):
+        content.build_content_index()
+        url = reverse('books:more_like_this', args=[self.books['patisserie'].pk])
+        data = self.client.get(url, {'limit': 2}).json()
+        self.assertEqual(data['book'], self.books['patisserie'].pk)
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual({result['category'] for result in data['results']}, {'Cuisine'})
+        self.assertEqual(self.client.get(url, {'limit': 'x'}).status_code, 200)
+        self.assertEqual(self.client.get(reverse('books:more_like_this', args=[0])).status_code, 404)
+
+
+class TrendingTest(TestCase):
+    """Tests des tendances (scores à décroissance exponentielle tenus par incréments)"""
+
+    def setUp(self):
+        cache.clear()
+        publisher = Publisher.objects.create(name='Test Publisher')
+        self.novels = Category.objects.create(name='Roman')
+        self.comics = Category.objects.create(name='Bande dessinée')
+        self.books = {
+            name: Book.objects.create(
+                title=f'Livre {name}', isbn=f'97800000003{i:02d}', publisher=publisher, category=category,
+                publication_date='2023-01-01', pages=100, summary='Résumé', total_copies=10, available_copies=10,
+            )
+            for i, (name, category) in enumerate([
+                ('classique', self.novels), ('nouveau', self.novels), ('album', self.comics),
+            ])
+        }
+        self.readers = [User.objects.create_user(username=f'reader{i}', password='testpass123') for i in range(5)]
+        now = timezone.now()
+        # Un classique très emprunté il y a cent jours, des emprunts récents ailleurs
+        for reader in self.readers:
+            self.lend('classique', reader, now - timedelta(days=100))
+        for reader in self.readers[:2]:
+            self.lend('nouveau', reader, now - timedelta(days=1))
+        self.lend('album', self.readers[0], now - timedelta(days=20))
+
+    def lend(self, name, reader, when):
+        return Loan.objects.create(
+            book=self.books[name], borrower=reader, loan_date=when, due_date=when.date() + timedelta(days=14),
+        )
+
+    def ranking(self, period, category=None):
+        return [book.title[6:] for book in trending.trending_books(period, category=category)]
+
+    def scores(self):
+        rows = BookTrend.objects.order_by('pk').values_list('week', 'month')
+        return [round(value, 6) for row in rows for value in row]
+
+    def test_rankings(self):
+        self.assertEqual(self.ranking('week'), ['nouveau', 'album', 'classique'])
+        self.assertEqual(self.ranking('all'), ['classique', 'nouveau', 'album'])
+        self.assertEqual(self.ranking('month', category=self.novels), ['nouveau', 'classique'])
+        categories = trending.trending_categories('month')
+        self.assertEqual([(c.name, c.loan_count, c.share) for c in categories][0], ('Roman', 7, 100))
+        self.assertEqual(CategoryTrend.objects.get(category=self.comics).total, 1)
+
+        Loan.objects.filter(book=self.books['nouveau']).delete()
+        self.assertEqual(self.ranking('week'), ['album', 'classique'])
+        self.assertEqual(CategoryTrend.objects.get(category=self.novels).total, 5)
+
+    def test_normalize_and_rebuild_agree(self):
+        incremental = self.scores()
+        trending.rebuild(now=trending.current_epoch())
+        self.assertEqual(self.scores(), incremental)
+
+        later = trending.current_epoch() + timedelta(days=14)
+        self.assertEqual(trending.normalize(now=later), 3)
+        # Deux demi-vies de la semaine : scores divisés par 4
+        self.assertAlmostEqual(
+            BookTrend.objects.get(book=self.books['nouveau']).week,
+            incremental[2] / 4, places=6,
+        )
+        normalized = self.scores()
+        trending.rebuild(now=later)
+        self.assertEqual(self.scores(), normalized)
+        self.assertEqual(self.ranking('month'), ['nouveau', 'album', 'classique'])
+
+        # Un an plus tard, plus rien n'est récent
+        self.assertEqual(trending.normalize(now=later + timedelta(days=365)), 0)
+        self.assertEqual(self.ranking('all'), ['classique', 'nouveau', 'album'])
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_category_page(self):
+        response = self.client.get(reverse('books:by_category', args=[self.novels.pk]))
+        self.assertEqual([book.title for book in response.context['trending_books']], ['Livre nouveau', 'Livre classique'])
+        self.assertContains(response, 'En ce moment dans cette catégorie')
+
+
+class ReferenceCacheTest(TestCase):
+    """Tests du cache de référence du catalogue"""
+
+    def setUp(self):
+        cache.clear()
+        reference.reference_cache.clear_local()
+        reference.reference_cache.reset_stats()
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.category = Category.objects.create(name='Roman')
+        self.book = Book.objects.create(
+            title='Test Book',
+            isbn='1234567890123',
+            publisher=Publisher.objects.create(name='Test Publisher'),
+            category=self.category,
+            publication_date='2023-01-01',
+            pages=100,
+            summary='Test summary',
+            total_copies=2,
+            available_copies=2
+        )
+
+    def test_local_tier_then_shared_tier(self):
+        self.assertEqual([c.name for c in reference.categories()], ['Roman'])
+        with self.assertNumQueries(0):
+            reference.categories()
+        reference.reference_cache.local.clear()
+        with self.assertNumQueries(0):
+            reference.categories()
+        counters = reference.reference_cache.stats()
+        self.assertEqual(
+            (counters['misses'], counters['local_hits'], counters['shared_hits']), (1, 1, 1)
+        )
+
+    def test_saves_bump_version(self):
+        reference.categories()
+        Category.objects.create(name='Essai')
+        self.assertEqual([c.name for c in reference.categories()], ['Essai', 'Roman'])
+        self.category.name = 'Romans'
+        self.category.save()
+        self.assertEqual(reference.category_names()[self.category.pk], 'Romans')
+
+    def test_local_tier_evicts_least_recently_used(self):
+        lru = reference.LocalLRU(2)
+        lru.set('a', 1, 60)
+        lru.set('b', 2, 60)
+        lru.get('a')
+        lru.set('c', 3, 60)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+        self.assertEqual(lru.evictions, 1)
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_detail_bundle_follows_author_changes(self):
+        url = reverse('books:detail', args=[self.book.pk])
+        self.client.get(url)
+        author = Author.objects.create(first_name='Victor', last_name='Hugo')
+        self.book.authors.add(author)
+        self.assertContains(self.client.get(url), 'Victor Hugo')
+        author.last_name = 'Hugo-Foucher'
+        author.save()
+        self.assertContains(self.client.get(url), 'Victor Hugo-Foucher')
+
+    def test_stats_endpoint(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('books:cache_stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hit_ratio', response.json())
+
+    def test_process_local_cache_is_refused_with_several_workers(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 't'}}
+        with override_settings(CACHES=locmem, WEB_CONCURRENCY=4):
+            self.assertEqual([m.id for m in check_shared_cache(None)], ['books.E001'])
+        with override_settings(CACHES=locmem, WEB_CONCURRENCY=1):
+            self.assertEqual(check_shared_cache(None), [])
+        with override_settings(CACHES=shared, WEB_CONCURRENCY=4):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+def _jpeg_with_exif(size=(1200, 1800)):
+    image = Image.new('RGB', size, 'navy')
+    exif = Image.Exif()
+    exif[0x010F] = 'PhoneMaker'
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+class ImageProcessingTest(TestCase):
+    """Tests des renditions de couvertures"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            IMAGE_PROCESSING_WORKERS=0,
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+        )
+        self.override.enable()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.addCleanup(self.override.disable)
+        self.publisher = Publisher.objects.create(name='Test Publisher')
+        self.category = Category.objects.create(name='Test Category')
+
+    def create_book(self, isbn, cover):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Book.objects.create(
+                title='Test Book', isbn=isbn, publisher=self.publisher, category=self.category,
+                publication_date='2023-01-01', pages=100, summary='Test summary',
+                cover_image=SimpleUploadedFile('photo.jpg', cover, content_type='image/jpeg'),
+            )
+
+    def test_renditions_are_resized_and_stripped(self):
+        book = self.create_book('1234567890123', _jpeg_with_exif())
+        book.refresh_from_db()
+        thumb = book.cover_renditions['thumb']
+        self.assertEqual((thumb['width'], thumb['height']), (200, 300))
+        with default_storage.open(thumb['jpeg'], 'rb') as handle:
+            with Image.open(handle) as image:
+                self.assertEqual(image.size, (200, 300))
+                self.assertFalse(image.getexif())
+        with default_storage.open(book.cover_renditions['medium']['webp'], 'rb') as handle:
+            with Image.open(handle) as image:
+                self.assertEqual((image.format, image.size), ('WEBP', (400, 600)))
+
+    def test_original_is_stored_without_exif(self):
+        """L'original enregistré n'a plus de métadonnées EXIF mais garde sa taille et son format"""
+        book = self.create_book('1234567890123', _jpeg_with_exif())
+        with book.cover_image.open('rb') as handle:
+            with Image.open(handle) as image:
+                self.assertEqual((image.format, image.size), ('JPEG', (1200, 1800)))
+                self.assertFalse(image.getexif())
+
+    def test_original_orientation_is_applied(self):
+        """L'orientation EXIF de l'original est appliquée avant d'être retirée"""
+        image = Image.new('RGB', (300, 200), 'navy')
+        exif = Image.Exif()
+        exif[images.ORIENTATION_TAG] = 6
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', exif=exif.tobytes())
+        book = self.create_book('1234567890123', buffer.getvalue())
+        with book.cover_image.open('rb') as handle:
+            with Image.open(handle) as stored:
+                self.assertEqual(stored.size, (200, 300))
+                self.assertFalse(stored.getexif())
+
+    def test_duplicate_covers_are_stored_once(self):
+        cover = _jpeg_with_exif()
+        first = self.create_book('1234567890123', cover)
+        second = self.create_book('1234567890124', cover)
+        self.assertEqual(first.cover_image.name, second.cover_image.name)
+        self.assertEqual(len(os.listdir(os.path.dirname(first.cover_image.path))), 1)
+
+    def test_srcset_and_cache_headers(self):
+        book = Book.objects.get(pk=self.create_book('1234567890123', _jpeg_with_exif()).pk)
+        html = Template('{% load book_images %}{% responsive_image book "thumb" alt=book.title %}').render(
+            Context({'book': book})
+        )
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(' 400w', html)
+        # Vue de développement (DEBUG) ; en production, le serveur web sert ces fichiers
+        path = book.cover_renditions['thumb']['jpeg'].split(f'{images.RENDITIONS_PREFIX}/', 1)[1]
+        response = serve_rendition(RequestFactory().get('/'), path)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_backfill_command(self):
+        book = self.create_book('1234567890123', _jpeg_with_exif())
+        Book.objects.filter(pk=book.pk).update(cover_renditions={})
+        call_command('process_images', workers=0, stdout=open(os.devnull, 'w'))
+        book.refresh_from_db()
+        self.assertEqual(set(book.cover_renditions), {'thumb', 'medium'})
@@ -0,0 +1,185 @@
+"""
+Tendances des emprunts : livres et catégories les plus empruntés récemment.
+
+Un emprunt compte moins à mesure qu'il vieillit : son poids est divisé par
+deux toutes les ``HALF_LIVES[période]`` jours (décroissance exponentielle).
+Plutôt que de réduire tous les scores à chaque instant, les scores sont
+exprimés en emprunts à la date de référence (``TrendingEpoch``) : un emprunt
+fait ``t`` jours après elle ajoute ``2 ** (t / demi-vie)``. Tous les scores
+sont ainsi multipliés par le même facteur et le classement reste exact :
+
+- un emprunt met à jour une ligne de ``BookTrend`` et une de
+  ``CategoryTrend`` (``UPDATE ... SET week = week + x``), sans agrégat ;
+- les classements sont des lectures des premières lignes d'un index
+  (``-week``, ``-month``) ; « depuis toujours » lit les compteurs
+  ``BookStats.loan_count`` et ``CategoryTrend.total`` ;
+- la commande ``decay_trending`` ramène chaque jour la référence à
+  maintenant (les scores sont divisés d'autant, ils restent petits) et
+  supprime les livres qui ne sont plus empruntés depuis des mois.
+
+Un emprunt enregistré pendant cette normalisation peut être compté avec la
+référence précédente (trop fort d'un facteur d'une journée) : c'est sans
+conséquence pour un classement, ``decay_trending --rebuild`` recalcule tout
+depuis les emprunts.
+"""
+import itertools
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Book, BookTrend, Category, CategoryTrend, TrendingEpoch
+
+# Demi-vie des scores de chaque période (jours)
+HALF_LIVES = {'week': 7, 'month': 30}
+PERIODS = {
+    'week': 'Cette semaine',
+    'month': 'Ce mois-ci',
+    'all': 'Depuis toujours',
+}
+# Livres dont le score du mois est passé sous ce seuil retirés à la normalisation
+PRUNE_BELOW = 0.01
+# Emprunts lus par aller-retour avec la base lors d'un recalcul
+LOANS_CHUNK = 20000
+
+SECONDS_PER_DAY = 86400
+
+
+def current_epoch():
+    """Date de référence des scores (créée au premier emprunt)"""
+    epoch, _ = TrendingEpoch.objects.get_or_create(pk=1, defaults={'started_at': timezone.now()})
+    return epoch.started_at
+
+
+def weights(when, epoch):
+    """Poids d'un emprunt fait à ``when`` dans chaque score : {période: poids}"""
+    days = (when - epoch).total_seconds() / SECONDS_PER_DAY
+    return {period: 2 ** (days / half_life) for period, half_life in HALF_LIVES.items()}
+
+
+def _adjust(model, pk, deltas):
+    """Incrémente les scores d'une ligne (créée au besoin, jamais en dessous de zéro)"""
+    changes = {
+        field: Greatest(F(field) + Value(delta), Value(0))
+        for field, delta in deltas.items()
+    }
+    rows = model.objects.filter(pk=pk)
+    if not rows.update(**changes) and min(deltas.values()) > 0:
+        model.objects.bulk_create([model(pk=pk)], ignore_conflicts=True)
+        rows.update(**changes)
+
+
+def record_loan(book_id, when, sign=1):
+    """Ajoute (sign=1) ou retire (sign=-1) un emprunt des scores de son livre et de sa catégorie"""
+    category_id = Book.objects.filter(pk=book_id).values_list('category_id', flat=True).first()
+    if category_id is None:
+        return
+    deltas = {period: sign * weight for period, weight in weights(when, current_epoch()).items()}
+    _adjust(BookTrend, book_id, deltas)
+    _adjust(CategoryTrend, category_id, {**deltas, 'total': sign})
+
+
+def normalize(now=None):
+    """
+    Ramène la référence des scores à ``now`` (divise tous les scores) et
+    retire les livres aux scores négligeables ; retourne le nombre de livres
+    conservés
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        epoch = TrendingEpoch.objects.select_for_update().filter(pk=1).first()
+        if epoch is None:
+            return 0
+        factors = weights(epoch.started_at, now)
+        for model in (BookTrend, CategoryTrend):
+            model.objects.update(**{period: F(period) * factor for period, factor in factors.items()})
+        BookTrend.objects.filter(month__lt=PRUNE_BELOW).delete()
+        epoch.started_at = now
+        epoch.save(update_fields=['started_at'])
+    return BookTrend.objects.count()
+
+
+def rebuild(now=None):
+    """Recalcule tous les scores depuis les emprunts (par lots vectorisés) ; retourne le nombre de livres"""
+    import numpy as np
+
+    from loans.models import Loan
+
+    now = now or timezone.now()
+    rows = Loan.objects.order_by().values_list('book_id', 'book__category_id', 'loan_date').iterator(
+        chunk_size=LOANS_CHUNK
+    )
+    book_ids, category_ids, days = [], [], []
+    while True:
+        chunk = list(itertools.islice(rows, LOANS_CHUNK))
+        if not chunk:
+            break
+        books, categories, dates = zip(*chunk)
+        book_ids.append(np.array(books, dtype=np.int64))
+        category_ids.append(np.array(categories, dtype=np.int64))
+        # Âge de chaque emprunt en jours (négatif : avant la nouvelle référence)
+        seconds = np.array([when.timestamp() for when in dates]) - now.timestamp()
+        days.append(seconds / SECONDS_PER_DAY)
+    book_ids, category_ids, days = (
+        np.concatenate(parts) if parts else np.zeros(0) for parts in (book_ids, category_ids, days)
+    )
+
+    def totals(keys):
+        """Scores de chaque période et nombre d'emprunts par clé : {clé: {champ: valeur}}"""
+        present, inverse = np.unique(keys, return_inverse=True)
+        sums = {
+            period: np.bincount(inverse, weights=np.exp2(days / half_life), minlength=len(present))
+            for period, half_life in HALF_LIVES.items()
+        }
+        sums['total'] = np.bincount(inverse, minlength=len(present))
+        return {
+            int(key): {field: values[position].item() for field, values in sums.items()}
+            for position, key in enumerate(present)
+        }
+
+    books = totals(book_ids)
+    categories = totals(category_ids)
+    with transaction.atomic():
+        TrendingEpoch.objects.update_or_create(pk=1, defaults={'started_at': now})
+        BookTrend.objects.all().delete()
+        CategoryTrend.objects.all().delete()
+        trends = (
+            BookTrend(book_id=key, week=values['week'], month=values['month'])
+            for key, values in books.items() if values['month'] >= PRUNE_BELOW
+        )
+        while True:
+            batch = list(itertools.islice(trends, 1000))
+            if not batch:
+                break
+            BookTrend.objects.bulk_create(batch)
+        CategoryTrend.objects.bulk_create([
+            CategoryTrend(category_id=key, **values) for key, values in categories.items()
+        ])
+    return BookTrend.objects.count()
+
+
+def trending_books(period='week', category=None):
+    """Livres actifs par tendance décroissante sur la période (``trend_score``), à découper"""
+    books = Book.objects.filter(is_active=True)
+    if category is not None:
+        books = books.filter(category=category)
+    if period == 'all':
+        field = 'stats__loan_count'
+    else:
+        field = f'trend__{period}'
+    # Tri sur la seule colonne indexée : lecture des premières entrées de l'index
+    return books.filter(**{f'{field}__gt': 0}).annotate(trend_score=F(field)).order_by(F(field).desc())
+
+
+def trending_categories(period='month', limit=5):
+    """Catégories par tendance décroissante, avec leur part du score de la première (``share``, en %)"""
+    field = 'total' if period == 'all' else period
+    categories = list(
+        Category.objects.filter(**{f'trend__{field}__gt': 0})
+        .annotate(trend_score=F(f'trend__{field}'), loan_count=F('trend__total'))
+        .order_by(F(f'trend__{field}').desc())[:limit]
+    )
+    for category in categories:
+        category.share = round(100 * category.trend_score / categories[0].trend_score)
+    return categories
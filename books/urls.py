@@ -7,6 +7,7 @@ urlpatterns = [
     path('', views.BookListView.as_view(), name='list'),
     path('<int:pk>/', views.BookDetailView.as_view(), name='detail'),
     path('search/', views.BookSearchView.as_view(), name='search'),
+    path('search/facets/<str:facet>/', views.search_facet, name='search_facet'),
     path('category/<int:category_id>/', views.BooksByCategoryView.as_view(), name='by_category'),
     path('author/<int:author_id>/', views.BooksByAuthorView.as_view(), name='by_author'),
     
@@ -14,5 +15,8 @@ urlpatterns = [
     path('admin/', views.AdminBookListView.as_view(), name='admin_list'),
     
     # API endpoints
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
+    path('<int:pk>/similar/', views.more_like_this, name='more_like_this'),
+    path('cache/stats/', views.cache_stats, name='cache_stats'),
     path('<int:book_id>/review/', views.add_review, name='add_review'),
 ]
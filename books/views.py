@@ -1,50 +1,79 @@
+import os
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, DetailView
 from django.contrib import messages
 from django.http import JsonResponse
-from django.db.models import Count, Q, Avg
-from django.utils import timezone
-from datetime import timedelta
-from .models import Book, Category, Author, BookReview
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+from django.db.models import Q
+from .models import Book, Category, Author, BookReview, BookStats
+from . import cache as reference
+from . import content
+from . import trending
+from .images import RENDITIONS_PREFIX
+from .autocomplete import suggest
+from .facets import FACET_LABELS, compute_facets, facet_values
+from .fuzzy import fuzzy_search
+from .pagination import EstimatedCountPaginator, KeysetPaginationMixin
+from .search import get_search_backend
 from loans.models import Loan
 
 
-class BookListView(ListView):
+# Nombre maximum de livres renvoyés par « plus de livres comme celui-ci »
+MORE_LIKE_THIS_LIMIT = 50
+
+# Les tris par titre utilisent la clé normalisée indexée
+SORT_ALIASES = {
+    'title': 'sort_title',
+    '-title': '-sort_title',
+}
+
+
+class BookListView(KeysetPaginationMixin, ListView):
     """Vue liste des livres pour les utilisateurs"""
     model = Book
     template_name = 'books/book_list.html'
     context_object_name = 'books'
     paginate_by = 12
+    # Tout le catalogue : total estimé (statistiques de la base ou compte en cache)
+    paginator_class = EstimatedCountPaginator
     
     def get_queryset(self):
-        queryset = Book.objects.filter(is_active=True).select_related('category', 'publisher')
-        
-        # Recherche
-        query = self.request.GET.get('q')
-        if query:
-            queryset = queryset.filter(
-                Q(title__icontains=query) |
-                Q(authors__first_name__icontains=query) |
-                Q(authors__last_name__icontains=query) |
-                Q(keywords__icontains=query)
-            ).distinct()
+        queryset = Book.objects.filter(is_active=True).select_related(
+            'category', 'publisher'
+        ).prefetch_related('authors')
         
         # Filtrage par catégorie
         category = self.request.GET.get('category')
         if category:
             queryset = queryset.filter(category_id=category)
         
+        # Recherche plein texte (triée par pertinence si aucun tri n'est demandé),
+        # avec repli sur la recherche approchée pour les fautes de frappe
+        query = self.request.GET.get('q')
+        sort_by = self.request.GET.get('sort')
+        if query:
+            backend = get_search_backend()
+            matches = backend.filter(queryset, query)
+            if not matches.exists():
+                return fuzzy_search(queryset, query)
+            queryset = matches
+            if not sort_by:
+                return backend.rank(queryset, query)
+        
         # Tri
-        sort_by = self.request.GET.get('sort', '-created_at')
-        queryset = queryset.order_by(sort_by)
+        sort_by = sort_by or '-created_at'
+        queryset = queryset.order_by(SORT_ALIASES.get(sort_by, sort_by))
         
         return queryset
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        context['categories'] = reference.categories()
         context['current_category'] = self.request.GET.get('category')
         context['current_query'] = self.request.GET.get('q', '')
         context['current_sort'] = self.request.GET.get('sort', '-created_at')
@@ -59,13 +88,16 @@ class BookDetailView(DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        book = self.get_object()
+        book = self.object
+        
+        # Auteurs, catégorie, éditeur et livres similaires (cache de référence)
+        context.update(reference.book_detail_bundle(book))
         
         # Avis sur le livre
-        context['reviews'] = book.reviews.all()[:5]
-        context['average_rating'] = book.reviews.aggregate(
-            avg_rating=Avg('rating')
-        )['avg_rating']
+        context['reviews'] = book.reviews.select_related('reviewer')[:5]
+        book_stats = BookStats.objects.filter(book=book).first()
+        context['book_stats'] = book_stats
+        context['average_rating'] = book_stats.average_rating if book_stats else None
         
         # Vérifier si l'utilisateur peut emprunter
         if self.request.user.is_authenticated:
@@ -73,18 +105,40 @@ class BookDetailView(DetailView):
             context['user_has_active_loan'] = Loan.objects.filter(
                 borrower=self.request.user,
                 book=book,
-                returned_date__isnull=True
-            ).exists()
-        
-        # Livres similaires
-        context['similar_books'] = Book.objects.filter(
-            category=book.category,
-            is_active=True
-        ).exclude(id=book.id)[:4]
+            ).active().exists()
         
         return context
 
 
+def autocomplete(request):
+    """Suggestions de titres, auteurs, éditeurs et ISBN pour la barre de recherche"""
+    query = request.GET.get('q', '').strip()
+    if len(query) < 2:
+        return JsonResponse({'results': [], 'source': None})
+    results, source = suggest(query, limit=10)
+    return JsonResponse({'results': results, 'source': source})
+
+
+def more_like_this(request, pk):
+    """Livres au contenu proche (résumé, mots-clés, titre, catégorie), en JSON"""
+    book = get_object_or_404(Book, pk=pk, is_active=True)
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), MORE_LIKE_THIS_LIMIT)
+    except ValueError:
+        limit = 10
+    results = [
+        {
+            'id': similar.pk,
+            'title': similar.title,
+            'category': similar.category.name,
+            'url': similar.get_absolute_url(),
+            'score': round(similar.similarity, 4),
+        }
+        for similar in content.similar_books(book, limit=limit)
+    ]
+    return JsonResponse({'book': book.pk, 'results': results})
+
+
 @login_required
 def toggle_favorite(request, book_id):
     """Toggle favori pour un livre"""
@@ -120,7 +174,7 @@ def add_review(request, book_id):
     return redirect('books:list')
 
 
-class BooksByAuthorView(ListView):
+class BooksByAuthorView(KeysetPaginationMixin, ListView):
     """Vue des livres par auteur"""
     model = Book
     template_name = 'books/books_by_author.html'
@@ -132,7 +186,7 @@ class BooksByAuthorView(ListView):
         return Book.objects.filter(
             authors__id=author_id,
             is_active=True
-        ).select_related('category', 'publisher')
+        ).select_related('category', 'publisher').prefetch_related('authors')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -141,7 +195,7 @@ class BooksByAuthorView(ListView):
         return context
 
 
-class BooksByCategoryView(ListView):
+class BooksByCategoryView(KeysetPaginationMixin, ListView):
     """Vue des livres par catégorie"""
     model = Book
     template_name = 'books/books_by_category.html'
@@ -153,36 +207,30 @@ class BooksByCategoryView(ListView):
         return Book.objects.filter(
             category_id=category_id,
             is_active=True
-        ).select_related('category', 'publisher')
+        ).select_related('category', 'publisher').prefetch_related('authors')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         category_id = self.kwargs.get('category_id')
         context['category'] = get_object_or_404(Category, id=category_id)
+        # Tendances du mois dans la catégorie
+        context['trending_books'] = list(
+            trending.trending_books('month', category=category_id).only('pk', 'title')[:4]
+        )
         return context
 
 
-class BookSearchView(ListView):
+class BookSearchView(KeysetPaginationMixin, ListView):
     """Vue de recherche de livres avec filtres avancés"""
     model = Book
     template_name = 'books/search.html'
     context_object_name = 'books'
     paginate_by = 20
     
-    def get_queryset(self):
+    def get_filtered_queryset(self):
+        """Résultat de la recherche et des filtres, sans tri (sert aussi aux facettes)"""
         queryset = Book.objects.filter(is_active=True).select_related('category', 'publisher')
         
-        # Recherche par texte
-        query = self.request.GET.get('q')
-        if query:
-            queryset = queryset.filter(
-                Q(title__icontains=query) |
-                Q(authors__first_name__icontains=query) |
-                Q(authors__last_name__icontains=query) |
-                Q(keywords__icontains=query) |
-                Q(summary__icontains=query)
-            ).distinct()
-        
         # Filtres
         category = self.request.GET.get('category')
         if category:
@@ -196,28 +244,70 @@ class BookSearchView(ListView):
         if language:
             queryset = queryset.filter(language=language)
         
-        # Disponibilité
-        available_only = self.request.GET.get('available')
-        if available_only:
+        publisher = self.request.GET.get('publisher')
+        if publisher:
+            queryset = queryset.filter(publisher_id=publisher)
+        
+        decade = self.request.GET.get('decade')
+        if decade and decade.isdigit():
+            start = int(decade)
+            queryset = queryset.filter(
+                publication_date__year__gte=start,
+                publication_date__year__lt=start + 10
+            )
+        
+        # Disponibilité ('0' : uniquement les livres empruntés)
+        available = self.request.GET.get('available')
+        if available == '0':
+            queryset = queryset.filter(available_copies=0)
+        elif available:
             queryset = queryset.filter(available_copies__gt=0)
         
+        # Recherche plein texte
+        query = self.request.GET.get('q')
+        if query:
+            queryset = get_search_backend().filter(queryset, query)
+        
+        return queryset
+    
+    def get_queryset(self):
+        queryset = self.get_filtered_queryset().prefetch_related('authors')
+        
+        # Tri par pertinence quand une recherche est saisie
+        query = self.request.GET.get('q')
+        if query:
+            return get_search_backend().rank(queryset, query)
+        
         return queryset.order_by('-created_at')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
-        context['authors'] = Author.objects.all()
-        context['languages'] = Book.objects.values_list('language', flat=True).distinct()
+        context['query'] = self.request.GET.get('q', '')
+        context['facets'] = compute_facets(self.get_filtered_queryset(), self.request.GET)
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        context['base_querystring'] = params.urlencode()
         return context
 
 
+def search_facet(request, facet):
+    """Valeurs complètes d'une facette de recherche (chargement à la demande)"""
+    if facet not in FACET_LABELS:
+        return JsonResponse({'error': 'Unknown facet'}, status=404)
+    view = BookSearchView(request=request, kwargs={})
+    values = facet_values(view.get_filtered_queryset(), facet, request.GET)
+    return JsonResponse({'facet': facet, 'values': values})
+
+
 # Vues d'administration (à compléter)
-class AdminBookListView(LoginRequiredMixin, ListView):
+class AdminBookListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """Vue d'administration pour la liste des livres"""
     model = Book
     template_name = 'books/admin_book_list.html'
     context_object_name = 'books'
     paginate_by = 20
+    # Tout le catalogue : total estimé (statistiques de la base ou compte en cache)
+    paginator_class = EstimatedCountPaginator
     
     def dispatch(self, request, *args, **kwargs):
         if not request.user.is_staff:
@@ -231,13 +321,11 @@ class AdminBookListView(LoginRequiredMixin, ListView):
         # Recherche
         query = self.request.GET.get('q')
         if query:
-            queryset = queryset.filter(
-                Q(title__icontains=query) |
-                Q(authors__first_name__icontains=query) |
-                Q(authors__last_name__icontains=query) |
-                Q(isbn__icontains=query) |
-                Q(keywords__icontains=query)
-            ).distinct()
+            matches = queryset.filter(
+                get_search_backend().match_q(query) |
+                Q(isbn__startswith=query.strip())
+            )
+            queryset = matches if matches.exists() else fuzzy_search(queryset, query)
         
         # Filtres
         category = self.request.GET.get('category')
@@ -256,7 +344,7 @@ class AdminBookListView(LoginRequiredMixin, ListView):
         sort_by = self.request.GET.get('sort', '-created_at')
         if sort_by in ['title', '-title', 'category__name', '-category__name', 
                       'created_at', '-created_at', 'publication_date', '-publication_date']:
-            queryset = queryset.order_by(sort_by)
+            queryset = queryset.order_by(SORT_ALIASES.get(sort_by, sort_by))
         
         return queryset
     
@@ -268,13 +356,32 @@ class AdminBookListView(LoginRequiredMixin, ListView):
         context['total_books'] = all_books.count()
         context['available_books'] = all_books.filter(available_copies__gt=0).count()
         context['borrowed_books'] = all_books.filter(available_copies=0).count()
-        context['total_categories'] = Category.objects.count()
+        context['categories'] = reference.categories()
+        context['total_categories'] = len(context['categories'])
         
         # Filtres pour le template
-        context['categories'] = Category.objects.all()
         context['current_query'] = self.request.GET.get('q', '')
         context['current_category'] = self.request.GET.get('category')
         context['current_status'] = self.request.GET.get('status')
         context['current_sort'] = self.request.GET.get('sort', '-created_at')
         
         return context
+
+
+@login_required
+def cache_stats(request):
+    """Compteurs du cache de référence (dimensionnement)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    return JsonResponse(reference.reference_cache.stats())
+
+
+def serve_rendition(request, path):
+    """
+    Renditions d'images en développement (DEBUG) : chemin dérivé du contenu,
+    donc cache permanent ; en production, le serveur web sert ces fichiers
+    avec les mêmes en-têtes
+    """
+    response = serve(request, path, document_root=os.path.join(settings.MEDIA_ROOT, RENDITIONS_PREFIX))
+    patch_cache_control(response, public=True, max_age=365 * 24 * 3600, immutable=True)
+    return response
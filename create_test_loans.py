@@ -0,0 +1,23 @@
+"""
+Génère un jeu de données de test (livres, lecteurs, emprunts, réservations, avis).
+
+Raccourci de ``python manage.py generate_dataset`` ; sans argument, un petit
+jeu de données de développement. Les arguments sont transmis à la commande
+(--loans, --members, --seed...), par exemple pour la volumétrie de production :
+
+    python create_test_loans.py --books 50000 --members 100000 --loans 1500000
+"""
+import os
+import sys
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_project.settings')
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+
+if __name__ == '__main__':
+    args = sys.argv[1:] or ['--books', '2000', '--members', '1000', '--loans', '20000',
+                            '--reservations', '1000', '--reviews', '5000']
+    call_command('generate_dataset', *args)
@@ -0,0 +1,79 @@
+"""
+Exécution concurrente des requêtes indépendantes des tableaux de bord.
+
+L'ORM asynchrone de Django 4.2 (``acount``, ``aget``...) délègue chaque
+requête à ``sync_to_async(thread_sensitive=True)`` : les requêtes d'une vue
+passent toutes par le même thread, l'une après l'autre. Les requêtes
+indépendantes d'une page (compteurs, listes, séries) sont donc confiées à un
+pool borné de ``DASHBOARD_QUERY_WORKERS`` threads, chacun avec sa propre
+connexion à la base ; la page attend la plus lente au lieu de leur somme.
+
+Chaque requête est une fonction sans argument (``thunk``) qui renvoie une
+valeur entièrement évaluée (``list(queryset)``, ``count()``...) : un
+queryset paresseux serait évalué plus tard, dans le thread de la vue.
+
+Les fonctions sont évaluées à la suite, dans le thread appelant, avec 0
+worker ou dans une transaction : les autres connexions ne verraient pas ses
+écritures non validées (c'est aussi le cas des tests).
+"""
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+_executor = None
+_executor_lock = threading.Lock()
+_local = threading.local()
+
+
+def workers():
+    return getattr(settings, 'DASHBOARD_QUERY_WORKERS', 4)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers(), thread_name_prefix='dashboard')
+    return _executor
+
+
+def _run(thunk):
+    _local.in_pool = True
+    try:
+        return thunk()
+    finally:
+        close_old_connections()
+
+
+def evaluate(thunks):
+    """Évalue les fonctions une à une ; renvoie {nom: résultat}"""
+    return {name: thunk() for name, thunk in thunks.items()}
+
+
+def _sequential():
+    # Un thread du pool n'attend pas d'autres tâches du pool (pas d'interblocage)
+    return workers() <= 0 or getattr(_local, 'in_pool', False) or connection.in_atomic_block
+
+
+def run_all(thunks):
+    """Évalue les fonctions en parallèle dans le pool (code synchrone) ; renvoie {nom: résultat}"""
+    if _sequential() or len(thunks) < 2:
+        return evaluate(thunks)
+    # Chaque tâche reçoit une copie du contexte (routage des lectures de la requête)
+    futures = {
+        name: _get_executor().submit(contextvars.copy_context().run, _run, thunk)
+        for name, thunk in thunks.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+
+async def gather(thunks):
+    """
+    ``run_all`` pour les vues asynchrones : appelé depuis le thread de la
+    requête (sa connexion, sa transaction éventuelle), sans bloquer la boucle.
+    """
+    return await sync_to_async(run_all)(thunks)
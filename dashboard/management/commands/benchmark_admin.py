@@ -0,0 +1,71 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+User = get_user_model()
+
+# (route, paramètres) : listes non filtrées, puis filtres et recherche
+PAGES = [
+    ('admin:books_book_changelist', {}),
+    ('admin:books_book_changelist', {'q': 'le'}),
+    ('admin:books_author_changelist', {}),
+    ('admin:books_category_changelist', {}),
+    ('admin:books_publisher_changelist', {}),
+    ('admin:books_bookreview_changelist', {}),
+    ('admin:loans_loan_changelist', {}),
+    ('admin:loans_loan_changelist', {'due': 'overdue'}),
+    ('admin:loans_loanhistory_changelist', {}),
+    ('admin:loans_reservation_changelist', {'status': 'pending'}),
+]
+
+
+class Command(BaseCommand):
+    help = "Mesure les listes de l'administration : nombre de requêtes SQL et temps de rendu"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help="Superutilisateur utilisé (défaut : le premier)")
+        parser.add_argument('--repeat', type=int, default=5, help="Requêtes mesurées par page (défaut : 5)")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_superuser=True, is_active=True)
+        if options['username']:
+            users = users.filter(username=options['username'])
+        user = users.order_by('pk').first()
+        if user is None:
+            raise CommandError("Aucun superutilisateur actif trouvé")
+        repeat = max(1, options['repeat'])
+
+        client = Client()
+        client.force_login(user)
+        # Le client de test s'annonce comme « testserver »
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name, params in PAGES:
+                self._measure(client, name, params, repeat)
+        self.stdout.write(self.style.SUCCESS("Mesure terminée"))
+
+    def _measure(self, client, name, params, repeat):
+        url = reverse(name)
+        # Une requête à blanc : caches et connexion initialisés
+        self._check(client.get(url, params))
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = self._check(client.get(url, params))
+            timings.append((time.perf_counter() - started) * 1000)
+        # Résumé de QueryInstrumentationMiddleware (dernière requête)
+        sql = response.sql_summary
+        label = url + ('?' + '&'.join(f'{k}={v}' for k, v in params.items()) if params else '')
+        self.stdout.write(
+            f"{label:<44} {sql['queries']:3d} requêtes SQL ({sql['time_ms']:7.1f} ms) | "
+            f"rendu médian {statistics.median(timings):7.1f} ms, max {max(timings):7.1f} ms"
+        )
+
+    def _check(self, response):
+        if response.status_code != 200:
+            raise CommandError(f"Réponse inattendue : {response.status_code}")
+        return response
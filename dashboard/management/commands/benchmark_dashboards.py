@@ -0,0 +1,89 @@
+import statistics
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from dashboard import metrics
+
+User = get_user_model()
+
+PAGES = ['dashboard:home', 'dashboard:admin', 'dashboard:stats']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare la latence des tableaux de bord : gestionnaire WSGI avec requêtes à la suite "
+        "(ancien chemin) et gestionnaire ASGI avec requêtes en parallèle"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help="Administrateur utilisé (défaut : le premier)")
+        parser.add_argument('--repeat', type=int, default=20, help="Requêtes mesurées par page (défaut : 20)")
+        parser.add_argument(
+            '--cold', action='store_true',
+            help="Recalcule l'instantané des compteurs à chaque requête"
+        )
+
+    def handle(self, *args, **options):
+        staff = User.objects.filter(is_staff=True, is_active=True)
+        if options['username']:
+            staff = staff.filter(username=options['username'])
+        user = staff.order_by('pk').first()
+        if user is None:
+            raise CommandError("Aucun administrateur actif trouvé")
+        repeat = max(1, options['repeat'])
+
+        wsgi = Client()
+        wsgi.force_login(user)
+        asgi = AsyncClient()
+        asgi.force_login(user)
+        self.stdout.write(
+            f"{repeat} requêtes par page, {settings.DASHBOARD_QUERY_WORKERS} worker(s) de requêtes"
+        )
+        # Les clients de test s'annoncent comme « testserver »
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name in PAGES:
+                self._compare(reverse(name), wsgi, asgi, repeat, options['cold'])
+        self.stdout.write(self.style.SUCCESS("Mesure terminée"))
+
+    def _compare(self, url, wsgi, asgi, repeat, cold):
+        with override_settings(DASHBOARD_QUERY_WORKERS=0):
+            sequential = self._measure(lambda: wsgi.get(url), repeat, cold)
+
+        async def fetch():
+            return await asgi.get(url)
+
+        parallel = self._measure(async_to_sync(fetch), repeat, cold)
+        change = (statistics.median(parallel) / statistics.median(sequential) - 1) * 100
+        self.stdout.write(
+            f"{url:<24} WSGI séquentiel {self._summary(sequential)} | "
+            f"ASGI parallèle {self._summary(parallel)} | médiane {change:+.0f} %"
+        )
+
+    def _measure(self, request, repeat, cold):
+        # Une requête à blanc : caches et connexions du pool initialisés
+        self._check(request())
+        timings = []
+        for _ in range(repeat):
+            if cold:
+                metrics.mark_stale()
+                cache.delete(metrics.CACHE_KEY)
+            started = time.perf_counter()
+            self._check(request())
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def _check(self, response):
+        if response.status_code != 200:
+            raise CommandError(f"Réponse inattendue : {response.status_code}")
+
+    def _summary(self, timings):
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        return f"{statistics.median(timings):6.1f} ms (p95 {p95:6.1f})"
@@ -0,0 +1,271 @@
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from itertools import accumulate
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from books.models import Book
+from books.views import BookListView
+from loans.models import Loan
+
+User = get_user_model()
+
+# Trafic simulé : (nom de route, poids)
+MIX = [
+    ('books:list', 20),
+    ('books:search', 15),
+    ('books:autocomplete', 10),
+    ('books:detail', 25),
+    ('loans:my_loans', 8),
+    ('loans:borrow', 4),
+    ('loans:return', 4),
+    ('dashboard:home', 10),
+    ('dashboard:admin', 2),
+    ('dashboard:stats', 2),
+]
+
+# Routes réservées aux bibliothécaires
+STAFF_ROUTES = {'dashboard:admin', 'dashboard:stats'}
+
+# Livres tirés pour les fiches et les emprunts (les plus empruntés d'abord)
+POPULAR_BOOKS = 5000
+
+
+def percentile(sorted_values, fraction):
+    """Percentile par rang le plus proche d'une liste triée"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Traffic:
+    """Tirage des requêtes d'un utilisateur simulé"""
+
+    def __init__(self, seed, book_ids, terms, members, staff, list_pages=20):
+        self.rng = random.Random(seed)
+        self.list_pages = list_pages
+        self.book_ids = book_ids
+        # Popularité des fiches : loi de Zipf sur le classement des emprunts
+        self.book_weights = list(accumulate(1 / rank for rank in range(1, len(book_ids) + 1)))
+        self.terms = terms
+        self.members = members
+        self.staff = staff
+        self.names = [name for name, _ in MIX]
+        self.weights = list(accumulate(weight for _, weight in MIX))
+
+    def book(self):
+        return self.rng.choices(self.book_ids, cum_weights=self.book_weights)[0]
+
+    def next(self):
+        """(nom de route, utilisateur, méthode, chemin, paramètres)"""
+        name = self.rng.choices(self.names, cum_weights=self.weights)[0]
+        user = self.rng.choice(self.staff if name in STAFF_ROUTES else self.members)
+        if name == 'books:search':
+            return name, user, 'get', reverse(name), {'q': self.rng.choice(self.terms)}
+        if name == 'books:autocomplete':
+            return name, user, 'get', reverse(name), {'q': self.rng.choice(self.terms)[:3]}
+        if name == 'books:list':
+            return name, user, 'get', reverse(name), {'page': self.rng.randint(1, self.list_pages)}
+        if name in ('books:detail', 'loans:borrow'):
+            return name, user, 'post' if name == 'loans:borrow' else 'get', reverse(name, args=[self.book()]), {}
+        if name == 'loans:return':
+            loan_id = (
+                Loan.objects.active().filter(borrower=user).order_by('?').values_list('pk', flat=True).first()
+            )
+            if loan_id is None:
+                return self.next()
+            return name, user, 'post', reverse(name, args=[loan_id]), {}
+        return name, user, 'get', reverse(name), {}
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge local : trafic mixte (catalogue, recherche, fiches, emprunts et retours, "
+        "tableaux de bord), débit et latences p50/p95/p99 par route, résultats en JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=30, help="Durée en secondes (défaut : 30)")
+        parser.add_argument('--requests', type=int, help="Nombre maximal de requêtes (défaut : illimité)")
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help="Utilisateurs simultanés, un thread et une connexion chacun (défaut : 4)"
+        )
+        parser.add_argument('--seed', type=int, default=42, help="Graine du tirage du trafic (défaut : 42)")
+        parser.add_argument('--output', help="Fichier JSON des résultats (défaut : load_test_<date>.json)")
+        parser.add_argument('--compare', help="Résultats précédents (JSON) à comparer")
+        parser.add_argument(
+            '--threshold', type=float, default=20,
+            help="Hausse du p95 (%%) signalée comme régression (défaut : 20)"
+        )
+
+    def handle(self, *args, **options):
+        members = list(User.objects.filter(is_active=True, is_staff=False).order_by('?')[:1000])
+        staff = list(User.objects.filter(is_active=True, is_staff=True)[:20])
+        book_ids = list(
+            Book.objects.filter(is_active=True)
+            .order_by(F('stats__loan_count').desc(nulls_last=True), 'pk')
+            .values_list('pk', flat=True)[:POPULAR_BOOKS]
+        )
+        if not (members and staff and book_ids):
+            raise CommandError(
+                "Il faut des lecteurs, un bibliothécaire et des livres (voir generate_dataset)"
+            )
+        terms = sorted({
+            word
+            for title in Book.objects.filter(pk__in=book_ids[:200]).values_list('title', flat=True)
+            for word in title.split() if len(word) > 3
+        }) or ['livre']
+
+        # Pages du catalogue parcourues : les 20 premières au plus
+        list_pages = max(1, min(20, -(-Book.objects.filter(is_active=True).count() // BookListView.paginate_by)))
+        concurrency = max(1, options['concurrency'])
+        budget = options['requests']
+        results = defaultdict(list)
+        lock = threading.Lock()
+        issued = [0]
+
+        def send(clients, request):
+            name, user, method, path, params = request
+            client = clients.get(user.pk)
+            if client is None:
+                # Erreurs serveur comptées comme réponses 500, sans interrompre la mesure
+                client = clients[user.pk] = Client(raise_request_exception=False)
+                client.force_login(user)
+            return getattr(client, method)(path, params)
+
+        def worker(index):
+            traffic = Traffic(options['seed'] + index, book_ids, terms, members, staff, list_pages)
+            clients = {}
+            try:
+                while time.monotonic() < deadline:
+                    with lock:
+                        if budget is not None and issued[0] >= budget:
+                            return
+                        issued[0] += 1
+                    request = traffic.next()
+                    started = time.perf_counter()
+                    try:
+                        response = send(clients, request)
+                        ok = response.status_code < 400
+                        queries = getattr(response, 'sql_summary', {}).get('queries')
+                    except Exception:
+                        ok, queries = False, None
+                    elapsed = (time.perf_counter() - started) * 1000
+                    with lock:
+                        results[request[0]].append((elapsed, ok, queries))
+            finally:
+                if concurrency > 1:
+                    close_old_connections()
+                    connection.close()
+
+        self.stdout.write(
+            f"{concurrency} utilisateur(s) simultané(s), {options['duration']:.0f} s, "
+            f"{len(members)} lecteurs, {len(book_ids)} livres tirés"
+        )
+        # Le client de test s'annonce comme « testserver »
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            # Une requête à blanc par route (index en mémoire, caches, pool des tableaux de bord)
+            warm_up = Traffic(options['seed'], book_ids, terms, members, staff, list_pages)
+            pending = {name for name, _ in MIX} - {'loans:borrow', 'loans:return'}
+            while pending:
+                request = warm_up.next()
+                if request[0] in pending:
+                    pending.discard(request[0])
+                    send({}, request)
+            started = time.monotonic()
+            deadline = started + options['duration']
+            if concurrency == 1:
+                worker(0)
+            else:
+                threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        elapsed = time.monotonic() - started
+
+        report = self._report(results, elapsed, concurrency, options)
+        self._print(report)
+        output = Path(options['output'] or f"load_test_{timezone.now():%Y%m%d_%H%M%S}.json")
+        output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        self.stdout.write(f"Résultats enregistrés dans {output}")
+        if options['compare']:
+            self._compare(report, options['compare'], options['threshold'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['total']['requests']} requêtes, {report['total']['throughput']} req/s"
+        ))
+
+    def _stats(self, samples, elapsed):
+        timings = sorted(elapsed_ms for elapsed_ms, _, _ in samples)
+        queries = [count for _, _, count in samples if count is not None]
+        return {
+            'requests': len(samples),
+            'errors': sum(1 for _, ok, _ in samples if not ok),
+            'throughput': round(len(samples) / elapsed, 2) if elapsed else 0,
+            'mean_ms': round(sum(timings) / len(timings), 2) if timings else None,
+            'p50_ms': round(percentile(timings, 0.50), 2) if timings else None,
+            'p95_ms': round(percentile(timings, 0.95), 2) if timings else None,
+            'p99_ms': round(percentile(timings, 0.99), 2) if timings else None,
+            'max_ms': round(timings[-1], 2) if timings else None,
+            'queries': round(sum(queries) / len(queries), 1) if queries else None,
+        }
+
+    def _report(self, results, elapsed, concurrency, options):
+        everything = [sample for samples in results.values() for sample in samples]
+        return {
+            'started_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'dataset': {
+                'books': Book.objects.count(),
+                'loans': Loan.objects.count(),
+                'users': User.objects.count(),
+            },
+            'seed': options['seed'],
+            'concurrency': concurrency,
+            'duration_s': round(elapsed, 2),
+            'total': self._stats(everything, elapsed),
+            'urls': {name: self._stats(results[name], elapsed) for name in sorted(results)},
+        }
+
+    def _print(self, report):
+        self.stdout.write(
+            f"{'route':<20} {'req':>6} {'err':>4} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'SQL':>5}"
+        )
+        for name, stats in [*report['urls'].items(), ('total', report['total'])]:
+            self.stdout.write(
+                f"{name:<20} {stats['requests']:>6} {stats['errors']:>4} {stats['throughput']:>7} "
+                f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8} {'-' if stats['queries'] is None else stats['queries']:>5}"
+            )
+
+    def _compare(self, report, path, threshold):
+        """p95 par route comparé à une exécution précédente ; échoue en cas de régression"""
+        try:
+            previous = json.loads(Path(path).read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Résultats illisibles : {path} ({e})")
+        regressions = []
+        for name, stats in report['urls'].items():
+            before = previous.get('urls', {}).get(name, {}).get('p95_ms')
+            if not before or stats['p95_ms'] is None:
+                continue
+            change = (stats['p95_ms'] / before - 1) * 100
+            flag = ''
+            if change > threshold:
+                flag = ' RÉGRESSION'
+                regressions.append(name)
+            self.stdout.write(f"  {name:<20} p95 {before:8.2f} -> {stats['p95_ms']:8.2f} ms ({change:+.0f} %){flag}")
+        if regressions:
+            raise CommandError(f"p95 en hausse de plus de {threshold:.0f} % : {', '.join(regressions)}")
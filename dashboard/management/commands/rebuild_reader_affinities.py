@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from dashboard import personalization
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule les profils d'affinités des lecteurs (catégories, auteurs, "
+        "langues) depuis les emprunts ; à lancer après une reprise de données"
+    )
+
+    def handle(self, *args, **options):
+        rows = personalization.rebuild_affinities()
+        self.stdout.write(self.style.SUCCESS(f"Profils recalculés : {rows} affinités"))
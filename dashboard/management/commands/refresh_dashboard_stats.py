@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from dashboard import metrics
+
+
+class Command(BaseCommand):
+    help = "Recalcule l'instantané des compteurs du tableau de bord (à planifier, ex. cron)"
+
+    def handle(self, *args, **options):
+        data = metrics.reconcile()
+        counters = ', '.join(f"{name}={data[name]}" for name in metrics.COUNTERS)
+        self.stdout.write(self.style.SUCCESS(f"Instantané v{data['version']} recalculé : {counters}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from dashboard import reports
+
+
+class Command(BaseCommand):
+    help = (
+        "Produit les exports de rapports perdus par un worker arrêté : en attente, "
+        "ou en cours depuis plus de REPORTS_EXPORT_TIMEOUT secondes (à planifier, ex. cron)"
+    )
+
+    def handle(self, *args, **options):
+        count = reports.recover_exports()
+        self.stdout.write(self.style.SUCCESS(f"Exports repris : {count}"))
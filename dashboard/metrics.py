@@ -0,0 +1,201 @@
+"""
+Compteurs du tableau de bord.
+
+Les compteurs (livres, utilisateurs, emprunts en cours, en retard, du mois)
+sont lus dans l'instantané ``DashboardSnapshot`` plutôt que recomptés à chaque
+affichage :
+
+- les emprunts et retours les ajustent par incréments (``adjust``), écrits
+  sur l'une des ``DASHBOARD_STATS_SHARDS`` lignes de ``DashboardCounterShard``
+  (tirée au hasard par thread) : les mises à jour simultanées ne se disputent
+  pas une ligne unique ; la lecture ajoute la somme des lignes à l'instantané ;
+- les autres changements (livres, utilisateurs, prolongations) marquent
+  une ligne comme périmée : l'instantané est recalculé à la lecture suivante ;
+- l'instantané est aussi recalculé au changement de jour et au plus tard
+  toutes les ``DASHBOARD_STATS_RECONCILE_SECONDS`` secondes ; le recalcul
+  remet les lignes d'incréments à zéro ;
+- la lecture passe par le cache pendant ``DASHBOARD_STATS_MAX_STALENESS``
+  secondes : c'est le retard maximal d'un worker sur les autres.
+
+La version (celle de l'instantané plus celles des lignes d'incréments),
+qui augmente à chaque changement, sert d'ETag à l'API des statistiques. Les
+comptages d'un recalcul sont indépendants : ils sont exécutés en parallèle
+(``concurrent.run_all``).
+"""
+import random
+import threading
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from . import concurrent
+from .models import DashboardCounterShard, DashboardSnapshot
+
+CACHE_KEY = 'dashboard:snapshot'
+SNAPSHOT_PK = 1
+
+_local = threading.local()
+
+COUNTERS = ['total_books', 'total_users', 'total_loans', 'active_loans', 'overdue_loans', 'monthly_loans']
+
+
+def max_staleness():
+    return getattr(settings, 'DASHBOARD_STATS_MAX_STALENESS', 30)
+
+
+def reconcile_interval():
+    return getattr(settings, 'DASHBOARD_STATS_RECONCILE_SECONDS', 900)
+
+
+def shard_count():
+    return max(1, getattr(settings, 'DASHBOARD_STATS_SHARDS', 8))
+
+
+def count_queries(today=None):
+    """Comptages indépendants des compteurs : {compteur: fonction}"""
+    from accounts.models import CustomUser
+    from books.models import Book
+    from loans.models import Loan
+
+    today = today or timezone.localdate()
+    return {
+        'total_books': Book.objects.filter(is_active=True).count,
+        'total_users': CustomUser.objects.filter(is_active=True).count,
+        'total_loans': Loan.objects.count,
+        'active_loans': Loan.objects.active().count,
+        'overdue_loans': Loan.objects.overdue(today).count,
+        'monthly_loans': Loan.objects.filter(loan_date__date__gte=today.replace(day=1)).count,
+    }
+
+
+def count_all(today=None):
+    """Recompte tous les compteurs depuis les tables sources"""
+    return concurrent.run_all(count_queries(today))
+
+
+def _shard_totals():
+    """Somme des lignes d'incréments : {compteur: delta, 'version': n, 'stale': bool} (une requête)"""
+    totals = DashboardCounterShard.objects.aggregate(
+        version=Sum('version'), rows=Count('pk'), stale=Count('pk', filter=Q(stale=True)),
+        **{counter: Sum(counter) for counter in COUNTERS},
+    )
+    totals = {key: value or 0 for key, value in totals.items()}
+    # Lignes manquantes (premier recalcul, DASHBOARD_STATS_SHARDS augmenté) : incréments perdus
+    totals['stale'] = bool(totals['stale']) or totals.pop('rows') < shard_count()
+    return totals
+
+
+def _as_dict(snapshot, shards):
+    data = {counter: max(0, getattr(snapshot, counter) + shards[counter]) for counter in COUNTERS}
+    data['version'] = snapshot.version + shards['version']
+    data['day'] = snapshot.day
+    return data
+
+
+def _version():
+    version = DashboardSnapshot.objects.filter(pk=SNAPSHOT_PK).values_list('version', flat=True).first()
+    return (version or 0) + _shard_totals()['version']
+
+
+def reconcile():
+    """Recalcule entièrement l'instantané, remet les incréments à zéro et place le tout en cache"""
+    today = timezone.localdate()
+    version = _version()
+    # Comptages en parallèle, hors du verrou de l'instantané
+    counts = count_all(today)
+    with transaction.atomic():
+        snapshot, _ = DashboardSnapshot.objects.select_for_update().get_or_create(pk=SNAPSHOT_PK)
+        DashboardCounterShard.objects.bulk_create(
+            [DashboardCounterShard(pk=shard) for shard in range(shard_count())], ignore_conflicts=True
+        )
+        # Lignes d'incréments verrouillées (dans l'ordre des clés) jusqu'à leur remise à zéro
+        list(DashboardCounterShard.objects.select_for_update().order_by('pk').values_list('pk'))
+        shards = _shard_totals()
+        if snapshot.version + shards['version'] != version:
+            # Des incréments ont eu lieu pendant les comptages : recompte sous le verrou
+            counts = count_all(today)
+        for counter, value in counts.items():
+            setattr(snapshot, counter, value)
+        snapshot.day = today
+        # Les versions des lignes d'incréments sont conservées : la version totale ne fait que croître
+        snapshot.version += 1
+        snapshot.reconciled_at = timezone.now()
+        snapshot.save()
+        DashboardCounterShard.objects.update(stale=False, **{counter: 0 for counter in COUNTERS})
+    data = _as_dict(snapshot, {**dict.fromkeys(COUNTERS, 0), 'version': shards['version']})
+    cache.set(CACHE_KEY, data, max_staleness())
+    return data
+
+
+def _needs_reconcile(snapshot, shards):
+    if snapshot is None or snapshot.reconciled_at is None or shards['stale']:
+        return True
+    if snapshot.day != timezone.localdate():
+        return True
+    return timezone.now() - snapshot.reconciled_at > timedelta(seconds=reconcile_interval())
+
+
+def get_snapshot():
+    """Compteurs courants : cache, puis ligne d'instantané, recalculée si nécessaire"""
+    data = cache.get(CACHE_KEY)
+    if data is not None:
+        return data
+    snapshot = DashboardSnapshot.objects.filter(pk=SNAPSHOT_PK).first()
+    shards = _shard_totals()
+    if _needs_reconcile(snapshot, shards):
+        return reconcile()
+    data = _as_dict(snapshot, shards)
+    cache.set(CACHE_KEY, data, max_staleness())
+    return data
+
+
+async def aget_snapshot():
+    """``get_snapshot`` pour les vues asynchrones"""
+    data = await cache.aget(CACHE_KEY)
+    if data is not None:
+        return data
+    return await sync_to_async(get_snapshot)()
+
+
+def _invalidate_cache():
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
+
+
+def _shard():
+    """
+    Ligne d'incréments du thread courant, tirée au hasard à son premier
+    ajustement : une transaction n'écrit que sur une ligne, deux transactions
+    ne peuvent pas se bloquer mutuellement en les prenant dans l'ordre inverse
+    """
+    if getattr(_local, 'shard', None) is None:
+        _local.shard = random.randrange(1 << 16)
+    return _local.shard % shard_count()
+
+
+def _update_shard(**changes):
+    """Écrit sur la ligne d'incréments du thread (ignoré tant qu'elles n'existent pas)"""
+    DashboardCounterShard.objects.filter(pk=_shard()).update(version=F('version') + 1, **changes)
+    _invalidate_cache()
+
+
+def adjust(**deltas):
+    """Ajuste des compteurs par incréments"""
+    changes = {counter: F(counter) + delta for counter, delta in deltas.items() if delta}
+    if changes:
+        _update_shard(**changes)
+
+
+def mark_stale():
+    """Force un recalcul complet à la prochaine lecture"""
+    _update_shard(stale=True)
+
+
+def etag(data):
+    """ETag d'un instantané : version et jour"""
+    return f"{data['version']}-{data['day']}"
+
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_books', models.PositiveIntegerField(default=0, verbose_name='Livres actifs')),
+                ('total_users', models.PositiveIntegerField(default=0, verbose_name='Utilisateurs actifs')),
+                ('total_loans', models.PositiveIntegerField(default=0, verbose_name='Emprunts')),
+                ('active_loans', models.PositiveIntegerField(default=0, verbose_name='Emprunts en cours')),
+                ('overdue_loans', models.PositiveIntegerField(default=0, verbose_name='Emprunts en retard')),
+                ('monthly_loans', models.PositiveIntegerField(default=0, verbose_name='Emprunts du mois')),
+                ('day', models.DateField(null=True, verbose_name='Jour de référence')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Version')),
+                ('reconciled_at', models.DateTimeField(null=True, verbose_name='Recalculé le')),
+            ],
+            options={
+                'verbose_name': 'Instantané du tableau de bord',
+                'verbose_name_plural': 'Instantanés du tableau de bord',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=30, verbose_name='Métrique')),
+                ('granularity', models.CharField(max_length=10, verbose_name='Granularité')),
+                ('period_start', models.DateField(verbose_name='Début de période')),
+                ('value', models.PositiveIntegerField(default=0, verbose_name='Valeur')),
+                ('computed_at', models.DateTimeField(auto_now_add=True, verbose_name='Calculé le')),
+            ],
+            options={
+                'verbose_name': 'Agrégat de métrique',
+                'verbose_name_plural': 'Agrégats de métriques',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='metricrollup',
+            constraint=models.UniqueConstraint(fields=('metric', 'granularity', 'period_start'), name='unique_metric_rollup'),
+        ),
+    ]
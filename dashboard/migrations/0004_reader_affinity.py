@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dashboard', '0003_report_export'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReaderAffinity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('category', 'Catégorie'), ('author', 'Auteur'), ('language', 'Langue')], max_length=10, verbose_name='Type')),
+                ('key', models.CharField(max_length=50, verbose_name='Clé')),
+                ('weight', models.PositiveIntegerField(default=0, verbose_name='Emprunts')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='affinities', to=settings.AUTH_USER_MODEL, verbose_name='Lecteur')),
+            ],
+            options={
+                'verbose_name': 'Affinité de lecteur',
+                'verbose_name_plural': 'Affinités de lecteurs',
+                'indexes': [models.Index(fields=['user', 'kind', '-weight'], name='reader_affinity_weight_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='readeraffinity',
+            constraint=models.UniqueConstraint(fields=('user', 'kind', 'key'), name='unique_reader_affinity'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_reader_affinity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportexport',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Commencé le'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_report_export_started_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounterShard',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('total_books', models.IntegerField(default=0, verbose_name='Livres actifs')),
+                ('total_users', models.IntegerField(default=0, verbose_name='Utilisateurs actifs')),
+                ('total_loans', models.IntegerField(default=0, verbose_name='Emprunts')),
+                ('active_loans', models.IntegerField(default=0, verbose_name='Emprunts en cours')),
+                ('overdue_loans', models.IntegerField(default=0, verbose_name='Emprunts en retard')),
+                ('monthly_loans', models.IntegerField(default=0, verbose_name='Emprunts du mois')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Version')),
+                ('stale', models.BooleanField(default=False, verbose_name='Périmé')),
+            ],
+            options={
+                'verbose_name': 'Fraction des compteurs du tableau de bord',
+                'verbose_name_plural': 'Fractions des compteurs du tableau de bord',
+            },
+        ),
+    ]
@@ -1,4 +1,147 @@
+from django.conf import settings
 from django.db import models
 
-# Le dashboard utilise les modèles des autres applications
-# Pas de modèles spécifiques nécessaires ici
+
+class DashboardSnapshot(models.Model):
+    """
+    Compteurs du tableau de bord précalculés (une seule ligne, pk=1), écrits
+    par les recalculs complets ; les incréments des emprunts et retours sont
+    dans ``DashboardCounterShard`` (voir ``dashboard.metrics``).
+    """
+    total_books = models.PositiveIntegerField(default=0, verbose_name="Livres actifs")
+    total_users = models.PositiveIntegerField(default=0, verbose_name="Utilisateurs actifs")
+    total_loans = models.PositiveIntegerField(default=0, verbose_name="Emprunts")
+    active_loans = models.PositiveIntegerField(default=0, verbose_name="Emprunts en cours")
+    overdue_loans = models.PositiveIntegerField(default=0, verbose_name="Emprunts en retard")
+    monthly_loans = models.PositiveIntegerField(default=0, verbose_name="Emprunts du mois")
+    
+    # Jour de référence des compteurs « en retard » et « du mois »
+    day = models.DateField(null=True, verbose_name="Jour de référence")
+    version = models.PositiveIntegerField(default=0, verbose_name="Version")
+    reconciled_at = models.DateTimeField(null=True, verbose_name="Recalculé le")
+    
+    class Meta:
+        verbose_name = "Instantané du tableau de bord"
+        verbose_name_plural = "Instantanés du tableau de bord"
+    
+    def __str__(self):
+        return f"Tableau de bord v{self.version}"
+
+
+class DashboardCounterShard(models.Model):
+    """
+    Incréments des compteurs depuis le dernier recalcul, répartis sur
+    ``DASHBOARD_STATS_SHARDS`` lignes : chaque emprunt ou retour met à jour
+    une ligne tirée au hasard, l'instantané n'est écrit que par les recalculs.
+    La lecture ajoute la somme des lignes à l'instantané.
+    """
+    id = models.PositiveSmallIntegerField(primary_key=True)
+    total_books = models.IntegerField(default=0, verbose_name="Livres actifs")
+    total_users = models.IntegerField(default=0, verbose_name="Utilisateurs actifs")
+    total_loans = models.IntegerField(default=0, verbose_name="Emprunts")
+    active_loans = models.IntegerField(default=0, verbose_name="Emprunts en cours")
+    overdue_loans = models.IntegerField(default=0, verbose_name="Emprunts en retard")
+    monthly_loans = models.IntegerField(default=0, verbose_name="Emprunts du mois")
+    version = models.PositiveIntegerField(default=0, verbose_name="Version")
+    # Changement non incrémental (livre modifié, suppression...) : recalcul à la lecture
+    stale = models.BooleanField(default=False, verbose_name="Périmé")
+    
+    class Meta:
+        verbose_name = "Fraction des compteurs du tableau de bord"
+        verbose_name_plural = "Fractions des compteurs du tableau de bord"
+    
+    def __str__(self):
+        return f"Fraction {self.pk} v{self.version}"
+
+
+class MetricRollup(models.Model):
+    """Valeur d'une métrique sur une période close (jamais recalculée)"""
+    metric = models.CharField(max_length=30, verbose_name="Métrique")
+    granularity = models.CharField(max_length=10, verbose_name="Granularité")
+    period_start = models.DateField(verbose_name="Début de période")
+    value = models.PositiveIntegerField(default=0, verbose_name="Valeur")
+    computed_at = models.DateTimeField(auto_now_add=True, verbose_name="Calculé le")
+    
+    class Meta:
+        verbose_name = "Agrégat de métrique"
+        verbose_name_plural = "Agrégats de métriques"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['metric', 'granularity', 'period_start'],
+                name='unique_metric_rollup',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.metric} {self.granularity} {self.period_start} = {self.value}"
+
+
+class ReportExport(models.Model):
+    """Export de rapport produit en arrière-plan (voir ``dashboard.reports``)"""
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+        ('failed', 'Échec'),
+    ]
+    
+    report = models.CharField(max_length=20, verbose_name="Rapport")
+    format = models.CharField(max_length=10, verbose_name="Format")
+    filters = models.JSONField(default=dict, blank=True, verbose_name="Filtres")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="Statut")
+    row_count = models.PositiveIntegerField(default=0, verbose_name="Lignes")
+    file = models.FileField(upload_to='reports/', blank=True, verbose_name="Fichier")
+    error = models.TextField(blank=True, verbose_name="Erreur")
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='report_exports',
+        verbose_name="Demandé par"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Demandé le")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Commencé le")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Terminé le")
+    
+    class Meta:
+        verbose_name = "Export de rapport"
+        verbose_name_plural = "Exports de rapports"
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.report}.{self.format} ({self.get_status_display()})"
+
+
+class ReaderAffinity(models.Model):
+    """
+    Intérêt d'un lecteur pour une catégorie, un auteur ou une langue : nombre
+    de ses emprunts concernés, incrémenté à chaque emprunt (voir
+    ``dashboard.personalization``).
+    """
+    KIND_CHOICES = [
+        ('category', 'Catégorie'),
+        ('author', 'Auteur'),
+        ('language', 'Langue'),
+    ]
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='affinities',
+        verbose_name="Lecteur"
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name="Type")
+    key = models.CharField(max_length=50, verbose_name="Clé")
+    weight = models.PositiveIntegerField(default=0, verbose_name="Emprunts")
+    
+    class Meta:
+        verbose_name = "Affinité de lecteur"
+        verbose_name_plural = "Affinités de lecteurs"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'kind', 'key'], name='unique_reader_affinity'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'kind', '-weight'], name='reader_affinity_weight_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} {self.kind}:{self.key} = {self.weight}"
@@ -0,0 +1,205 @@
+"""
+Recommandations personnalisées du tableau de bord des lecteurs.
+
+Chaque lecteur a un profil d'affinités (``ReaderAffinity``) : le nombre de
+ses emprunts par catégorie, par auteur et par langue. Il est tenu à jour par
+incréments à chaque emprunt (signaux, trois requêtes) au lieu d'être agrégé
+sur la table des emprunts à l'affichage ; ``rebuild_affinities`` le recalcule
+entièrement (commande ``rebuild_reader_affinities``).
+
+Recommandations d'un lecteur :
+
+1. candidats : les livres les plus empruntés de ses catégories et de ses
+   auteurs préférés, hors livres qu'il a déjà empruntés ;
+2. score : affinité (part de la catégorie, du meilleur auteur et de la langue
+   du livre, rapportée à la préférée de chaque type) plus popularité
+   (nombre d'emprunts, en échelle logarithmique) ;
+3. liste mise en cache par lecteur, supprimée à chacun de ses emprunts et
+   filtrée à la lecture des livres qu'il a empruntés depuis.
+
+Un lecteur sans emprunt n'a pas de recommandations : le tableau de bord
+garde les livres populaires et les nouveautés.
+"""
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Value, prefetch_related_objects
+from django.db.models.functions import Greatest
+
+from books.models import Book, Category
+from loans.models import Loan
+
+from .models import ReaderAffinity
+
+# Poids de chaque type d'affinité et de la popularité dans le score
+KIND_WEIGHTS = {'category': 0.5, 'author': 0.35, 'language': 0.15}
+POPULARITY_WEIGHT = 0.3
+# Catégories et auteurs préférés d'où sont tirés les candidats
+TOP_CATEGORIES = 5
+TOP_AUTHORS = 10
+# Candidats lus par source (catégories, auteurs)
+CANDIDATES = 100
+
+CACHE_KEY = 'dashboard:recommendations:{}'
+# Recommandations gardées en cache au-delà de la limite, pour remplacer
+# celles retirées à la lecture (livres empruntés depuis)
+SPARE_RECOMMENDATIONS = 4
+
+
+def book_keys(book_id):
+    """Couples (type, clé) d'affinité d'un livre (une requête)"""
+    keys = set()
+    for category_id, language, author_id in Book.objects.filter(pk=book_id).values_list(
+        'category_id', 'language', 'authors'
+    ):
+        keys.add(('category', str(category_id)))
+        if language:
+            keys.add(('language', language[:50]))
+        if author_id is not None:
+            keys.add(('author', str(author_id)))
+    return keys
+
+
+def record_loan(user_id, book_id, sign=1):
+    """Ajoute (sign=1) ou retire (sign=-1) un emprunt du profil d'un lecteur"""
+    keys = book_keys(book_id)
+    if not keys:
+        return
+    if sign > 0:
+        ReaderAffinity.objects.bulk_create(
+            [ReaderAffinity(user_id=user_id, kind=kind, key=key) for kind, key in keys],
+            ignore_conflicts=True,
+        )
+    match = Q()
+    for kind, key in keys:
+        match |= Q(kind=kind, key=key)
+    ReaderAffinity.objects.filter(match, user_id=user_id).update(
+        weight=Greatest(F('weight') + Value(sign), Value(0))
+    )
+
+
+def rebuild_affinities(batch_size=1000):
+    """Recalcule tous les profils depuis les emprunts ; retourne le nombre de lignes"""
+    sources = {
+        'category': 'book__category_id',
+        'author': 'book__authors',
+        'language': 'book__language',
+    }
+    with transaction.atomic():
+        ReaderAffinity.objects.all().delete()
+        total = 0
+        for kind, field in sources.items():
+            rows = (
+                Loan.objects.order_by().exclude(**{f'{field}__isnull': True})
+                .values_list('borrower_id', field).annotate(weight=Count('id'))
+            )
+            batch = []
+            for user_id, key, weight in rows.iterator(chunk_size=batch_size):
+                batch.append(ReaderAffinity(user_id=user_id, kind=kind, key=str(key)[:50], weight=weight))
+                if len(batch) >= batch_size:
+                    ReaderAffinity.objects.bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+            ReaderAffinity.objects.bulk_create(batch)
+            total += len(batch)
+    return total
+
+
+def affinities(user):
+    """Profil d'un lecteur : {type: {clé: part rapportée à la clé préférée}}"""
+    profile = {kind: {} for kind in KIND_WEIGHTS}
+    top = {}
+    rows = ReaderAffinity.objects.filter(user=user, weight__gt=0).order_by('kind', '-weight')
+    for kind, key, weight in rows.values_list('kind', 'key', 'weight'):
+        # Première ligne de chaque type : la clé préférée
+        top.setdefault(kind, weight)
+        profile[kind][key] = weight / top[kind]
+    return profile
+
+
+def favorite_categories(user, limit=5):
+    """Catégories les plus empruntées par un lecteur (``loan_count``), sans agrégat"""
+    rows = list(
+        ReaderAffinity.objects.filter(user=user, kind='category', weight__gt=0)
+        .order_by('-weight').values_list('key', 'weight')[:limit]
+    )
+    categories = Category.objects.in_bulk([int(key) for key, _ in rows])
+    favorites = []
+    for key, weight in rows:
+        category = categories.get(int(key))
+        if category is not None:
+            category.loan_count = weight
+            favorites.append(category)
+    return favorites
+
+
+def _top(shares, count):
+    return [int(key) for key, _ in sorted(shares.items(), key=lambda item: -item[1])[:count]]
+
+
+def compute_recommendations(user, limit=6):
+    """Livres recommandés à un lecteur (``recommendation_score``, ``loan_count``), sans cache"""
+    profile = affinities(user)
+    categories = _top(profile['category'], TOP_CATEGORIES)
+    authors = _top(profile['author'], TOP_AUTHORS)
+    if not categories and not authors:
+        return []
+
+    books = (
+        Book.objects.filter(is_active=True)
+        .exclude(pk__in=Loan.objects.filter(borrower=user).values('book_id'))
+        .annotate(loan_count=F('stats__loan_count'))
+        .order_by(F('stats__loan_count').desc(nulls_last=True), '-pk')
+    )
+    candidates = {}
+    for source in (
+        books.filter(category_id__in=categories),
+        books.filter(authors__in=authors).distinct() if authors else None,
+    ):
+        if source is not None:
+            for book in source[:CANDIDATES]:
+                candidates.setdefault(book.pk, book)
+    candidates = list(candidates.values())
+    prefetch_related_objects(candidates, 'authors')
+
+    most_loans = math.log1p(max((book.loan_count or 0 for book in candidates), default=0)) or 1
+    for book in candidates:
+        affinity = (
+            KIND_WEIGHTS['category'] * profile['category'].get(str(book.category_id), 0)
+            + KIND_WEIGHTS['author'] * max(
+                (profile['author'].get(str(author.pk), 0) for author in book.authors.all()), default=0
+            )
+            + KIND_WEIGHTS['language'] * profile['language'].get(book.language, 0)
+        )
+        popularity = math.log1p(book.loan_count or 0) / most_loans
+        book.recommendation_score = affinity + POPULARITY_WEIGHT * popularity
+    candidates.sort(key=lambda book: (-book.recommendation_score, -book.pk))
+    return candidates[:limit]
+
+
+def recommended_books(user, limit=6):
+    """
+    Recommandations d'un lecteur, en cache jusqu'à son prochain emprunt.
+    Une liste lue en cache est filtrée des livres qu'il a empruntés depuis
+    (invalidation pas encore visible, calcul concurrent mis en cache après
+    elle) : une requête sur ses seuls livres recommandés.
+    """
+    key = CACHE_KEY.format(user.pk)
+    books = cache.get(key)
+    if books is None:
+        books = compute_recommendations(user, limit + SPARE_RECOMMENDATIONS)
+        cache.set(key, books, settings.DASHBOARD_RECOMMENDATIONS_TIMEOUT)
+    elif books:
+        borrowed = set(
+            Loan.objects.filter(borrower=user, book_id__in=[book.pk for book in books])
+            .values_list('book_id', flat=True)
+        )
+        books = [book for book in books if book.pk not in borrowed]
+    return books[:limit]
+
+
+def invalidate(user_id):
+    """Oublie les recommandations d'un lecteur après validation de la transaction"""
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY.format(user_id)))
@@ -0,0 +1,399 @@
+"""
+Rapports exportables (livres, emprunts, utilisateurs) en CSV, XLSX et PDF.
+
+Les lignes sont lues par ``values_list(...).iterator(chunk_size=...)`` et
+écrites au fil de l'eau, la mémoire ne dépend donc pas du nombre de lignes :
+
+- CSV : générateur servi par ``StreamingHttpResponse`` ;
+- XLSX : classeur openpyxl en mode « write only » écrit dans un fichier ;
+- PDF : flowables reportlab produits à la demande (``_StreamedStory``) ;
+  reportlab conserve toutefois les pages produites jusqu'à l'enregistrement,
+  la mémoire d'un PDF croît donc avec son nombre de pages.
+
+Au-delà de ``REPORTS_BACKGROUND_ROWS`` lignes, l'export est confié à un
+thread (``ReportExport``) pour ne pas bloquer un worker pendant sa durée ;
+le fichier est ensuite téléchargé depuis la page de l'export. Un worker
+s'approprie un export par une mise à jour conditionnelle (``run_export``) ;
+ceux perdus par un redémarrage sont repris par ``resume_report_exports``.
+"""
+import csv
+import datetime
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.db import close_old_connections
+from django.db.models import Count, Q
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from books.models import Book, Category
+from library_project.routers import replica_reads
+from loans.models import Loan
+
+from .models import ReportExport
+
+CHUNK_SIZE = 2000
+PDF_ROWS_PER_TABLE = 40
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'pdf': ('application/pdf', 'pdf'),
+}
+
+AUTHORS = object()
+
+
+class Report:
+    """Définition d'un rapport : source, colonnes et champs filtrés"""
+
+    def __init__(self, title, queryset, columns, date_field, category_field):
+        self.title = title
+        self._queryset = queryset
+        self.columns = columns
+        self.date_field = date_field
+        self.category_field = category_field
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+    def queryset(self, filters):
+        queryset = self._queryset()
+        if filters.get('start'):
+            queryset = queryset.filter(**{f'{self.date_field}__date__gte': filters['start']})
+        if filters.get('end'):
+            queryset = queryset.filter(**{f'{self.date_field}__date__lte': filters['end']})
+        if filters.get('category'):
+            queryset = queryset.filter(**{self.category_field: filters['category']})
+        return queryset
+
+
+REPORTS = {
+    'books': Report(
+        'Livres',
+        lambda: Book.objects.order_by('pk'),
+        [
+            ('ISBN', 'isbn'),
+            ('Titre', 'title'),
+            ('Auteurs', AUTHORS),
+            ('Catégorie', 'category__name'),
+            ('Éditeur', 'publisher__name'),
+            ('Publication', 'publication_date'),
+            ('Langue', 'language'),
+            ('Exemplaires', 'total_copies'),
+            ('Disponibles', 'available_copies'),
+            ('Emprunts', 'stats__loan_count'),
+            ('Ajouté le', 'created_at'),
+        ],
+        'created_at', 'category_id',
+    ),
+    'loans': Report(
+        'Emprunts',
+        lambda: Loan.objects.order_by('pk'),
+        [
+            ('N°', 'pk'),
+            ('Livre', 'book__title'),
+            ('ISBN', 'book__isbn'),
+            ('Catégorie', 'book__category__name'),
+            ('Emprunteur', 'borrower__username'),
+            ('Emprunté le', 'loan_date'),
+            ('Échéance', 'due_date'),
+            ('Rendu le', 'returned_date'),
+            ('Statut', 'status'),
+        ],
+        'loan_date', 'book__category_id',
+    ),
+    'users': Report(
+        'Utilisateurs',
+        # Avec un filtre de catégorie, seuls les emprunts de la catégorie sont comptés
+        lambda: get_user_model().objects.order_by('pk'),
+        [
+            ('Identifiant', 'username'),
+            ('Nom', 'last_name'),
+            ('Prénom', 'first_name'),
+            ('Email', 'email'),
+            ('Inscrit le', 'date_joined'),
+            ('Membre actif', 'is_active_member'),
+            ('Emprunts', 'loan_total'),
+        ],
+        'date_joined', 'loan__book__category_id',
+    ),
+}
+
+
+def _cell(value):
+    """Valeur exportable (dates locales sans fuseau, booléens en texte)"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'Oui' if value else 'Non'
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.replace(tzinfo=None, microsecond=0)
+    return value
+
+
+def _book_authors(book_ids):
+    """{id du livre: "Prénom Nom, ..."} pour un paquet de livres"""
+    through = Book.authors.through
+    names = {}
+    rows = through.objects.filter(book_id__in=book_ids).order_by('pk').values_list(
+        'book_id', 'author__first_name', 'author__last_name'
+    )
+    for book_id, first, last in rows:
+        names.setdefault(book_id, []).append(f"{first} {last}".strip())
+    return {book_id: ', '.join(authors) for book_id, authors in names.items()}
+
+
+def rows(name, filters, chunk_size=CHUNK_SIZE):
+    """Lignes d'un rapport (tuples de cellules), lues par paquets"""
+    report = REPORTS[name]
+    queryset = report.queryset(filters)
+    if name == 'users':
+        queryset = queryset.annotate(loan_total=Count('loan'))
+    fields = ['pk'] + [field for _, field in report.columns if field is not AUTHORS]
+    iterator = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        authors = _book_authors([row[0] for row in chunk]) if name == 'books' else {}
+        for row in chunk:
+            values = iter(row[1:])
+            yield tuple(
+                authors.get(row[0], '') if field is AUTHORS else _cell(next(values))
+                for _, field in report.columns
+            )
+
+
+def count(name, filters):
+    # distinct : le filtre de catégorie des utilisateurs passe par leurs emprunts
+    return REPORTS[name].queryset(filters).distinct().count()
+
+
+def describe_filters(filters):
+    """Résumé lisible des filtres (en-tête du PDF)"""
+    parts = []
+    if filters.get('start'):
+        parts.append(f"du {filters['start']:%d/%m/%Y}")
+    if filters.get('end'):
+        parts.append(f"au {filters['end']:%d/%m/%Y}")
+    if filters.get('category'):
+        category = Category.objects.filter(pk=filters['category']).first()
+        parts.append(f"catégorie {category.name if category else filters['category']}")
+    return ' '.join(parts) or 'Toutes les données'
+
+
+# --- Écriture ---------------------------------------------------------------------
+
+class _Echo:
+    """Pseudo-fichier : ``csv.writer`` renvoie la ligne au lieu de l'écrire"""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(name, filters, rows_per_chunk=500):
+    """Morceaux du CSV (point-virgule, BOM pour Excel)"""
+    writer = csv.writer(_Echo(), delimiter=';')
+    yield '\ufeff' + writer.writerow(REPORTS[name].headers)
+    buffer = []
+    for row in rows(name, filters):
+        buffer.append(writer.writerow(row))
+        if len(buffer) >= rows_per_chunk:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def write_csv(name, filters, target):
+    for chunk in csv_chunks(name, filters):
+        target.write(chunk.encode('utf-8'))
+
+
+def write_xlsx(name, filters, target):
+    # Import à la demande : openpyxl charge NumPy s'il est installé
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(REPORTS[name].title)
+    sheet.append(REPORTS[name].headers)
+    for row in rows(name, filters):
+        sheet.append(row)
+    workbook.save(target)
+
+
+class _StreamedStory(list):
+    """
+    Flowables produits à la demande : ``build`` consomme la liste par le début,
+    seules quelques tables sont donc en mémoire à la fois.
+    """
+
+    def __init__(self, flowables, lookahead=4):
+        super().__init__()
+        self._source = iter(flowables)
+        self._lookahead = lookahead
+
+    def _fill(self):
+        while self._source is not None and list.__len__(self) < self._lookahead:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        self._fill()
+        return list.__getitem__(self, index)
+
+
+def _pdf_flowables(name, filters):
+    styles = getSampleStyleSheet()
+    report = REPORTS[name]
+    yield Paragraph(f"Rapport : {report.title}", styles['Title'])
+    yield Paragraph(describe_filters(filters), styles['Normal'])
+    yield Spacer(1, 0.5 * cm)
+    style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4e73df')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTSIZE', (0, 0), (-1, -1), 7),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ])
+    iterator = rows(name, filters)
+    while True:
+        chunk = list(islice(iterator, PDF_ROWS_PER_TABLE))
+        if not chunk:
+            return
+        data = [report.headers] + [
+            [value.strftime('%d/%m/%Y %H:%M') if isinstance(value, datetime.datetime)
+             else value.strftime('%d/%m/%Y') if isinstance(value, datetime.date)
+             else str(value)[:60] for value in row]
+            for row in chunk
+        ]
+        yield Table(data, style=style, repeatRows=1)
+
+
+def write_pdf(name, filters, target):
+    document = SimpleDocTemplate(
+        target, pagesize=landscape(A4), title=f"Rapport {REPORTS[name].title}",
+        leftMargin=cm, rightMargin=cm, topMargin=cm, bottomMargin=cm,
+    )
+    document.build(_StreamedStory(_pdf_flowables(name, filters)))
+
+
+WRITERS = {'csv': write_csv, 'xlsx': write_xlsx, 'pdf': write_pdf}
+
+
+def write_to_tempfile(name, filters, format_name):
+    """Fichier temporaire (supprimé à la fermeture) contenant l'export"""
+    target = tempfile.TemporaryFile()
+    WRITERS[format_name](name, filters, target)
+    target.seek(0)
+    return target
+
+
+def filename(name, format_name):
+    return f"rapport_{name}_{timezone.localdate():%Y%m%d}.{FORMATS[format_name][1]}"
+
+
+# --- Exports en arrière-plan ---------------------------------------------------
+
+def background_threshold():
+    return getattr(settings, 'REPORTS_BACKGROUND_ROWS', 50000)
+
+
+def serialize_filters(filters):
+    return {key: value.isoformat() if hasattr(value, 'isoformat') else value
+            for key, value in filters.items() if value}
+
+
+def deserialize_filters(data):
+    filters = dict(data)
+    for key in ('start', 'end'):
+        if filters.get(key):
+            filters[key] = datetime.date.fromisoformat(filters[key])
+    return filters
+
+
+def export_timeout():
+    return getattr(settings, 'REPORTS_EXPORT_TIMEOUT', 3600)
+
+
+def _claimable(now):
+    """Exports à produire : en attente, ou en cours depuis plus du délai (worker perdu)"""
+    stale = now - datetime.timedelta(seconds=export_timeout())
+    return ReportExport.objects.filter(
+        Q(status='pending') | Q(status='running', started_at__lt=stale) | Q(status='running', started_at=None)
+    )
+
+
+def run_export(export_id):
+    """Produit le fichier d'un export en attente ; ignoré s'il est déjà pris par un autre worker"""
+    now = timezone.now()
+    if not _claimable(now).filter(pk=export_id).update(status='running', started_at=now):
+        return
+    export = ReportExport.objects.get(pk=export_id)
+    try:
+        # Les lignes sont lues sur la réplique (si elle existe), l'export reste sur la base principale
+        with replica_reads():
+            handle = write_to_tempfile(export.report, deserialize_filters(export.filters), export.format)
+        with handle:
+            export.file.save(filename(export.report, export.format), File(handle), save=False)
+    except Exception as exc:
+        export.status = 'failed'
+        export.error = str(exc)[:500]
+    else:
+        export.status = 'done'
+    export.finished_at = timezone.now()
+    export.save()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _run(export_id):
+    try:
+        run_export(export_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_export(export):
+    """Confie l'export au pool de threads (dans le processus si aucun worker)"""
+    global _executor
+    workers = getattr(settings, 'REPORTS_BACKGROUND_WORKERS', 1)
+    if workers <= 0:
+        run_export(export.pk)
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='reports')
+    _executor.submit(_run, export.pk)
+
+
+def recover_exports():
+    """
+    Produit les exports perdus par un worker arrêté (en attente, ou en cours
+    depuis plus de ``REPORTS_EXPORT_TIMEOUT``) ; retourne leur nombre
+    """
+    export_ids = list(_claimable(timezone.now()).order_by('created_at').values_list('pk', flat=True))
+    for export_id in export_ids:
+        run_export(export_id)
+    return len(export_ids)
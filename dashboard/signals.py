@@ -0,0 +1,108 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from books.models import Book
+from loans.models import Loan, LoanHistory
+
+from . import metrics, personalization, timeseries
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Loan)
+def count_loan(sender, instance, created, raw=False, **kwargs):
+    """Nouvel emprunt : incréments ; autre modification (prolongation...) : recalcul"""
+    if raw:
+        return
+    if not created:
+        metrics.mark_stale()
+        return
+    today = timezone.localdate()
+    open_loan = instance.returned_date is None
+    metrics.adjust(
+        total_loans=1,
+        active_loans=1 if open_loan else 0,
+        overdue_loans=1 if open_loan and instance.due_date < today else 0,
+        monthly_loans=1 if timezone.localtime(instance.loan_date).date() >= today.replace(day=1) else 0,
+    )
+
+
+@receiver(post_init, sender=Loan)
+def remember_loan_dates(sender, instance, **kwargs):
+    """Mémorise l'échéance et la date de retour chargées (agrégats clos à invalider)"""
+    instance._rollup_dates = (instance.__dict__.get('due_date'), instance.__dict__.get('returned_date'))
+
+
+@receiver(post_save, sender=Loan)
+def invalidate_rollups(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """
+    Échéance modifiée (prolongation, admin) ou date de retour saisie dans le
+    passé : les agrégats clos des retards et des retours qui en dépendent sont
+    supprimés, ils seront recalculés à la lecture suivante
+    """
+    if raw or created:
+        return
+    due_date, returned_date = instance._rollup_dates
+    today = timezone.localdate()
+    if due_date is not None and (update_fields is None or 'due_date' in update_fields):
+        if instance.due_date != due_date:
+            timeseries.invalidate('overdue', since=min(due_date, instance.due_date))
+    if update_fields is None or 'returned_date' in update_fields:
+        if instance.returned_date != returned_date:
+            days = [timezone.localtime(value).date() for value in (returned_date, instance.returned_date) if value]
+            if days and min(days) < today:
+                timeseries.invalidate('returns', since=min(days))
+                timeseries.invalidate('overdue', since=instance.due_date)
+    remember_loan_dates(sender, instance)
+
+
+@receiver(post_save, sender=Loan)
+def update_affinities(sender, instance, created, raw=False, **kwargs):
+    """Nouvel emprunt : profil du lecteur incrémenté, recommandations oubliées"""
+    if created and not raw:
+        personalization.record_loan(instance.borrower_id, instance.book_id)
+        personalization.invalidate(instance.borrower_id)
+
+
+@receiver(post_delete, sender=Loan)
+def remove_affinities(sender, instance, **kwargs):
+    personalization.record_loan(instance.borrower_id, instance.book_id, sign=-1)
+    personalization.invalidate(instance.borrower_id)
+
+
+@receiver(post_save, sender=LoanHistory)
+def count_return(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.action == 'returned':
+        due_date = Loan.objects.filter(pk=instance.loan_id).values_list('due_date', flat=True).first()
+        overdue = due_date is not None and due_date < timezone.localdate()
+        metrics.adjust(active_loans=-1, overdue_loans=-1 if overdue else 0)
+
+
+@receiver(post_save, sender=Book)
+def count_book(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        metrics.adjust(total_books=1 if instance.is_active else 0)
+    else:
+        metrics.mark_stale()
+
+
+@receiver(post_save, sender=User)
+def count_user(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if created:
+        metrics.adjust(total_users=1 if instance.is_active else 0)
+    elif update_fields is None or 'is_active' in update_fields:
+        # Les connexions (update_fields=['last_login']) ne changent rien
+        metrics.mark_stale()
+
+
+@receiver(post_delete, sender=Loan)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=User)
+def recount_after_delete(sender, instance, **kwargs):
+    metrics.mark_stale()
@@ -1,4 +1,429 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import threading
 
-# Tests pour l'application dashboard
-# À implémenter selon les besoins spécifiques
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from books.models import Author, Book, Category, Publisher
+from library_project.instrumentation import QueryBudgetMixin
+from loans import services as circulation
+from loans.models import Loan
+from openpyxl import load_workbook
+from . import concurrent, metrics, personalization, reports, timeseries
+from .models import DashboardCounterShard, DashboardSnapshot, MetricRollup, ReaderAffinity, ReportExport
+
+User = get_user_model()
+
+# Tableau de bord d'administration une fois les agrégats clos enregistrés :
+# session, utilisateur, lecture des agrégats et période en cours de chaque
+# série, tendances
+WARM_ADMIN_QUERIES = 17
+
+
+class DashboardSnapshotTest(TestCase):
+    """Tests de l'instantané des compteurs du tableau de bord"""
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.reader = User.objects.create_user(username='reader', password='testpass123')
+        self.book = Book.objects.create(
+            title='Test Book',
+            isbn='1234567890123',
+            publisher=Publisher.objects.create(name='Test Publisher'),
+            category=Category.objects.create(name='Test Category'),
+            publication_date='2023-01-01',
+            pages=100,
+            summary='Test summary',
+            total_copies=2,
+            available_copies=2
+        )
+
+    def test_circulation_updates_counters_incrementally(self):
+        before = metrics.get_snapshot()
+        self.assertEqual(before['total_books'], 1)
+        self.assertEqual(before['active_loans'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            loan = circulation.borrow(self.book, self.reader)
+        after_borrow = metrics.get_snapshot()
+        self.assertEqual(after_borrow['active_loans'], 1)
+        self.assertEqual(after_borrow['monthly_loans'], 1)
+        self.assertGreater(after_borrow['version'], before['version'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            circulation.return_loan(loan)
+        self.assertEqual(metrics.get_snapshot()['active_loans'], 0)
+        incremental = metrics.get_snapshot()
+        recounted = metrics.reconcile()
+        self.assertEqual(
+            {name: incremental[name] for name in metrics.COUNTERS},
+            {name: recounted[name] for name in metrics.COUNTERS}
+        )
+
+    def test_increments_are_spread_over_shards(self):
+        self.addCleanup(setattr, metrics._local, 'shard', None)
+        with override_settings(DASHBOARD_STATS_SHARDS=4):
+            metrics.get_snapshot()
+            for shard in range(4):
+                metrics._local.shard = shard
+                with self.captureOnCommitCallbacks(execute=True):
+                    metrics.adjust(total_loans=1)
+            self.assertEqual(list(DashboardCounterShard.objects.values_list('total_loans', flat=True)), [1] * 4)
+            self.assertEqual(DashboardSnapshot.objects.get().total_loans, 0)
+            self.assertEqual(metrics.get_snapshot()['total_loans'], 4)
+            metrics.reconcile()
+            self.assertEqual(set(DashboardCounterShard.objects.values_list('total_loans', flat=True)), {0})
+
+    def test_cached_snapshot_avoids_queries(self):
+        metrics.get_snapshot()
+        with self.assertNumQueries(0):
+            metrics.get_snapshot()
+
+    def test_other_changes_force_recount(self):
+        metrics.get_snapshot()
+        self.book.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.save()
+        self.assertEqual(metrics.get_snapshot()['total_books'], 0)
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_stats_endpoint_etag(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('dashboard:stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_books'], 1)
+        etag = response['ETag']
+
+        response = self.client.get(reverse('dashboard:stats'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            circulation.borrow(self.book, self.reader)
+        response = self.client.get(reverse('dashboard:stats'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['active_loans'], 1)
+
+    def test_stats_endpoint_requires_staff(self):
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.get(reverse('dashboard:stats')).status_code, 403)
+
+    async def test_stats_endpoint_under_asgi(self):
+        await sync_to_async(self.async_client.force_login)(self.staff)
+        response = await self.async_client.get(reverse('dashboard:stats'))
+        self.assertEqual(response.json()['total_books'], 1)
+        response = await self.async_client.get(
+            reverse('dashboard:stats'), headers={'if-none-match': response['ETag']}
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class DashboardViewsTest(QueryBudgetMixin, TestCase):
+    """Tests des vues asynchrones du tableau de bord"""
+
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.reader = User.objects.create_user(username='reader', password='testpass123')
+        self.book = Book.objects.create(
+            title='Livre emprunté', isbn='1234567890123',
+            publisher=Publisher.objects.create(name='Test Publisher'),
+            category=Category.objects.create(name='Test Category'),
+            publication_date='2023-01-01', pages=100, summary='Résumé',
+            total_copies=2, available_copies=2,
+        )
+        circulation.borrow(self.book, self.reader)
+
+    def test_user_and_staff_home(self):
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('dashboard:home'))
+        self.assertWithinQueryBudget(response)
+        self.assertTrue(response.context['is_user_dashboard'])
+        self.assertEqual(len(response.context['active_loans']), 1)
+        self.assertContains(response, 'Livre emprunté')
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('dashboard:home'))
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(response.context['active_loans'], 1)
+        self.assertEqual(response.context['total_users'], 2)
+
+    def test_admin_dashboard(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('dashboard:admin'), {'granularity': 'day'})
+        # Premier affichage : agrégats clos de l'année calculés et enregistrés
+        self.assertWithinQueryBudget(response)
+        self.assertEqual(response.context['series_rows'][-1]['loans'], 1)
+        self.assertEqual(response.context['monthly_data'][-1]['loans'], 1)
+        self.assertEqual([books for _, books in response.context['trending_books']], [[self.book]] * 3)
+        # Affichages suivants : agrégats clos relus, seule la période en cours est comptée
+        response = self.client.get(reverse('dashboard:admin'), {'granularity': 'day'})
+        self.assertWithinQueryBudget(response, budget=WARM_ADMIN_QUERIES)
+
+        self.client.force_login(self.reader)
+        self.assertRedirects(self.client.get(reverse('dashboard:admin')), reverse('dashboard:home'))
+        self.client.logout()
+        response = self.client.get(reverse('dashboard:admin'))
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class PersonalizationTest(TestCase):
+    """Tests des affinités des lecteurs et des recommandations personnalisées"""
+
+    def setUp(self):
+        cache.clear()
+        publisher = Publisher.objects.create(name='Test Publisher')
+        self.fantasy = Category.objects.create(name='Fantasy')
+        self.cooking = Category.objects.create(name='Cuisine')
+        self.tolkien = Author.objects.create(first_name='John', last_name='Tolkien')
+        self.books = {}
+        for i, (name, category, language) in enumerate([
+            ('hobbit', self.fantasy, 'Anglais'), ('anneaux', self.fantasy, 'Anglais'),
+            ('silmarillion', self.fantasy, 'Anglais'), ('dragons', self.fantasy, 'Français'),
+            ('sorciers', self.fantasy, 'Français'), ('tartes', self.cooking, 'Français'),
+        ]):
+            self.books[name] = Book.objects.create(
+                title=f'Livre {name}', isbn=f'97800000002{i:02d}', publisher=publisher,
+                category=category, language=language, publication_date='2023-01-01', pages=100,
+                summary='Résumé', total_copies=10, available_copies=10,
+            )
+        for name in ('hobbit', 'anneaux', 'silmarillion'):
+            self.books[name].authors.add(self.tolkien)
+        self.reader = User.objects.create_user(username='reader', password='testpass123')
+        self.others = [User.objects.create_user(username=f'other{i}', password='testpass123') for i in range(3)]
+        # « dragons » et « tartes » sont populaires, pas « sorciers »
+        for other in self.others:
+            self.borrow(other, 'dragons', 'tartes')
+        self.borrow(self.reader, 'hobbit', 'anneaux')
+
+    def borrow(self, reader, *names):
+        for name in names:
+            circulation.borrow(self.books[name], reader, max_active_loans=None)
+
+    def profile(self, user):
+        return sorted(ReaderAffinity.objects.filter(user=user).values_list('kind', 'key', 'weight'))
+
+    def test_affinities_are_incremental(self):
+        self.assertEqual(self.profile(self.reader), [
+            ('author', str(self.tolkien.pk), 2),
+            ('category', str(self.fantasy.pk), 2),
+            ('language', 'Anglais', 2),
+        ])
+        incremental = {user.pk: self.profile(user) for user in [self.reader, *self.others]}
+        call_command('rebuild_reader_affinities', stdout=io.StringIO())
+        self.assertEqual({user.pk: self.profile(user) for user in [self.reader, *self.others]}, incremental)
+
+        self.borrow(self.others[0], 'sorciers')
+        favorites = personalization.favorite_categories(self.others[0])
+        self.assertEqual([(c.name, c.loan_count) for c in favorites], [('Fantasy', 2), ('Cuisine', 1)])
+
+    def test_recommendations(self):
+        titles = [book.title for book in personalization.recommended_books(self.reader)]
+        # Déjà empruntés exclus ; auteur et langue préférés d'abord, puis la popularité
+        self.assertEqual(titles, ['Livre silmarillion', 'Livre dragons', 'Livre sorciers'])
+        self.assertEqual(personalization.recommended_books(User.objects.create_user(username='new')), [])
+
+    def test_cache_is_invalidated_by_new_loans(self):
+        with self.assertNumQueries(4):
+            personalization.recommended_books(self.reader)
+        with self.assertNumQueries(1):
+            personalization.recommended_books(self.reader)
+        # Invalidation pas encore visible (autre worker) : filtré à la lecture
+        self.borrow(self.reader, 'silmarillion')
+        titles = [book.title for book in personalization.recommended_books(self.reader)]
+        self.assertEqual(titles, ['Livre dragons', 'Livre sorciers'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.borrow(self.reader, 'sorciers')
+        titles = [book.title for book in personalization.recommended_books(self.reader)]
+        self.assertEqual(titles, ['Livre dragons'])
+
+        self.client.force_login(self.reader)
+        response = self.client.get(reverse('dashboard:home'))
+        self.assertContains(response, 'Recommandés pour vous')
+        self.assertEqual(response.context['recommended_books'][0].title, 'Livre dragons')
+
+
+class ConcurrentQueriesTest(SimpleTestCase):
+    """Tests de l'exécution parallèle des requêtes indépendantes"""
+
+    def test_thunks_run_in_the_pool(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def thunk(value):
+            # Les trois fonctions doivent s'exécuter en même temps pour franchir la barrière
+            barrier.wait()
+            return value
+
+        with override_settings(DASHBOARD_QUERY_WORKERS=3):
+            results = concurrent.run_all({name: lambda name=name: thunk(name) for name in 'abc'})
+        self.assertEqual(results, {'a': 'a', 'b': 'b', 'c': 'c'})
+
+    def test_sequential_without_workers(self):
+        with override_settings(DASHBOARD_QUERY_WORKERS=0):
+            results = async_to_sync(concurrent.gather)({'thread': lambda: threading.current_thread()})
+        self.assertIs(results['thread'], threading.main_thread())
+
+
+class TimeSeriesTest(TestCase):
+    """Tests du moteur de séries temporelles"""
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader', password='testpass123')
+        self.book = Book.objects.create(
+            title='Test Book',
+            isbn='1234567890123',
+            publisher=Publisher.objects.create(name='Test Publisher'),
+            category=Category.objects.create(name='Test Category'),
+            publication_date='2023-01-01',
+            pages=100,
+            summary='Test summary',
+            total_copies=5,
+            available_copies=5
+        )
+        tz = timezone.get_current_timezone()
+        for day, due in [((2024, 1, 31), (2024, 2, 14)), ((2024, 3, 1), (2024, 3, 15)), ((2024, 3, 20), (2024, 4, 3))]:
+            Loan.objects.create(
+                book=self.book, borrower=self.reader,
+                loan_date=datetime.datetime(*day, 10, tzinfo=tz),
+                due_date=datetime.date(*due),
+                returned_date=datetime.datetime(*due, 12, tzinfo=tz) + datetime.timedelta(days=2),
+            )
+        self.today = datetime.date(2024, 3, 25)
+
+    def test_monthly_series_has_every_month(self):
+        rows = timeseries.series('loans', datetime.date(2023, 12, 15), datetime.date(2024, 3, 25), 'month', self.today)
+        self.assertEqual(rows, [
+            (datetime.date(2023, 12, 1), 0),
+            (datetime.date(2024, 1, 1), 1),
+            (datetime.date(2024, 2, 1), 0),
+            (datetime.date(2024, 3, 1), 2),
+        ])
+
+    def test_closed_periods_are_rolled_up_once(self):
+        start, end = datetime.date(2024, 1, 1), datetime.date(2024, 3, 25)
+        timeseries.series('returns', start, end, 'month', self.today)
+        self.assertEqual(MetricRollup.objects.filter(metric='returns').count(), 2)
+        Loan.objects.filter(loan_date__month=1).update(returned_date=None)
+        # Janvier et février sont lus dans la table d'agrégats, mars est recalculé
+        with self.assertNumQueries(2):
+            rows = timeseries.series('returns', start, end, 'month', self.today)
+        self.assertEqual([value for _, value in rows], [0, 1, 1])
+
+    def test_weekly_and_overdue_series(self):
+        rows = timeseries.series('loans', datetime.date(2024, 3, 18), datetime.date(2024, 3, 24), 'week', self.today)
+        self.assertEqual(rows, [(datetime.date(2024, 3, 18), 1)])
+        overdue = dict(timeseries.series('overdue', datetime.date(2024, 1, 1), self.today, 'month', self.today))
+        self.assertEqual(overdue[datetime.date(2024, 2, 1)], 1)
+        self.assertEqual(overdue[datetime.date(2024, 3, 1)], 1)
+
+
+    def test_changed_due_date_invalidates_overdue_rollups(self):
+        """Une échéance repoussée (prolongation, admin) fait recalculer les périodes closes touchées"""
+        start = datetime.date(2024, 1, 1)
+        overdue = dict(timeseries.series('overdue', start, self.today, 'month', self.today))
+        self.assertEqual(overdue[datetime.date(2024, 2, 1)], 1)
+        loan = Loan.objects.get(due_date=datetime.date(2024, 2, 14))
+        loan.due_date = datetime.date(2024, 3, 20)
+        loan.save()
+        self.assertFalse(MetricRollup.objects.filter(metric='overdue', period_start__gte=datetime.date(2024, 2, 1)).exists())
+        overdue = dict(timeseries.series('overdue', start, self.today, 'month', self.today))
+        self.assertEqual(overdue[datetime.date(2024, 2, 1)], 0)
+        # Les périodes antérieures sont conservées
+        self.assertTrue(MetricRollup.objects.filter(metric='overdue', period_start=start).exists())
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ReportsTest(TestCase):
+    """Tests des rapports exportables"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.reader = User.objects.create_user(username='reader', password='testpass123')
+        publisher = Publisher.objects.create(name='Test Publisher')
+        self.novels = Category.objects.create(name='Romans')
+        self.essays = Category.objects.create(name='Essais')
+        self.books = [
+            Book.objects.create(
+                title=f'Livre {i}', isbn=f'978000000000{i}', publisher=publisher,
+                category=self.novels if i % 2 else self.essays,
+                publication_date='2023-01-01', pages=100, summary='Résumé',
+                total_copies=2, available_copies=2,
+            )
+            for i in range(4)
+        ]
+        for book in self.books:
+            circulation.borrow(book, self.reader)
+        self.client.force_login(self.staff)
+
+    def test_csv_is_streamed_with_filters(self):
+        response = self.client.get(reverse('dashboard:loans_report'), {'format': 'csv', 'category': self.novels.pk})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').strip().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('N°;Livre'))
+
+        tomorrow = (timezone.localdate() + datetime.timedelta(days=1)).isoformat()
+        response = self.client.get(reverse('dashboard:loans_report'), {'format': 'csv', 'start': tomorrow})
+        self.assertEqual(len(b''.join(response.streaming_content).decode('utf-8-sig').strip().splitlines()), 1)
+
+    def test_xlsx_and_pdf(self):
+        response = self.client.get(reverse('dashboard:books_report'), {'format': 'xlsx'})
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual(sheet.max_row, 5)
+        self.assertEqual(sheet.cell(1, 3).value, 'Auteurs')
+
+        response = self.client.get(reverse('dashboard:users_report'), {'format': 'pdf', 'category': self.essays.pk})
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_large_reports_run_in_background(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(REPORTS_BACKGROUND_ROWS=2, REPORTS_BACKGROUND_WORKERS=0, MEDIA_ROOT=media_root):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.get(reverse('dashboard:loans_report'), {'format': 'csv'})
+            export = ReportExport.objects.get()
+            self.assertRedirects(response, reverse('dashboard:report_export', args=[export.pk]))
+            export.refresh_from_db()
+            self.assertEqual((export.status, export.row_count), ('done', 4))
+            response = self.client.get(reverse('dashboard:report_export', args=[export.pk]), {'download': 1})
+            self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 5)
+
+    def test_exports_lost_by_a_worker_are_resumed(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        now = timezone.now()
+        pending, stale, running = (
+            ReportExport.objects.create(report='books', format='csv', requested_by=self.staff, **fields)
+            for fields in (
+                {},
+                {'status': 'running', 'started_at': now - datetime.timedelta(hours=2)},
+                {'status': 'running', 'started_at': now},
+            )
+        )
+        with override_settings(MEDIA_ROOT=media_root, REPORTS_EXPORT_TIMEOUT=3600):
+            call_command('resume_report_exports', stdout=io.StringIO())
+            # Export déjà pris par un autre worker : ignoré
+            reports.run_export(pending.pk)
+        for export in (pending, stale, running):
+            export.refresh_from_db()
+        self.assertEqual([pending.status, stale.status, running.status], ['done', 'done', 'running'])
+        self.assertEqual(len(os.listdir(os.path.join(media_root, 'reports'))), 2)
+
+    def test_preview_and_permissions(self):
+        response = self.client.get(reverse('dashboard:users_report'))
+        self.assertContains(response, 'reader')
+        self.client.force_login(self.reader)
+        self.assertRedirects(
+            self.client.get(reverse('dashboard:books_report')), reverse('dashboard:home'),
+            fetch_redirect_response=False,
+        )
@@ -0,0 +1,198 @@
+"""
+Séries temporelles du tableau de bord.
+
+Chaque métrique (emprunts, retours, nouveaux membres, réservations, retards)
+est agrégée par période (jour, semaine, mois, année) en une seule requête
+groupée ``Trunc*``. Les périodes closes sont conservées dans ``MetricRollup``
+et ne sont pas recalculées ; seule la période en cours (et les suivantes)
+est calculée à chaque lecture. Une modification qui change une période close
+(échéance prolongée, date de retour saisie après coup) supprime les agrégats
+concernés (``invalidate``, appelé par les signaux de ``Loan``).
+
+Les bornes d'une plage sont alignées sur les périodes : une série mensuelle
+du 15 janvier au 10 mars couvre janvier, février et mars entiers.
+"""
+import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, DateField, F, Q
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek, TruncYear
+from django.utils import timezone
+
+from loans.models import Loan, Reservation
+
+from .models import MetricRollup
+
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+METRIC_LABELS = {
+    'loans': 'Emprunts',
+    'returns': 'Retours',
+    'new_members': 'Nouveaux membres',
+    'reservations': 'Réservations',
+    'overdue': 'Retards',
+}
+
+
+def _metric_source(metric, today):
+    """(queryset, champ daté) d'une métrique"""
+    if metric == 'loans':
+        return Loan.objects.all(), 'loan_date'
+    if metric == 'returns':
+        return Loan.objects.filter(returned_date__isnull=False), 'returned_date'
+    if metric == 'new_members':
+        return get_user_model().objects.all(), 'date_joined'
+    if metric == 'reservations':
+        return Reservation.objects.all(), 'reserved_date'
+    if metric == 'overdue':
+        # Emprunts dont l'échéance tombe dans la période et qui ont été rendus
+        # en retard ou ne sont toujours pas rendus à échéance dépassée
+        return Loan.objects.filter(
+            Q(returned_date__date__gt=F('due_date')) |
+            Q(returned_date__isnull=True, due_date__lt=today)
+        ), 'due_date'
+    raise ValueError(f"Métrique inconnue : {metric}")
+
+
+def bucket_start(day, granularity):
+    """Début de la période contenant ``day``"""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    raise ValueError(f"Granularité inconnue : {granularity}")
+
+
+def next_bucket(start, granularity):
+    """Début de la période suivante"""
+    if granularity == 'day':
+        return start + datetime.timedelta(days=1)
+    if granularity == 'week':
+        return start + datetime.timedelta(days=7)
+    if granularity == 'month':
+        return (start + datetime.timedelta(days=32)).replace(day=1)
+    return start.replace(year=start.year + 1)
+
+
+def buckets(start, end, granularity):
+    """Débuts des périodes couvrant [start, end]"""
+    current = bucket_start(start, granularity)
+    result = []
+    while current <= end:
+        result.append(current)
+        current = next_bucket(current, granularity)
+    return result
+
+
+def _to_date(value):
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value
+
+
+def _midnight(day):
+    """Début de la journée ``day`` (heure locale)"""
+    moment = datetime.datetime.combine(day, datetime.time.min)
+    return timezone.make_aware(moment) if settings.USE_TZ else moment
+
+
+def aggregate(metric, start, end, granularity, today=None):
+    """
+    Compte une métrique par période sur [start, end[ en une requête groupée.
+    Retourne {début de période: nombre}.
+    """
+    today = today or timezone.localdate()
+    queryset, field = _metric_source(metric, today)
+    is_datetime = queryset.model._meta.get_field(field).get_internal_type() == 'DateTimeField'
+    if is_datetime:
+        # Bornes à minuit local plutôt que ``__date`` : intervalle sur l'index
+        # de la colonne au lieu d'une conversion de chaque ligne de la table
+        start, end = _midnight(start), _midnight(end)
+    trunc = GRANULARITIES[granularity](field, output_field=DateField())
+    rows = (
+        queryset.filter(**{f'{field}__gte': start, f'{field}__lt': end})
+        .order_by()
+        .annotate(period=trunc)
+        .values('period')
+        .annotate(total=Count('pk'))
+    )
+    return {_to_date(row['period']): row['total'] for row in rows}
+
+
+def series(metric, start, end, granularity='month', today=None):
+    """
+    Série [(début de période, nombre)] d'une métrique, périodes vides comprises.
+    Les périodes closes viennent de ``MetricRollup`` (calculées une fois).
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularité inconnue : {granularity}")
+    today = today or timezone.localdate()
+    periods = buckets(start, end, granularity)
+    if not periods:
+        return []
+    current = bucket_start(today, granularity)
+    closed = [p for p in periods if p < current]
+    live = [p for p in periods if p >= current]
+    values = {}
+    missing = []
+
+    if closed:
+        values.update(
+            MetricRollup.objects.filter(
+                metric=metric, granularity=granularity, period_start__in=closed
+            ).values_list('period_start', 'value')
+        )
+        missing = [p for p in closed if p not in values]
+
+    # Périodes closes manquantes et période en cours : une seule requête groupée
+    counted = missing + live
+    if counted:
+        computed = aggregate(metric, counted[0], next_bucket(counted[-1], granularity), granularity, today)
+        if missing:
+            rollups = [
+                MetricRollup(metric=metric, granularity=granularity, period_start=p, value=computed.get(p, 0))
+                for p in missing
+            ]
+            MetricRollup.objects.bulk_create(rollups, ignore_conflicts=True)
+        values.update((p, computed.get(p, 0)) for p in counted)
+
+    return [(p, values.get(p, 0)) for p in periods]
+
+
+def table(metrics, start, end, granularity='month', today=None):
+    """Lignes {period, <métrique>: nombre...} pour plusieurs métriques"""
+    columns = {metric: series(metric, start, end, granularity, today) for metric in metrics}
+    return merge(columns, start, end, granularity)
+
+
+def merge(columns, start, end, granularity='month'):
+    """Lignes de ``table`` à partir des séries déjà calculées {métrique: série}"""
+    columns = {metric: dict(rows) for metric, rows in columns.items()}
+    metrics = list(columns)
+    return [
+        {'period': period, **{metric: columns[metric][period] for metric in metrics}}
+        for period in buckets(start, end, granularity)
+    ]
+
+
+def invalidate(metric=None, since=None):
+    """Supprime des agrégats clos (données historiques corrigées) ; ils seront recalculés"""
+    rollups = MetricRollup.objects.all()
+    if metric:
+        rollups = rollups.filter(metric=metric)
+    if since:
+        condition = Q()
+        for granularity in GRANULARITIES:
+            condition |= Q(granularity=granularity, period_start__gte=bucket_start(since, granularity))
+        rollups = rollups.filter(condition)
+    return rollups.delete()[0]
@@ -7,4 +7,9 @@ urlpatterns = [
     path('', views.DashboardHomeView.as_view(), name='home'),
     path('admin/', views.AdminDashboardView.as_view(), name='admin'),
     path('stats/', views.dashboard_stats, name='stats'),
+    path('stats/timeseries/', views.timeseries_data, name='timeseries'),
+    path('reports/books/', views.books_report, name='books_report'),
+    path('reports/loans/', views.loans_report, name='loans_report'),
+    path('reports/users/', views.users_report, name='users_report'),
+    path('reports/exports/<int:pk>/', views.report_export, name='report_export'),
 ]
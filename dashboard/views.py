@@ -1,169 +1,253 @@
-from django.shortcuts import render, redirect
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.views import redirect_to_login
 from django.views.generic import TemplateView
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Count, Q, Avg
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
 from datetime import timedelta, datetime
+from functools import partial, wraps
+from itertools import islice
+from books import trending
 from books.models import Book, Category
 from loans.models import Loan
-from accounts.models import CustomUser
+from . import concurrent, metrics, personalization, reports, timeseries
+from .models import ReportExport
+
+
+async def _load_user(request):
+    """Charge l'utilisateur de la session hors de la boucle (``request.user`` est paresseux)"""
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
+
 
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """``LoginRequiredMixin`` pour les vues asynchrones"""
 
-class DashboardHomeView(LoginRequiredMixin, TemplateView):
-    """Vue principale du tableau de bord"""
+    async def dispatch(self, request, *args, **kwargs):
+        await _load_user(request)
+        response = super().dispatch(request, *args, **kwargs)
+        if asyncio.iscoroutine(response):
+            response = await response
+        return response
+
+
+class DashboardHomeView(AsyncLoginRequiredMixin, TemplateView):
+    """Vue principale du tableau de bord (requêtes indépendantes exécutées en parallèle)"""
     template_name = 'dashboard/home.html'
     
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        user = self.request.user
+    async def get(self, request, *args, **kwargs):
+        context = self.get_context_data(**kwargs)
+        user = request.user
         
         if user.is_staff:
             # Statistiques pour les administrateurs
-            context.update(self.get_admin_stats())
+            stats = await concurrent.gather(self.get_admin_stats())
+            counters = stats.pop('counters')
+            context.update({name: counters[name] for name in metrics.COUNTERS}, **stats)
+            context['is_admin_dashboard'] = True
         else:
             # Statistiques pour les utilisateurs
-            context.update(self.get_user_stats(user))
+            context.update(await concurrent.gather(self.get_user_stats(user)))
+            context['is_user_dashboard'] = True
         
-        return context
+        return self.render_to_response(context)
     
     def get_user_stats(self, user):
-        """Statistiques pour un utilisateur normal"""
+        """Requêtes des statistiques d'un utilisateur normal : {nom: fonction}"""
         # Emprunts de l'utilisateur
         user_loans = Loan.objects.filter(borrower=user)
-        active_loans = user_loans.filter(returned_date__isnull=True)
-        overdue_loans = active_loans.filter(due_date__lt=timezone.now().date())
         
         # Livres récemment ajoutés
-        recent_books = Book.objects.filter(is_active=True).order_by('-created_at')[:6]
+        recent_books = Book.objects.filter(is_active=True).prefetch_related('authors').order_by('-created_at')[:6]
         
-        # Livres populaires
-        popular_books = Book.objects.filter(is_active=True).annotate(
-            loan_count=Count('loan')
-        ).order_by('-loan_count')[:6]
+        # Tendances du mois (emprunts pondérés par leur ancienneté, tri indexé) ;
+        # les plus empruntés depuis toujours tant qu'aucun emprunt n'est récent
+        def popular_books():
+            books = list(trending.trending_books('month').annotate(
+                loan_count=F('stats__loan_count')
+            ).prefetch_related('authors')[:6])
+            return books or list(trending.trending_books('all').annotate(
+                loan_count=F('stats__loan_count')
+            ).prefetch_related('authors')[:6])
         
         return {
-            'total_loans': user_loans.count(),
-            'active_loans': active_loans,
-            'overdue_loans': overdue_loans,
-            'recent_books': recent_books,
+            'total_loans': user_loans.count,
+            'active_loans': lambda: list(
+                user_loans.active().select_related('book').prefetch_related('book__authors')
+            ),
+            'overdue_loans': user_loans.overdue().count,
+            'recent_books': lambda: list(recent_books),
             'popular_books': popular_books,
-            'is_user_dashboard': True,
+            # Recommandations du lecteur (en cache jusqu'à son prochain emprunt)
+            'recommended_books': lambda: personalization.recommended_books(user),
         }
     
     def get_admin_stats(self):
-        """Statistiques pour les administrateurs"""
-        today = timezone.now().date()
-        this_month = today.replace(day=1)
-        
-        # Statistiques générales
-        total_books = Book.objects.filter(is_active=True).count()
-        total_users = CustomUser.objects.filter(is_active=True).count()
-        total_loans = Loan.objects.count()
-        active_loans = Loan.objects.filter(returned_date__isnull=True).count()
-        overdue_loans = Loan.objects.filter(
-            returned_date__isnull=True,
-            due_date__lt=today
-        ).count()
-        
-        # Statistiques du mois
-        monthly_loans = Loan.objects.filter(
-            loan_date__gte=this_month
-        ).count()
-        
-        # Livres les plus empruntés
-        popular_books = Book.objects.annotate(
-            loan_count=Count('loan')
-        ).order_by('-loan_count')[:5]
-        
-        # Catégories les plus populaires
-        popular_categories = Category.objects.annotate(
-            book_count=Count('book')
-        ).order_by('-book_count')[:5]
+        """Requêtes des statistiques pour les administrateurs : {nom: fonction}"""
+        # Livres en tendance cette semaine (tri indexé)
+        popular_books = trending.trending_books('week').annotate(loan_count=F('stats__loan_count'))[:5]
         
         # Emprunts récents
         recent_loans = Loan.objects.select_related(
             'book', 'borrower'
-        ).order_by('-loan_date')[:10]
+        ).prefetch_related('book__authors').order_by('-loan_date')[:10]
         
         return {
-            'total_books': total_books,
-            'total_users': total_users,
-            'total_loans': total_loans,
-            'active_loans': active_loans,
-            'overdue_loans': overdue_loans,
-            'monthly_loans': monthly_loans,
-            'popular_books': popular_books,
-            'popular_categories': popular_categories,
-            'recent_loans': recent_loans,
-            'is_admin_dashboard': True,
+            # Statistiques générales et du mois (instantané précalculé)
+            'counters': metrics.get_snapshot,
+            'popular_books': lambda: list(popular_books),
+            # Catégories en tendance ce mois-ci (compteurs par catégorie)
+            'popular_categories': partial(trending.trending_categories, 'month'),
+            'recent_loans': lambda: list(recent_loans),
         }
 
 
-class AdminDashboardView(LoginRequiredMixin, TemplateView):
+class AdminDashboardView(AsyncLoginRequiredMixin, TemplateView):
     """Tableau de bord administrateur avancé"""
     template_name = 'dashboard/admin.html'
     
-    def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_staff:
+    async def dispatch(self, request, *args, **kwargs):
+        user = await _load_user(request)
+        if not user.is_staff:
             messages.error(request, "Accès non autorisé.")
             return redirect('dashboard:home')
-        return super().dispatch(request, *args, **kwargs)
+        return await super().dispatch(request, *args, **kwargs)
     
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+    async def get(self, request, *args, **kwargs):
+        context = self.get_context_data(**kwargs)
         
         # Statistiques détaillées
-        context.update(self.get_detailed_stats())
+        context.update(await self.get_detailed_stats())
         
-        return context
+        return self.render_to_response(context)
     
-    def get_detailed_stats(self):
-        """Statistiques détaillées pour l'administration"""
-        today = timezone.now().date()
-        
+    async def get_detailed_stats(self):
+        """Statistiques détaillées pour l'administration (une série par requête parallèle)"""
+        granularity, start, end = series_range(self.request.GET)
+        monthly_range = default_range()
+        queries = {
+            metric: partial(timeseries.series, metric, start, end, granularity)
+            for metric in timeseries.METRIC_LABELS
+        }
         # Graphiques et données pour les derniers 12 mois
-        monthly_data = []
-        for i in range(12):
-            month_start = (today.replace(day=1) - timedelta(days=i*30)).replace(day=1)
-            month_end = (month_start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
-            
-            loans_count = Loan.objects.filter(
-                loan_date__gte=month_start,
-                loan_date__lte=month_end
-            ).count()
-            
-            monthly_data.append({
-                'month': month_start.strftime('%Y-%m'),
-                'loans': loans_count
-            })
+        queries['monthly'] = partial(timeseries.series, 'loans', *monthly_range, 'month')
+        # Livres en tendance par période (lectures d'index)
+        for period in trending.PERIODS:
+            queries[f'trending_{period}'] = partial(_trending_titles, period)
+        columns = await concurrent.gather(queries)
+        trending_books = [
+            (label, columns.pop(f'trending_{period}')) for period, label in trending.PERIODS.items()
+        ]
+        
+        monthly_data = [
+            {'month': period.strftime('%Y-%m'), 'loans': value}
+            for period, value in columns.pop('monthly')
+        ]
         
         return {
-            'monthly_data': list(reversed(monthly_data)),
+            'trending_books': trending_books,
+            'monthly_data': monthly_data,
+            'series_rows': timeseries.merge(columns, start, end, granularity),
+            'series_metrics': timeseries.METRIC_LABELS,
+            'granularity': granularity,
+            'granularities': GRANULARITY_LABELS,
+            'series_start': start,
+            'series_end': end,
         }
 
 
-@login_required
-def dashboard_stats(request):
-    """API endpoint pour les statistiques en temps réel"""
-    if not request.user.is_staff:
+def _trending_titles(period, limit=5):
+    return list(trending.trending_books(period).only('pk', 'title')[:limit])
+
+
+GRANULARITY_LABELS = {
+    'day': 'Jour',
+    'week': 'Semaine',
+    'month': 'Mois',
+    'year': 'Année',
+}
+
+
+def default_range():
+    """Les 12 derniers mois, mois courant compris"""
+    today = timezone.localdate()
+    start = today.replace(day=1)
+    for _ in range(11):
+        start = (start - timedelta(days=1)).replace(day=1)
+    return start, today
+
+
+def series_range(params):
+    """Granularité et bornes demandées (?granularity=&start=&end=), 12 derniers mois par défaut"""
+    granularity = params.get('granularity', 'month')
+    if granularity not in timeseries.GRANULARITIES:
+        granularity = 'month'
+    start, end = default_range()
+    try:
+        if params.get('start'):
+            start = datetime.strptime(params['start'], '%Y-%m-%d').date()
+        if params.get('end'):
+            end = datetime.strptime(params['end'], '%Y-%m-%d').date()
+    except ValueError:
+        start, end = default_range()
+    # Limite le nombre de périodes affichées (une ligne par jour sur dix ans...)
+    if len(timeseries.buckets(start, end, granularity)) > 366:
+        start = end - timedelta(days=365)
+    return granularity, min(start, end), end
+
+
+def _staff_only(view):
+    """Refuse l'API aux non-administrateurs avant tout calcul d'ETag"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_staff:
+            return JsonResponse({'error': 'Unauthorized'}, status=403)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+async def dashboard_stats(request):
+    """API endpoint pour les statistiques en temps réel (304 si rien n'a changé)"""
+    user = await _load_user(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    if not user.is_staff:
         return JsonResponse({'error': 'Unauthorized'}, status=403)
+    counters = await metrics.aget_snapshot()
+    etag = quote_etag(metrics.etag(counters))
     
-    today = timezone.now().date()
-    
-    stats = {
-        'total_books': Book.objects.filter(is_active=True).count(),
-        'total_users': CustomUser.objects.filter(is_active=True).count(),
-        'active_loans': Loan.objects.filter(returned_date__isnull=True).count(),
-        'overdue_loans': Loan.objects.filter(
-            returned_date__isnull=True,
-            due_date__lt=today
-        ).count(),
-    }
-    
-    return JsonResponse(stats)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({
+            'total_books': counters['total_books'],
+            'total_users': counters['total_users'],
+            'active_loans': counters['active_loans'],
+            'overdue_loans': counters['overdue_loans'],
+        })
+    response['ETag'] = etag
+    # Le navigateur revalide à chaque interrogation (If-None-Match)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+@_staff_only
+def timeseries_data(request):
+    """Séries temporelles au format JSON (graphiques)"""
+    granularity, start, end = series_range(request.GET)
+    metrics_requested = [m for m in request.GET.getlist('metric') if m in timeseries.METRIC_LABELS]
+    rows = timeseries.table(metrics_requested or list(timeseries.METRIC_LABELS), start, end, granularity)
+    for row in rows:
+        row['period'] = row['period'].isoformat()
+    return JsonResponse({'granularity': granularity, 'rows': rows})
 
 
 @login_required
@@ -174,14 +258,10 @@ def user_profile(request):
     # Statistiques de l'utilisateur
     user_loans = Loan.objects.filter(borrower=user)
     total_loans = user_loans.count()
-    active_loans = user_loans.filter(returned_date__isnull=True)
+    active_loans = user_loans.active()
     
-    # Catégories préférées
-    favorite_categories = Category.objects.filter(
-        book__loan__borrower=user
-    ).annotate(
-        loan_count=Count('book__loan')
-    ).order_by('-loan_count')[:5]
+    # Catégories préférées (profil d'affinités, sans agrégat sur les emprunts)
+    favorite_categories = personalization.favorite_categories(user, limit=5)
     
     context = {
         'user': user,
@@ -193,26 +273,85 @@ def user_profile(request):
     return render(request, 'dashboard/user_profile.html', context)
 
 
-# Vues pour les rapports (à implémenter selon les besoins)
+# Rapports exportables (CSV, XLSX, PDF)
+def report_filters(params):
+    """Filtres d'un rapport (?start=&end=&category=), ignorés s'ils sont invalides"""
+    filters = {}
+    for key in ('start', 'end'):
+        try:
+            filters[key] = datetime.strptime(params.get(key, ''), '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    if params.get('category', '').isdigit():
+        filters['category'] = int(params['category'])
+    return filters
+
+
+def _report(request, name):
+    """Aperçu d'un rapport, export direct ou export en arrière-plan selon sa taille"""
+    if not request.user.is_staff:
+        return redirect('dashboard:home')
+    filters = report_filters(request.GET)
+    format_name = request.GET.get('format')
+    row_count = reports.count(name, filters)
+
+    if format_name in reports.FORMATS:
+        if row_count > reports.background_threshold():
+            export = ReportExport.objects.create(
+                report=name, format=format_name, filters=reports.serialize_filters(filters),
+                row_count=row_count, requested_by=request.user,
+            )
+            transaction.on_commit(lambda: reports.schedule_export(export))
+            messages.info(request, f"{row_count} lignes : le fichier est préparé en arrière-plan.")
+            return redirect('dashboard:report_export', pk=export.pk)
+        content_type, _ = reports.FORMATS[format_name]
+        if format_name == 'csv':
+            response = StreamingHttpResponse(reports.csv_chunks(name, filters), content_type=content_type)
+            response['Content-Disposition'] = f'attachment; filename="{reports.filename(name, format_name)}"'
+            return response
+        return FileResponse(
+            reports.write_to_tempfile(name, filters, format_name),
+            as_attachment=True, filename=reports.filename(name, format_name), content_type=content_type,
+        )
+
+    params = request.GET.copy()
+    params.pop('format', None)
+    context = {
+        'report_name': name,
+        'report': reports.REPORTS[name],
+        'rows': list(islice(reports.rows(name, filters, chunk_size=50), 50)),
+        'row_count': row_count,
+        'filters': filters,
+        'categories': Category.objects.order_by('name'),
+        'querystring': params.urlencode(),
+        'background_threshold': reports.background_threshold(),
+        'exports': ReportExport.objects.filter(requested_by=request.user, report=name)[:5],
+    }
+    return render(request, 'dashboard/report.html', context)
+
+
 @login_required
 def books_report(request):
     """Rapport sur les livres"""
-    if not request.user.is_staff:
-        return redirect('dashboard:home')
-    return render(request, 'dashboard/reports/books.html')
+    return _report(request, 'books')
 
 
 @login_required
 def loans_report(request):
     """Rapport sur les emprunts"""
-    if not request.user.is_staff:
-        return redirect('dashboard:home')
-    return render(request, 'dashboard/reports/loans.html')
+    return _report(request, 'loans')
 
 
 @login_required
 def users_report(request):
     """Rapport sur les utilisateurs"""
-    if not request.user.is_staff:
-        return redirect('dashboard:home')
-    return render(request, 'dashboard/reports/users.html')
+    return _report(request, 'users')
+
+
+@login_required
+def report_export(request, pk):
+    """Suivi et téléchargement d'un export en arrière-plan"""
+    export = get_object_or_404(ReportExport, pk=pk, requested_by=request.user)
+    if request.GET.get('download') and export.status == 'done':
+        return FileResponse(export.file.open('rb'), as_attachment=True, filename=export.file.name.rsplit('/', 1)[-1])
+    return render(request, 'dashboard/report_export.html', {'export': export})
@@ -0,0 +1,19 @@
+"""
+Importe books.csv (dataset Kaggle Goodreads) dans le catalogue.
+
+Raccourci de ``python manage.py import_books books.csv`` ; les arguments
+supplémentaires sont transmis à la commande (--format, --workers, --resume...).
+"""
+import os
+import sys
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_project.settings')
+django.setup()
+
+from django.core.management import call_command  # noqa: E402
+
+if __name__ == '__main__':
+    args = sys.argv[1:] or ['books.csv']
+    call_command('import_books', *args)
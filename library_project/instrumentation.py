@@ -0,0 +1,170 @@
+"""
+Instrumentation SQL par requête HTTP.
+
+``QueryInstrumentationMiddleware`` compte les requêtes SQL de chaque page,
+leur durée totale et leurs empreintes (texte SQL aux paramètres près, listes
+``IN (...)`` réduites). L'enregistrement passe par un ``execute_wrapper``
+posé sur chaque connexion : il fonctionne sans ``DEBUG``, et suit la requête
+dans les threads qui reçoivent une copie de son contexte (pool des tableaux
+de bord).
+
+- Une empreinte répétée au moins ``SQL_DUPLICATE_THRESHOLD`` fois est
+  signalée comme N+1 (une requête par ligne affichée).
+- ``SQL_QUERY_BUDGETS`` fixe le nombre maximal de requêtes par nom de route
+  (motifs ``fnmatch`` admis, le premier qui correspond s'applique).
+- Le résumé est envoyé dans les en-têtes ``X-SQL-*`` avec ``DEBUG``, sinon
+  dans le journal ``library.sql`` (une ligne JSON par page, niveau WARNING en
+  cas de N+1 ou de budget dépassé).
+
+Les tests font respecter les mêmes budgets (``QueryBudgetMixin``). Les
+requêtes d'une réponse en flux, exécutées après le middleware, ne sont pas
+comptées.
+"""
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger('library.sql')
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_recorder = contextvars.ContextVar('sql_recorder', default=None)
+
+
+def fingerprint(sql):
+    """Empreinte d'une requête : même texte aux valeurs et à la taille des listes IN près"""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+def duplicate_threshold():
+    return getattr(settings, 'SQL_DUPLICATE_THRESHOLD', 10)
+
+
+def query_budget(view_name):
+    """Budget de requêtes d'une route, ou None"""
+    budgets = getattr(settings, 'SQL_QUERY_BUDGETS', {})
+    if view_name in budgets:
+        return budgets[view_name]
+    for pattern, budget in budgets.items():
+        if fnmatchcase(view_name or '', pattern):
+            return budget
+    return None
+
+
+class QueryRecorder:
+    """Requêtes exécutées pendant un bloc ``record_queries``"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, sql, duration):
+        with self._lock:
+            self.count += 1
+            self.duration += duration
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self, threshold=None):
+        """[(empreinte, nombre)] des requêtes répétées (N+1 probables)"""
+        threshold = threshold or duplicate_threshold()
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count >= threshold]
+
+    def summary(self, view_name=None):
+        budget = query_budget(view_name)
+        return {
+            'view': view_name,
+            'queries': self.count,
+            'time_ms': round(self.duration * 1000, 2),
+            'budget': budget,
+            'over_budget': budget is not None and self.count > budget,
+            'duplicates': [{'sql': sql[:300], 'count': count} for sql, count in self.duplicates()],
+        }
+
+
+def _record(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.add(sql, time.perf_counter() - started)
+
+
+def _instrument(connection):
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    """Chaque nouvelle connexion (y compris celles des threads) est instrumentée"""
+    _instrument(connection)
+
+
+@contextmanager
+def record_queries():
+    """Enregistre les requêtes du bloc (et des threads qui en copient le contexte)"""
+    for connection in connections.all():
+        _instrument(connection)
+    recorder = QueryRecorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+class QueryInstrumentationMiddleware:
+    """Résumé SQL de chaque page : en-têtes en DEBUG, journal structuré sinon"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        summary = recorder.summary(match.view_name if match else None)
+        # Consulté par les tests (QueryBudgetMixin)
+        response.sql_summary = summary
+        if settings.DEBUG:
+            response['X-SQL-Queries'] = str(summary['queries'])
+            response['X-SQL-Time-Ms'] = str(summary['time_ms'])
+            response['X-SQL-Duplicates'] = str(len(summary['duplicates']))
+            if summary['budget'] is not None:
+                response['X-SQL-Budget'] = str(summary['budget'])
+        else:
+            problem = summary['over_budget'] or summary['duplicates']
+            logger.log(
+                logging.WARNING if problem else logging.INFO,
+                json.dumps({'path': request.path, 'status': response.status_code, **summary}),
+            )
+        return response
+
+
+class QueryBudgetMixin:
+    """Assertions de budget SQL pour les ``TestCase`` (réponses du client de test)"""
+
+    def assertWithinQueryBudget(self, response, budget=None, allow_duplicates=False):
+        summary = response.sql_summary
+        budget = budget if budget is not None else summary['budget']
+        if budget is not None and summary['queries'] > budget:
+            self.fail(f"{summary['view']} : {summary['queries']} requêtes SQL pour un budget de {budget}")
+        if not allow_duplicates and summary['duplicates']:
+            repeated = '\n'.join(f"  {d['count']} × {d['sql']}" for d in summary['duplicates'])
+            self.fail(f"{summary['view']} : requêtes répétées (N+1)\n{repeated}")
+        return summary
@@ -0,0 +1,144 @@
+"""
+Routage des lectures vers la réplique de la base.
+
+Les écritures vont toujours à la base principale. Les lectures ne vont à la
+réplique (``DATABASE_READ_REPLICAS``) que pendant une requête ``GET`` ou
+``HEAD`` d'une route de lecture lourde (``REPLICA_ROUTES`` : catalogue,
+tableaux de bord, rapports) ou dans un bloc ``replica_reads()`` :
+
+- dès qu'une écriture a lieu, les lectures suivantes de la requête reviennent
+  à la base principale (un lecteur relit ce qu'il vient d'écrire) ; de même
+  dans une transaction ouverte sur la base principale (``ATOMIC_REQUESTS``,
+  ``TestCase``), dont la réplique ne voit pas les écritures ;
+- après une écriture ou une requête ``POST``, un cookie maintient le
+  navigateur sur la base principale pendant ``DATABASE_REPLICA_PIN_SECONDS``
+  secondes : la page affichée après ``borrow_book`` (``MyLoansView``...)
+  voit l'emprunt même si la réplique est en retard.
+
+Le choix est porté par une ``ContextVar`` : il suit la requête à travers
+``sync_to_async`` et dans les threads qui reçoivent une copie du contexte
+(pool des tableaux de bord, génération d'un CSV en flux).
+"""
+import contextvars
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Routes (espace de noms:nom) dont les lectures peuvent aller à la réplique
+REPLICA_ROUTES = ('books:*', 'dashboard:*')
+
+PIN_COOKIE = 'db_primary'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Modèle fictif des tables de DatabaseCache (toujours sur la base principale)
+CACHE_APP_LABEL = 'django_cache'
+
+
+class _Routing:
+    """État de routage d'une requête (partagé par les copies du contexte)"""
+
+    __slots__ = ('replica', 'wrote')
+
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+
+_routing = contextvars.ContextVar('db_routing', default=None)
+
+
+def replica_alias():
+    """Alias de la réplique configurée, ou None"""
+    replicas = getattr(settings, 'DATABASE_READ_REPLICAS', [])
+    return replicas[0] if replicas else None
+
+
+def is_replica_route(view_name):
+    return bool(view_name) and any(fnmatchcase(view_name, pattern) for pattern in REPLICA_ROUTES)
+
+
+@contextmanager
+def replica_reads():
+    """Lectures du bloc envoyées à la réplique (si elle est configurée)"""
+    token = _routing.set(_Routing(replica_alias()))
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+class ReplicaRouter:
+    """Lectures vers la réplique quand le contexte le permet, tout le reste vers la base principale"""
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if model._meta.app_label == CACHE_APP_LABEL:
+            return DEFAULT_DB_ALIAS
+        if (
+            routing is not None and routing.replica and not routing.wrote
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return routing.replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        # Une entrée du cache (DatabaseCache) n'est pas une donnée relue par l'utilisateur
+        if routing is not None and model._meta.app_label != CACHE_APP_LABEL:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplique contient les mêmes données que la base principale
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _stream_in(context, content):
+    """Contenu en flux produit dans le contexte de routage de la requête"""
+    iterator = iter(content)
+    while True:
+        try:
+            chunk = context.run(next, iterator)
+        except StopIteration:
+            return
+        yield chunk
+
+
+class ReplicaRoutingMiddleware:
+    """Choisit la base des lectures de chaque requête (voir le module)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing = _Routing()
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if response.streaming and routing.replica:
+            context = contextvars.copy_context()
+            context.run(_routing.set, routing)
+            response.streaming_content = _stream_in(context, response.streaming_content)
+        if replica_alias() and (routing.wrote or request.method not in SAFE_METHODS):
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 15),
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _routing.get()
+        if (
+            routing is not None and request.method in ('GET', 'HEAD')
+            and PIN_COOKIE not in request.COOKIES
+            and is_replica_route(request.resolver_match.view_name)
+        ):
+            routing.replica = replica_alias()
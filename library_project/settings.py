@@ -51,6 +51,7 @@ LOCAL_APPS = [
     'books',
     'loans',
     'dashboard',
+    'notifications',
 ]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
@@ -58,12 +59,14 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'library_project.instrumentation.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'library_project.routers.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'library_project.urls'
@@ -89,13 +92,152 @@ WSGI_APPLICATION = 'library_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-# Utiliser SQLite par défaut pour le développement
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite par défaut (développement) ; PostgreSQL en production avec
+# DATABASE_ENGINE=postgresql. Les connexions sont conservées
+# DATABASE_CONN_MAX_AGE secondes et vérifiées avant réutilisation. Derrière un
+# pooler en mode transaction (PgBouncer : DATABASE_HOST/PORT pointent sur
+# lui), DATABASE_POOLER=True désactive les curseurs côté serveur.
+DATABASE_ENGINE = config('DATABASE_ENGINE', default='sqlite3')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DATABASE_NAME', default='bibliotheque'),
+            'USER': config('DATABASE_USER', default=''),
+            'PASSWORD': config('DATABASE_PASSWORD', default=''),
+            'HOST': config('DATABASE_HOST', default='localhost'),
+            'PORT': config('DATABASE_PORT', default='5432'),
+            'CONN_MAX_AGE': config('DATABASE_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': config('DATABASE_POOLER', default=False, cast=bool),
+            'OPTIONS': {
+                'connect_timeout': config('DATABASE_CONNECT_TIMEOUT', default=5, cast=int),
+            },
+        }
     }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DATABASE_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            # Attente d'un verrou d'écriture (secondes) : requêtes simultanées, load_test
+            'OPTIONS': {'timeout': config('DATABASE_SQLITE_TIMEOUT', default=20, cast=int)},
+        }
+    }
+
+# Réplique en lecture (optionnelle) : hôte PostgreSQL ou, en local, second
+# fichier SQLite (copie de la base principale). Les lectures du catalogue,
+# des tableaux de bord et des rapports y sont envoyées (library_project.routers) ;
+# après une écriture, le navigateur reste DATABASE_REPLICA_PIN_SECONDS
+# secondes sur la base principale.
+DATABASE_REPLICA = config('DATABASE_REPLICA', default='')
+if DATABASE_REPLICA:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST' if DATABASE_ENGINE == 'postgresql' else 'NAME': DATABASE_REPLICA,
+        # Les tests lisent la base de test principale
+        'TEST': {'MIRROR': 'default'},
+    }
+    if DATABASE_ENGINE == 'postgresql':
+        DATABASES['replica']['PORT'] = config('DATABASE_REPLICA_PORT', default=DATABASES['default']['PORT'])
+
+DATABASE_ROUTERS = ['library_project.routers.ReplicaRouter']
+DATABASE_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_REPLICA_PIN_SECONDS = config('DATABASE_REPLICA_PIN_SECONDS', default=15, cast=int)
+
+# Cache partagé par tous les workers (versions du catalogue, compteurs et
+# recommandations des tableaux de bord) : CACHE_URL=redis://hôte:6379/1, ou
+# db://[table] pour une table de la base principale (python manage.py
+# createcachetable). locmem:// (défaut avec DEBUG) garde un cache par
+# processus : à réserver à un seul worker (vérifié au démarrage avec
+# WEB_CONCURRENCY, voir books.checks).
+CACHE_URL = config('CACHE_URL', default='locmem://' if DEBUG else 'db://')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+elif CACHE_URL.startswith('db://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': CACHE_URL[len('db://'):] or 'library_cache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'library',
+        }
+    }
+BOOKS_CACHE_ALIAS = config('BOOKS_CACHE_ALIAS', default='default')
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=1, cast=int)
+
+# Instrumentation SQL (library_project.instrumentation) : nombre maximal de
+# requêtes par route (motifs admis, le premier qui correspond s'applique ;
+# vérifié par les tests) et nombre de répétitions d'une même requête
+# signalé comme N+1.
+SQL_QUERY_BUDGETS = {
+    'books:list': 10,
+    'books:detail': 14,
+    # Facettes : une petite requête groupée par facette (5), plus leurs libellés
+    'books:search': 12,
+    'loans:my_loans': 14,
+    'dashboard:home': 30,
+    'dashboard:admin': 30,
+    'admin:*_changelist': 12,
+    '*': 40,
 }
+SQL_DUPLICATE_THRESHOLD = config('SQL_DUPLICATE_THRESHOLD', default=10, cast=int)
+
+# Moteur de recherche plein texte du catalogue (chemin pointé).
+# Vide : choisi selon la base (FTS5 pour SQLite, tsvector/GIN pour PostgreSQL).
+BOOKS_SEARCH_BACKEND = config('BOOKS_SEARCH_BACKEND', default='')
+
+# Budget mémoire (Mo) de l'index d'autocomplétion de chaque worker ;
+# au-delà, les suggestions sont servies par la base.
+BOOKS_AUTOCOMPLETE_MEMORY_MB = config('BOOKS_AUTOCOMPLETE_MEMORY_MB', default=64, cast=int)
+
+# Compteurs du tableau de bord : retard maximal toléré d'un worker (cache, en
+# secondes) et intervalle maximal entre deux recalculs complets de l'instantané.
+DASHBOARD_STATS_MAX_STALENESS = config('DASHBOARD_STATS_MAX_STALENESS', default=30, cast=int)
+DASHBOARD_STATS_RECONCILE_SECONDS = config('DASHBOARD_STATS_RECONCILE_SECONDS', default=900, cast=int)
+# Lignes sur lesquelles sont réparties les mises à jour des compteurs (emprunts,
+# retours simultanés) ; la lecture les additionne.
+DASHBOARD_STATS_SHARDS = config('DASHBOARD_STATS_SHARDS', default=8, cast=int)
+
+# Threads (et connexions) exécutant en parallèle les requêtes indépendantes
+# des tableaux de bord, pour tout le processus ; 0 : à la suite.
+DASHBOARD_QUERY_WORKERS = config('DASHBOARD_QUERY_WORKERS', default=4, cast=int)
+
+# Recommandations personnalisées des lecteurs : durée de vie en cache
+# (secondes) ; supprimées plus tôt à chaque nouvel emprunt du lecteur.
+DASHBOARD_RECOMMENDATIONS_TIMEOUT = config('DASHBOARD_RECOMMENDATIONS_TIMEOUT', default=3600, cast=int)
+
+# Rapports exportés : au-delà de ce nombre de lignes, le fichier est produit
+# en arrière-plan par REPORTS_BACKGROUND_WORKERS threads (0 : dans la requête).
+# Un export en cours depuis plus de REPORTS_EXPORT_TIMEOUT secondes est
+# considéré comme perdu (worker redémarré) et repris par resume_report_exports.
+REPORTS_BACKGROUND_ROWS = config('REPORTS_BACKGROUND_ROWS', default=50000, cast=int)
+REPORTS_BACKGROUND_WORKERS = config('REPORTS_BACKGROUND_WORKERS', default=1, cast=int)
+REPORTS_EXPORT_TIMEOUT = config('REPORTS_EXPORT_TIMEOUT', default=3600, cast=int)
+
+# Cache de référence du catalogue (catégories, éditeurs, fiches) : taille du
+# niveau local par processus, durée de vie des entrées et délai de relecture
+# des versions invalidées par les autres processus (secondes).
+BOOKS_CACHE_LOCAL_ENTRIES = config('BOOKS_CACHE_LOCAL_ENTRIES', default=512, cast=int)
+BOOKS_CACHE_TIMEOUT = config('BOOKS_CACHE_TIMEOUT', default=3600, cast=int)
+BOOKS_CACHE_VERSION_TTL = config('BOOKS_CACHE_VERSION_TTL', default=2, cast=int)
+
+# Index des livres proches par le contenu (commande build_content_index) :
+# répertoire des vecteurs, ouverts en mémoire partagée par les workers, et
+# nombre de composantes par livre.
+BOOKS_SIMILARITY_DIR = config('BOOKS_SIMILARITY_DIR', default=str(BASE_DIR / 'var' / 'similarity'))
+BOOKS_SIMILARITY_DIMENSIONS = config('BOOKS_SIMILARITY_DIMENSIONS', default=128, cast=int)
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -140,6 +282,10 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Threads de calcul des renditions d'images (couvertures, photos de profil)
+# hors de la requête ; 0 : calcul immédiat après validation de la transaction.
+IMAGE_PROCESSING_WORKERS = config('IMAGE_PROCESSING_WORKERS', default=2, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -157,8 +303,42 @@ LOGIN_URL = 'accounts:login'
 LOGIN_REDIRECT_URL = 'dashboard:home'
 LOGOUT_REDIRECT_URL = 'accounts:login'
 
+# Journaux : résumé SQL de chaque page (une ligne JSON, library.sql)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'library.sql': {
+            'handlers': ['console'],
+            'level': config('SQL_LOG_LEVEL', default='WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 # Email configuration (for password reset)
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# Essais sans serveur réel : EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend
+# (messages écrits dans EMAIL_FILE_PATH), ou le backend SMTP vers un serveur
+# local de test (par ex. `python -m aiosmtpd -n -l localhost:1025`).
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=30, cast=int)
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=str(BASE_DIR / 'sent_emails'))
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='bibliotheque@localhost')
+
+# Notifications des lecteurs (commande send_notifications) : nombre de
+# tentatives d'envoi, délai de base entre deux tentatives (doublé à chaque
+# échec) et durée de réservation d'un lot par un worker (secondes).
+NOTIFICATIONS_MAX_ATTEMPTS = config('NOTIFICATIONS_MAX_ATTEMPTS', default=5, cast=int)
+NOTIFICATIONS_RETRY_SECONDS = config('NOTIFICATIONS_RETRY_SECONDS', default=300, cast=int)
+NOTIFICATIONS_LEASE_SECONDS = config('NOTIFICATIONS_LEASE_SECONDS', default=600, cast=int)
 
 # WhiteNoise configuration for static files in production
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
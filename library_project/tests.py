@@ -0,0 +1,257 @@
+from datetime import date, timedelta
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache.backends.db import DatabaseCache
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from books.models import Author, Book, BookReview, Category, Publisher
+from dashboard import concurrent
+from loans import services as circulation
+from loans.models import Loan, Reservation
+
+from .instrumentation import QueryBudgetMixin, fingerprint, record_queries
+from .routers import PIN_COOKIE, ReplicaRoutingMiddleware, replica_reads
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_READ_REPLICAS=['replica'])
+class ReplicaRoutingTest(SimpleTestCase):
+    """Tests des règles de routage (sans requête sur la réplique)"""
+
+    def route(self, method, path, cookies=None, write=False):
+        """Base des lectures avant (et après une écriture) pendant la requête"""
+        request = getattr(RequestFactory(), method.lower())(path)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(path)
+        seen = []
+
+        def view(request):
+            middleware.process_view(request, None, (), {})
+            seen.append(router.db_for_read(Book))
+            if write:
+                router.db_for_write(Loan)
+                seen.append(router.db_for_read(Book))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        return seen, middleware(request)
+
+    def test_heavy_reads_go_to_the_replica(self):
+        for path in (reverse('books:list'), reverse('dashboard:admin'), reverse('dashboard:loans_report')):
+            seen, response = self.route('GET', path)
+            self.assertEqual(seen, ['replica'])
+            self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_circulation_stays_on_the_primary(self):
+        seen, _ = self.route('GET', reverse('loans:my_loans'))
+        self.assertEqual(seen, [DEFAULT_DB_ALIAS])
+        seen, response = self.route('POST', reverse('loans:borrow', args=[1]))
+        self.assertEqual(seen, [DEFAULT_DB_ALIAS])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_reads_follow_writes(self):
+        seen, response = self.route('GET', reverse('books:list'), write=True)
+        self.assertEqual(seen, ['replica', DEFAULT_DB_ALIAS])
+        self.assertIn(PIN_COOKIE, response.cookies)
+        # Requête suivante du même navigateur : base principale
+        seen, _ = self.route('GET', reverse('books:list'), cookies={PIN_COOKIE: '1'})
+        self.assertEqual(seen, [DEFAULT_DB_ALIAS])
+
+    def test_database_cache_writes_do_not_pin_the_primary(self):
+        cache_model = DatabaseCache('library_cache', {}).cache_model_class
+
+        def view(request):
+            middleware.process_view(request, None, (), {})
+            self.assertEqual(router.db_for_write(cache_model), DEFAULT_DB_ALIAS)
+            seen.append(router.db_for_read(Book))
+            return HttpResponse()
+
+        seen = []
+        request = RequestFactory().get(reverse('books:list'))
+        request.resolver_match = resolve(request.path)
+        middleware = ReplicaRoutingMiddleware(view)
+        response = middleware(request)
+        self.assertEqual(seen, ['replica'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_without_replica(self):
+        with override_settings(DATABASE_READ_REPLICAS=[]):
+            seen, response = self.route('POST', reverse('books:list'))
+        self.assertEqual(seen, [DEFAULT_DB_ALIAS])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_context_reaches_streams_and_worker_threads(self):
+        def view(request):
+            middleware.process_view(request, None, (), {})
+            return StreamingHttpResponse(router.db_for_read(Book) for _ in range(2))
+
+        request = RequestFactory().get(reverse('dashboard:books_report'))
+        request.resolver_match = resolve(request.path)
+        middleware = ReplicaRoutingMiddleware(view)
+        self.assertEqual(b''.join(middleware(request).streaming_content), b'replicareplica')
+
+        with replica_reads(), override_settings(DASHBOARD_QUERY_WORKERS=2):
+            aliases = concurrent.run_all({n: lambda: router.db_for_read(Book) for n in 'ab'})
+        self.assertEqual(set(aliases.values()), {'replica'})
+        self.assertEqual(router.db_for_read(Book), DEFAULT_DB_ALIAS)
+
+
+@skipUnless('replica' in settings.DATABASES, "réplique non configurée (DATABASE_REPLICA)")
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ReplicaIntegrationTest(TransactionTestCase):
+    """
+    Parcours complet avec une réplique configurée (par ex. deux fichiers
+    SQLite) ; données validées pour être visibles de la connexion de la réplique.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader', password='testpass123')
+        self.book = Book.objects.create(
+            title='Livre répliqué', isbn='1234567890123',
+            publisher=Publisher.objects.create(name='Test Publisher'),
+            category=Category.objects.create(name='Test Category'),
+            publication_date='2023-01-01', pages=100, summary='Résumé',
+            total_copies=1, available_copies=1,
+        )
+        self.client.force_login(self.reader)
+
+    def test_borrow_then_my_loans(self):
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            self.client.get(reverse('books:list'))
+        self.assertTrue(replica_queries.captured_queries)
+
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            self.client.post(reverse('loans:borrow', args=[self.book.pk]), follow=True)
+            self.client.get(reverse('books:detail', args=[self.book.pk]))
+        self.assertEqual(replica_queries.captured_queries, [])
+        self.assertTrue(Loan.objects.filter(book=self.book, borrower=self.reader).exists())
+        self.assertContains(self.client.get(reverse('loans:my_loans')), 'Livre répliqué')
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Budgets SQL des pages principales (SQL_QUERY_BUDGETS), sans N+1"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.reader = User.objects.create_user(username='reader', password='testpass123')
+        publisher = Publisher.objects.create(name='Test Publisher')
+        categories = [Category.objects.create(name=f'Catégorie {i}') for i in range(3)]
+        self.books = []
+        for i in range(12):
+            book = Book.objects.create(
+                title=f'Livre {i}', isbn=f'97800000000{i:02d}', publisher=publisher,
+                category=categories[i % 3], publication_date='2023-01-01', pages=100,
+                summary='Résumé', total_copies=2, available_copies=2,
+            )
+            book.authors.add(Author.objects.create(first_name='Auteur', last_name=str(i)))
+            self.books.append(book)
+        for book in self.books[:10]:
+            circulation.borrow(book, self.reader, max_active_loans=None)
+
+    def test_reader_pages(self):
+        for i in range(5):
+            reviewer = User.objects.create_user(username=f'reviewer{i}', password='testpass123')
+            BookReview.objects.create(book=self.books[0], reviewer=reviewer, rating=4)
+        self.client.force_login(self.reader)
+        for url in (
+            reverse('books:list'),
+            reverse('books:detail', args=[self.books[0].pk]),
+            reverse('books:search') + '?q=Livre',
+            reverse('loans:my_loans'),
+            reverse('dashboard:home'),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinQueryBudget(response)
+
+    def test_staff_pages(self):
+        self.client.force_login(self.staff)
+        for url in (reverse('dashboard:home'), reverse('dashboard:admin')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertWithinQueryBudget(response)
+
+    def test_admin_changelists(self):
+        admin = User.objects.create_superuser(username='admin', password='testpass123')
+        for i, book in enumerate(self.books):
+            BookReview.objects.create(book=book, reviewer=self.reader, rating=1 + i % 5)
+            Reservation.objects.create(book=book, user=admin, expiry_date=timezone.now() + timedelta(days=3))
+        self.client.force_login(admin)
+        pages = [
+            (f'admin:{model}_changelist', {})
+            for model in (
+                'books_book', 'books_author', 'books_category', 'books_publisher', 'books_bookreview',
+                'loans_loan', 'loans_loanhistory', 'loans_reservation',
+            )
+        ] + [
+            ('admin:books_book_changelist', {'q': '3'}),
+            ('admin:loans_loan_changelist', {'due': 'open', 'status': 'active'}),
+        ]
+        for name, params in pages:
+            with self.subTest(page=name, params=params):
+                response = self.client.get(reverse(name), params)
+                self.assertEqual(response.status_code, 200)
+                self.assertWithinQueryBudget(response)
+        response = self.client.get(reverse('admin:books_book_changelist'), {'q': '3'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.books[3]])
+
+    def test_admin_date_filter(self):
+        admin = User.objects.create_superuser(username='admin', password='testpass123')
+        self.client.force_login(admin)
+        url = reverse('admin:loans_loan_changelist')
+        Loan.objects.filter(pk=Loan.objects.order_by('pk')[0].pk).update(
+            loan_date=timezone.now() - timedelta(days=800)
+        )
+        year = timezone.localdate().year
+        changelist = self.client.get(url).context['cl']
+        spec = next(s for s in changelist.filter_specs if getattr(s, 'field_path', None) == 'loan_date')
+        choices = [c['display'] for c in spec.choices(changelist)]
+        self.assertEqual(choices[:2], ['Toutes les dates', str(year)])
+        self.assertIn(str(year - 2), choices)
+        self.assertFalse(any(c.startswith('—') for c in choices))
+
+        response = self.client.get(url, {
+            'loan_date__gte': spec._bound(date(year, 1, 1)),
+            'loan_date__lt': spec._bound(date(year + 1, 1, 1)),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_list.count(), 9)
+        self.assertWithinQueryBudget(response)
+        self.assertContains(response, '— ')
+
+    def test_repeated_queries_are_reported(self):
+        with record_queries() as recorder:
+            for book in Book.objects.all():
+                list(book.authors.all())
+        self.assertEqual(recorder.count, 13)
+        [(sql, count)] = recorder.duplicates()
+        self.assertEqual(count, 12)
+        self.assertIn('books_author', sql)
+        self.assertEqual(
+            fingerprint('WHERE id IN (%s, %s, %s)'), fingerprint('WHERE id IN (%s)')
+        )
+
+    @override_settings(DEBUG=True)
+    def test_debug_headers(self):
+        response = self.client.get(reverse('books:list'))
+        self.assertEqual(response['X-SQL-Queries'], str(response.sql_summary['queries']))
+        self.assertEqual(response['X-SQL-Budget'], str(settings.SQL_QUERY_BUDGETS['books:list']))
+        self.assertEqual(response['X-SQL-Duplicates'], '0')
+
+    def test_over_budget_is_logged(self):
+        budgets = {**settings.SQL_QUERY_BUDGETS, 'books:list': 1}
+        with override_settings(SQL_QUERY_BUDGETS=budgets), self.assertLogs('library.sql', 'WARNING') as logs:
+            self.client.get(reverse('books:list'))
+        self.assertIn('"over_budget": true', logs.output[0])
+
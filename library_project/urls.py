@@ -18,6 +18,8 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import RedirectView
+from books.images import RENDITIONS_PREFIX
+from books.views import serve_rendition
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -28,8 +30,13 @@ urlpatterns = [
     path('dashboard/', include('dashboard.urls')),
 ]
 
-# Serve media files during development
+# Serve media files during development ; en production, les fichiers
+# téléversés et les renditions sont servis par le serveur web (README)
 if settings.DEBUG:
+    # Renditions d'images (chemins immuables, servis avec un cache d'un an)
+    urlpatterns.append(
+        path(f"{settings.MEDIA_URL.strip('/')}/{RENDITIONS_PREFIX}/<path:path>", serve_rendition, name='rendition')
+    )
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
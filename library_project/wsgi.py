@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_project.settings')
 
 application = get_wsgi_application()
+
+# Construire l'index d'autocomplétion au démarrage du worker
+from books.autocomplete import prefix_index  # noqa: E402
+
+prefix_index.warm_up()
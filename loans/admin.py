@@ -1,19 +1,64 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.http import HttpResponseRedirect
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils import timezone
+from books.admin_filters import DateDrilldownFilter
+from books.pagination import EstimatedCountPaginator
+from . import services as circulation
 from .models import Loan, LoanHistory, Reservation
 
 
+class LoanAdminForm(forms.ModelForm):
+    """Vérifie la disponibilité à la création (la transaction d'emprunt reste l'arbitre)"""
+
+    class Meta:
+        model = Loan
+        fields = '__all__'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        book = cleaned_data.get('book')
+        if self.instance.pk is None and book is not None and not book.is_available():
+            raise forms.ValidationError("Ce livre n'est pas disponible pour l'emprunt.")
+        return cleaned_data
+
+
+class DueFilter(admin.SimpleListFilter):
+    """Filtre par échéance, calculé par la base (indépendant du statut enregistré)"""
+    title = 'échéance'
+    parameter_name = 'due'
+
+    def lookups(self, request, model_admin):
+        return [('overdue', 'En retard'), ('soon', 'Sous 3 jours'), ('open', 'En cours')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'overdue':
+            return queryset.overdue()
+        if self.value() == 'soon':
+            return queryset.due_soon(3)
+        if self.value() == 'open':
+            return queryset.active()
+        return queryset
+
+
 @admin.register(Loan)
 class LoanAdmin(admin.ModelAdmin):
     """Administration des emprunts"""
+    form = LoanAdminForm
+    actions = ['mark_returned']
     list_display = ['get_book_title', 'get_borrower_name', 'loan_date', 'due_date', 
                    'returned_date', 'get_status_display', 'is_overdue']
-    list_filter = ['status', 'loan_date', 'due_date', 'returned_date']
+    list_select_related = ['book', 'borrower']
+    # Dates : années et mois d'emprunt, échéance ; colonnes indexées
+    list_filter = [DueFilter, 'status', ('loan_date', DateDrilldownFilter), 'due_date']
     search_fields = ['book__title', 'borrower__username', 'borrower__first_name', 'borrower__last_name']
     ordering = ['-loan_date']
+    autocomplete_fields = ['book', 'borrower']
     readonly_fields = ['loan_date', 'created_by']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Informations principales', {
@@ -59,29 +104,96 @@ class LoanAdmin(admin.ModelAdmin):
         )
     get_status_display.short_description = 'Statut'
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_overdue_flag()
+    
     def is_overdue(self, obj):
-        """Indicateur de retard"""
-        if obj.is_overdue():
+        """Indicateur de retard (annoté par la requête de la liste)"""
+        if obj.overdue_flag:
             return format_html('<span style="color: red;">⚠️ Oui</span>')
         return format_html('<span style="color: green;">✓ Non</span>')
     is_overdue.short_description = 'En retard'
     is_overdue.boolean = False
+    is_overdue.admin_order_field = 'overdue_flag'
     
+    # Champs écrits par circulation.return_loan lors d'un retour
+    RETURN_FIELDS = ('returned_date', 'status')
+
     def save_model(self, request, obj, form, change):
-        """Enregistrer l'utilisateur qui crée l'emprunt"""
-        if not change:  # Nouvel emprunt
-            obj.created_by = request.user
-        super().save_model(request, obj, form, change)
+        """Un nouvel emprunt passe par le service de circulation (stock décrémenté)"""
+        if change:
+            if 'returned_date' in form.changed_data and obj.returned_date and not form.initial.get('returned_date'):
+                # Retour saisi dans le formulaire : stock et historique via le service,
+                # qui écrit la date de retour et le statut ; seuls les autres champs
+                # modifiés sont enregistrés, sans écraser son résultat
+                try:
+                    circulation.return_loan(obj.pk, performed_by=request.user)
+                except circulation.AlreadyReturned:
+                    pass
+                fields = [name for name in form.changed_data if name not in self.RETURN_FIELDS]
+                if fields:
+                    obj.save(update_fields=fields)
+                obj.refresh_from_db(fields=self.RETURN_FIELDS)
+                return
+            super().save_model(request, obj, form, change)
+            return
+        try:
+            loan = circulation.borrow(
+                obj.book, obj.borrower,
+                performed_by=request.user,
+                due_date=obj.due_date,
+                notes=obj.notes,
+                librarian_notes=obj.librarian_notes,
+                max_active_loans=None,
+            )
+        except circulation.CirculationError as e:
+            # Refus du service (livre pris entre-temps, déjà emprunté...) : rien
+            # n'est enregistré, le formulaire d'ajout est réaffiché
+            obj._borrow_refused = True
+            self.message_user(request, str(e), messages.ERROR)
+            return
+        obj.pk = loan.pk
+        obj.loan_date = loan.loan_date
+        obj.created_by = request.user
+        obj._state.adding = False
+
+    def save_related(self, request, form, formsets, change):
+        if not getattr(form.instance, '_borrow_refused', False):
+            super().save_related(request, form, formsets, change)
+
+    def log_addition(self, request, obj, message):
+        if not getattr(obj, '_borrow_refused', False):
+            return super().log_addition(request, obj, message)
+
+    def response_add(self, request, obj, post_url_continue=None):
+        if getattr(obj, '_borrow_refused', False):
+            return HttpResponseRedirect(request.get_full_path())
+        return super().response_add(request, obj, post_url_continue)
+    
+    @admin.action(description="Marquer comme retourné")
+    def mark_returned(self, request, queryset):
+        """Retourne les emprunts sélectionnés et remet les exemplaires en stock"""
+        returned = 0
+        for loan_id in queryset.active().values_list('pk', flat=True):
+            try:
+                circulation.return_loan(loan_id, performed_by=request.user)
+                returned += 1
+            except circulation.AlreadyReturned:
+                pass
+        self.message_user(request, f"{returned} emprunt(s) retourné(s).", messages.SUCCESS)
 
 
 @admin.register(LoanHistory)
 class LoanHistoryAdmin(admin.ModelAdmin):
     """Administration de l'historique des emprunts"""
     list_display = ['loan', 'action', 'performed_by', 'timestamp']
-    list_filter = ['action', 'timestamp']
+    list_select_related = ['loan__book', 'loan__borrower', 'performed_by']
+    list_filter = ['action', ('timestamp', DateDrilldownFilter)]
     search_fields = ['loan__book__title', 'loan__borrower__username', 'performed_by__username']
     ordering = ['-timestamp']
     readonly_fields = ['timestamp']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def has_add_permission(self, request):
         """Interdire l'ajout manuel d'historique"""
@@ -97,10 +209,14 @@ class ReservationAdmin(admin.ModelAdmin):
     """Administration des réservations"""
     list_display = ['get_book_title', 'get_user_name', 'reserved_date', 'expiry_date', 
                    'get_status_display', 'notified']
-    list_filter = ['status', 'reserved_date', 'expiry_date', 'notified']
+    list_select_related = ['book', 'user']
+    list_filter = ['status', 'notified', ('reserved_date', DateDrilldownFilter)]
     search_fields = ['book__title', 'user__username', 'user__first_name', 'user__last_name']
     ordering = ['-reserved_date']
+    autocomplete_fields = ['book', 'user']
     readonly_fields = ['reserved_date']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def get_book_title(self, obj):
         """Titre du livre avec lien"""
@@ -0,0 +1,131 @@
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+
+from books.models import Author, Book, Category, Publisher
+from loans import services as circulation
+from loans.models import Loan
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge de la circulation : des threads se disputent les exemplaires "
+        "d'un même livre ; vérifie le stock final et mesure les emprunts par seconde"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Nombre de threads (défaut : 8)")
+        parser.add_argument('--patrons', type=int, default=200, help="Nombre de lecteurs (défaut : 200)")
+        parser.add_argument('--copies', type=int, default=50, help="Exemplaires du livre (défaut : 50)")
+        parser.add_argument('--rounds', type=int, default=3, help="Cycles emprunt/retour (défaut : 3)")
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.settings_dict['NAME'] == ':memory:':
+            raise CommandError("Une base SQLite en mémoire ne peut pas être partagée entre threads")
+
+        tag = uuid.uuid4().hex[:8]
+        book, patrons = self._fixtures(tag, options['patrons'], options['copies'])
+        try:
+            for round_number in range(1, options['rounds'] + 1):
+                self._round(round_number, book, patrons, options['threads'], options['copies'])
+        finally:
+            Loan.objects.filter(book=book).delete()
+            Book.objects.filter(pk=book.pk).delete()
+            User.objects.filter(pk__in=[p.pk for p in patrons]).delete()
+
+    def _fixtures(self, tag, patron_count, copies):
+        category, _ = Category.objects.get_or_create(name='Benchmark')
+        publisher, _ = Publisher.objects.get_or_create(name='Benchmark')
+        author, _ = Author.objects.get_or_create(first_name='Bench', last_name='Mark')
+        book = Book.objects.create(
+            title=f'Benchmark circulation {tag}',
+            isbn=f'999{tag}'[:13],
+            publisher=publisher,
+            category=category,
+            publication_date='2000-01-01',
+            pages=1,
+            summary='Livre de test de charge',
+            total_copies=copies,
+            available_copies=copies,
+        )
+        book.authors.add(author)
+        patrons = User.objects.bulk_create([
+            User(username=f'bench_{tag}_{i}', email=f'bench_{tag}_{i}@example.com')
+            for i in range(patron_count)
+        ])
+        if any(p.pk is None for p in patrons):
+            patrons = list(User.objects.filter(username__startswith=f'bench_{tag}_'))
+        return book, patrons
+
+    def _run_threads(self, thread_count, items, work):
+        """Répartit ``items`` entre les threads ; retourne (succès, refus, erreurs, durée)"""
+        counters = {'ok': 0, 'refused': 0, 'errors': 0}
+        lock = threading.Lock()
+        queue = list(items)
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if not queue:
+                            return
+                        item = queue.pop()
+                    try:
+                        work(item)
+                        result = 'ok'
+                    except circulation.CirculationError:
+                        result = 'refused'
+                    except OperationalError:
+                        # Base verrouillée (SQLite) : compté, jamais masqué
+                        result = 'errors'
+                    with lock:
+                        counters[result] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counters, time.perf_counter() - started
+
+    def _round(self, number, book, patrons, thread_count, copies):
+        counters, elapsed = self._run_threads(
+            thread_count, patrons, lambda patron: circulation.borrow(book.pk, patron, performed_by=patron)
+        )
+        book.refresh_from_db(fields=['available_copies'])
+        active = Loan.objects.filter(book=book, returned_date__isnull=True).count()
+        rate = counters['ok'] / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Cycle {number} - emprunts : {counters['ok']} accordés, {counters['refused']} refusés, "
+            f"{counters['errors']} erreurs en {elapsed:.2f} s ({rate:.0f} emprunts/s)"
+        )
+        self._check(active == counters['ok'] and book.available_copies == copies - active,
+                    f"stock {book.available_copies}/{copies}, {active} emprunts en cours")
+
+        loan_ids = list(Loan.objects.filter(book=book, returned_date__isnull=True).values_list('pk', flat=True))
+        counters, elapsed = self._run_threads(
+            thread_count, loan_ids * 2,  # chaque retour est tenté deux fois
+            lambda loan_id: circulation.return_loan(loan_id)
+        )
+        book.refresh_from_db(fields=['available_copies'])
+        rate = counters['ok'] / elapsed if elapsed else 0
+        self.stdout.write(
+            f"Cycle {number} - retours : {counters['ok']} effectués, {counters['refused']} doublons refusés, "
+            f"{counters['errors']} erreurs en {elapsed:.2f} s ({rate:.0f} retours/s)"
+        )
+        self._check(book.available_copies == copies, f"stock {book.available_copies}/{copies} après retours")
+
+    def _check(self, condition, detail):
+        if condition:
+            self.stdout.write(self.style.SUCCESS(f"  Stock cohérent : {detail}"))
+        else:
+            raise CommandError(f"Stock incohérent : {detail}")
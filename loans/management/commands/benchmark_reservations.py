@@ -0,0 +1,114 @@
+import random
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from books.models import Book, Category, Publisher
+from loans import reservations, services as circulation
+from loans.models import Loan, Reservation
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge de la file de réservations : retours sur un livre très demandé "
+        "(chaque exemplaire rendu est attribué au premier de la file, qui l'emprunte)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--holds', type=int, default=5000, help="Réservations en attente (défaut : 5000)")
+        parser.add_argument('--copies', type=int, default=20, help="Exemplaires du livre (défaut : 20)")
+        parser.add_argument('--returns', type=int, default=500, help="Retours mesurés (défaut : 500)")
+        parser.add_argument('--lookups', type=int, default=1000, help="Calculs de position mesurés (défaut : 1000)")
+
+    def handle(self, *args, **options):
+        if options['returns'] > options['holds']:
+            raise CommandError("--returns ne peut pas dépasser --holds")
+        tag = uuid.uuid4().hex[:8]
+        book, patrons, holders = self._fixtures(tag, options['copies'], options['holds'])
+        try:
+            self._returns(book, options['returns'])
+            self._lookups(book, options['lookups'])
+            self._check(book, options['copies'])
+        finally:
+            Loan.objects.filter(book=book).delete()
+            Reservation.objects.filter(book=book).delete()
+            Book.objects.filter(pk=book.pk).delete()
+            User.objects.filter(username__startswith=f'bench_{tag}_').delete()
+
+    def _fixtures(self, tag, copies, hold_count):
+        category, _ = Category.objects.get_or_create(name='Benchmark')
+        publisher, _ = Publisher.objects.get_or_create(name='Benchmark')
+        book = Book.objects.create(
+            title=f'Benchmark réservations {tag}',
+            isbn=f'998{tag}'[:13],
+            publisher=publisher,
+            category=category,
+            publication_date='2000-01-01',
+            pages=1,
+            summary='Livre de test de charge',
+            total_copies=copies,
+            available_copies=copies,
+        )
+        User.objects.bulk_create([
+            User(username=f'bench_{tag}_{i}', email=f'bench_{tag}_{i}@example.com')
+            for i in range(copies + hold_count)
+        ])
+        users = list(User.objects.filter(username__startswith=f'bench_{tag}_').order_by('pk'))
+        patrons, holders = users[:copies], users[copies:]
+        for patron in patrons:
+            circulation.borrow(book, patron, max_active_loans=None)
+
+        now = timezone.now()
+        Reservation.objects.bulk_create([
+            Reservation(book=book, user=holder, expiry_date=now + timedelta(days=reservations.RESERVATION_DAYS))
+            for holder in holders
+        ], batch_size=1000)
+        self.stdout.write(f"{copies} exemplaires empruntés, {len(holders)} réservations en attente")
+        return book, patrons, holders
+
+    def _returns(self, book, count):
+        """Retour d'un emprunt puis emprunt par le lecteur servi, ``count`` fois"""
+        return_time = 0.0
+        for _ in range(count):
+            loan = Loan.objects.filter(book=book).active().order_by('pk').first()
+            started = time.perf_counter()
+            circulation.return_loan(loan)
+            return_time += time.perf_counter() - started
+            served = Reservation.objects.filter(book=book, status='available').select_related('user').first()
+            circulation.borrow(book, served.user, max_active_loans=None)
+        rate = count / return_time if return_time else 0
+        self.stdout.write(
+            f"Retours avec attribution : {count} en {return_time:.2f} s ({rate:.0f} retours/s)"
+        )
+
+    def _lookups(self, book, count):
+        pending = list(reservations.queue(book))
+        if not pending:
+            return
+        sample = [random.choice(pending) for _ in range(count)]
+        started = time.perf_counter()
+        for reservation in sample:
+            reservations.position(reservation)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Positions dans la file : {count} en {elapsed:.2f} s "
+            f"({elapsed / count * 1000:.2f} ms par calcul, file de {len(pending)})"
+        )
+
+    def _check(self, book, copies):
+        book.refresh_from_db(fields=['available_copies'])
+        active = Loan.objects.filter(book=book).active().count()
+        if book.available_copies == 0 and active == copies:
+            self.stdout.write(self.style.SUCCESS(
+                f"  Stock cohérent : aucun exemplaire en rayon, {active} emprunts en cours"
+            ))
+        else:
+            raise CommandError(
+                f"Stock incohérent : {book.available_copies} en rayon, {active} emprunts en cours"
+            )
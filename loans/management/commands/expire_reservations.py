@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from loans.reservations import expire
+
+
+class Command(BaseCommand):
+    help = "Expire les réservations échues et attribue les exemplaires libérés aux suivants ; à planifier"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help="Réservations expirées par transaction (défaut : 5000)"
+        )
+
+    def handle(self, *args, **options):
+        counts = expire(batch_size=max(1, options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['pending']} demande(s) et {counts['available']} exemplaire(s) mis de côté expirés"
+        ))
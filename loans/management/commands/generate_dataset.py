@@ -0,0 +1,409 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, models, router, transaction
+from django.utils import timezone
+
+from books import fuzzy
+from books.cache import NAMESPACES, reference_cache
+from books.models import Author, Book, BookReview, Category, Publisher
+from books.normalize import normalize_key, sort_key
+from books.search import get_search_backend, update_search_documents
+from books.stats import rebuild_book_stats
+from dashboard import metrics, timeseries
+from loans.models import Loan, LoanHistory, Reservation
+from loans.reservations import RESERVATION_DAYS
+from loans.services import MAX_ACTIVE_LOANS
+
+User = get_user_model()
+
+# Mot de passe commun des comptes générés (connexion manuelle)
+PASSWORD = 'library-dataset'
+# Préfixe ISBN non attribué : pas de collision avec un catalogue importé
+ISBN_PREFIX = '990'
+
+CATEGORIES = [
+    'Roman', 'Policier', 'Science-fiction', 'Fantasy', 'Histoire', 'Biographie', 'Poésie',
+    'Théâtre', 'Jeunesse', 'Bande dessinée', 'Philosophie', 'Sciences', 'Informatique',
+    'Cuisine', 'Voyage', 'Art', 'Économie', 'Psychologie', 'Santé', 'Sport',
+]
+LANGUAGES = ['Français'] * 8 + ['Anglais', 'Espagnol', 'Allemand', 'Italien']
+FIRST_NAMES = [
+    'Jean', 'Marie', 'Pierre', 'Claire', 'Louis', 'Anne', 'Paul', 'Sophie', 'Jacques', 'Julie',
+    'Michel', 'Camille', 'Henri', 'Léa', 'Victor', 'Émilie', 'Georges', 'Chloé', 'André', 'Inès',
+]
+LAST_NAMES = [
+    'Martin', 'Bernard', 'Dubois', 'Thomas', 'Robert', 'Richard', 'Petit', 'Durand', 'Leroy',
+    'Moreau', 'Simon', 'Laurent', 'Lefèvre', 'Michel', 'Garcia', 'David', 'Bertrand', 'Roux',
+    'Vincent', 'Fournier', 'Morel', 'Girard', 'André', 'Mercier', 'Dupont', 'Lambert', 'Bonnet',
+]
+WORDS = [
+    'nuit', 'mer', 'jardin', 'silence', 'ombre', 'voyage', 'mémoire', 'temps', 'ville', 'hiver',
+    'feu', 'secret', 'lumière', 'chemin', 'rivière', 'étoile', 'maison', 'guerre', 'amour', 'rêve',
+    'montagne', 'forêt', 'île', 'fenêtre', 'lettre', 'sang', 'vent', 'royaume', 'miroir', 'sable',
+]
+ARTICLES = ['Le', 'La', 'Les', 'Un', 'Une', '']
+
+LOAN_FIELDS = [
+    'id', 'book', 'borrower', 'loan_date', 'due_date', 'returned_date', 'status', 'notes', 'librarian_notes',
+]
+
+# Notes des avis : les lecteurs notent surtout les livres qu'ils ont aimés
+RATING_WEIGHTS = [5, 10, 20, 35, 30]
+
+
+def zipf_weights(n, exponent):
+    """Poids cumulés d'une loi de Zipf sur n rangs (rang 1 le plus fréquent)"""
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+@contextmanager
+def historical_dates(*fields):
+    """Désactive auto_now / auto_now_add : ``bulk_create`` écrit les dates générées"""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un jeu de données synthétique reproductible (graine) : livres à popularité "
+        "Zipf, auteurs, lecteurs, emprunts et historiques, réservations et avis, par bulk_create"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42, help="Graine du générateur (défaut : 42)")
+        parser.add_argument('--books', type=int, default=20000, help="Livres (défaut : 20000)")
+        parser.add_argument('--authors', type=int, default=8000, help="Auteurs (défaut : 8000)")
+        parser.add_argument('--publishers', type=int, default=300, help="Éditeurs (défaut : 300)")
+        parser.add_argument('--members', type=int, default=100000, help="Lecteurs (défaut : 100000)")
+        parser.add_argument('--staff', type=int, default=5, help="Bibliothécaires (défaut : 5)")
+        parser.add_argument(
+            '--loans', type=int, default=1500000,
+            help="Emprunts, chacun avec une ou deux lignes d'historique (défaut : 1500000)"
+        )
+        parser.add_argument('--reservations', type=int, default=50000, help="Réservations (défaut : 50000)")
+        parser.add_argument('--reviews', type=int, default=200000, help="Avis, au plus (défaut : 200000)")
+        parser.add_argument('--years', type=int, default=3, help="Période couverte en années (défaut : 3)")
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help="Exposant de la loi de Zipf de la popularité des livres (défaut : 1.1)"
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help="Lignes par insertion (défaut : 5000)")
+        parser.add_argument(
+            '--skip-indexes', action='store_true',
+            help="Ne construit ni l'index de recherche ni les trigrammes"
+        )
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith='member').exists():
+            raise CommandError("Un jeu de données généré est déjà présent : utiliser une base vide (flush)")
+        if options['books'] < 1 or options['members'] < 1:
+            raise CommandError("--books et --members doivent être positifs")
+        self.rng = random.Random(options['seed'])
+        self.batch_size = max(100, options['batch_size'])
+        self.now = timezone.now()
+        self.rows = 0
+        self.start = self.now - timedelta(days=365 * max(1, options['years']))
+        started = time.monotonic()
+
+        with historical_dates(
+            User._meta.get_field('registration_date'),
+            Book._meta.get_field('created_at'),
+            Book._meta.get_field('updated_at'),
+        ):
+            self._members(options['members'], options['staff'])
+            self._catalogue(options['books'], options['authors'], options['publishers'])
+            # Rangs de popularité : livres et lecteurs mélangés, puis tirés selon Zipf
+            self.rng.shuffle(self.book_ids)
+            self.book_weights = zipf_weights(len(self.book_ids), options['zipf'])
+            self.member_weights = zipf_weights(len(self.member_ids), 0.6)
+            self._loans(options['loans'])
+            self._reservations(options['reservations'])
+            self._reviews(options['reviews'])
+        self._derived(options['skip_indexes'])
+        self._concurrent_access()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Jeu de données généré en {time.monotonic() - started:.0f} s : {self.rows} lignes "
+            f"(mot de passe des comptes : {PASSWORD})"
+        ))
+
+    # --- Tirages ---------------------------------------------------------------
+
+    def _books(self, k):
+        return self.rng.choices(self.book_ids, cum_weights=self.book_weights, k=k)
+
+    def _members_drawn(self, k):
+        return self.rng.choices(self.member_ids, cum_weights=self.member_weights, k=k)
+
+    def _moment(self, start=None):
+        start = start or self.start
+        return start + (self.now - start) * self.rng.random()
+
+    def _insert(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.rows += len(objects)
+        return objects
+
+    def _copy(self, model, fields, rows):
+        """
+        Insertion par ``executemany`` dans une transaction, pour les grandes
+        tables : ``bulk_create`` prépare chaque valeur de chaque instance, ce
+        qui coûte bien plus cher que l'insertion elle-même
+        """
+        if not rows:
+            return
+        connection = connections[router.db_for_write(model)]
+        columns = [model._meta.get_field(name) for name in fields]
+        adapters = [self._adapter(connection, field) for field in columns]
+        quote = connection.ops.quote_name
+        sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            quote(model._meta.db_table),
+            ', '.join(quote(field.column) for field in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                tuple(adapt(value) for adapt, value in zip(adapters, row)) for row in rows
+            ])
+        self.rows += len(rows)
+
+    @staticmethod
+    def _adapter(connection, field):
+        if isinstance(field, models.DateTimeField):
+            return connection.ops.adapt_datetimefield_value
+        if isinstance(field, models.DateField):
+            return connection.ops.adapt_datefield_value
+        return lambda value: value
+
+    def _progress(self, label, done, total):
+        self.stdout.write(f"  {label} : {done}/{total}")
+
+    # --- Comptes et catalogue --------------------------------------------------
+
+    def _members(self, count, staff):
+        password = make_password(PASSWORD)
+        self._insert(User, [
+            User(
+                username=f'librarian{i:03d}', email=f'librarian{i:03d}@example.com',
+                first_name=self.rng.choice(FIRST_NAMES), last_name=self.rng.choice(LAST_NAMES),
+                password=password, is_staff=True, registration_date=self.start, date_joined=self.start,
+            )
+            for i in range(staff)
+        ])
+        for offset in range(0, count, self.batch_size):
+            members = []
+            for i in range(offset, min(count, offset + self.batch_size)):
+                joined = self._moment()
+                members.append(User(
+                    username=f'member{i:06d}', email=f'member{i:06d}@example.com',
+                    first_name=self.rng.choice(FIRST_NAMES), last_name=self.rng.choice(LAST_NAMES),
+                    password=password, registration_date=joined, date_joined=joined,
+                ))
+            self._insert(User, members)
+        self.member_ids = list(
+            User.objects.filter(username__startswith='member').order_by('pk').values_list('pk', flat=True)
+        )
+        self.stdout.write(f"{count} lecteurs, {staff} bibliothécaires")
+
+    def _catalogue(self, book_count, author_count, publisher_count):
+        rng = self.rng
+        existing = set(Category.objects.values_list('name', flat=True))
+        self._insert(Category, [Category(name=name) for name in CATEGORIES if name not in existing])
+        category_ids = list(Category.objects.filter(name__in=CATEGORIES).values_list('pk', flat=True))
+
+        names = [f"Éditions {rng.choice(LAST_NAMES)} {i}" for i in range(publisher_count)]
+        publishers = self._insert(Publisher, [Publisher(name=name, name_key=normalize_key(name)) for name in names])
+        self.publisher_ids = publisher_ids = [publisher.pk for publisher in publishers]
+
+        authors = []
+        for i in range(author_count):
+            first, last = rng.choice(FIRST_NAMES), f"{rng.choice(LAST_NAMES)}-{i}"
+            authors.append(Author(
+                first_name=first, last_name=last,
+                first_name_key=normalize_key(first), last_name_key=normalize_key(last),
+            ))
+        self.author_ids = author_ids = [author.pk for author in self._insert(Author, authors)]
+        author_weights = zipf_weights(len(author_ids), 0.8)
+
+        self.book_ids = []
+        self.copies = {}
+        for offset in range(0, book_count, self.batch_size):
+            books = []
+            for i in range(offset, min(book_count, offset + self.batch_size)):
+                words = rng.sample(WORDS, rng.randint(1, 3))
+                title = f"{rng.choice(ARTICLES)} {' '.join(words)} {i}".strip().capitalize()
+                created = self._moment(self.start - timedelta(days=365))
+                copies = rng.choice([1, 1, 2, 2, 3, 5])
+                books.append(Book(
+                    title=title, title_key=normalize_key(title), sort_title=sort_key(title),
+                    isbn=f'{ISBN_PREFIX}{i:010d}',
+                    publisher_id=rng.choice(publisher_ids), category_id=rng.choice(category_ids),
+                    publication_date=(created - timedelta(days=rng.randint(0, 20000))).date(),
+                    pages=rng.randint(80, 900), language=rng.choice(LANGUAGES),
+                    summary=' '.join(rng.choices(WORDS, k=30)).capitalize() + '.',
+                    keywords=', '.join(words),
+                    total_copies=copies, available_copies=copies,
+                    created_at=created, updated_at=created,
+                ))
+            self._insert(Book, books)
+            through = Book.authors.through
+            links = {
+                (book.pk, author_id)
+                for book in books
+                for author_id in rng.choices(author_ids, cum_weights=author_weights, k=rng.choice([1, 1, 1, 2]))
+            }
+            self._insert(through, [through(book_id=b, author_id=a) for b, a in links])
+            self.book_ids.extend(book.pk for book in books)
+            self.copies.update((book.pk, book.total_copies) for book in books)
+        self.stdout.write(f"{book_count} livres, {author_count} auteurs, {publisher_count} éditeurs")
+
+    # --- Circulation -----------------------------------------------------------
+
+    def _loans(self, count):
+        """
+        Emprunts répartis sur la période ; ceux qui couvrent aujourd'hui restent
+        en cours dans la limite des exemplaires, d'un emprunt en cours par
+        livre et par lecteur et de ``MAX_ACTIVE_LOANS`` par lecteur.
+        """
+        rng = self.rng
+        today = self.now.date()
+        active_by_book, active_by_member, active_pairs = {}, {}, set()
+        # Identifiants attribués ici : l'historique les référence sans relire les emprunts
+        next_id = (Loan.objects.aggregate(last=models.Max('pk'))['last'] or 0) + 1
+        done = 0
+        while done < count:
+            size = min(self.batch_size, count - done)
+            loans, history = [], []
+            for book_id, member_id in zip(self._books(size), self._members_drawn(size)):
+                loan_date = self._moment()
+                due_date = (loan_date + timedelta(days=14)).date()
+                returned = loan_date + timedelta(days=rng.randint(2, 35), hours=rng.randint(0, 23))
+                if returned >= self.now:
+                    if (
+                        active_by_book.get(book_id, 0) < self.copies[book_id]
+                        and active_by_member.get(member_id, 0) < MAX_ACTIVE_LOANS
+                        and (book_id, member_id) not in active_pairs
+                    ):
+                        returned = None
+                        active_by_book[book_id] = active_by_book.get(book_id, 0) + 1
+                        active_by_member[member_id] = active_by_member.get(member_id, 0) + 1
+                        active_pairs.add((book_id, member_id))
+                    else:
+                        returned = self._moment(loan_date)
+                if returned is not None:
+                    status = 'returned'
+                else:
+                    status = 'overdue' if due_date < today else 'active'
+                loans.append((next_id, book_id, member_id, loan_date, due_date, returned, status, '', ''))
+                history.append((next_id, 'created', loan_date, ''))
+                if returned is not None:
+                    history.append((next_id, 'returned', returned, ''))
+                next_id += 1
+            self._copy(Loan, LOAN_FIELDS, loans)
+            self._copy(LoanHistory, ['loan', 'action', 'timestamp', 'notes'], history)
+            done += size
+            self._progress("emprunts", done, count)
+        self._reset_sequence(Loan)
+
+        # Stock : exemplaires en rayon = exemplaires - emprunts en cours
+        books = [
+            Book(pk=book_id, available_copies=self.copies[book_id] - active)
+            for book_id, active in active_by_book.items()
+        ]
+        Book.objects.bulk_update(books, ['available_copies'], batch_size=self.batch_size)
+        self.unavailable = {book.pk for book in books if book.available_copies == 0}
+        self.stdout.write(f"{count} emprunts, dont {len(active_pairs)} en cours")
+
+    def _reservations(self, count):
+        """Réservations closes sur la période ; en attente sur les livres récemment sans exemplaire"""
+        rng = self.rng
+        recent = self.now - timedelta(days=RESERVATION_DAYS)
+        open_pairs = set()
+        reservations = []
+        for book_id, member_id in zip(self._books(count), self._members_drawn(count)):
+            reserved = self._moment()
+            status = rng.choices(['fulfilled', 'expired', 'cancelled'], weights=[5, 3, 2])[0]
+            if reserved >= recent and book_id in self.unavailable and (book_id, member_id) not in open_pairs:
+                status = 'pending'
+                open_pairs.add((book_id, member_id))
+            reservations.append((
+                book_id, member_id, reserved, reserved + timedelta(days=RESERVATION_DAYS),
+                status, status == 'fulfilled',
+            ))
+        fields = ['book', 'user', 'reserved_date', 'expiry_date', 'status', 'notified']
+        for offset in range(0, len(reservations), self.batch_size):
+            self._copy(Reservation, fields, reservations[offset:offset + self.batch_size])
+        self.stdout.write(f"{count} réservations, dont {len(open_pairs)} en attente")
+
+    def _reviews(self, count):
+        """Avis (un par livre et par lecteur au plus) sur les livres les plus empruntés"""
+        seen = set()
+        reviews = []
+        for book_id, member_id in zip(self._books(count), self._members_drawn(count)):
+            if (book_id, member_id) in seen:
+                continue
+            seen.add((book_id, member_id))
+            reviews.append((
+                book_id, member_id, self.rng.choices(range(1, 6), weights=RATING_WEIGHTS)[0],
+                ' '.join(self.rng.choices(WORDS, k=12)).capitalize() + '.', self._moment(),
+            ))
+        fields = ['book', 'reviewer', 'rating', 'comment', 'created_at']
+        for offset in range(0, len(reviews), self.batch_size):
+            self._copy(BookReview, fields, reviews[offset:offset + self.batch_size])
+        self.stdout.write(f"{len(seen)} avis")
+
+    def _reset_sequence(self, model):
+        """Séquence de la clé primaire après des identifiants explicites (PostgreSQL)"""
+        connection = connections[router.db_for_write(model)]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [model]):
+                cursor.execute(sql)
+
+    # --- Données dérivées --------------------------------------------------------
+
+    def _derived(self, skip_indexes):
+        """Ce que les signaux auraient tenu à jour (bulk_create ne les émet pas)"""
+        rebuild_book_stats(batch_size=self.batch_size)
+        if not skip_indexes:
+            for kind, model, ids, fields in (
+                ('book', Book, sorted(self.book_ids), ['title']),
+                ('author', Author, self.author_ids, ['first_name', 'last_name']),
+                ('publisher', Publisher, self.publisher_ids, ['name']),
+            ):
+                for offset in range(0, len(ids), self.batch_size):
+                    batch = ids[offset:offset + self.batch_size]
+                    with transaction.atomic():
+                        if kind == 'book':
+                            update_search_documents(batch)
+                        fuzzy.index_objects(kind, model.objects.filter(pk__in=batch).only('pk', *fields))
+            get_search_backend().rebuild()
+        reference_cache.bump(*NAMESPACES)
+        timeseries.invalidate()
+        metrics.reconcile()
+        self.stdout.write("Statistiques, index de recherche et compteurs recalculés")
+
+    def _concurrent_access(self):
+        """
+        Fichier SQLite en mode WAL (réglage conservé par la base) : lectures et
+        écriture simultanées ne se bloquent plus, condition d'un test de charge
+        à plusieurs utilisateurs (load_test)
+        """
+        connection = connections[router.db_for_write(Loan)]
+        if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
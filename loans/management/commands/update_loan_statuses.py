@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from loans.services import update_statuses
+
+
+class Command(BaseCommand):
+    help = "Met à jour les statuts des emprunts (retards, retards levés) ; à planifier toutes les quelques minutes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help="Emprunts modifiés par transaction (défaut : 5000)"
+        )
+
+    def handle(self, *args, **options):
+        counts = update_statuses(batch_size=max(1, options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['overdue']} emprunt(s) en retard, {counts['active']} retard(s) levé(s), "
+            f"{counts['returned']} retour(s) régularisé(s)"
+        ))
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:03
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models.functions import Least
+from django.utils import timezone
+
+
+def close_duplicate_loans(apps, schema_editor):
+    """
+    Garde un seul emprunt ouvert par livre et par lecteur (le plus ancien) :
+    les doublons sont clos et leur exemplaire revient au stock
+    """
+    Loan = apps.get_model('loans', 'Loan')
+    Book = apps.get_model('books', 'Book')
+    seen = set()
+    duplicates = []
+    returned = Counter()
+    open_loans = Loan.objects.filter(returned_date__isnull=True).order_by('loan_date', 'pk')
+    for pk, book_id, borrower_id in open_loans.values_list('pk', 'book_id', 'borrower_id'):
+        if (book_id, borrower_id) in seen:
+            duplicates.append(pk)
+            returned[book_id] += 1
+        seen.add((book_id, borrower_id))
+    Loan.objects.filter(pk__in=duplicates).update(
+        status='returned', returned_date=timezone.now(),
+        librarian_notes='Emprunt en double clos par la migration 0002.',
+    )
+    for book_id, copies in returned.items():
+        Book.objects.filter(pk=book_id).update(
+            available_copies=Least(models.F('available_copies') + copies, models.F('total_copies'))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_loans, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='loan',
+            constraint=models.UniqueConstraint(condition=models.Q(('returned_date__isnull', True)), fields=('book', 'borrower'), name='unique_active_loan'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0002_circulation_constraints'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loanhistory',
+            name='action',
+            field=models.CharField(choices=[('created', 'Créé'), ('extended', 'Prolongé'), ('returned', 'Retourné'), ('marked_lost', 'Marqué comme perdu'), ('renewed', 'Renouvelé'), ('marked_overdue', 'Passé en retard'), ('overdue_cleared', 'Retard levé')], max_length=20, verbose_name='Action'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('returned_date__isnull', True)), fields=['due_date', 'status'], name='loan_open_due_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:20
+
+from django.db import migrations, models
+
+
+def cancel_duplicate_holds(apps, schema_editor):
+    """Garde une seule réservation ouverte par livre et par lecteur (la plus ancienne)"""
+    Reservation = apps.get_model('loans', 'Reservation')
+    seen = set()
+    duplicates = []
+    open_holds = Reservation.objects.filter(status__in=['pending', 'available']).order_by('reserved_date', 'pk')
+    for pk, book_id, user_id in open_holds.values_list('pk', 'book_id', 'user_id'):
+        if (book_id, user_id) in seen:
+            duplicates.append(pk)
+        seen.add((book_id, user_id))
+    Reservation.objects.filter(pk__in=duplicates).update(status='cancelled')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0003_loan_status_maintenance'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='reservation',
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['book', 'status', 'reserved_date'], name='reservation_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['status', 'expiry_date'], name='reservation_expiry_idx'),
+        ),
+        migrations.RunPython(cancel_duplicate_holds, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reservation',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'available'])), fields=('book', 'user'), name='unique_open_reservation'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0005_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['returned_date'], name='loan_returned_idx'),
+        ),
+    ]
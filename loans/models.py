@@ -7,6 +7,34 @@ from books.models import Book
 User = get_user_model()
 
 
+class LoanQuerySet(models.QuerySet):
+    """
+    Filtres communs sur les emprunts. Ils portent sur ``returned_date`` et
+    ``due_date`` (index partiel des emprunts en cours) et non sur ``status``,
+    qui n'est remis à jour que périodiquement (``update_loan_statuses``).
+    """
+
+    def active(self):
+        """Emprunts en cours (non rendus)"""
+        return self.filter(returned_date__isnull=True)
+
+    def overdue(self, today=None):
+        """Emprunts en cours dont l'échéance est dépassée"""
+        return self.active().filter(due_date__lt=today or timezone.localdate())
+
+    def due_soon(self, days=3, today=None):
+        """Emprunts en cours arrivant à échéance dans les ``days`` prochains jours"""
+        today = today or timezone.localdate()
+        return self.active().filter(due_date__gte=today, due_date__lte=today + timedelta(days=days))
+
+    def with_overdue_flag(self, today=None):
+        """Annote ``overdue_flag`` (en retard) calculé par la base"""
+        return self.annotate(overdue_flag=models.ExpressionWrapper(
+            models.Q(returned_date__isnull=True, due_date__lt=today or timezone.localdate()),
+            output_field=models.BooleanField(),
+        ))
+
+
 class Loan(models.Model):
     """Modèle pour les emprunts de livres"""
     
@@ -47,6 +75,8 @@ class Loan(models.Model):
         verbose_name="Créé par"
     )
     
+    objects = LoanQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Emprunt"
         verbose_name_plural = "Emprunts"
@@ -55,6 +85,24 @@ class Loan(models.Model):
             models.Index(fields=['borrower', 'status']),
             models.Index(fields=['due_date']),
             models.Index(fields=['status']),
+            # Liste de l'administration (tri et filtre par années et mois)
+            models.Index(fields=['loan_date'], name='loan_date_idx'),
+            # Série des retours du tableau de bord (intervalle de dates)
+            models.Index(fields=['returned_date'], name='loan_returned_idx'),
+            # Emprunts en cours par échéance : retards, échéances proches, statuts
+            models.Index(
+                fields=['due_date', 'status'],
+                condition=models.Q(returned_date__isnull=True),
+                name='loan_open_due_idx',
+            ),
+        ]
+        constraints = [
+            # Un seul emprunt en cours par livre et par lecteur
+            models.UniqueConstraint(
+                fields=['book', 'borrower'],
+                condition=models.Q(returned_date__isnull=True),
+                name='unique_active_loan',
+            ),
         ]
     
     def __str__(self):
@@ -93,16 +141,13 @@ class Loan(models.Model):
         return days if days >= 0 else 0
     
     def return_book(self, librarian=None, notes=""):
-        """Retourne le livre"""
-        if not self.returned_date:
-            self.returned_date = timezone.now()
-            self.status = 'returned'
-            if notes:
-                self.librarian_notes = notes
-            self.book.return_book()  # Augmente le stock disponible
-            self.save()
-            return True
-        return False
+        """Retourne le livre (voir ``loans.services.return_loan``)"""
+        from .services import AlreadyReturned, return_loan
+        try:
+            return_loan(self, performed_by=librarian, notes=notes)
+        except AlreadyReturned:
+            return False
+        return True
 
 
 class LoanHistory(models.Model):
@@ -114,6 +159,8 @@ class LoanHistory(models.Model):
         ('returned', 'Retourné'),
         ('marked_lost', 'Marqué comme perdu'),
         ('renewed', 'Renouvelé'),
+        ('marked_overdue', 'Passé en retard'),
+        ('overdue_cleared', 'Retard levé'),
     ]
     
     loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name='history', verbose_name="Emprunt")
@@ -126,6 +173,9 @@ class LoanHistory(models.Model):
         verbose_name = "Historique d'emprunt"
         verbose_name_plural = "Historiques d'emprunts"
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp'], name='loan_history_time_idx'),
+        ]
     
     def __str__(self):
         return f"{self.loan} - {self.get_action_display()}"
@@ -158,7 +208,20 @@ class Reservation(models.Model):
         verbose_name = "Réservation"
         verbose_name_plural = "Réservations"
         ordering = ['-reserved_date']
-        unique_together = ['book', 'user', 'status']
+        indexes = [
+            # File d'attente d'un livre, dans l'ordre d'arrivée
+            models.Index(fields=['book', 'status', 'reserved_date'], name='reservation_queue_idx'),
+            models.Index(fields=['status', 'expiry_date'], name='reservation_expiry_idx'),
+            models.Index(fields=['reserved_date'], name='reservation_date_idx'),
+        ]
+        constraints = [
+            # Une seule réservation ouverte par livre et par lecteur
+            models.UniqueConstraint(
+                fields=['book', 'user'],
+                condition=models.Q(status__in=['pending', 'available']),
+                name='unique_open_reservation',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.book.title} - {self.user.get_full_name()}"
@@ -0,0 +1,174 @@
+"""
+File d'attente des réservations.
+
+Chaque livre a sa file : les réservations ``pending`` dans l'ordre de
+``reserved_date`` (puis de clé), servie par l'index
+``(book, status, reserved_date)``.
+
+- Un exemplaire rendu va directement à la tête de la file, dans la
+  transaction du retour (``allocate``) : il ne repasse pas en rayon, la
+  réservation devient ``available`` et le lecteur a ``HOLD_DAYS`` jours pour
+  l'emprunter. L'emprunt consomme alors la réservation au lieu du stock.
+- Les réservations échues sont expirées par lots (``expire``) ; les
+  exemplaires qu'elles bloquaient passent aux suivants de la file, le reste
+  est remis en rayon.
+- Une réservation qui devient ``available`` émet ``holds_ready`` dans la même
+  transaction (notification du lecteur).
+- La position dans la file est le nombre de réservations qui la précèdent :
+  un comptage sur l'intervalle d'index correspondant, proportionnel au rang
+  (``position``). Les positions de toutes les réservations d'un lecteur sont
+  calculées en une requête (``positions``) par le même comptage en
+  sous-requête corrélée, une par réservation ; le reste des files n'est pas lu.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Func, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from books.models import Book
+
+from . import services, signals
+from .models import Reservation
+
+# Durée de validité d'une demande en file d'attente, et délai de retrait
+# d'un exemplaire mis de côté
+RESERVATION_DAYS = 30
+HOLD_DAYS = 3
+
+QUEUE_ORDER = ('reserved_date', 'pk')
+
+
+class ReservationError(services.CirculationError):
+    pass
+
+
+def queue(book):
+    """Réservations en attente d'un livre, dans l'ordre de service"""
+    return Reservation.objects.filter(book=book, status='pending').order_by(*QUEUE_ORDER)
+
+
+def reserve(book, user, now=None):
+    """Place ``user`` en fin de file ; lève ``ReservationError`` si c'est impossible"""
+    now = now or timezone.now()
+    if book.is_available():
+        raise ReservationError("Ce livre est disponible, vous pouvez l'emprunter directement.")
+    try:
+        with transaction.atomic():
+            return Reservation.objects.create(
+                book=book, user=user, expiry_date=now + timedelta(days=RESERVATION_DAYS)
+            )
+    except IntegrityError:
+        raise ReservationError("Vous avez déjà réservé ce livre.")
+
+
+def _ahead(book_id, reserved_date, pk):
+    """Réservations en attente qui précèdent (reserved_date, pk) dans la file du livre"""
+    # La borne reserved_date <= ... limite le parcours de l'index à l'intervalle qui précède
+    return Reservation.objects.filter(
+        Q(reserved_date__lt=reserved_date) | Q(pk__lt=pk),
+        book_id=book_id, status='pending', reserved_date__lte=reserved_date,
+    )
+
+
+def position(reservation):
+    """Rang (à partir de 1) d'une réservation en attente, None sinon (comptage de celles qui la précèdent)"""
+    if reservation.status != 'pending':
+        return None
+    return _ahead(reservation.book_id, reservation.reserved_date, reservation.pk).count() + 1
+
+
+def positions(user):
+    """Rang de chaque réservation en attente de ``user`` : {pk: rang}, en une requête"""
+    ahead = (
+        _ahead(OuterRef('book_id'), OuterRef('reserved_date'), OuterRef('pk'))
+        .order_by().annotate(count=Func(F('pk'), function='COUNT')).values('count')
+    )
+    ranked = (
+        Reservation.objects.filter(user=user, status='pending')
+        .annotate(ahead=Subquery(ahead, output_field=IntegerField()))
+        .order_by().values_list('pk', 'ahead')
+    )
+    return {pk: count + 1 for pk, count in ranked}
+
+
+def allocate(book_id, copies=1, now=None):
+    """
+    Met ``copies`` exemplaires de côté pour les premiers de la file (à appeler
+    dans la transaction qui libère les exemplaires). Retourne le nombre
+    d'exemplaires attribués ; les autres sont à remettre en rayon.
+    """
+    now = now or timezone.now()
+    heads = list(
+        Reservation.objects.select_for_update()
+        .filter(book_id=book_id, status='pending', expiry_date__gt=now)
+        .order_by(*QUEUE_ORDER)
+        .values_list('pk', flat=True)[:copies]
+    )
+    if not heads:
+        return 0
+    allocated = Reservation.objects.filter(pk__in=heads, status='pending').update(
+        status='available', expiry_date=now + timedelta(days=HOLD_DAYS), notified=False
+    )
+    signals.holds_ready.send(sender=Reservation, reservation_ids=heads)
+    return allocated
+
+
+def release_copies(book_id, copies=1, now=None):
+    """Exemplaires libérés : attribués à la file, le reste remis en rayon"""
+    remaining = copies - allocate(book_id, copies, now)
+    if remaining:
+        Book.objects.filter(pk=book_id).update(
+            available_copies=Least(F('available_copies') + remaining, F('total_copies'))
+        )
+
+
+def claim(book_id, user, now=None):
+    """
+    Consomme la réservation mise de côté pour ``user`` (emprunt). Retourne
+    True si un exemplaire l'attendait.
+    """
+    return Reservation.objects.filter(
+        book_id=book_id, user=user, status='available', expiry_date__gt=now or timezone.now()
+    ).update(status='fulfilled') == 1
+
+
+def cancel(reservation, now=None):
+    """Annule une réservation ; l'exemplaire éventuellement mis de côté passe au suivant"""
+    with transaction.atomic():
+        if Reservation.objects.filter(pk=reservation.pk, status='available').update(status='cancelled'):
+            release_copies(reservation.book_id, 1, now)
+        elif not Reservation.objects.filter(pk=reservation.pk, status='pending').update(status='cancelled'):
+            return False
+    reservation.status = 'cancelled'
+    return True
+
+
+def expire(now=None, batch_size=5000):
+    """
+    Expire par lots les réservations échues. Les exemplaires mis de côté et
+    non retirés passent aux suivants de la file. Retourne {statut: nombre}.
+    """
+    now = now or timezone.now()
+    counts = {'pending': 0, 'available': 0}
+    while True:
+        with transaction.atomic():
+            expired = Reservation.objects.select_for_update().filter(
+                status__in=['pending', 'available'], expiry_date__lte=now
+            )
+            rows = list(expired.order_by('pk').values_list('pk', 'book_id', 'status')[:batch_size])
+            if not rows:
+                break
+            Reservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(status='expired')
+            held = {}
+            for _, book_id, status in rows:
+                counts[status] += 1
+                if status == 'available':
+                    held[book_id] = held.get(book_id, 0) + 1
+            for book_id, copies in held.items():
+                release_copies(book_id, copies, now)
+        if len(rows) < batch_size:
+            break
+    return counts
+
@@ -0,0 +1,189 @@
+"""
+Service de circulation : emprunts et retours transactionnels.
+
+Le stock n'est jamais modifié par lecture-modification-écriture : chaque
+mouvement est un ``UPDATE`` conditionnel (``available_copies > 0`` à l'emprunt,
+``available_copies < total_copies`` au retour) dont le nombre de lignes
+modifiées indique le succès. Deux lecteurs qui se disputent le dernier
+exemplaire ne peuvent donc pas l'obtenir tous les deux, et les autres
+colonnes du livre (modifiées en parallèle dans l'administration) ne sont pas
+réécrites. Les contraintes de la base (``available_copies <= total_copies``,
+un seul emprunt en cours par livre et par lecteur) garantissent le reste.
+
+Seule la ligne du lecteur est verrouillée (``SELECT ... FOR UPDATE``), le temps
+de vérifier sa limite d'emprunts simultanés.
+
+Les statuts « en retard » ne sont pas recalculés à chaque lecture :
+``update_statuses`` (commande ``update_loan_statuses``, planifiée) fait passer
+d'un statut à l'autre tous les emprunts concernés par ``UPDATE`` groupés ;
+chaque lot passé en retard émet ``loans_overdue`` dans sa transaction.
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from books.models import Book
+
+from . import signals
+from .models import Loan, LoanHistory
+
+User = get_user_model()
+
+MAX_ACTIVE_LOANS = 5
+LOAN_DAYS = 14
+
+
+class CirculationError(Exception):
+    """Opération de circulation refusée (message destiné à l'utilisateur)"""
+
+
+class BookUnavailable(CirculationError):
+    pass
+
+
+class AlreadyBorrowed(CirculationError):
+    pass
+
+
+class LoanLimitReached(CirculationError):
+    pass
+
+
+class AlreadyReturned(CirculationError):
+    pass
+
+
+def take_copy(book_id):
+    """Retire un exemplaire du stock si possible ; retourne True en cas de succès"""
+    return Book.objects.filter(
+        pk=book_id, is_active=True, available_copies__gt=0
+    ).update(available_copies=F('available_copies') - 1) == 1
+
+
+def put_back_copy(book_id):
+    """Remet un exemplaire en stock sans dépasser le nombre total d'exemplaires"""
+    return Book.objects.filter(
+        pk=book_id, available_copies__lt=F('total_copies')
+    ).update(available_copies=F('available_copies') + 1) == 1
+
+
+def borrow(book, borrower, performed_by=None, due_date=None, notes='',
+           librarian_notes='', max_active_loans=MAX_ACTIVE_LOANS):
+    """
+    Emprunte un exemplaire de ``book`` pour ``borrower`` et retourne le ``Loan``.
+    Lève une ``CirculationError`` si l'emprunt est impossible.
+    """
+    book_id = getattr(book, 'pk', book)
+    if due_date is None:
+        due_date = timezone.now().date() + timedelta(days=LOAN_DAYS)
+
+    from . import reservations
+
+    with transaction.atomic():
+        # L'écriture conditionnelle vient en premier : elle prend le verrou
+        # d'écriture tout de suite (SQLite) et réserve l'exemplaire, sauf si
+        # un exemplaire a été mis de côté pour ce lecteur
+        if not reservations.claim(book_id, borrower) and not take_copy(book_id):
+            raise BookUnavailable("Ce livre n'est pas disponible pour l'emprunt.")
+
+        if max_active_loans is not None:
+            # Sérialise les emprunts d'un même lecteur le temps du comptage
+            list(User.objects.select_for_update().filter(pk=borrower.pk).values_list('pk', flat=True))
+            active = Loan.objects.filter(borrower=borrower).active().count()
+            if active >= max_active_loans:
+                raise LoanLimitReached(
+                    f"Vous avez atteint la limite d'emprunts simultanés ({max_active_loans})."
+                )
+
+        try:
+            with transaction.atomic():
+                loan = Loan.objects.create(
+                    book_id=book_id,
+                    borrower=borrower,
+                    due_date=due_date,
+                    notes=notes,
+                    librarian_notes=librarian_notes,
+                    created_by=performed_by,
+                )
+        except IntegrityError:
+            raise AlreadyBorrowed("Vous avez déjà emprunté ce livre.")
+
+        LoanHistory.objects.create(loan=loan, action='created', performed_by=performed_by)
+
+    if isinstance(book, Book):
+        book.refresh_from_db(fields=['available_copies'])
+    return loan
+
+
+def return_loan(loan, performed_by=None, notes=''):
+    """
+    Clôt l'emprunt et remet l'exemplaire en stock, ou le met de côté pour le
+    premier de la file d'attente. Lève ``AlreadyReturned`` si l'emprunt l'a
+    déjà été (y compris par une requête concurrente).
+    """
+    from . import reservations
+
+    loan_id = getattr(loan, 'pk', loan)
+    now = timezone.now()
+    changes = {'returned_date': now, 'status': 'returned'}
+    if notes:
+        changes['librarian_notes'] = notes
+
+    with transaction.atomic():
+        if not Loan.objects.filter(pk=loan_id, returned_date__isnull=True).update(**changes):
+            raise AlreadyReturned("Ce livre a déjà été retourné.")
+        book_id = Loan.objects.filter(pk=loan_id).values_list('book_id', flat=True).get()
+        # L'exemplaire va au premier de la file d'attente, sinon en rayon
+        if not reservations.allocate(book_id):
+            put_back_copy(book_id)
+        LoanHistory.objects.create(loan_id=loan_id, action='returned', performed_by=performed_by)
+
+    if isinstance(loan, Loan):
+        for field, value in changes.items():
+            setattr(loan, field, value)
+        if Loan.book.is_cached(loan):
+            loan.book.refresh_from_db(fields=['available_copies'])
+    return loan
+
+
+# Changements de statut périodiques : (statut cible, condition, action journalisée)
+STATUS_TRANSITIONS = [
+    ('overdue', lambda today: Q(returned_date__isnull=True, status='active', due_date__lt=today), 'marked_overdue'),
+    ('active', lambda today: Q(returned_date__isnull=True, status='overdue', due_date__gte=today), 'overdue_cleared'),
+    # Retours enregistrés sans mise à jour du statut (anciennes données)
+    ('returned', lambda today: Q(returned_date__isnull=False, status__in=['active', 'overdue']), None),
+]
+
+
+def update_statuses(today=None, batch_size=5000):
+    """
+    Met les statuts en accord avec les échéances : un ``UPDATE`` par transition
+    (par lot de ``batch_size`` emprunts) et l'historique en ``bulk_create``.
+    Sans changement à faire, une requête indexée par transition : la commande
+    peut tourner toutes les quelques minutes. Retourne {statut cible: nombre}.
+    """
+    today = today or timezone.localdate()
+    counts = {}
+    for status, condition, action in STATUS_TRANSITIONS:
+        queryset = Loan.objects.filter(condition(today))
+        counts[status] = 0
+        while True:
+            with transaction.atomic():
+                ids = list(queryset.select_for_update().order_by('pk').values_list('pk', flat=True)[:batch_size])
+                if not ids:
+                    break
+                updated = queryset.filter(pk__in=ids).update(status=status)
+                if action:
+                    LoanHistory.objects.bulk_create([
+                        LoanHistory(loan_id=loan_id, action=action, notes=f"Échéance du {today:%d/%m/%Y}")
+                        for loan_id in ids
+                    ])
+                if status == 'overdue':
+                    signals.loans_overdue.send(sender=Loan, loan_ids=ids)
+            counts[status] += updated
+            if len(ids) < batch_size:
+                break
+    return counts
@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Émis dans la transaction de la mise à jour groupée des statuts : loan_ids
+# (emprunts qui viennent de passer en retard)
+loans_overdue = Signal()
+
+# Émis dans la transaction qui met des exemplaires de côté : reservation_ids
+# (réservations devenues disponibles)
+holds_ready = Signal()
@@ -1,8 +1,23 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.admin.models import LogEntry
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db.models import Count, F
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
-from .models import Loan, Reservation
+from . import reservations, services as circulation
+from .admin import LoanAdmin
+from .models import Loan, LoanHistory, Reservation
 from books.models import Book, Author, Publisher, Category
 
 User = get_user_model()
@@ -70,3 +85,279 @@ class LoanModelTest(TestCase):
         # Vérifier que le stock a été mis à jour
         self.book.refresh_from_db()
         self.assertEqual(self.book.available_copies, initial_available + 1)
+
+
+class CirculationServiceTest(TestCase):
+    """Tests du service de circulation"""
+    
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=f'reader{i}', password='testpass123')
+            for i in range(3)
+        ]
+        category = Category.objects.create(name='Test Category')
+        publisher = Publisher.objects.create(name='Test Publisher')
+        self.book = Book.objects.create(
+            title='Test Book',
+            isbn='1234567890123',
+            publisher=publisher,
+            category=category,
+            publication_date='2023-01-01',
+            pages=100,
+            summary='Test summary',
+            total_copies=2,
+            available_copies=2
+        )
+    
+    def test_borrow_takes_last_copies_only(self):
+        circulation.borrow(self.book, self.users[0])
+        circulation.borrow(self.book, self.users[1])
+        self.assertEqual(self.book.available_copies, 0)
+        with self.assertRaises(circulation.BookUnavailable):
+            circulation.borrow(self.book, self.users[2])
+        self.assertEqual(Loan.objects.filter(book=self.book).count(), 2)
+    
+    def test_borrow_twice_is_refused_and_rolled_back(self):
+        circulation.borrow(self.book, self.users[0])
+        with self.assertRaises(circulation.AlreadyBorrowed):
+            circulation.borrow(self.book, self.users[0])
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+    
+    def test_loan_limit(self):
+        with self.assertRaises(circulation.LoanLimitReached):
+            circulation.borrow(self.book, self.users[0], max_active_loans=0)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+    
+    def test_return_only_once(self):
+        loan = circulation.borrow(self.book, self.users[0])
+        circulation.return_loan(loan.pk)
+        with self.assertRaises(circulation.AlreadyReturned):
+            circulation.return_loan(loan.pk)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+        self.assertEqual(
+            list(loan.history.order_by('pk').values_list('action', flat=True)),
+            ['created', 'returned']
+        )
+    
+    def test_admin_return_keeps_service_changes(self):
+        loan = circulation.borrow(self.book, self.users[0])
+        staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        request = RequestFactory().post('/')
+        request.user = staff
+        # Instance du formulaire : date de retour saisie, statut encore « actif »
+        obj = Loan.objects.get(pk=loan.pk)
+        obj.returned_date = timezone.now()
+        obj.notes = 'Rendu au guichet'
+        # Colonne modifiée ailleurs pendant l'édition : non écrasée
+        Loan.objects.filter(pk=loan.pk).update(librarian_notes='Relance envoyée')
+        form = SimpleNamespace(changed_data=['returned_date', 'notes'], initial={'returned_date': None})
+        LoanAdmin(Loan, admin.site).save_model(request, obj, form, change=True)
+        loan.refresh_from_db()
+        self.assertEqual(
+            (loan.status, loan.notes, loan.librarian_notes), ('returned', 'Rendu au guichet', 'Relance envoyée')
+        )
+        self.assertEqual(obj.status, 'returned')
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+        self.assertTrue(loan.history.filter(action='returned', performed_by=staff).exists())
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_admin_add_refused_by_service(self):
+        """Un emprunt refusé par le service est signalé dans l'admin, sans erreur 500"""
+        staff = User.objects.create_superuser(username='staff', password='testpass123')
+        self.client.force_login(staff)
+        url = reverse('admin:loans_loan_add')
+        # Dernier exemplaire pris entre la validation du formulaire et l'emprunt
+        Book.objects.filter(pk=self.book.pk).update(available_copies=0)
+        with mock.patch.object(Book, 'is_available', return_value=True):
+            response = self.client.post(url, {
+                'book': self.book.pk,
+                'borrower': self.users[0].pk,
+                'due_date': (timezone.localdate() + timedelta(days=14)).isoformat(),
+                'status': 'active',
+            }, follow=True)
+        self.assertEqual(response.redirect_chain, [(url, 302)])
+        self.assertEqual(
+            [str(m) for m in response.context['messages']], ["Ce livre n'est pas disponible pour l'emprunt."]
+        )
+        self.assertFalse(Loan.objects.filter(book=self.book).exists())
+        self.assertFalse(LogEntry.objects.exists())
+
+    def test_book_stock_updates_do_not_overwrite_other_columns(self):
+        stale = Book.objects.get(pk=self.book.pk)
+        Book.objects.filter(pk=self.book.pk).update(title='Titre modifié')
+        self.assertTrue(stale.borrow_book())
+        self.assertEqual(stale.available_copies, 1)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, 'Titre modifié')
+
+
+class LoanStatusTest(TestCase):
+    """Tests de la mise à jour groupée des statuts"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='testpass123')
+        category = Category.objects.create(name='Test Category')
+        publisher = Publisher.objects.create(name='Test Publisher')
+        self.today = timezone.localdate()
+        self.loans = {}
+        for i, days in enumerate([-5, 0, 2, 10]):
+            book = Book.objects.create(
+                title=f'Test Book {i}', isbn=f'123456789012{i}', publisher=publisher,
+                category=category, publication_date='2023-01-01', pages=100,
+                summary='Test summary', total_copies=1, available_copies=1
+            )
+            loan = circulation.borrow(book, self.user, due_date=self.today + timedelta(days=days))
+            Loan.objects.filter(pk=loan.pk).update(status='active')
+            self.loans[days] = loan
+    
+    def test_queryset_filters(self):
+        self.assertEqual(list(Loan.objects.overdue()), [self.loans[-5]])
+        self.assertEqual(
+            set(Loan.objects.due_soon(3)), {self.loans[0], self.loans[2]}
+        )
+        circulation.return_loan(self.loans[-5])
+        self.assertFalse(Loan.objects.overdue().exists())
+        self.assertEqual(Loan.objects.active().count(), 3)
+    
+    def test_update_statuses_is_idempotent(self):
+        self.assertEqual(circulation.update_statuses(self.today)['overdue'], 1)
+        self.assertEqual(Loan.objects.get(pk=self.loans[-5].pk).status, 'overdue')
+        self.assertEqual(LoanHistory.objects.filter(action='marked_overdue').count(), 1)
+        
+        self.assertEqual(circulation.update_statuses(self.today), {'overdue': 0, 'active': 0, 'returned': 0})
+        self.assertEqual(LoanHistory.objects.filter(action='marked_overdue').count(), 1)
+        
+        # Prolongation : le retard est levé au passage suivant
+        Loan.objects.filter(pk=self.loans[-5].pk).update(due_date=self.today + timedelta(days=7))
+        self.assertEqual(circulation.update_statuses(self.today)['active'], 1)
+        self.assertEqual(Loan.objects.get(pk=self.loans[-5].pk).status, 'active')
+    
+    def test_batches(self):
+        Loan.objects.update(due_date=self.today - timedelta(days=1))
+        self.assertEqual(circulation.update_statuses(self.today, batch_size=3)['overdue'], 4)
+        self.assertEqual(Loan.objects.filter(status='overdue').count(), 4)
+
+
+class ReservationQueueTest(TestCase):
+    """Tests de la file d'attente des réservations"""
+    
+    def setUp(self):
+        self.borrower = User.objects.create_user(username='borrower', password='testpass123')
+        self.holders = [
+            User.objects.create_user(username=f'holder{i}', password='testpass123')
+            for i in range(3)
+        ]
+        self.book = Book.objects.create(
+            title='Test Book',
+            isbn='1234567890123',
+            publisher=Publisher.objects.create(name='Test Publisher'),
+            category=Category.objects.create(name='Test Category'),
+            publication_date='2023-01-01',
+            pages=100,
+            summary='Test summary',
+            total_copies=1,
+            available_copies=1
+        )
+        self.loan = circulation.borrow(self.book, self.borrower)
+        self.holds = [reservations.reserve(self.book, holder) for holder in self.holders]
+    
+    def test_positions_follow_arrival_order(self):
+        self.assertEqual([reservations.position(r) for r in self.holds], [1, 2, 3])
+        reservations.cancel(self.holds[0])
+        self.assertEqual(reservations.position(self.holds[2]), 2)
+        self.assertEqual(reservations.positions(self.holders[2]), {self.holds[2].pk: 2})
+        self.assertEqual(reservations.positions(self.holders[0]), {})
+        with self.assertRaises(reservations.ReservationError):
+            reservations.reserve(self.book, self.holders[1])
+    
+    def test_positions_break_ties_by_arrival(self):
+        """Les réservations de même date sont départagées par leur clé, en une requête"""
+        Reservation.objects.filter(book=self.book).update(reserved_date=self.holds[0].reserved_date)
+        for holder, rank in zip(self.holders, [1, 2, 3]):
+            with self.assertNumQueries(1):
+                self.assertEqual(reservations.positions(holder), {self.holds[rank - 1].pk: rank})
+    
+    def test_return_goes_to_head_of_queue(self):
+        circulation.return_loan(self.loan)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 0)
+        self.assertEqual(Reservation.objects.get(pk=self.holds[0].pk).status, 'available')
+        
+        # Seul le lecteur servi peut emprunter l'exemplaire mis de côté
+        with self.assertRaises(circulation.BookUnavailable):
+            circulation.borrow(self.book, self.holders[1])
+        circulation.borrow(self.book, self.holders[0])
+        self.assertEqual(Reservation.objects.get(pk=self.holds[0].pk).status, 'fulfilled')
+        self.assertEqual(reservations.position(Reservation.objects.get(pk=self.holds[1].pk)), 1)
+    
+    def test_expired_hold_passes_to_next(self):
+        circulation.return_loan(self.loan)
+        later = timezone.now() + timedelta(days=reservations.HOLD_DAYS, hours=1)
+        self.assertEqual(reservations.expire(later), {'pending': 0, 'available': 1})
+        self.assertEqual(Reservation.objects.get(pk=self.holds[1].pk).status, 'available')
+        
+        # Plus personne en file : l'exemplaire revient en rayon
+        Reservation.objects.filter(pk=self.holds[2].pk).delete()
+        reservations.cancel(Reservation.objects.get(pk=self.holds[1].pk))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 1)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class SyntheticDatasetTest(TestCase):
+    """Jeu de données généré (generate_dataset) et test de charge (load_test)"""
+
+    def setUp(self):
+        # Comptes du catalogue mis en cache par les autres tests
+        cache.clear()
+
+    def generate(self, seed=7):
+        call_command(
+            'generate_dataset', '--seed', str(seed), '--books', '60', '--authors', '20', '--publishers', '5',
+            '--members', '40', '--staff', '1', '--loans', '600', '--reservations', '50', '--reviews', '80',
+            '--batch-size', '100', stdout=io.StringIO(),
+        )
+
+    def test_generated_data_is_consistent(self):
+        self.generate()
+        self.assertEqual(Loan.objects.count(), 600)
+        self.assertEqual(
+            LoanHistory.objects.count(), 600 + Loan.objects.filter(returned_date__isnull=False).count()
+        )
+        active = dict(Loan.objects.active().values('book').annotate(n=Count('id')).values_list('book', 'n'))
+        for book in Book.objects.all():
+            self.assertEqual(book.available_copies, book.total_copies - active.get(book.pk, 0))
+            self.assertEqual(book.stats.loan_count, book.loan_set.count())
+        # Popularité Zipf : les livres les plus empruntés concentrent les emprunts
+        top = Book.objects.order_by('-stats__loan_count')[:6]
+        self.assertGreater(sum(book.stats.loan_count for book in top), 600 * 0.3)
+        self.assertFalse(Loan.objects.filter(due_date__lt=F('loan_date')).exists())
+        # Inscriptions étalées sur la période (séries « nouveaux membres »)
+        members = User.objects.filter(username__startswith='member')
+        self.assertFalse(members.exclude(date_joined=F('registration_date')).exists())
+        with self.assertRaises(CommandError):
+            self.generate()
+
+    def test_load_test_report(self):
+        self.generate()
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'run.json'
+            call_command(
+                'load_test', '--concurrency', '1', '--requests', '40', '--output', str(output),
+                stdout=io.StringIO(),
+            )
+            report = json.loads(output.read_text(encoding='utf-8'))
+            self.assertEqual(report['total']['requests'], 40)
+            self.assertEqual(report['total']['errors'], 0)
+            self.assertIn('books:detail', report['urls'])
+            for stats in report['urls'].values():
+                self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+            # Comparaison avec lui-même : pas de régression
+            call_command(
+                'load_test', '--concurrency', '1', '--requests', '10', '--output', str(output),
+                '--compare', str(output), '--threshold', '100000', stdout=io.StringIO(),
+            )
@@ -15,6 +15,7 @@ urlpatterns = [
     path('return/<int:pk>/', views.return_book, name='return'),
     path('extend/<int:pk>/', views.extend_loan, name='renew'),
     path('reserve/<int:book_id>/', views.reserve_book, name='reserve'),
+    path('reservations/<int:pk>/cancel/', views.cancel_reservation, name='cancel_reservation'),
     
     # Admin
     path('admin/detail/<int:pk>/', views.AdminLoanDetailView.as_view(), name='admin_detail'),
@@ -7,6 +7,7 @@ from django.http import JsonResponse
 from django.db.models import Count, Q, Avg
 from django.utils import timezone
 from datetime import timedelta
+from . import reservations, services as circulation
 from .models import Loan, LoanHistory, Reservation
 from books.models import Book
 
@@ -20,19 +21,25 @@ class MyLoansView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         return Loan.objects.filter(
             borrower=self.request.user
-        ).select_related('book').order_by('-loan_date')
+        ).select_related('book').prefetch_related('book__authors').order_by('-loan_date')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user_loans = self.get_queryset()
         
-        context['active_loans'] = user_loans.filter(returned_date__isnull=True)
-        context['overdue_loans'] = user_loans.filter(
-            returned_date__isnull=True,
-            due_date__lt=timezone.now().date()
-        )
+        context['active_loans'] = user_loans.active()
+        context['overdue_loans'] = user_loans.overdue()
         context['loan_history'] = user_loans.filter(returned_date__isnull=False)[:10]
         
+        # Réservations ouvertes et rang dans la file d'attente
+        open_reservations = list(Reservation.objects.filter(
+            user=self.request.user, status__in=['pending', 'available']
+        ).select_related('book').order_by('reserved_date'))
+        queue_positions = reservations.positions(self.request.user) if open_reservations else {}
+        for reservation in open_reservations:
+            reservation.queue_position = queue_positions.get(reservation.pk)
+        context['reservations'] = open_reservations
+        
         return context
 
 
@@ -41,48 +48,16 @@ def borrow_book(request, book_id):
     """Emprunter un livre"""
     book = get_object_or_404(Book, id=book_id)
     
-    if not book.is_available():
-        messages.error(request, "Ce livre n'est pas disponible pour l'emprunt.")
-        return redirect('books:detail', pk=book_id)
-    
-    # Vérifier si l'utilisateur a déjà emprunté ce livre
-    existing_loan = Loan.objects.filter(
-        borrower=request.user,
-        book=book,
-        returned_date__isnull=True
-    ).exists()
-    
-    if existing_loan:
-        messages.warning(request, "Vous avez déjà emprunté ce livre.")
+    # Disponibilité, doublon et limite d'emprunts sont vérifiés dans la transaction
+    try:
+        loan = circulation.borrow(book, request.user, performed_by=request.user)
+    except circulation.AlreadyBorrowed as e:
+        messages.warning(request, str(e))
         return redirect('books:detail', pk=book_id)
-    
-    # Vérifier le nombre d'emprunts actifs
-    active_loans_count = Loan.objects.filter(
-        borrower=request.user,
-        returned_date__isnull=True
-    ).count()
-    
-    if active_loans_count >= 5:  # Limite de 5 emprunts simultanés
-        messages.error(request, "Vous avez atteint la limite d'emprunts simultanés (5).")
+    except circulation.CirculationError as e:
+        messages.error(request, str(e))
         return redirect('books:detail', pk=book_id)
     
-    # Créer l'emprunt
-    loan = Loan.objects.create(
-        book=book,
-        borrower=request.user,
-        due_date=timezone.now().date() + timedelta(days=14)
-    )
-    
-    # Réduire le stock disponible
-    book.borrow_book()
-    
-    # Créer l'historique
-    LoanHistory.objects.create(
-        loan=loan,
-        action='created',
-        performed_by=request.user
-    )
-    
     messages.success(request, f"Livre '{book.title}' emprunté avec succès! Date de retour: {loan.due_date}")
     return redirect('loans:my_loans')
 
@@ -90,22 +65,14 @@ def borrow_book(request, book_id):
 @login_required
 def return_book(request, pk):
     """Retourner un livre"""
-    loan = get_object_or_404(Loan, pk=pk, borrower=request.user)
+    loan = get_object_or_404(Loan.objects.select_related('book'), pk=pk, borrower=request.user)
     
-    if loan.returned_date:
-        messages.warning(request, "Ce livre a déjà été retourné.")
+    try:
+        circulation.return_loan(loan, performed_by=request.user, notes="Retour par l'utilisateur")
+    except circulation.AlreadyReturned as e:
+        messages.warning(request, str(e))
         return redirect('loans:my_loans')
     
-    # Retourner le livre
-    loan.return_book(notes="Retour par l'utilisateur")
-    
-    # Créer l'historique
-    LoanHistory.objects.create(
-        loan=loan,
-        action='returned',
-        performed_by=request.user
-    )
-    
     messages.success(request, f"Livre '{loan.book.title}' retourné avec succès!")
     return redirect('loans:my_loans')
 
@@ -147,35 +114,32 @@ def extend_loan(request, pk):
 
 @login_required
 def reserve_book(request, book_id):
-    """Réserver un livre"""
+    """Réserver un livre (place en fin de file d'attente)"""
     book = get_object_or_404(Book, id=book_id)
     
-    if book.is_available():
-        messages.info(request, "Ce livre est disponible, vous pouvez l'emprunter directement.")
+    try:
+        reservation = reservations.reserve(book, request.user)
+    except reservations.ReservationError as e:
+        messages.info(request, str(e))
         return redirect('books:detail', pk=book_id)
     
-    # Vérifier si l'utilisateur a déjà une réservation
-    existing_reservation = Reservation.objects.filter(
-        user=request.user,
-        book=book,
-        status='pending'
-    ).exists()
-    
-    if existing_reservation:
-        messages.warning(request, "Vous avez déjà réservé ce livre.")
-        return redirect('books:detail', pk=book_id)
-    
-    # Créer la réservation
-    reservation = Reservation.objects.create(
-        book=book,
-        user=request.user,
-        expiry_date=timezone.now() + timedelta(days=7)
+    messages.success(
+        request,
+        f"Livre '{book.title}' réservé avec succès! Vous êtes en position "
+        f"{reservations.position(reservation)} dans la file d'attente."
     )
-    
-    messages.success(request, f"Livre '{book.title}' réservé avec succès! Vous serez notifié quand il sera disponible.")
     return redirect('books:detail', pk=book_id)
 
 
+@login_required
+def cancel_reservation(request, pk):
+    """Annuler une réservation"""
+    reservation = get_object_or_404(Reservation, pk=pk, user=request.user)
+    if request.method == 'POST' and reservations.cancel(reservation):
+        messages.success(request, "Réservation annulée.")
+    return redirect('loans:my_loans')
+
+
 # Vues d'administration (à compléter)
 class AdminLoanListView(LoginRequiredMixin, ListView):
     """Vue d'administration pour les emprunts"""
@@ -0,0 +1,24 @@
+from django.contrib import admin, messages
+from django.utils import timezone
+
+from .models import Notification
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'kind', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at']
+    list_filter = ['kind', 'status', 'created_at']
+    search_fields = ['user__username', 'user__email', 'key']
+    list_select_related = ['user']
+    raw_id_fields = ['user', 'loan', 'reservation']
+    readonly_fields = ['key', 'attempts', 'last_error', 'created_at', 'sent_at']
+    date_hierarchy = 'created_at'
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        """Remet les notifications en échec dans la file d'envoi"""
+        count = queryset.filter(status__in=['failed', 'pending']).update(
+            status='pending', attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f"{count} notification(s) remise(s) en file.", messages.SUCCESS)
+    retry_now.short_description = "Renvoyer maintenant"
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from notifications import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Met en file les rappels d'échéance et de retard, puis envoie les notifications "
+        "en attente (un message récapitulatif par lecteur, une seule connexion SMTP)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--no-scan', action='store_true',
+            help="N'examine pas les échéances, envoie seulement la file (réservations disponibles...)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Notifications traitées par lot (défaut : 500)"
+        )
+        parser.add_argument(
+            '--max-batches', type=int, default=None,
+            help="Nombre maximal de lots envoyés (défaut : toute la file)"
+        )
+
+    def handle(self, *args, **options):
+        if not options['no_scan']:
+            scanned = outbox.enqueue_due()
+            self.stdout.write(
+                f"{scanned['due_soon']} échéance(s) proche(s), {scanned['overdue']} retard(s) examiné(s)"
+            )
+        counts = outbox.drain(batch_size=max(1, options['batch_size']), max_batches=options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['sent']} notification(s) envoyée(s), {counts['retried']} à retenter, "
+            f"{counts['failed']} abandonnée(s), {counts['cancelled']} annulée(s)"
+        ))
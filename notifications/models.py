@@ -0,0 +1,59 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from loans.models import Loan, Reservation
+
+User = get_user_model()
+
+
+class Notification(models.Model):
+    """
+    Boîte d'envoi des notifications aux lecteurs. Les lignes sont écrites
+    dans la transaction de l'événement de circulation qui les motive, puis
+    envoyées par lots (``send_notifications``).
+    """
+
+    KIND_CHOICES = [
+        ('due_soon', 'Échéance proche'),
+        ('overdue', 'Retard'),
+        ('hold_ready', 'Réservation disponible'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('sent', 'Envoyée'),
+        ('failed', 'Échec'),
+        ('cancelled', 'Annulée'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Destinataire")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Type")
+    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Emprunt")
+    reservation = models.ForeignKey(
+        Reservation, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Réservation"
+    )
+    # Clé de dédoublonnage : un même événement n'est mis en file qu'une fois
+    key = models.CharField(max_length=100, unique=True, verbose_name="Clé")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="Statut")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Tentatives")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Prochaine tentative")
+    last_error = models.TextField(blank=True, verbose_name="Dernière erreur")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Créée le")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Envoyée le")
+
+    class Meta:
+        verbose_name = "Notification"
+        verbose_name_plural = "Notifications"
+        ordering = ['-created_at']
+        indexes = [
+            # File d'envoi : seules les notifications en attente sont indexées
+            models.Index(
+                fields=['next_attempt_at', 'user'],
+                condition=models.Q(status='pending'),
+                name='notification_due_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} - {self.user.username}"
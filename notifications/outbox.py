@@ -0,0 +1,233 @@
+"""
+Boîte d'envoi des notifications aux lecteurs (échéance proche, retard,
+réservation disponible).
+
+- Les notifications sont écrites dans la transaction de l'événement qui les
+  motive (signaux ``loans_overdue`` et ``holds_ready``) : rien n'est envoyé
+  pour une transaction annulée, rien n'est perdu si le processus s'arrête
+  avant l'envoi. Les échéances proches, qui ne correspondent à aucun
+  événement, sont mises en file par un balayage (``enqueue_due``). La clé
+  unique de chaque ligne rend ces insertions idempotentes.
+- ``drain`` envoie la file par lots sur une seule connexion SMTP. Les
+  notifications d'un même lecteur sont regroupées en un message
+  récapitulatif ; celles devenues sans objet (livre rendu, échéance
+  prolongée, réservation retirée) sont annulées au lieu d'être envoyées.
+- Un envoi en échec est retenté après un délai exponentiel
+  (``NOTIFICATIONS_RETRY_SECONDS`` × 2^(tentatives - 1), 6 h au plus),
+  jusqu'à ``NOTIFICATIONS_MAX_ATTEMPTS`` tentatives.
+"""
+from datetime import timedelta
+from itertools import groupby, islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from loans.models import Loan, Reservation
+
+from .models import Notification
+
+DUE_SOON_DAYS = 2
+MAX_RETRY_DELAY = timedelta(hours=6)
+
+SUBJECTS = {
+    'due_soon': "Rappel : un emprunt arrive à échéance",
+    'overdue': "Emprunt en retard",
+    'hold_ready': "Votre réservation vous attend",
+}
+
+COUNTERS = ('sent', 'retried', 'failed', 'cancelled')
+
+
+# --- Mise en file -------------------------------------------------------------
+
+def _loan_key(kind, loan_id, due_date):
+    # L'échéance fait partie de la clé : une prolongation donne lieu à un nouveau rappel
+    return f'{kind}:{loan_id}:{due_date:%Y%m%d}'
+
+
+def _enqueue_loan_rows(kind, rows, batch_size=1000):
+    Notification.objects.bulk_create(
+        [
+            Notification(user_id=user_id, kind=kind, loan_id=loan_id, key=_loan_key(kind, loan_id, due_date))
+            for loan_id, user_id, due_date in rows
+        ],
+        batch_size=batch_size, ignore_conflicts=True,
+    )
+
+
+def enqueue_loans(kind, loan_ids):
+    """Met en file une notification ``kind`` par emprunt en cours"""
+    rows = Loan.objects.active().filter(pk__in=loan_ids).values_list('pk', 'borrower_id', 'due_date')
+    _enqueue_loan_rows(kind, rows)
+
+
+def enqueue_holds(reservation_ids):
+    """Met en file une notification par réservation disponible"""
+    rows = Reservation.objects.filter(pk__in=reservation_ids, status='available').values_list('pk', 'user_id')
+    Notification.objects.bulk_create(
+        [
+            Notification(user_id=user_id, kind='hold_ready', reservation_id=pk, key=f'hold_ready:{pk}')
+            for pk, user_id in rows
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def enqueue_due(today=None, batch_size=5000):
+    """
+    Balayage des échéances : emprunts à rendre sous ``DUE_SOON_DAYS`` jours et
+    emprunts en retard pas encore notifiés. Retourne {type: emprunts examinés}.
+    """
+    counts = {}
+    for kind, queryset in (
+        ('due_soon', Loan.objects.due_soon(DUE_SOON_DAYS, today)),
+        ('overdue', Loan.objects.overdue(today)),
+    ):
+        counts[kind] = 0
+        rows = queryset.order_by().values_list('pk', 'borrower_id', 'due_date').iterator(chunk_size=batch_size)
+        while True:
+            chunk = list(islice(rows, batch_size))
+            if not chunk:
+                break
+            _enqueue_loan_rows(kind, chunk)
+            counts[kind] += len(chunk)
+    return counts
+
+
+# --- Envoi --------------------------------------------------------------------
+
+def _claim(now, batch_size):
+    """
+    Réserve un lot de notifications dues (triées par lecteur) : leur prochaine
+    tentative est repoussée le temps de l'envoi, un autre worker les ignore.
+    """
+    lease = timedelta(seconds=getattr(settings, 'NOTIFICATIONS_LEASE_SECONDS', 600))
+    with transaction.atomic():
+        ids = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('user_id', 'pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if ids:
+            Notification.objects.filter(pk__in=ids).update(next_attempt_at=now + lease)
+    return ids
+
+
+def is_current(notification):
+    """La notification a-t-elle encore un objet ?"""
+    if notification.kind == 'hold_ready':
+        reservation = notification.reservation
+        return reservation is not None and reservation.status == 'available'
+    loan = notification.loan
+    return (
+        loan is not None and loan.returned_date is None
+        and notification.key == _loan_key(notification.kind, loan.pk, loan.due_date)
+    )
+
+
+def build_message(user, notifications):
+    """Message récapitulatif des notifications d'un lecteur"""
+    kinds = {notification.kind for notification in notifications}
+    if len(kinds) == 1:
+        subject = SUBJECTS[kinds.pop()]
+    else:
+        subject = f"Bibliothèque : {len(notifications)} informations sur vos emprunts"
+    body = render_to_string('notifications/digest.txt', {'user': user, 'notifications': notifications})
+    return EmailMessage(subject, body, to=[user.email])
+
+
+def _retry_delay(attempts):
+    base = getattr(settings, 'NOTIFICATIONS_RETRY_SECONDS', 300)
+    return min(timedelta(seconds=base * 2 ** (attempts - 1)), MAX_RETRY_DELAY)
+
+
+def _reopen(connection):
+    """Après une erreur, repart d'une connexion neuve (l'envoi suivant la rouvre sinon)"""
+    try:
+        connection.close()
+        connection.open()
+    except Exception:
+        pass
+
+
+def send_batch(ids, connection, now=None):
+    """Envoie un lot réservé par ``_claim`` ; retourne les compteurs du lot"""
+    now = now or timezone.now()
+    notifications = list(
+        Notification.objects.filter(pk__in=ids, status='pending')
+        .select_related('user', 'loan__book', 'reservation__book')
+        .order_by('user_id', 'pk')
+    )
+    counts = dict.fromkeys(COUNTERS, 0)
+    sent, cancelled, failures = [], [], []
+    for _, group in groupby(notifications, key=attrgetter('user_id')):
+        group = list(group)
+        current = [notification for notification in group if is_current(notification)]
+        cancelled.extend(notification.pk for notification in group if notification not in current)
+        if not current:
+            continue
+        user = current[0].user
+        if not user.email or not user.is_active:
+            cancelled.extend(notification.pk for notification in current)
+            continue
+        try:
+            connection.send_messages([build_message(user, current)])
+        except Exception as exc:
+            failures.append((current, f"{type(exc).__name__}: {exc}"[:500]))
+            _reopen(connection)
+        else:
+            sent.extend(current)
+
+    with transaction.atomic():
+        counts['cancelled'] = Notification.objects.filter(pk__in=cancelled).update(status='cancelled')
+        counts['sent'] = Notification.objects.filter(pk__in=[n.pk for n in sent]).update(
+            status='sent', sent_at=now, attempts=F('attempts') + 1, last_error=''
+        )
+        Reservation.objects.filter(
+            pk__in=[n.reservation_id for n in sent if n.kind == 'hold_ready']
+        ).update(notified=True)
+        max_attempts = getattr(settings, 'NOTIFICATIONS_MAX_ATTEMPTS', 5)
+        for group, error in failures:
+            for notification in group:
+                attempts = notification.attempts + 1
+                if attempts >= max_attempts:
+                    changes = {'status': 'failed'}
+                    counts['failed'] += 1
+                else:
+                    changes = {'next_attempt_at': now + _retry_delay(attempts)}
+                    counts['retried'] += 1
+                Notification.objects.filter(pk=notification.pk).update(
+                    attempts=attempts, last_error=error, **changes
+                )
+    return counts
+
+
+def drain(now=None, batch_size=500, max_batches=None):
+    """
+    Envoie les notifications dues, lot par lot, sur une seule connexion.
+    Retourne les compteurs cumulés (envoyées, à retenter, abandonnées, annulées).
+    """
+    now = now or timezone.now()
+    totals = dict.fromkeys(COUNTERS, 0)
+    connection = get_connection()
+    connection.open()
+    try:
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            ids = _claim(now, batch_size)
+            if not ids:
+                break
+            for name, value in send_batch(ids, connection, now).items():
+                totals[name] += value
+            batches += 1
+            if len(ids) < batch_size:
+                break
+    finally:
+        connection.close()
+    return totals
@@ -0,0 +1,17 @@
+from django.dispatch import receiver
+
+from loans.signals import holds_ready, loans_overdue
+
+from . import outbox
+
+
+@receiver(loans_overdue)
+def enqueue_overdue(sender, loan_ids, **kwargs):
+    """Retards constatés : mis en file dans la même transaction"""
+    outbox.enqueue_loans('overdue', loan_ids)
+
+
+@receiver(holds_ready)
+def enqueue_holds(sender, reservation_ids, **kwargs):
+    """Exemplaires mis de côté : mis en file dans la transaction du retour"""
+    outbox.enqueue_holds(reservation_ids)
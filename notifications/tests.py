@@ -0,0 +1,109 @@
+import io
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from books.models import Book, Category, Publisher
+from loans import reservations, services as circulation
+from loans.models import Loan
+
+from . import outbox
+from .models import Notification
+
+User = get_user_model()
+
+
+class FailingBackend(EmailBackend):
+    """Backend de test : le serveur refuse tous les messages"""
+
+    def send_messages(self, messages):
+        raise ConnectionRefusedError("serveur indisponible")
+
+
+class OutboxTest(TestCase):
+    """Tests de la boîte d'envoi des notifications"""
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader', email='reader@example.com', password='testpass123')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='testpass123')
+        publisher = Publisher.objects.create(name='Test Publisher')
+        category = Category.objects.create(name='Test Category')
+        self.books = [
+            Book.objects.create(
+                title=f"L'ouvrage {i}", isbn=f'978000000000{i}', publisher=publisher, category=category,
+                publication_date='2023-01-01', pages=100, summary='Résumé',
+                total_copies=1, available_copies=1,
+            )
+            for i in range(3)
+        ]
+        self.today = timezone.localdate()
+
+    def loan(self, book, user, due_in):
+        return Loan.objects.create(book=book, borrower=user, due_date=self.today + timedelta(days=due_in))
+
+    def test_overdue_and_due_soon_are_digested_per_user(self):
+        overdue = self.loan(self.books[0], self.reader, -1)
+        self.loan(self.books[1], self.reader, 2)
+        self.loan(self.books[2], self.other, 10)
+        # Statut pas encore mis à jour par la commande périodique
+        Loan.objects.filter(pk=overdue.pk).update(status='active')
+
+        circulation.update_statuses(self.today)
+        self.assertEqual(Notification.objects.get().kind, 'overdue')
+        outbox.enqueue_due(self.today)
+        outbox.enqueue_due(self.today)
+        self.assertEqual(Notification.objects.count(), 2)
+
+        counts = outbox.drain()
+        self.assertEqual(counts['sent'], 2)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['reader@example.com'])
+        self.assertIn("« L'ouvrage 0 » devait être rendu", mail.outbox[0].body)
+        self.assertIn("« L'ouvrage 1 » est à rendre", mail.outbox[0].body)
+        self.assertFalse(Notification.objects.exclude(status='sent').exists())
+
+    def test_hold_ready_is_enqueued_with_the_return(self):
+        loan = circulation.borrow(self.books[0], self.other)
+        reservation = reservations.reserve(self.books[0], self.reader)
+        self.assertFalse(Notification.objects.exists())
+
+        circulation.return_loan(loan)
+        notification = Notification.objects.get()
+        self.assertEqual((notification.kind, notification.reservation_id), ('hold_ready', reservation.pk))
+
+        call_command('send_notifications', '--no-scan', stdout=io.StringIO())
+        self.assertEqual(mail.outbox[0].subject, outbox.SUBJECTS['hold_ready'])
+        reservation.refresh_from_db()
+        self.assertTrue(reservation.notified)
+
+    def test_obsolete_notifications_are_cancelled(self):
+        loan = self.loan(self.books[0], self.reader, 1)
+        outbox.enqueue_due(self.today)
+        circulation.return_loan(loan)
+        self.assertEqual(outbox.drain()['cancelled'], 1)
+        self.assertEqual(len(mail.outbox), 0)
+
+    @override_settings(
+        EMAIL_BACKEND='notifications.tests.FailingBackend',
+        NOTIFICATIONS_MAX_ATTEMPTS=2, NOTIFICATIONS_RETRY_SECONDS=60,
+    )
+    def test_failures_are_retried_with_backoff(self):
+        self.loan(self.books[0], self.reader, -3)
+        outbox.enqueue_due(self.today)
+        now = timezone.now()
+
+        self.assertEqual(outbox.drain(now)['retried'], 1)
+        notification = Notification.objects.get()
+        self.assertEqual((notification.status, notification.attempts), ('pending', 1))
+        self.assertEqual(notification.next_attempt_at, now + timedelta(seconds=60))
+        self.assertIn('serveur indisponible', notification.last_error)
+
+        # Pas de nouvelle tentative avant l'échéance du délai
+        self.assertEqual(outbox.drain(now + timedelta(seconds=30))['retried'], 0)
+        self.assertEqual(outbox.drain(now + timedelta(seconds=61))['failed'], 1)
+        self.assertEqual(Notification.objects.get().status, 'failed')
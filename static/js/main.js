@@ -19,19 +19,28 @@ $(document).ready(function() {
         $('.alert').fadeOut('slow');
     }, 5000);
     
-    // Recherche en temps réel
+    // Autocomplétion de la barre de recherche
     let searchTimeout;
     $('#search-input').on('input', function() {
         clearTimeout(searchTimeout);
-        const query = $(this).val();
+        const input = $(this);
+        const query = input.val().trim();
         
-        if (query.length >= 3) {
+        if (query.length >= 2) {
             searchTimeout = setTimeout(function() {
-                performSearch(query);
-            }, 500);
+                fetchSuggestions(input, query);
+            }, 150);
+        } else {
+            $('#search-suggestions').removeClass('show').empty();
         }
     });
     
+    $('#search-input').on('blur', function() {
+        setTimeout(function() {
+            $('#search-suggestions').removeClass('show');
+        }, 200);
+    });
+    
     // Initialisation des tooltips Bootstrap
     $('[data-toggle="tooltip"]').tooltip();
     
@@ -103,6 +112,12 @@ $(document).ready(function() {
         updateBulkActions();
     });
     
+    // Facettes de recherche : chargement des valeurs restantes à la demande
+    $('.facet-more').on('click', function(e) {
+        e.preventDefault();
+        loadFacetValues($(this));
+    });
+    
     // Actions groupées
     $('#bulk-action-btn').on('click', function() {
         const action = $('#bulk-action-select').val();
@@ -123,14 +138,34 @@ $(document).ready(function() {
 
 // Fonctions utilitaires
 
-function performSearch(query) {
-    // Implémentation de la recherche AJAX
+const SUGGESTION_ICONS = {
+    book: 'fa-book',
+    author: 'fa-user',
+    publisher: 'fa-building'
+};
+
+function fetchSuggestions(input, query) {
     $.ajax({
-        url: '/search/',
+        url: input.data('autocomplete-url'),
         method: 'GET',
         data: { q: query },
         success: function(response) {
-            $('#search-results').html(response);
+            // Ignorer les réponses arrivées après une nouvelle saisie
+            if (input.val().trim() !== query) {
+                return;
+            }
+            const menu = $('#search-suggestions');
+            menu.empty();
+            response.results.forEach(suggestion => {
+                const item = $('<a class="dropdown-item small"></a>').attr('href', suggestion.url);
+                item.append($('<i class="fas mr-2"></i>').addClass(SUGGESTION_ICONS[suggestion.type]));
+                item.append(document.createTextNode(suggestion.label));
+                if (suggestion.detail) {
+                    item.append($('<small class="text-muted ml-2"></small>').text(suggestion.detail));
+                }
+                menu.append(item);
+            });
+            menu.toggleClass('show', response.results.length > 0);
         },
         error: function() {
             console.error('Erreur lors de la recherche');
@@ -138,6 +173,28 @@ function performSearch(query) {
     });
 }
 
+function loadFacetValues(link) {
+    $.ajax({
+        url: link.data('url'),
+        method: 'GET',
+        success: function(response) {
+            const list = $(link.data('target'));
+            list.empty();
+            response.values.forEach(entry => {
+                const item = $('<li class="list-group-item d-flex justify-content-between align-items-center py-1 small"></li>');
+                item.toggleClass('active', entry.selected);
+                item.append($('<a></a>').attr('href', '?' + entry.querystring).text(entry.label));
+                item.append($('<span class="badge badge-light"></span>').text(entry.count));
+                list.append(item);
+            });
+            link.closest('.card-footer').remove();
+        },
+        error: function() {
+            console.error('Erreur lors du chargement des facettes');
+        }
+    });
+}
+
 function previewImage(input) {
     if (input.files && input.files[0]) {
         const reader = new FileReader();